@@ -10,6 +10,7 @@ from fastapi import APIRouter, HTTPException, Query
 from app.services.workspace_db import workspace_session
 from app.models.database import Run, PatternMatch, NodeFact, Pattern, RunKind
 from app.services.llm_extractor import get_llm_extractor
+from app.services.llm_event_loop import run_on_llm_loop_async
 import logging
 
 router = APIRouter()
@@ -1061,7 +1062,7 @@ Be factual and concise. Format as a paragraph, NOT bullet points.
 """
 
             # Call LLM (async)
-            detailed_explanation = await llm.generate_explanation_async(prompt)
+            detailed_explanation = await run_on_llm_loop_async(llm.generate_explanation_async(prompt))
 
             # Build structured comparison for side-by-side visualization (if not already built)
             if pattern and is_mismatch and 'comparison' not in locals():
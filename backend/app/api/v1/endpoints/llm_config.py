@@ -267,11 +267,14 @@ async def test_llm_connection():
 
     try:
         from app.services.llm_extractor import get_llm_extractor
+        from app.services.llm_event_loop import run_on_llm_loop_async
 
         llm = get_llm_extractor()
 
         # Simple test prompt
-        test_response = await llm.generate_explanation_async("Respond with 'OK' if you can read this.")
+        test_response = await run_on_llm_loop_async(
+            llm.generate_explanation_async("Respond with 'OK' if you can read this.")
+        )
 
         if test_response and len(test_response) > 0:
             return {
@@ -10,7 +10,8 @@ from pydantic import BaseModel
 import structlog
 
 from app.services.llm_extractor import get_llm_extractor
-from app.services.xml_parser import XmlSubtree, XmlElement
+from app.services.llm_event_loop import run_on_llm_loop_async
+from app.services.xml_parser import XmlSubtree
 from app.core.logging import get_logger
 
 router = APIRouter()
@@ -48,22 +49,8 @@ async def test_llm_extraction(request: LLMTestRequest) -> LLMTestResponse:
                 section_path=request.section_path)
 
     try:
-        # Create test subtree
-        xml_element = XmlElement(
-            tag="TestElement",
-            text=None,
-            attributes={},
-            path=request.section_path,
-            namespace_uri="http://test.example.com"
-        )
-
-        subtree = XmlSubtree(
-            root_element=xml_element,
-            xml_content=request.xml_content,
-            size_bytes=len(request.xml_content.encode('utf-8')),
-            path=request.section_path,
-            node_count=1
-        )
+        # Create test subtree (serialized once, with structure stats)
+        subtree = XmlSubtree.from_xml(request.xml_content, request.section_path)
 
         # Get LLM extractor and test
         llm_extractor = get_llm_extractor()
@@ -75,7 +62,7 @@ async def test_llm_extraction(request: LLMTestRequest) -> LLMTestResponse:
             )
 
         # Extract facts
-        result = await llm_extractor.extract_from_subtree(subtree)
+        result = await run_on_llm_loop_async(llm_extractor.extract_from_subtree(subtree))
 
         logger.info("LLM extraction completed",
                     facts_extracted=len(result.node_facts),
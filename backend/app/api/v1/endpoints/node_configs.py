@@ -7,12 +7,11 @@ Handles BA-managed node extraction rules and reference configurations.
 from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
 from sqlalchemy.orm import Session
-from lxml import etree
 import logging
 
 from app.services.workspace_db import get_workspace_db
 from app.models.database import NodeConfiguration
-from app.services.xml_parser import detect_ndc_version_fast
+from app.services.xml_parser import detect_ndc_version_fast, discover_xml_nodes
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -52,33 +51,7 @@ async def analyze_xml_structure(
                 raise HTTPException(status_code=400, detail="Could not detect NDC version from XML")
 
             # Parse XML to extract all node paths
-            parser = etree.XMLParser(recover=True)
-            tree = etree.parse(tmp_file_path, parser)
-            root = tree.getroot()
-
-            # Recursively discover all nodes
-            discovered_nodes = []
-
-            def extract_nodes(element, path=""):
-                # Remove namespace
-                tag = element.tag.split('}')[-1] if '}' in element.tag else element.tag
-
-                current_path = f"{path}/{tag}" if path else tag
-
-                # Add this node
-                discovered_nodes.append({
-                    "node_type": tag,
-                    "section_path": current_path,
-                    "has_children": len(element) > 0,
-                    "has_attributes": len(element.attrib) > 0,
-                    "child_count": len(element)
-                })
-
-                # Recursively process children
-                for child in element:
-                    extract_nodes(child, current_path)
-
-            extract_nodes(root)
+            discovered_nodes = discover_xml_nodes(tmp_file_path)
 
             logger.info(f"Detected: {version_info.spec_version}/{version_info.message_root}, Airline: {version_info.airline_code or 'None'}")
 
@@ -12,7 +12,7 @@ from sqlalchemy.orm import Session
 
 from app.models.schemas import NodeFactResponse
 from app.models.database import NodeFact
-from app.services.workspace_db import get_workspace_db
+from app.services.workspace_db import get_workspace_read_db
 from app.core.logging import get_logger
 
 router = APIRouter()
@@ -49,7 +49,7 @@ async def list_node_facts(
                 offset=offset,
                 workspace=workspace)
 
-    db_generator = get_workspace_db(workspace)
+    db_generator = get_workspace_read_db(workspace)
     db = next(db_generator)
 
     try:
@@ -12,10 +12,12 @@ import structlog
 
 from app.models.schemas import PatternResponse
 from app.core.logging import get_logger
-from app.services.workspace_db import get_workspace_db
+from app.services.workspace_db import get_workspace_db, get_workspace_read_db
 from app.services.pattern_generator import create_pattern_generator
 from app.models.database import Pattern
 from app.services.llm_extractor import get_llm_extractor
+from app.services.llm_event_loop import run_on_llm_loop_async
+from app.services.llm_rate_limiter import get_llm_rate_limiter, prompt_token_estimate
 
 router = APIRouter()
 logger = get_logger(__name__)
@@ -55,7 +57,7 @@ async def list_patterns(
                 offset=offset,
                 workspace=workspace)
 
-    db_generator = get_workspace_db(workspace)
+    db_generator = get_workspace_read_db(workspace)
     db = next(db_generator)
 
     try:
@@ -393,23 +395,32 @@ Return a JSON object with:
 """
 
         try:
-            # Call LLM asynchronously
-            response = await llm_extractor.client.chat.completions.create(
-                model=llm_extractor.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an XML pattern modification expert. Analyze patterns and incorporate new requirements while maintaining structural consistency."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.3,
-                max_tokens=2000,
-                response_format={"type": "json_object"}
-            )
+            system_prompt = "You are an XML pattern modification expert. Analyze patterns and incorporate new requirements while maintaining structural consistency."
+            estimated_tokens = prompt_token_estimate(system_prompt, prompt, max_tokens=2000)
+
+            async def _modify_pattern():
+                async with get_llm_rate_limiter().limit(estimated_tokens) as permit:
+                    response = await llm_extractor.client.chat.completions.create(
+                        model=llm_extractor.model,
+                        messages=[
+                            {
+                                "role": "system",
+                                "content": system_prompt
+                            },
+                            {
+                                "role": "user",
+                                "content": prompt
+                            }
+                        ],
+                        temperature=0.3,
+                        max_tokens=2000,
+                        response_format={"type": "json_object"}
+                    )
+                    permit.record_usage(response.usage.total_tokens if response.usage else None)
+                return response
+
+            # The extractor's async client belongs to the shared LLM loop
+            response = await run_on_llm_loop_async(_modify_pattern())
 
             import json
             result = json.loads(response.choices[0].message.content)
@@ -12,7 +12,7 @@ import structlog
 
 from app.models.schemas import RelationshipResponse, RelationshipStatsResponse
 from app.core.logging import get_logger
-from app.services.workspace_db import get_workspace_db
+from app.services.workspace_db import get_workspace_read_db
 from app.models.database import NodeRelationship, Run
 
 router = APIRouter()
@@ -50,7 +50,7 @@ async def list_relationships(
                 offset=offset,
                 workspace=workspace)
 
-    db_generator = get_workspace_db(workspace)
+    db_generator = get_workspace_read_db(workspace)
     db = next(db_generator)
 
     try:
@@ -123,7 +123,7 @@ async def get_relationship_stats(
     """
     logger.info("Getting relationship statistics", run_id=run_id, workspace=workspace)
 
-    db_generator = get_workspace_db(workspace)
+    db_generator = get_workspace_read_db(workspace)
     db = next(db_generator)
 
     try:
@@ -187,7 +187,7 @@ async def get_run_relationship_summary(
     """
     logger.info("Getting relationship summary for run", run_id=run_id, workspace=workspace)
 
-    db_generator = get_workspace_db(workspace)
+    db_generator = get_workspace_read_db(workspace)
     db = next(db_generator)
 
     try:
@@ -295,7 +295,7 @@ async def get_reference_types(
 
     Useful for understanding what types of relationships exist in the system.
     """
-    db_generator = get_workspace_db(workspace)
+    db_generator = get_workspace_read_db(workspace)
     db = next(db_generator)
 
     try:
@@ -4,25 +4,41 @@ Run management endpoints for AssistedDiscovery.
 Handles creation and monitoring of Pattern Extractor and Discovery runs.
 """
 
+import asyncio
+import json
 import tempfile
 import os
+import shutil
+import zipfile
+from datetime import datetime
 from pathlib import Path
-from typing import Optional, List
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
-from fastapi.responses import JSONResponse
+from typing import Any, AsyncIterator, Dict, Optional, List, Tuple
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
-from app.models.schemas import RunCreate, RunResponse, RunStatus, ConflictDetectionResponse, ConflictResolution
-from app.services.workspace_db import get_workspace_db
+from app.core.config import settings
+from app.models.schemas import (
+    RunCreate, RunResponse, RunStatus, ConflictDetectionResponse, ConflictResolution, BatchRunResponse,
+    BatchFileResult
+)
+from app.services.workspace_db import get_workspace_db, get_workspace_read_db
 from app.services.pattern_extractor_workflow import create_pattern_extractor_workflow
-from app.services.discovery_workflow import create_discovery_workflow
 from app.services.conflict_detector import create_conflict_detector
+from app.services.run_executor import get_run_executor
+from app.services.run_progress import get_run_progress
 from app.models.database import Run, RunKind, RunStatus as DbRunStatus
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Comment line sent on idle event streams so proxies keep the connection open
+SSE_HEARTBEAT_SECONDS = 15
+# Events buffered per event-stream client; node results are dropped beyond this
+SSE_QUEUE_SIZE = 1000
+
 
 @router.post("/", response_model=RunResponse)
 async def create_run(
@@ -38,6 +54,10 @@ async def create_run(
     """
     Create a new Pattern Extractor or Discovery run.
 
+    The run executes in the background: the response returns the run id
+    immediately (status 'started'); poll GET /runs/{run_id} for its phase,
+    progress counters and final status.
+
     - **kind**: Type of run - 'pattern_extractor' for pattern learning, 'discovery' for pattern matching
     - **file**: XML file to process (OrderViewRS format)
     - **target_version**: (Not used - kept for backwards compatibility)
@@ -65,78 +85,195 @@ async def create_run(
 
     logger.info(f"Creating {kind} run in workspace: {workspace}, file: {file.filename}")
 
-    # Get workspace database session
-    db_generator = get_workspace_db(workspace)
-    db = next(db_generator)
+    # Save the upload; the run executor deletes the file when the run ends
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.xml') as temp_file:
+        content = await file.read()
+        temp_file.write(content)
+        temp_file_path = temp_file.name
 
     try:
-        # Create temporary file for processing
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xml') as temp_file:
-            # Read and save uploaded content
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-
+        run_id = await run_in_threadpool(
+            get_run_executor().submit,
+            workspace,
+            kind,
+            temp_file_path,
+            file.filename,
+            conflict_resolution=conflict_resolution if kind == "pattern_extractor" else None
+        )
+    except Exception as e:
         try:
-            # Run appropriate workflow based on kind
-            if kind == "pattern_extractor":
-                workflow = create_pattern_extractor_workflow(db)
-                results = workflow.run_discovery(
-                    temp_file_path,
-                    conflict_resolution=conflict_resolution
-                )
-            elif kind == "discovery":
-                workflow = create_discovery_workflow(db)
-                results = workflow.run_identify(
-                    temp_file_path,
-                    target_version=None,  # Cross-version matching always enabled
-                    target_message_root=None,  # Cross-message matching always enabled
-                    target_airline_code=None,  # Cross-airline matching always enabled
-                    allow_cross_airline=True  # Always enabled
-                )
-            else:
-                raise HTTPException(status_code=400, detail=f"Invalid run kind: {kind}")
+            os.unlink(temp_file_path)
+        except OSError:
+            pass
+        logger.error(f"Failed to create run: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-            # Convert status to API enum
-            api_status = RunStatus.STARTED
-            if results['status'] == 'completed':
-                api_status = RunStatus.COMPLETED
-            elif results['status'] == 'failed':
-                api_status = RunStatus.FAILED
+    progress = get_run_progress(run_id)
+    return RunResponse(
+        id=run_id,
+        kind=kind,
+        status=RunStatus.STARTED,
+        filename=file.filename,
+        file_size_bytes=len(content),
+        created_at=datetime.utcnow().isoformat(),
+        progress=progress.snapshot() if progress else None
+    )
 
-            return RunResponse(
-                id=results['run_id'],
-                kind=kind,
-                status=api_status,
-                filename=file.filename,
-                file_size_bytes=results.get('file_size_bytes'),
-                created_at=results['started_at'],
-                finished_at=results.get('finished_at'),
-                duration_seconds=results.get('duration_seconds'),
-                elements_analyzed=results.get('node_facts_extracted', 0),
-                subtrees_processed=results.get('subtrees_processed', 0),
-                spec_version=results.get('version_info', {}).get('spec_version') if results.get('version_info') else None,
-                message_root=results.get('version_info', {}).get('message_root') if results.get('version_info') else None,
-                airline_code=results.get('version_info', {}).get('airline_code') if results.get('version_info') else None,
-                airline_name=results.get('version_info', {}).get('airline_name') if results.get('version_info') else None,
-                error_details=results.get('error_details'),
-                warning=results.get('warning')
-            )
 
-        finally:
-            # Clean up temporary file
+def _save_batch_uploads(uploads: List[Tuple[str, bytes]], target_dir: Path) -> List[Path]:
+    """
+    Write uploaded XML files (and the XML members of uploaded .zip archives) to target_dir.
+
+    Each file gets its own sub-directory so the original filename is kept
+    even when names repeat across archives.
+    """
+    max_bytes = settings.MAX_XML_SIZE_MB * 1024 * 1024
+    saved: List[Path] = []
+
+    def save(filename: str, content: bytes):
+        file_dir = target_dir / str(len(saved))
+        file_dir.mkdir()
+        path = file_dir / Path(filename).name
+        path.write_bytes(content)
+        saved.append(path)
+
+    for filename, content in uploads:
+        lower_name = filename.lower()
+        if lower_name.endswith('.xml'):
+            if len(content) > max_bytes:
+                raise HTTPException(status_code=400, detail=f"{filename}: file too large (max {settings.MAX_XML_SIZE_MB}MB)")
+            save(filename, content)
+        elif lower_name.endswith('.zip'):
+            zip_path = target_dir / f"upload_{len(saved)}.zip"
+            zip_path.write_bytes(content)
             try:
-                os.unlink(temp_file_path)
-            except OSError:
-                pass
+                with zipfile.ZipFile(zip_path) as archive:
+                    for member in archive.infolist():
+                        if member.is_dir() or not member.filename.lower().endswith('.xml'):
+                            continue
+                        if member.file_size > max_bytes:
+                            raise HTTPException(
+                                status_code=400,
+                                detail=f"{filename}:{member.filename}: file too large (max {settings.MAX_XML_SIZE_MB}MB)"
+                            )
+                        save(member.filename, archive.read(member))
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{filename}: not a valid zip archive")
+            finally:
+                zip_path.unlink()
+        else:
+            raise HTTPException(status_code=400, detail=f"{filename}: files must be XML files or zip archives of XML files")
+
+    return saved
+
+
+@router.post("/batch", response_model=BatchRunResponse)
+async def create_batch_run(
+    files: List[UploadFile] = File(..., description="XML files and/or .zip archives of XML files"),
+    workspace: str = Query("default", description="Workspace name (e.g., default, SQ, LATAM)"),
+    max_parallel_files: Optional[int] = Query(None, ge=1, le=32, description="Files processed concurrently (default: MAX_PARALLEL_FILES)")
+) -> BatchRunResponse:
+    """
+    Run Discovery on many XML files at once.
+
+    - **files**: XML files, or zip archives of XML files (multipart upload)
+    - **workspace**: Workspace name (default: 'default')
+    - **max_parallel_files**: Files processed concurrently
+
+    The batch executes in the background: the response returns the batch id and
+    the Discovery run id of every file immediately. GET /runs/{batch_id} and
+    GET /runs/{batch_id}/events report files as they finish (files_done,
+    files_failed, one 'file_result' event per file); each file's run can be
+    followed the same way. GET /runs/batch/{batch_id} returns the per-file
+    results and, once the batch has finished, the aggregated coverage and gap report.
+    """
+    logger.info(f"Creating batch discovery run in workspace: {workspace}, uploads: {len(files)}")
+
+    uploads = [(upload.filename or "upload.xml", await upload.read()) for upload in files]
 
+    # The run executor deletes the directory when the batch ends
+    temp_dir = tempfile.mkdtemp(prefix="discovery_batch_")
+    try:
+        xml_paths = _save_batch_uploads(uploads, Path(temp_dir))
+        if not xml_paths:
+            raise HTTPException(status_code=400, detail="No XML files found in upload")
+
+        batch_id, run_ids = await run_in_threadpool(
+            get_run_executor().submit_batch,
+            workspace,
+            [str(path) for path in xml_paths],
+            temp_dir,
+            max_parallel_files=max_parallel_files
+        )
     except HTTPException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
         raise
     except Exception as e:
-        logger.error(f"Failed to create run: {e}")
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        logger.error(f"Failed to create batch run: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    progress = get_run_progress(batch_id)
+    return BatchRunResponse(
+        batch_id=batch_id,
+        status=RunStatus.STARTED,
+        files=[
+            BatchFileResult(filename=path.name, run_id=run_id, status=RunStatus.STARTED)
+            for path, run_id in zip(xml_paths, run_ids)
+        ],
+        started_at=datetime.utcnow().isoformat(),
+        progress=progress.snapshot() if progress else None
+    )
+
+
+@router.get("/batch/{batch_id}", response_model=BatchRunResponse)
+async def get_batch_run(
+    batch_id: str,
+    workspace: str = Query("default", description="Workspace name")
+) -> BatchRunResponse:
+    """
+    Get the per-file results of a batch Discovery run.
+
+    While the batch executes, each file reports the status of its run; once it
+    has finished, the stored per-file gap analysis and aggregated report are returned.
+    """
+    db_generator = get_workspace_read_db(workspace)
+    db = next(db_generator)
+
+    try:
+        batch = db.query(Run).filter(Run.id == batch_id, Run.kind == RunKind.DISCOVERY_BATCH).first()
+        if not batch:
+            raise HTTPException(status_code=404, detail="Batch not found")
+
+        metadata = batch.metadata_json or {}
+        live_progress = get_run_progress(batch_id)
+        progress = live_progress.snapshot() if live_progress else metadata.get('progress')
+
+        if metadata.get('batch'):
+            return BatchRunResponse(batch_id=batch_id, progress=progress, **metadata['batch'])
+
+        run_ids = metadata.get('run_ids') or []
+        file_runs = {run.id: run for run in db.query(Run).filter(Run.id.in_(run_ids)).all()}
+        return BatchRunResponse(
+            batch_id=batch_id,
+            status=batch.status,
+            files=[
+                BatchFileResult(
+                    filename=file_runs[run_id].filename,
+                    run_id=run_id,
+                    status=file_runs[run_id].status,
+                    spec_version=file_runs[run_id].spec_version,
+                    message_root=file_runs[run_id].message_root,
+                    error_details=file_runs[run_id].error_details
+                )
+                for run_id in run_ids if run_id in file_runs
+            ],
+            started_at=batch.started_at.isoformat() if batch.started_at else None,
+            finished_at=batch.finished_at.isoformat() if batch.finished_at else None,
+            duration_seconds=batch.duration_seconds,
+            progress=progress
+        )
     finally:
-        # Clean up database session
         try:
             next(db_generator)
         except StopIteration:
@@ -156,19 +293,7 @@ async def get_run_status(
     """
     logger.info(f"Getting run status: {run_id} from workspace: {workspace}")
 
-    # Get workspace database session
-    db_generator = get_workspace_db(workspace)
-    db = next(db_generator)
-
-    try:
-        # Get run from database using PatternExtractorWorkflow (has get_run_summary method)
-        workflow = create_pattern_extractor_workflow(db)
-        run_summary = workflow.get_run_summary(run_id)
-    finally:
-        try:
-            next(db_generator)
-        except StopIteration:
-            pass
+    run_summary = _get_run_summary(run_id, workspace)
 
     if not run_summary:
         raise HTTPException(status_code=404, detail="Run not found")
@@ -181,6 +306,12 @@ async def get_run_status(
         api_status = RunStatus.FAILED
     elif run_summary['status'] == 'in_progress':
         api_status = RunStatus.IN_PROGRESS
+    elif run_summary['status'] == 'partial_failure':
+        api_status = RunStatus.PARTIAL_FAILURE
+
+    # Live progress while the run executes in this process, else the final snapshot
+    live_progress = get_run_progress(run_id)
+    progress = live_progress.snapshot() if live_progress else (run_summary.get('metadata') or {}).get('progress')
 
     return RunResponse(
         id=run_summary['run_id'],
@@ -196,7 +327,118 @@ async def get_run_status(
         message_root=run_summary['message_root'],
         airline_code=run_summary.get('airline_code'),
         airline_name=run_summary.get('airline_name'),
-        error_details=run_summary['error_details']
+        error_details=run_summary['error_details'],
+        warning=run_summary.get('warning'),
+        progress=progress
+    )
+
+
+def _get_run_summary(run_id: str, workspace: str) -> Optional[Dict[str, Any]]:
+    # Get workspace database session
+    db_generator = get_workspace_read_db(workspace)
+    db = next(db_generator)
+
+    try:
+        # Get run from database using PatternExtractorWorkflow (has get_run_summary method)
+        workflow = create_pattern_extractor_workflow(db)
+        return workflow.get_run_summary(run_id)
+    finally:
+        try:
+            next(db_generator)
+        except StopIteration:
+            pass
+
+
+def _format_sse(event: str, data: Dict[str, Any], event_id: int) -> str:
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.get("/{run_id}/events")
+async def stream_run_events(
+    run_id: str,
+    request: Request,
+    workspace: str = Query("default", description="Workspace name")
+) -> StreamingResponse:
+    """
+    Stream the progress of a run as server-sent events.
+
+    Events (data is JSON):
+    - **snapshot**: current progress when the stream opens
+    - **phase** / **progress**: progress snapshot after a phase change or counter update
+      (subtrees, NodeFacts, tokens_used, processing_time_ms, facts_matched, elapsed_seconds)
+    - **node_result**: one extracted subtree (path, status, facts, confidence, latency, tokens)
+    - **relationships**: section pairs analyzed and relationships found so far
+    - **patterns**: pattern generation counts
+    - **end**: final progress snapshot; the stream closes after it
+
+    For a run not executing in this process the stream sends its stored status
+    (**end** if it has finished, else **status**) and closes.
+    """
+    progress = get_run_progress(run_id)
+
+    if progress is None:
+        run_summary = _get_run_summary(run_id, workspace)
+        if not run_summary:
+            raise HTTPException(status_code=404, detail="Run not found")
+
+        stored = dict((run_summary.get('metadata') or {}).get('progress') or {})
+        stored.setdefault('phase', run_summary['status'])
+        stored['status'] = run_summary['status']
+        finished = run_summary['status'] not in (DbRunStatus.STARTED, DbRunStatus.IN_PROGRESS)
+
+        async def stored_events() -> AsyncIterator[str]:
+            yield _format_sse('end' if finished else 'status', stored, 1)
+
+        return StreamingResponse(stored_events(), media_type="text/event-stream")
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+
+    def offer(event: str, data: Dict[str, Any]):
+        # Runs on the event loop; the end event must never be lost
+        if queue.full():
+            if event == 'node_result':
+                return
+            queue.get_nowait()
+        queue.put_nowait((event, data))
+
+    def listener(event: str, data: Dict[str, Any]):
+        # Called on workflow and extraction threads
+        loop.call_soon_threadsafe(offer, event, data)
+
+    progress.add_listener(listener)
+
+    async def live_events() -> AsyncIterator[str]:
+        event_id = 0
+        try:
+            # Registered before the snapshot is taken, so no change falls in between
+            event_id += 1
+            yield _format_sse('snapshot', progress.snapshot(), event_id)
+            if progress.finished:
+                event_id += 1
+                yield _format_sse('end', progress.snapshot(), event_id)
+                return
+
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+
+                event_id += 1
+                yield _format_sse(event, data, event_id)
+                if event == 'end':
+                    return
+        finally:
+            progress.remove_listener(listener)
+
+    return StreamingResponse(
+        live_events(),
+        media_type="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
     )
 
 
@@ -249,7 +491,7 @@ async def list_runs(
     logger.info(f"Listing runs from workspace: {workspace}, limit={limit}, offset={offset}, kind={kind}")
 
     # Get workspace database session
-    db_generator = get_workspace_db(workspace)
+    db_generator = get_workspace_read_db(workspace)
     db = next(db_generator)
 
     try:
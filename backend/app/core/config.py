@@ -40,6 +40,16 @@ class Settings(BaseSettings):
     COUCHDB_PASSWORD: str = Field(default="", description="CouchDB password")
     COUCHDB_DATABASE: str = Field(default="assisted_discovery", description="CouchDB database name")
 
+    # Database - SQLite workspaces
+    SQLITE_WAL_ENABLED: bool = Field(default=True, description="Use WAL journaling for workspace databases")
+    SQLITE_SYNCHRONOUS: str = Field(default="NORMAL", description="PRAGMA synchronous (NORMAL is durable under WAL)")
+    SQLITE_BUSY_TIMEOUT_MS: int = Field(default=5000, description="Wait per attempt for a locked database (retried MAX_DB_RETRIES times)")
+    SQLITE_CACHE_SIZE_KB: int = Field(default=65536, description="Page cache per connection in KB")
+    SQLITE_MMAP_SIZE_MB: int = Field(default=256, description="Memory-mapped I/O size in MB (0 disables)")
+    WORKSPACE_DB_POOL_SIZE: int = Field(default=5, description="Read-write connections per workspace")
+    WORKSPACE_DB_MAX_OVERFLOW: int = Field(default=5, description="Extra read-write connections under load")
+    WORKSPACE_DB_READ_POOL_SIZE: int = Field(default=8, description="Read-only connections per workspace for listing endpoints")
+
     # Cache - Redis
     REDIS_HOST: str = Field(default="localhost", description="Redis host")
     REDIS_PORT: int = Field(default=6379, description="Redis port")
@@ -79,7 +89,11 @@ class Settings(BaseSettings):
     # XML Processing
     MAX_XML_SIZE_MB: int = Field(default=100, description="Maximum XML file size in MB")
     MAX_SUBTREE_SIZE_KB: int = Field(default=20, description="Maximum subtree size for LLM in KB")
+    SPLIT_OVERSIZED_SUBTREES: bool = Field(default=True, description="Split subtrees above MAX_SUBTREE_SIZE_KB into batches of their children")
+    MAX_SUBTREE_BATCHES: int = Field(default=50, description="Maximum batches per split subtree (larger subtrees are skipped)")
+    STRUCTURAL_DEDUP_ENABLED: bool = Field(default=False, description="Send one representative per distinct repeated-child shape to the LLM")
     MICRO_BATCH_SIZE: int = Field(default=6, description="NodeFacts per LLM batch")
+    HEADER_SNIFF_MAX_KB: int = Field(default=1024, description="Maximum bytes read (in KB) when sniffing NDC version/airline")
 
     # Pattern Discovery
     PATTERN_CONFIDENCE_THRESHOLD: float = Field(default=0.7, description="Minimum confidence for pattern matches")
@@ -90,19 +104,69 @@ class Settings(BaseSettings):
     MAX_DB_RETRIES: int = Field(default=5, description="Maximum retries for database operations")
     RETRY_BACKOFF_FACTOR: float = Field(default=2.0, description="Exponential backoff factor for retries")
 
+    # LLM Response Cache
+    LLM_CACHE_ENABLED: bool = Field(default=True, description="Cache LLM extraction and relationship discovery responses per workspace")
+    LLM_CACHE_MAX_ENTRIES: int = Field(default=10000, description="Maximum cached LLM responses per workspace (LRU eviction)")
+
     # Security
     PII_MASKING_ENABLED: bool = Field(default=True, description="Enable PII masking")
     MAX_SNIPPET_LENGTH: int = Field(default=120, description="Maximum snippet length in characters")
 
     # Parallel Processing Configuration
-    MAX_PARALLEL_NODES: int = Field(
-        default=10,
-        description="Maximum number of nodes to process in parallel during Discovery"
-    )
     ENABLE_PARALLEL_PROCESSING: bool = Field(
         default=True,
         description="Enable parallel node processing (set to False for debugging)"
     )
+    LLM_MAX_CONCURRENCY: int = Field(
+        default=16,
+        description="Maximum in-flight LLM extraction requests on the shared event loop during Discovery"
+    )
+    LLM_HTTP2_ENABLED: bool = Field(
+        default=True,
+        description="Use HTTP/2 for LLM clients when the h2 package is installed"
+    )
+    RELATIONSHIP_MAX_CONCURRENCY: int = Field(
+        default=8,
+        description="Maximum in-flight LLM relationship discovery requests (one per section pair)"
+    )
+    RELATIONSHIP_PREFILTER_ENABLED: bool = Field(
+        default=True,
+        description="Only ask the LLM about section pairs where a reference value of the source is an ID of the target"
+    )
+    RELATIONSHIP_RULES_ENABLED: bool = Field(
+        default=True,
+        description="Resolve section pairs with references learned from earlier runs of the message type without the LLM"
+    )
+    RELATIONSHIP_RULE_MIN_VALID_RATIO: float = Field(
+        default=0.5,
+        description="Share of stored instances of a learned reference that must have resolved for it to become a rule"
+    )
+    SUBTREE_QUEUE_SIZE: int = Field(
+        default=32,
+        description="Parsed subtrees buffered ahead of the extraction workers (parser backpressure bound)"
+    )
+    NODE_FACT_FLUSH_SIZE: int = Field(
+        default=500,
+        description="NodeFacts buffered by the writer thread before a bulk insert"
+    )
+    NODE_FACT_FLUSH_INTERVAL_SECONDS: float = Field(
+        default=1.0,
+        description="Maximum time extracted NodeFacts wait in the writer before being committed"
+    )
+    MAX_CONCURRENT_RUNS: int = Field(
+        default=2,
+        description="Runs submitted through POST /runs/ executed at the same time in the background"
+    )
+    MAX_PARALLEL_FILES: int = Field(
+        default=4,
+        description="Files of a batch Discovery request processed concurrently (LLM calls stay under LLM_MAX_CONCURRENCY)"
+    )
+
+    # LLM Rate Limiting (shared by all LLM callers; match the deployment quota)
+    LLM_RATE_LIMIT_ENABLED: bool = Field(default=True, description="Enable client-side LLM rate limiting")
+    LLM_REQUESTS_PER_MINUTE: int = Field(default=300, description="Requests-per-minute budget (0 = unlimited)")
+    LLM_TOKENS_PER_MINUTE: int = Field(default=150000, description="Tokens-per-minute budget (0 = unlimited)")
+    LLM_MIN_CONCURRENCY: int = Field(default=1, description="Lower bound of the adaptive concurrency window")
 
     # Monitoring
     ENABLE_METRICS: bool = Field(default=True, description="Enable Prometheus metrics")
@@ -41,6 +41,17 @@ def create_application() -> FastAPI:
     # Include API routes
     application.include_router(api_router, prefix="/api/v1")
 
+    @application.on_event("startup")
+    async def recover_interrupted_runs():
+        """Runs executing when the server last stopped will never finish; mark them failed."""
+        from app.services.run_executor import fail_interrupted_runs_in_all_workspaces
+        fail_interrupted_runs_in_all_workspaces()
+
+    @application.on_event("shutdown")
+    async def stop_run_executor():
+        from app.services.run_executor import shutdown_run_executor
+        shutdown_run_executor()
+
     # Health check endpoint
     @application.get("/health")
     async def health_check():
@@ -9,7 +9,7 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
 
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, JSON, DECIMAL, ForeignKey, BigInteger
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, JSON, DECIMAL, ForeignKey, BigInteger, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, Session
 from sqlalchemy.sql import func
@@ -29,6 +29,7 @@ class RunKind(str, Enum):
     """Types of processing runs."""
     PATTERN_EXTRACTOR = "pattern_extractor"  # Extracts and learns patterns from XML
     DISCOVERY = "discovery"  # Matches XML against learned patterns
+    DISCOVERY_BATCH = "discovery_batch"  # Discovery over many files, one discovery run per file
 
 
 class RunStatus(str, Enum):
@@ -94,6 +95,10 @@ class NodeFact(Base):
     """Extracted and masked node facts from XML processing."""
 
     __tablename__ = "node_facts"
+    __table_args__ = (
+        Index("ix_node_facts_run_section", "run_id", "section_path"),
+        Index("ix_node_facts_message_version", "message_root", "spec_version"),
+    )
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     run_id = Column(String(50), ForeignKey("runs.id", ondelete="CASCADE"), nullable=False)
@@ -118,6 +123,11 @@ class NodeRelationship(Base):
     """LLM-discovered and validated relationships between nodes with metadata."""
 
     __tablename__ = "node_relationships"
+    __table_args__ = (
+        Index("ix_node_relationships_source", "source_node_fact_id"),
+        Index("ix_node_relationships_target", "target_node_fact_id"),
+        Index("ix_node_relationships_run_source_section", "run_id", "source_section_path"),
+    )
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     run_id = Column(String(36), ForeignKey("runs.id", ondelete="CASCADE"), nullable=False)
@@ -143,7 +153,7 @@ class NodeRelationship(Base):
     confidence = Column(DECIMAL(3, 2), default=1.0, comment="LLM confidence (0.0-1.0)")
 
     # Discovery source
-    discovered_by = Column(String(50), default='llm', comment="'llm' or 'config'")
+    discovered_by = Column(String(50), default='llm', comment="'llm', 'rule' (learned reference rule) or 'config'")
     model_used = Column(String(100), comment="LLM model that discovered this")
 
     created_at = Column(DateTime, default=func.now())
@@ -163,6 +173,9 @@ class Pattern(Base):
     """Discovered patterns for XML node classification."""
 
     __tablename__ = "patterns"
+    __table_args__ = (
+        Index("ix_patterns_lookup", "message_root", "spec_version", "airline_code", "superseded_by"),
+    )
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     spec_version = Column(String(10), nullable=False, comment="NDC version this pattern applies to")
@@ -196,6 +209,11 @@ class PatternMatch(Base):
     """Results of pattern matching during discovery runs."""
 
     __tablename__ = "pattern_matches"
+    __table_args__ = (
+        Index("ix_pattern_matches_run_verdict", "run_id", "verdict"),
+        Index("ix_pattern_matches_node_fact", "node_fact_id"),
+        Index("ix_pattern_matches_pattern", "pattern_id"),
+    )
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
     run_id = Column(String(50), ForeignKey("runs.id", ondelete="CASCADE"), nullable=False)
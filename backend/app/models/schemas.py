@@ -16,6 +16,7 @@ class RunKind(str, Enum):
     """Types of processing runs."""
     PATTERN_EXTRACTOR = "pattern_extractor"  # Extracts and learns patterns from XML
     DISCOVERY = "discovery"  # Matches XML against learned patterns
+    DISCOVERY_BATCH = "discovery_batch"  # Discovery over many files, one discovery run per file
 
 
 class RunStatus(str, Enum):
@@ -67,11 +68,46 @@ class RunResponse(BaseModel):
     subtrees_processed: Optional[int] = Field(None, description="Number of subtrees processed")
     error_details: Optional[str] = Field(None, description="Error information if failed")
     warning: Optional[str] = Field(None, description="Warning message (e.g., no node configs found)")
+    progress: Optional[Dict[str, Any]] = Field(
+        None, description="Current phase and counters (subtrees_done/subtrees_total, node_facts, tokens_used, facts_matched)"
+    )
 
     class Config:
         from_attributes = True
 
 
+class BatchFileResult(BaseModel):
+    """Outcome of one file of a batch Discovery run."""
+    filename: str = Field(..., description="Original filename")
+    run_id: Optional[str] = Field(None, description="Discovery run created for the file")
+    status: RunStatus = Field(..., description="Run status")
+    spec_version: Optional[str] = Field(None, description="Detected NDC version")
+    message_root: Optional[str] = Field(None, description="Detected message root")
+    node_facts_extracted: int = Field(0, description="NodeFacts extracted from the file")
+    matched_facts: int = Field(0, description="NodeFacts matched to a pattern")
+    high_confidence_matches: int = Field(0, description="Matches at or above 0.85 confidence")
+    new_patterns: int = Field(0, description="NodeFacts without a matching pattern")
+    quality_breaks: int = Field(0, description="NodeFacts with quality errors")
+    match_rate: float = Field(0.0, description="Match rate of the file (%)")
+    missing_patterns: List[Dict[str, Any]] = Field(default_factory=list, description="Library patterns absent from the file")
+    new_pattern_sections: List[str] = Field(default_factory=list, description="Sections no pattern matched")
+    error_details: Optional[str] = Field(None, description="Error information if failed")
+
+
+class BatchRunResponse(BaseModel):
+    """Response model for a batch Discovery run."""
+    batch_id: str = Field(..., description="Run id of the batch (poll GET /runs/{batch_id} or its /events)")
+    status: RunStatus = Field(..., description="started/in_progress, then completed, or partial_failure if any file failed")
+    files: List[BatchFileResult] = Field(..., description="Per-file results, in upload order")
+    summary: Optional[Dict[str, Any]] = Field(None, description="Aggregated coverage and gap report, once the batch has finished")
+    started_at: Optional[str] = Field(None, description="When the batch started (ISO format)")
+    finished_at: Optional[str] = Field(None, description="When the batch finished (ISO format)")
+    duration_seconds: Optional[int] = Field(None, description="Batch duration in seconds")
+    progress: Optional[Dict[str, Any]] = Field(
+        None, description="Current phase and file counters (files_done/files_total, files_failed)"
+    )
+
+
 class NodeFactResponse(BaseModel):
     """Response model for node facts."""
     id: int = Field(..., description="Unique node fact identifier")
@@ -213,7 +249,7 @@ class RelationshipResponse(BaseModel):
     is_valid: bool = Field(..., description="Does the reference resolve to a target node?")
     was_expected: bool = Field(..., description="Was this in expected_references config?")
     confidence: Optional[float] = Field(None, description="LLM confidence score (0.0-1.0)")
-    discovered_by: Optional[str] = Field(None, description="Discovery source (llm or config)")
+    discovered_by: Optional[str] = Field(None, description="Discovery source (llm, rule or config)")
     model_used: Optional[str] = Field(None, description="LLM model that discovered this")
     created_at: Optional[str] = Field(None, description="When relationship was discovered")
 
@@ -76,3 +76,19 @@ def get_pattern_description_prompt(node_type: str, section_path: str,
         child_elements=child_elements,
         references=references
     )
+
+
+def get_prompt_version(*filenames: str) -> str:
+    """
+    Short content hash of the given prompt templates.
+
+    Used as the prompt-version part of LLM cache keys, so editing a template
+    invalidates cached responses produced with the old wording.
+    """
+    import hashlib
+
+    digest = hashlib.sha256()
+    for filename in filenames:
+        digest.update(filename.encode('utf-8'))
+        digest.update(load_prompt(filename).encode('utf-8'))
+    return digest.hexdigest()[:12]
@@ -113,13 +113,9 @@ class BdpAuthenticator:
         logger.info(f"   Endpoint: {azure_endpoint}")
         logger.info(f"   API Version: {api_version}")
 
-        # Create HTTP client with custom settings
-        http_client = httpx.AsyncClient(
-            timeout=httpx.Timeout(timeout, connect=10.0),
-            limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
-            follow_redirects=True,
-            verify=verify_ssl
-        )
+        # Pooled HTTP client shared by all requests on the LLM event loop
+        from app.services.llm_event_loop import create_pooled_async_http_client
+        http_client = create_pooled_async_http_client(timeout, verify_ssl)
 
         client = AsyncAzureOpenAI(
             azure_endpoint=azure_endpoint,
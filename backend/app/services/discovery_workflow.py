@@ -8,12 +8,13 @@ Implements Phase 3: Pattern Discovery and Matching.
 import logging
 import uuid
 import json
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 from datetime import datetime
 from pathlib import Path
-from collections import defaultdict
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.core.config import settings
 from app.models.database import Run, RunKind, RunStatus, NodeFact, Pattern, PatternMatch
@@ -21,7 +22,9 @@ from app.services.xml_parser import detect_ndc_version_fast
 from app.services.pattern_extractor_workflow import PatternExtractorWorkflow
 from app.services.pattern_generator import PatternGenerator
 from app.services.llm_extractor import get_llm_extractor
-from app.services.utils import normalize_iata_prefix
+from app.services.pattern_index import CompiledRule, FactProfile, PatternIndex, normalize_node_type, normalize_section_path
+from app.services.similarity_engine import BulkSimilarityScorer
+from app.services.run_progress import RunProgress
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +32,12 @@ logger = logging.getLogger(__name__)
 class DiscoveryWorkflow:
     """Orchestrates the discovery process: extract NodeFacts and match against patterns."""
 
+    # Ids per IN (...) query when prefetching rows
+    ID_BATCH_SIZE = 500
+
+    # NodeFacts matched between progress updates
+    PROGRESS_INTERVAL = 100
+
     def __init__(self, db_session: Session):
         """Initialize discovery workflow."""
         self.db_session = db_session
@@ -38,20 +47,7 @@ class DiscoveryWorkflow:
     @staticmethod
     def _normalize_node_type(node_type: Optional[str]) -> str:
         """Normalize node type names for flexible matching and comparison."""
-        if not node_type:
-            return ""
-
-        nt = node_type.lower()
-
-        # Only normalize explicit synonyms; keep other types distinct
-        if nt in {'paxlist', 'passengerlist'}:
-            return 'pax_list'
-        if nt in {'paxjourneylist', 'passengerjourneylist'}:
-            return 'pax_journey_list'
-        if nt in {'paxsegmentlist', 'passengersegmentlist'}:
-            return 'pax_segment_list'
-
-        return nt
+        return normalize_node_type(node_type)
 
     def calculate_pattern_similarity(self,
                                      node_fact_structure: Dict[str, Any],
@@ -61,236 +57,12 @@ class DiscoveryWorkflow:
 
         Supports both legacy single-pattern format and new variations format.
         When variations exist, tries to match against each variation and returns the best match.
+        Compiles the rule on every call; run_identify scores against a PatternIndex instead.
 
         Returns:
             Tuple of (confidence: float 0.0-1.0, variation_id: int or None)
         """
-        from app.utils.pattern_variations import is_variations_format, get_variations, match_node_to_variation
-
-        # Check if pattern uses variations format
-        if is_variations_format(pattern_decision_rule):
-            # NEW FORMAT: Try matching against each variation
-            variations = get_variations(pattern_decision_rule)
-            best_confidence = 0.0
-            best_variation_id = None
-
-            for variation in variations:
-                matches, confidence, details = match_node_to_variation(node_fact_structure, variation)
-
-                if matches and confidence == 1.0:
-                    # Perfect match found - return immediately
-                    return (1.0, variation.get('variation_id'))
-
-                if confidence > best_confidence:
-                    best_confidence = confidence
-                    best_variation_id = variation.get('variation_id')
-
-            return (best_confidence, best_variation_id)
-
-        # LEGACY FORMAT: Use existing similarity calculation
-        score = 0.0
-        total_weight = 0.0
-
-        # 1. Node type match (HARD REQUIREMENT - 30% weight)
-        # Support name variations: PaxList, PassengerList, etc.
-        weight_node_type = 0.3
-        total_weight += weight_node_type
-
-        pattern_node = self._normalize_node_type(pattern_decision_rule.get('node_type'))
-        fact_node = self._normalize_node_type(node_fact_structure.get('node_type'))
-
-        node_type_matches = (pattern_node == fact_node) or \
-                           (node_fact_structure.get('node_type') == pattern_decision_rule.get('node_type'))
-
-        if node_type_matches:
-            score += weight_node_type
-        else:
-            # Node type mismatch - cap final score at 20% regardless of other matches
-            # This prevents matching completely different node types
-            pass  # Score remains 0 for this component
-
-        # 2. Must-have attributes match (30% weight)
-        weight_must_have = 0.3
-        total_weight += weight_must_have
-
-        pattern_must_have = set(pattern_decision_rule.get('must_have_attributes', []))
-        pattern_optional = set(pattern_decision_rule.get('optional_attributes', []))
-
-        # Filter out metadata fields that are added during extraction
-        # These are NOT real XML attributes and should not be compared
-        METADATA_FIELDS = {'summary', 'child_count', 'confidence', 'node_ordinal'}
-        all_fact_attributes = set(node_fact_structure.get('attributes', {}).keys())
-        fact_attributes = all_fact_attributes - METADATA_FIELDS
-
-        # Calculate match score based on required attributes
-        if pattern_must_have:
-            must_have_match = len(pattern_must_have & fact_attributes) / len(pattern_must_have)
-            score += weight_must_have * must_have_match
-        else:
-            # No required attributes - start with full score
-            score += weight_must_have
-
-        # PENALTY: Reduce score for extra unexpected attributes
-        # Extra = attributes in NodeFact that are NOT in pattern's required OR optional lists
-        expected_all_attributes = pattern_must_have | pattern_optional
-        extra_attributes = fact_attributes - expected_all_attributes
-
-        if extra_attributes and expected_all_attributes:
-            # Penalize 10% per extra attribute (cap at 30% total penalty)
-            extra_penalty = min(0.3, len(extra_attributes) * 0.10)
-            score -= extra_penalty
-            logger.info(f"Found {len(extra_attributes)} unexpected attribute(s): {extra_attributes}. Applying {extra_penalty*100:.0f}% penalty.")
-
-        # 3. Child structure match (25% weight)
-        weight_child = 0.25
-        total_weight += weight_child
-
-        pattern_child = pattern_decision_rule.get('child_structure', {})
-        fact_children = node_fact_structure.get('children', [])
-
-        if pattern_child.get('has_children'):
-            if fact_children:
-                # Both have children
-                pattern_is_container = pattern_child.get('is_container', False)
-                fact_is_container = isinstance(fact_children[0], dict) if fact_children else False
-
-                if pattern_is_container == fact_is_container:
-                    score += weight_child * 0.5
-
-                    # Check child types if container
-                    # Support name variations: Pax, Passenger, etc.
-                    if pattern_is_container and fact_is_container:
-                        def normalize_child_type(child_type):
-                            """Normalize child type names for flexible matching."""
-                            if not child_type:
-                                return ""
-                            ct = child_type.lower()
-
-                            # Only normalize exact synonyms
-                            if ct in ['pax', 'passenger']:
-                                return 'pax'
-                            elif ct in ['paxjourney', 'passengerjourney']:
-                                return 'pax_journey'
-                            elif ct in ['paxsegment', 'passengersegment']:
-                                return 'pax_segment'
-
-                            return ct
-
-                        # Normalize both pattern and fact child types
-                        pattern_types = set(normalize_child_type(t) for t in pattern_child.get('child_types', []))
-                        fact_types = set(normalize_child_type(child.get('node_type', '')) for child in fact_children)
-
-                        if pattern_types and fact_types:
-                            type_overlap = len(pattern_types & fact_types) / len(pattern_types | fact_types)
-                            score += weight_child * 0.5 * type_overlap
-                        else:
-                            score += weight_child * 0.5
-        else:
-            # Pattern has no children
-            if not fact_children:
-                score += weight_child
-
-        # 4. Reference patterns match (15% weight)
-        # CRITICAL: Must match relationship types AND directions (airline-specific!)
-        weight_refs = 0.15
-        total_weight += weight_refs
-
-        pattern_refs = pattern_decision_rule.get('reference_patterns', [])
-        fact_relationships = node_fact_structure.get('relationships', [])
-
-        if pattern_refs:
-            if fact_relationships:
-                # Build relationship signatures including direction (type + direction)
-                # This ensures INF→ADT doesn't match ADT→INF (airline-specific!)
-                def get_ref_signature(ref):
-                    """Create unique signature for relationship including direction."""
-                    ref_type = ref.get('type', '')
-                    direction = ref.get('direction', '')
-                    # For infant_parent, direction is CRITICAL (varies by airline)
-                    if ref_type == 'infant_parent' and direction:
-                        return f"{ref_type}:{direction}"
-                    return ref_type
-
-                pattern_ref_sigs = set(get_ref_signature(r) for r in pattern_refs)
-                fact_ref_sigs = set(get_ref_signature(r) for r in fact_relationships)
-
-                # Calculate overlap - must match both type AND direction
-                if pattern_ref_sigs:
-                    ref_overlap = len(pattern_ref_sigs & fact_ref_sigs) / len(pattern_ref_sigs)
-                    score += weight_refs * ref_overlap
-                else:
-                    score += weight_refs
-        else:
-            # No reference patterns required
-            score += weight_refs
-
-        # Normalize score
-        normalized_score = min(1.0, score / total_weight) if total_weight > 0 else 0.0
-
-        # CRITICAL: If node types don't match, cap the score at 20%
-        # This prevents PaxSegmentList from matching BaggageAllowanceList
-        if not node_type_matches:
-            normalized_score = min(normalized_score, 0.20)
-
-        # 5. VALIDATION: Check for relationship mismatches
-        # Compare actual relationships vs pattern's expected relationships
-        # Only penalize MISMATCHES (not expected broken relationships!)
-        expected_relationships = pattern_decision_rule.get('expected_relationships', [])
-
-        if expected_relationships:
-            # Pattern has expected relationships - compare actual vs expected
-            fact_relationships = node_fact_structure.get('relationships', [])
-
-            # Build lookup map: target_section_path -> actual relationship
-            actual_rel_map = {}
-            for rel in fact_relationships:
-                target = rel.get('target_section_path', '')
-                actual_rel_map[target] = rel
-
-            # Check for mismatches
-            mismatch_count = 0
-            for expected in expected_relationships:
-                target = expected.get('target_section_path', '')
-                expected_valid = bool(expected.get('is_valid', True))  # Ensure boolean
-
-                # Find corresponding actual relationship
-                actual = actual_rel_map.get(target)
-
-                if actual:
-                    actual_valid = bool(actual.get('is_valid', True))  # Ensure boolean
-
-                    # Mismatch: expected valid but got broken, or expected broken but got valid
-                    if expected_valid != actual_valid:
-                        mismatch_count += 1
-                        logger.debug(f"Relationship mismatch for {target}: "
-                                   f"expected is_valid={expected_valid} ({type(expected_valid).__name__}), "
-                                   f"actual is_valid={actual_valid} ({type(actual_valid).__name__})")
-                else:
-                    # Expected relationship is missing - this is also a mismatch
-                    mismatch_count += 1
-                    logger.debug(f"Expected relationship to {target} is missing")
-
-            if mismatch_count > 0:
-                # Penalize relationship mismatches - 30% per mismatch
-                penalty = min(0.6, mismatch_count * 0.3)  # Cap at 60% penalty
-                normalized_score = normalized_score * (1.0 - penalty)
-                logger.warning(f"Node has {mismatch_count} relationship mismatch(es), applying {penalty*100:.0f}% penalty. "
-                             f"Original score: {normalized_score/(1.0-penalty):.2f}, New score: {normalized_score:.2f}")
-        else:
-            # Pattern has NO expected relationships - use old logic for backward compatibility
-            fact_relationships = node_fact_structure.get('relationships', [])
-            if fact_relationships:
-                broken_count = sum(1 for rel in fact_relationships if not rel.get('is_valid', True))
-                if broken_count > 0:
-                    # Penalize broken relationships - reduce score by 30% per broken relationship
-                    penalty = min(0.6, broken_count * 0.3)  # Cap at 60% penalty
-                    normalized_score = normalized_score * (1.0 - penalty)
-                    logger.warning(f"Node has {broken_count} broken relationship(s) (pattern has no expected relationships), "
-                                 f"applying {penalty*100:.0f}% penalty. "
-                                 f"Original score: {normalized_score/(1.0-penalty):.2f}, New score: {normalized_score:.2f}")
-
-        # Return tuple for backward compatibility (None variation_id for legacy patterns)
-        return (normalized_score, None)
+        return CompiledRule(pattern_decision_rule).score(FactProfile(node_fact_structure))
 
     def match_node_fact_to_patterns(self,
                                      node_fact: NodeFact,
@@ -298,7 +70,10 @@ class DiscoveryWorkflow:
                                      message_root: str,
                                      airline_code: Optional[str] = None,
                                      allow_cross_airline: bool = False,
-                                     allow_cross_version: bool = False) -> List[Dict[str, Any]]:
+                                     allow_cross_version: bool = False,
+                                     pattern_index: Optional[PatternIndex] = None,
+                                     relationships: Optional[List[Any]] = None,
+                                     scorer: Optional[BulkSimilarityScorer] = None) -> List[Dict[str, Any]]:
         """
         Match a single NodeFact against patterns from the SAME message type.
 
@@ -312,62 +87,60 @@ class DiscoveryWorkflow:
             airline_code: Airline code to match against (ignored if allow_cross_airline=True)
             allow_cross_airline: If True, match against patterns from all airlines (same message_root)
             allow_cross_version: If True, match against patterns from all NDC versions (same message_root)
+            pattern_index: Compiled active patterns (built for message_root if not given)
+            relationships: NodeRelationships whose source is this NodeFact (queried if not given)
+            scorer: Bulk scorer shared across the run (keeps patterns encoded between NodeFacts)
 
         Returns:
             List of matches with confidence scores
         """
         from app.models.database import NodeRelationship
 
-        # Query patterns - ONLY match within the same message_root
-        # We compare same message types across airlines, NOT different message types
-        # Only match against active patterns (not superseded)
-        query = self.db_session.query(Pattern).filter(
-            Pattern.superseded_by.is_(None),  # Exclude superseded patterns
-            Pattern.message_root == message_root  # CRITICAL: Same message type only
-        )
-
-        # Filter by spec_version if cross-version mode is disabled
-        if not allow_cross_version:
-            query = query.filter(Pattern.spec_version == spec_version)
+        # Only active patterns (not superseded) of the same message type are indexed
+        if pattern_index is None:
+            pattern_index = PatternIndex.build(self.db_session, message_root)
 
-        # Filter by airline_code if cross-airline mode is disabled
-        if airline_code and not allow_cross_airline:
-            query = query.filter(Pattern.airline_code == airline_code)
+        # Filter by spec_version / airline_code unless cross matching is enabled
+        version_filter = None if allow_cross_version else spec_version
+        airline_filter = airline_code if airline_code and not allow_cross_airline else None
 
-        patterns = query.all()
+        fact_structure = node_fact.fact_json
+        if isinstance(fact_structure, str):
+            try:
+                fact_structure = json.loads(fact_structure)
+            except json.JSONDecodeError:
+                logger.warning("Failed to decode NodeFact fact_json for node %s", node_fact.id)
+                fact_structure = {}
 
-        # Build log message
-        version_info = f"{spec_version}/" if not allow_cross_version else "all versions/"
-        airline_info = f"/{airline_code}" if airline_code and not allow_cross_airline else ""
-        cross_info = []
-        if allow_cross_airline:
-            cross_info.append("cross-airline")
-        if allow_cross_version:
-            cross_info.append("cross-version")
-        mode_info = f" ({', '.join(cross_info)} mode)" if cross_info else ""
+        fact_node_normalized = self._normalize_node_type(
+            fact_structure.get('node_type') or node_fact.node_type
+        )
+        fact_section_normalized = normalize_section_path(node_fact.section_path, message_root)
+
+        candidates = pattern_index.candidates(
+            message_root,
+            fact_node_normalized,
+            fact_section_normalized,
+            spec_version=version_filter,
+            airline_code=airline_filter
+        )
 
-        if not patterns:
-            logger.info(f"No patterns found for {version_info}{message_root}{airline_info}{mode_info}")
+        if not candidates:
+            version_info = f"{spec_version}/" if not allow_cross_version else "all versions/"
+            airline_info = f"/{airline_code}" if airline_filter else ""
+            logger.debug(f"No candidate patterns for {node_fact.node_type} in {version_info}{message_root}{airline_info}")
             return []
 
-        if cross_info:
-            # Log details about which patterns were found
-            airline_breakdown = {}
-            for p in patterns:
-                airline = p.airline_code or "NULL"
-                airline_breakdown[airline] = airline_breakdown.get(airline, 0) + 1
-            airline_summary = ", ".join([f"{airline}:{count}" for airline, count in airline_breakdown.items()])
-            logger.info(f"Cross-matching enabled: found {len(patterns)} patterns for {message_root} ({', '.join(cross_info)}) - Airlines: {airline_summary}")
-
-        # Query ALL relationships for this NodeFact from database
-        all_relationships = self.db_session.query(NodeRelationship).filter(
-            NodeRelationship.source_node_fact_id == node_fact.id
-        ).all()
+        # ALL relationships for this NodeFact (run_identify prefetches them for the whole run)
+        if relationships is None:
+            relationships = self.db_session.query(NodeRelationship).filter(
+                NodeRelationship.source_node_fact_id == node_fact.id
+            ).all()
 
         # Build relationships list for fact_structure
         relationships_list = []
         broken_count = 0
-        for rel in all_relationships:
+        for rel in relationships:
             relationships_list.append({
                 'target_section_path': rel.target_section_path,
                 'target_node_type': rel.target_node_type,
@@ -380,62 +153,23 @@ class DiscoveryWorkflow:
         if broken_count > 0:
             logger.warning(f"NodeFact {node_fact.id} ({node_fact.node_type}) has {broken_count} broken relationship(s)")
 
-        matches = []
-
-        fact_structure = node_fact.fact_json
-        if isinstance(fact_structure, str):
-            try:
-                fact_structure = json.loads(fact_structure)
-            except json.JSONDecodeError:
-                logger.warning("Failed to decode NodeFact fact_json for node %s", node_fact.id)
-                fact_structure = {}
-
         # Add relationships to fact_structure for comparison
         fact_structure['relationships'] = relationships_list
 
-        fact_node_normalized = self._normalize_node_type(
-            fact_structure.get('node_type') or node_fact.node_type
-        )
-        fact_section_normalized = normalize_iata_prefix(
-            (node_fact.section_path or "").strip("/"),
-            message_root or ""
-        ).strip("/").lower()
-
-        for pattern in patterns:
-            pattern_decision_rule = pattern.decision_rule or {}
+        # Score against all candidates at once (bitset-encoded; same results as calculate_pattern_similarity)
+        if scorer is None:
+            scorer = BulkSimilarityScorer()
+        scores = scorer.score_candidates(scorer.encode_fact(fact_structure), candidates)
 
-            pattern_node_normalized = self._normalize_node_type(
-                pattern_decision_rule.get('node_type')
-            )
-
-            node_type_override = False
-
-            # Skip patterns with incompatible node types to avoid unrelated matches
-            if fact_node_normalized and pattern_node_normalized and fact_node_normalized != pattern_node_normalized:
-                pattern_section_normalized = normalize_iata_prefix(
-                    (pattern.section_path or "").strip("/"),
-                    message_root or ""
-                ).strip("/").lower()
-
-                # Allow mismatched node types when section path is identical (signals structural differences)
-                if pattern_section_normalized and pattern_section_normalized == fact_section_normalized:
-                    node_type_override = True
-                else:
-                    continue
+        matches = []
 
-            # Calculate similarity (returns tuple: confidence, variation_id)
-            confidence, variation_id = self.calculate_pattern_similarity(
-                fact_structure,
-                pattern_decision_rule
-            )
+        for (compiled, node_type_override), (confidence, variation_id) in zip(candidates, scores):
 
             if node_type_override:
-                # Ensure mismatch-driven comparisons remain low confidence
+                # Mismatched node types at the identical section path signal structural
+                # differences; keep those comparisons low confidence
                 confidence = min(confidence, 0.4)
 
-            # Relationship penalties are now handled inside calculate_pattern_similarity()
-            # by comparing actual relationships vs expected relationships from the pattern
-
             # Determine verdict based on confidence
             if confidence >= 0.95:
                 verdict = "EXACT_MATCH"
@@ -449,8 +183,8 @@ class DiscoveryWorkflow:
                 verdict = "NO_MATCH"
 
             matches.append({
-                'pattern_id': pattern.id,
-                'pattern': pattern,
+                'pattern_id': compiled.id,
+                'pattern': compiled.pattern,
                 'confidence': confidence,
                 'verdict': verdict,
                 'variation_id': variation_id  # Track which variation matched
@@ -461,6 +195,44 @@ class DiscoveryWorkflow:
 
         return matches
 
+    def _load_relationships_by_source(self, run_id: str) -> Dict[int, List[Any]]:
+        """All NodeRelationships of a run, grouped by source NodeFact id."""
+        from app.models.database import NodeRelationship
+
+        relationships = self.db_session.query(NodeRelationship).filter(
+            NodeRelationship.run_id == run_id
+        ).order_by(NodeRelationship.id).all()
+
+        relationships_by_source: Dict[int, List[Any]] = defaultdict(list)
+        for rel in relationships:
+            relationships_by_source[rel.source_node_fact_id].append(rel)
+
+        logger.info(f"Prefetched {len(relationships)} relationship(s) for {len(relationships_by_source)} NodeFact(s)")
+        return relationships_by_source
+
+    def _load_patterns_by_id(self, pattern_ids) -> Dict[int, Pattern]:
+        """Fetch Patterns by id in bulk (chunked to stay under SQLite's bound-parameter limit)."""
+        pattern_ids = list(pattern_ids)
+        patterns_by_id: Dict[int, Pattern] = {}
+        for start in range(0, len(pattern_ids), self.ID_BATCH_SIZE):
+            chunk = pattern_ids[start:start + self.ID_BATCH_SIZE]
+            for pattern in self.db_session.query(Pattern).filter(Pattern.id.in_(chunk)).all():
+                patterns_by_id[pattern.id] = pattern
+        return patterns_by_id
+
+    def _record_patterns_seen(self, seen_counts: Dict[int, int]):
+        """
+        Add a run's high confidence matches to Pattern.times_seen.
+
+        Increments are applied in SQL (times_seen = times_seen + n), so runs of a
+        batch committing concurrently do not overwrite each other's counts.
+        """
+        now = datetime.utcnow()
+        for pattern_id, count in seen_counts.items():
+            self.db_session.query(Pattern).filter(Pattern.id == pattern_id).update(
+                {Pattern.times_seen: Pattern.times_seen + count, Pattern.last_seen_at: now}
+            )
+
     def get_quick_explanation(self,
                               node_fact: NodeFact,
                               pattern: Optional[Pattern],
@@ -532,7 +304,11 @@ class DiscoveryWorkflow:
                      target_version: Optional[str] = None,
                      target_message_root: Optional[str] = None,
                      target_airline_code: Optional[str] = None,
-                     allow_cross_airline: bool = False) -> Dict[str, Any]:
+                     allow_cross_airline: bool = False,
+                     pattern_index: Optional[PatternIndex] = None,
+                     scorer: Optional[BulkSimilarityScorer] = None,
+                     run_id: Optional[str] = None,
+                     progress: Optional[RunProgress] = None) -> Dict[str, Any]:
         """
         Run identify workflow on new XML file.
 
@@ -546,6 +322,10 @@ class DiscoveryWorkflow:
             target_message_root: Optional specific message root to match against (e.g., "OrderViewRS")
             target_airline_code: Optional specific airline code to match against (e.g., "SQ", "AF")
             allow_cross_airline: If True, match against patterns from all airlines (default: False)
+            pattern_index: Compiled active patterns bound to this session (built for the run if not given)
+            scorer: Bulk scorer to reuse pattern encodings from (created for the run if not given)
+            run_id: Id of an already created run record (background runs); a new run is created if None
+            progress: Receives the phase and counters as the run advances
 
         Returns:
             Dict with identification results
@@ -587,9 +367,12 @@ class DiscoveryWorkflow:
         logger.info("Phase 1: Extracting NodeFacts from XML")
 
         # Run discovery extraction but SKIP pattern generation (Identify only matches, doesn't create patterns)
-        discovery_results = self.pattern_extractor.run_discovery(xml_file_path, skip_pattern_generation=True)
+        discovery_results = self.pattern_extractor.run_discovery(
+            xml_file_path, skip_pattern_generation=True, run_id=run_id, progress=progress
+        )
 
         run_id = discovery_results['run_id']
+        progress = progress or RunProgress(run_id)
 
         # Update run kind to DISCOVERY
         run = self.db_session.query(Run).filter(Run.id == run_id).first()
@@ -661,10 +444,31 @@ class DiscoveryWorkflow:
         else:
             logger.info(f"Found {available_patterns_count} pattern(s) available for {match_message_root}")
 
+        # Compile the active patterns once for the whole run instead of querying per NodeFact
+        if pattern_index is None:
+            pattern_index = PatternIndex.build(self.db_session, match_message_root)
+
+        root_patterns = pattern_index.patterns(match_message_root)
+        if allow_cross_airline and root_patterns:
+            airline_breakdown = {}
+            for compiled in root_patterns:
+                airline = compiled.airline_code or "NULL"
+                airline_breakdown[airline] = airline_breakdown.get(airline, 0) + 1
+            airline_summary = ", ".join([f"{airline}:{count}" for airline, count in airline_breakdown.items()])
+            logger.info(f"Cross-matching enabled: found {len(root_patterns)} patterns for {match_message_root} - Airlines: {airline_summary}")
+
         node_facts = self.db_session.query(NodeFact).filter(
             NodeFact.run_id == run_id
         ).all()
 
+        # Load the run's relationships in one query instead of one query per NodeFact
+        relationships_by_source = self._load_relationships_by_source(run_id)
+
+        # Encode the candidate patterns once; every NodeFact is scored against the same encodings
+        if scorer is None:
+            scorer = BulkSimilarityScorer()
+        scorer.encode_index(pattern_index, match_message_root)
+
         match_results = []
         matched_count = 0
         high_confidence_count = 0
@@ -672,8 +476,14 @@ class DiscoveryWorkflow:
         quality_issue_count = 0
         quality_coverage_total = 0.0
         quality_alerts: List[Dict[str, Any]] = []
+        seen_counts: Counter = Counter()
+
+        progress.phase('matching', facts_matched=0, facts_total=len(node_facts))
+
+        for fact_position, nf in enumerate(node_facts, 1):
+            if fact_position % self.PROGRESS_INTERVAL == 0:
+                progress.update(facts_matched=fact_position)
 
-        for nf in node_facts:
             fact_payload = nf.fact_json if isinstance(nf.fact_json, dict) else {}
             if not isinstance(fact_payload, dict):
                 try:
@@ -707,7 +517,6 @@ class DiscoveryWorkflow:
             quality_summary = ""
             if missing_elements:
                 # Deduplicate and count missing elements for cleaner display
-                from collections import Counter
                 error_counts = Counter()
                 for item in missing_elements:
                     if isinstance(item, dict):
@@ -736,7 +545,10 @@ class DiscoveryWorkflow:
                 match_message_root,
                 match_airline_code,
                 allow_cross_airline=allow_cross_airline,
-                allow_cross_version=True  # Always match across all NDC versions
+                allow_cross_version=True,  # Always match across all NDC versions
+                pattern_index=pattern_index,
+                relationships=relationships_by_source.get(nf.id, []),
+                scorer=scorer
             )
 
             if matches:
@@ -985,11 +797,9 @@ class DiscoveryWorkflow:
                     if best_match['confidence'] >= 0.85 and quality_status != 'error':
                         high_confidence_count += 1
     
-                    # Update pattern times_seen for high confidence matches
+                    # Count high confidence matches towards pattern times_seen
                     if best_match['confidence'] >= 0.85:
-                        pattern = best_match['pattern']
-                        pattern.times_seen += 1
-                        pattern.last_seen_at = datetime.utcnow()
+                        seen_counts[best_match['pattern_id']] += 1
     
             else:
                 # No patterns found - this is a NEW pattern
@@ -1042,11 +852,14 @@ class DiscoveryWorkflow:
                     'quality_checks': quality_checks
                 })
 
+        self._record_patterns_seen(seen_counts)
+
         # Commit all pattern matches
         self.db_session.commit()
 
         # PHASE 3: Gap Analysis
         logger.info("Phase 3: Generating gap analysis")
+        progress.phase('gap_analysis', facts_matched=len(node_facts))
 
         confidence_match_rate = (matched_count / node_facts_extracted * 100) if node_facts_extracted > 0 else 0
         quality_match_rate = (quality_coverage_total / node_facts_extracted) if node_facts_extracted > 0 else 0
@@ -1071,12 +884,19 @@ class DiscoveryWorkflow:
 
         # Build set of node types that were matched (deduplicate by node type, not pattern ID)
         # This prevents showing "DatedMarketingSegmentList missing" when one version was matched
+        matched_pattern_ids = {
+            match['best_match']['pattern_id']
+            for match in match_results
+            if match.get('best_match') and match['best_match'].get('pattern_id')
+        }
+        matched_patterns = self._load_patterns_by_id(matched_pattern_ids)
+
         matched_node_types = set()
         for match in match_results:
             if match.get('best_match') and match['best_match'].get('pattern_id'):
                 pattern_id = match['best_match']['pattern_id']
                 # Get the pattern to extract node type
-                matched_pattern = self.db_session.query(Pattern).filter(Pattern.id == pattern_id).first()
+                matched_pattern = matched_patterns.get(pattern_id)
                 if matched_pattern and matched_pattern.decision_rule:
                     node_type = matched_pattern.decision_rule.get('node_type')
                     if node_type:
@@ -1168,6 +988,157 @@ class DiscoveryWorkflow:
 
         return results
 
+    def run_identify_batch(self,
+                           xml_file_paths: List[str],
+                           allow_cross_airline: bool = True,
+                           max_workers: Optional[int] = None,
+                           progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                           session_factory: Optional[Callable[[], Session]] = None,
+                           run_ids: Optional[List[str]] = None,
+                           file_progress: Optional[List[RunProgress]] = None) -> Dict[str, Any]:
+        """
+        Run the identify workflow on many XML files concurrently.
+
+        The active pattern library is compiled once and shared by all files: each
+        file runs in its own session on a worker thread with the index bound to
+        that session (PatternIndex.bind) and one BulkSimilarityScorer shared by
+        all of them. LLM extraction goes through the process-wide client and rate
+        limiter, so concurrent files share the LLM_MAX_CONCURRENCY budget.
+
+        Args:
+            xml_file_paths: XML files to identify
+            allow_cross_airline: If True, match against patterns from all airlines
+            max_workers: Files processed concurrently (default: settings.MAX_PARALLEL_FILES)
+            progress_callback: Called with {'completed', 'total', 'file'} each time a file finishes
+            session_factory: Creates the session of each file (default: sessions on this workflow's engine)
+            run_ids: Already created run records, one per file (background batches); new runs are created if None
+            file_progress: Progress of each file's run, in input order
+
+        Returns:
+            Dict with per-file results (in input order) and an aggregated coverage/gap summary
+        """
+        total = len(xml_file_paths)
+        max_workers = max(1, min(max_workers or settings.MAX_PARALLEL_FILES, total or 1))
+        if session_factory is None:
+            session_factory = sessionmaker(bind=self.db_session.get_bind())
+
+        started_at = datetime.utcnow()
+        logger.info(f"Starting batch identify: {total} file(s), {max_workers} worker(s)")
+
+        pattern_index = PatternIndex.build(self.db_session)
+        scorer = BulkSimilarityScorer()
+
+        def identify(position: int) -> Dict[str, Any]:
+            xml_file_path = xml_file_paths[position]
+            run_id = run_ids[position] if run_ids else None
+            session = session_factory()
+            try:
+                workflow = DiscoveryWorkflow(session)
+                results = workflow.run_identify(
+                    xml_file_path,
+                    allow_cross_airline=allow_cross_airline,
+                    pattern_index=pattern_index.bind(session),
+                    scorer=scorer,
+                    run_id=run_id,
+                    progress=file_progress[position] if file_progress else None
+                )
+                return self._batch_file_result(xml_file_path, results)
+            except Exception as e:
+                logger.error(f"Batch identify failed for {xml_file_path}: {e}")
+                session.rollback()
+                return self._batch_file_result(
+                    xml_file_path, {'run_id': run_id, 'status': 'failed', 'error_details': str(e)}
+                )
+            finally:
+                session.close()
+
+        file_results: List[Optional[Dict[str, Any]]] = [None] * total
+        completed = 0
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="identify-batch") as executor:
+            futures = {executor.submit(identify, position): position for position in range(total)}
+            for future in as_completed(futures):
+                file_result = future.result()
+                file_results[futures[future]] = file_result
+                completed += 1
+                logger.info(f"Batch identify progress: {completed}/{total} - {file_result['filename']} "
+                            f"({file_result['status']})")
+                if progress_callback:
+                    progress_callback({'completed': completed, 'total': total, 'file': file_result})
+
+        finished_at = datetime.utcnow()
+        return {
+            'status': 'completed' if all(r['status'] == 'completed' for r in file_results) else 'partial_failure',
+            'files': file_results,
+            'summary': self._aggregate_batch_results(file_results),
+            'started_at': started_at.isoformat(),
+            'finished_at': finished_at.isoformat(),
+            'duration_seconds': int((finished_at - started_at).total_seconds())
+        }
+
+    @staticmethod
+    def _batch_file_result(xml_file_path: str, results: Dict[str, Any]) -> Dict[str, Any]:
+        """Per-file entry of a batch: run id, status and the file's gap analysis (without the match list)."""
+        gap_analysis = results.get('gap_analysis') or {}
+        return {
+            'filename': Path(xml_file_path).name,
+            'run_id': results.get('run_id'),
+            'status': results.get('status', 'failed'),
+            'spec_version': results.get('spec_version'),
+            'message_root': results.get('message_root'),
+            'node_facts_extracted': results.get('node_facts_extracted', 0),
+            'matched_facts': gap_analysis.get('matched_facts', 0),
+            'high_confidence_matches': gap_analysis.get('high_confidence_matches', 0),
+            'new_patterns': gap_analysis.get('new_patterns', 0),
+            'quality_breaks': gap_analysis.get('quality_breaks', 0),
+            'match_rate': gap_analysis.get('match_rate', 0),
+            'missing_patterns': [
+                {'node_type': missing['node_type'], 'section_path': missing['section_path']}
+                for missing in gap_analysis.get('missing_patterns', [])
+            ],
+            'new_pattern_sections': sorted({
+                match['section_path'] for match in results.get('matches', [])
+                if match.get('verdict') == 'NEW_PATTERN'
+            }),
+            'error_details': results.get('error_details')
+        }
+
+    @staticmethod
+    def _aggregate_batch_results(file_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Coverage and gaps across the files of a batch."""
+        total_node_facts = sum(r['node_facts_extracted'] for r in file_results)
+        matched_facts = sum(r['matched_facts'] for r in file_results)
+        high_confidence = sum(r['high_confidence_matches'] for r in file_results)
+
+        # Library patterns absent from files, and sections no pattern matched: counted per file
+        missing_counts: Counter = Counter()
+        new_section_counts: Counter = Counter()
+        for r in file_results:
+            for missing in r['missing_patterns']:
+                missing_counts[(r['message_root'], missing['node_type'], missing['section_path'])] += 1
+            for section_path in r['new_pattern_sections']:
+                new_section_counts[(r['message_root'], section_path)] += 1
+
+        return {
+            'files': len(file_results),
+            'completed_files': sum(1 for r in file_results if r['status'] == 'completed'),
+            'failed_files': sum(1 for r in file_results if r['status'] != 'completed'),
+            'total_node_facts': total_node_facts,
+            'matched_facts': matched_facts,
+            'high_confidence_matches': high_confidence,
+            'new_patterns': sum(r['new_patterns'] for r in file_results),
+            'quality_breaks': sum(r['quality_breaks'] for r in file_results),
+            'match_rate': (matched_facts / total_node_facts * 100) if total_node_facts > 0 else 0,
+            'high_confidence_rate': (high_confidence / total_node_facts * 100) if total_node_facts > 0 else 0,
+            'missing_patterns': [
+                {'message_root': root, 'node_type': node_type, 'section_path': section_path, 'files': count}
+                for (root, node_type, section_path), count in missing_counts.most_common()
+            ],
+            'new_pattern_sections': [
+                {'message_root': root, 'section_path': section_path, 'files': count}
+                for (root, section_path), count in new_section_counts.most_common()
+            ]
+        }
+
 
 def create_discovery_workflow(db_session: Session) -> DiscoveryWorkflow:
     """Create discovery workflow instance."""
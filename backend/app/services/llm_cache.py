@@ -0,0 +1,167 @@
+"""
+Content-addressed cache for LLM extraction responses.
+
+One SQLite file per workspace (next to the workspace database) maps
+(model, prompt version, section path, canonical subtree hash) to the result of
+an LLM call, so re-uploading the same XML does not call the LLM again. Callers
+store parsed, PII-masked results only; raw LLM responses never reach the disk.
+The cache is size-bounded with least-recently-used eviction.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from lxml import etree
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the stored entry format changes; older entries are dropped on open.
+# Version 1 stores masked NodeFacts instead of raw (unmasked) LLM responses.
+CACHE_FORMAT_VERSION = 1
+
+
+def canonical_subtree_hash(xml_content: str) -> str:
+    """
+    SHA-256 of the C14N form of a subtree with whitespace-only text stripped,
+    so formatting differences between uploads map to the same key.
+    """
+    try:
+        canonical = etree.canonicalize(xml_content, strip_text=True)
+    except etree.XMLSyntaxError:
+        canonical = xml_content
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Persistent LRU cache of LLM responses with per-instance hit/miss counters.
+
+    Create one instance per run (see for_session) so the counters describe that
+    run; the underlying SQLite file is shared by all runs of the workspace.
+    """
+
+    def __init__(self, cache_path: Path, max_entries: Optional[int] = None):
+        self.cache_path = Path(cache_path)
+        self.max_entries = max_entries if max_entries is not None else settings.LLM_CACHE_MAX_ENTRIES
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.cache_path), check_same_thread=False, timeout=30)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                response_json TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_accessed ON llm_cache(last_accessed)")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < CACHE_FORMAT_VERSION:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.execute(f"PRAGMA user_version = {CACHE_FORMAT_VERSION}")
+        self._conn.commit()
+
+    @classmethod
+    def for_session(cls, db_session: Session) -> Optional['LLMResponseCache']:
+        """
+        Open the cache belonging to a session's workspace database.
+
+        Returns:
+            Cache instance, or None if caching is disabled or the session is not
+            bound to a file-backed SQLite database
+        """
+        if not settings.LLM_CACHE_ENABLED:
+            return None
+
+        bind = db_session.get_bind()
+        database = getattr(bind.url, 'database', None) if bind is not None else None
+        if not database or bind.url.get_backend_name() != 'sqlite' or database == ':memory:':
+            return None
+
+        db_path = Path(database)
+        # Not *.db, so list_workspaces() does not pick the cache up as a workspace
+        cache_path = db_path.with_name(f"{db_path.stem}.llm_cache.sqlite")
+        try:
+            return cls(cache_path)
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache unavailable ({cache_path}): {e}")
+            return None
+
+    @staticmethod
+    def make_key(model: str, prompt_version: str, section_path: str, subtree_hash: str) -> str:
+        """Cache key for one extraction call."""
+        return hashlib.sha256(
+            f"{model}|{prompt_version}|{section_path}|{subtree_hash}".encode('utf-8')
+        ).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached response for key (and mark it recently used), or None."""
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT response_json FROM llm_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+
+                self._conn.execute(
+                    "UPDATE llm_cache SET last_accessed = ? WHERE cache_key = ?", (time.time(), key)
+                )
+                self._conn.commit()
+                self.hits += 1
+                return json.loads(row[0])
+            except (sqlite3.Error, ValueError) as e:
+                logger.warning(f"LLM cache read failed: {e}")
+                self.misses += 1
+                return None
+
+    def put(self, key: str, response: Dict[str, Any]):
+        """Store a response, evicting least-recently-used entries above max_entries."""
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (cache_key, response_json, created_at, last_accessed) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(response), now, now)
+                )
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE cache_key IN ("
+                    "  SELECT cache_key FROM llm_cache ORDER BY last_accessed DESC LIMIT -1 OFFSET ?"
+                    ")",
+                    (self.max_entries,)
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"LLM cache write failed: {e}")
+
+    def entry_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this instance, for run metadata."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'entries': self.entry_count(),
+            'max_entries': self.max_entries
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
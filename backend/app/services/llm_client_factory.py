@@ -14,6 +14,7 @@ import httpx
 
 from app.core.config import settings
 from app.services.bdp_authenticator import get_bdp_authenticator
+from app.services.llm_event_loop import create_pooled_async_http_client
 
 logger = structlog.get_logger(__name__)
 
@@ -40,7 +41,7 @@ class LLMClientFactory:
             if settings.LLM_PROVIDER == "azure":
                 return LLMClientFactory._create_azure_async_client(timeout, verify_ssl)
             elif settings.OPENAI_API_KEY:
-                return LLMClientFactory._create_openai_async_client()
+                return LLMClientFactory._create_openai_async_client(timeout)
             else:
                 logger.error("❌ LLM INITIALIZATION FAILED: No API keys found!")
                 logger.error("  Please set either:")
@@ -128,12 +129,7 @@ class LLMClientFactory:
             logger.info(f"  Model Deployment: {settings.MODEL_DEPLOYMENT_NAME}")
             logger.info(f"  Auth Method: API Key")
 
-            http_client = httpx.AsyncClient(
-                timeout=httpx.Timeout(timeout, connect=10.0),
-                limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
-                follow_redirects=True,
-                verify=verify_ssl
-            )
+            http_client = create_pooled_async_http_client(timeout, verify_ssl)
 
             client = AsyncAzureOpenAI(
                 api_key=settings.AZURE_OPENAI_KEY,
@@ -214,12 +210,15 @@ class LLMClientFactory:
             raise ValueError(f"Azure authentication not configured (method: {auth_method})")
 
     @staticmethod
-    def _create_openai_async_client() -> Tuple[AsyncOpenAI, str]:
+    def _create_openai_async_client(timeout: float = 120.0) -> Tuple[AsyncOpenAI, str]:
         """Create an async OpenAI client."""
         logger.info("Initializing OpenAI (async) client...")
         logger.info(f"  Model: {settings.LLM_MODEL}")
 
-        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=create_pooled_async_http_client(timeout, verify_ssl=True)
+        )
         model = settings.LLM_MODEL
         logger.info(f"✅ Async OpenAI client initialized: {model}")
         return client, model
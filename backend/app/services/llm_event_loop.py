@@ -0,0 +1,96 @@
+"""
+Process-wide asyncio event loop for LLM I/O.
+
+The async LLM clients (and their httpx connection pools) are long-lived and
+must stay on a single event loop; creating a loop per call throws away
+keep-alive connections. Everything that talks to the async clients is
+scheduled on this background loop, from sync code (run_on_llm_loop) or from
+another event loop such as FastAPI's (run_on_llm_loop_async).
+"""
+
+import asyncio
+import importlib.util
+import logging
+import threading
+from typing import Any, Awaitable, Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def create_pooled_async_http_client(timeout: float, verify_ssl: bool) -> httpx.AsyncClient:
+    """
+    Async HTTP client for the long-lived LLM clients.
+
+    The pool is sized for LLM_MAX_CONCURRENCY in-flight requests with keep-alive.
+    HTTP/2 (one multiplexed connection per host) is used when LLM_HTTP2_ENABLED
+    and the optional h2 package is installed (pip install "httpx[http2]").
+    """
+    http2 = settings.LLM_HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout, connect=10.0),
+        limits=httpx.Limits(
+            max_keepalive_connections=settings.LLM_MAX_CONCURRENCY,
+            max_connections=settings.LLM_MAX_CONCURRENCY * 2,
+            keepalive_expiry=60.0
+        ),
+        follow_redirects=True,
+        verify=verify_ssl,
+        http2=http2
+    )
+
+
+class LLMEventLoop:
+    """An asyncio loop running forever in a daemon thread."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="LLMEventLoop", daemon=True)
+        self._thread.start()
+        logger.info("LLM event loop started")
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def in_loop_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and block until it finishes."""
+        if self.in_loop_thread():
+            raise RuntimeError("run_on_llm_loop() called from the LLM event loop; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    async def run_async(self, coro: Awaitable) -> Any:
+        """Await a coroutine on the LLM loop from another event loop."""
+        if self.in_loop_thread():
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+
+_llm_loop: Optional[LLMEventLoop] = None
+_llm_loop_lock = threading.Lock()
+
+
+def get_llm_event_loop() -> LLMEventLoop:
+    """Get (starting on first use) the shared LLM event loop."""
+    global _llm_loop
+    if _llm_loop is None:
+        with _llm_loop_lock:
+            if _llm_loop is None:
+                _llm_loop = LLMEventLoop()
+    return _llm_loop
+
+
+def run_on_llm_loop(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the shared LLM loop from synchronous code."""
+    return get_llm_event_loop().run(coro, timeout)
+
+
+async def run_on_llm_loop_async(coro: Awaitable) -> Any:
+    """Run a coroutine on the shared LLM loop from another event loop."""
+    return await get_llm_event_loop().run_async(coro)
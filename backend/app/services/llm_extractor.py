@@ -9,9 +9,8 @@ import json
 import logging
 import asyncio
 import time
-import re
 from typing import Dict, List, Any, Optional, Union
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from datetime import datetime
 from functools import wraps
 import openai
@@ -20,11 +19,14 @@ import httpx
 from lxml import etree
 
 from app.core.config import settings
-from app.services.xml_parser import XmlSubtree
+from app.services.xml_parser import XmlSubtree, SubtreeStats, compute_subtree_stats
 from app.services.pii_masking import pii_engine
 from app.services.business_intelligence import get_bi_enricher
 from app.services.llm_client_factory import LLMClientFactory
-from app.prompts import get_container_prompt, get_item_prompt, get_system_prompt
+from app.services.llm_cache import canonical_subtree_hash
+from app.services.llm_event_loop import run_on_llm_loop
+from app.services.llm_rate_limiter import get_llm_rate_limiter, prompt_token_estimate, retry_after_seconds
+from app.prompts import get_container_prompt, get_item_prompt, get_system_prompt, get_prompt_version
 
 logger = logging.getLogger(__name__)
 
@@ -67,20 +69,22 @@ def async_retry_with_backoff(max_retries: int = None, backoff_factor: float = No
                         )
                         # Log technical details for admins/debugging
                         logger.error(f"Technical details: {str(e)}")
-                        logger.error(f"Retry attempts: {max_retries + 1}, Parallel nodes: {settings.MAX_PARALLEL_NODES}")
+                        logger.error(f"Retry attempts: {max_retries + 1}, Rate limiter: {get_llm_rate_limiter().stats()}")
                         raise ValueError(error_msg)
 
-                    # Parse wait time from error message (e.g., "Try again in 50 seconds")
-                    wait_time = backoff_factor ** attempt  # Default exponential backoff
                     error_msg = str(e)
-                    match = re.search(r'try again in (\d+) seconds?', error_msg, re.IGNORECASE)
-                    if match:
-                        wait_time = int(match.group(1))
-
                     logger.warning(f"⚠️ Rate limit hit (attempt {attempt + 1}/{max_retries + 1})")
-                    logger.warning(f"   Waiting {wait_time:.1f} seconds before retry...")
                     logger.warning(f"   Error: {error_msg}")
 
+                    if get_llm_rate_limiter().enabled:
+                        # The shared limiter already paused all callers for retry-after
+                        # and shrank the concurrency window; just queue up again.
+                        continue
+
+                    # Use the server's retry-after, else exponential backoff
+                    wait_time = retry_after_seconds(e) or backoff_factor ** attempt
+                    logger.warning(f"   Waiting {wait_time:.1f} seconds before retry...")
+
                     await asyncio.sleep(wait_time)
                     continue
 
@@ -107,6 +111,23 @@ class LLMExtractionResult:
     extraction_method: str = "llm"
 
 
+def _merge_counts(base: Dict[str, Any], extra: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge two business-intelligence dicts: numbers are summed, flags OR-ed, dicts merged."""
+    merged = dict(base)
+    for key, value in extra.items():
+        current = merged.get(key)
+        if isinstance(current, bool) and isinstance(value, bool):
+            merged[key] = current or value
+        elif isinstance(current, (int, float)) and isinstance(value, (int, float)) \
+                and not isinstance(current, bool) and not isinstance(value, bool):
+            merged[key] = current + value
+        elif isinstance(current, dict) and isinstance(value, dict):
+            merged[key] = _merge_counts(current, value)
+        elif current is None:
+            merged[key] = value
+    return merged
+
+
 class LLMNodeFactsExtractor:
     """LLM-powered NodeFacts extractor for NDC XML."""
 
@@ -117,6 +138,7 @@ class LLMNodeFactsExtractor:
         self.max_tokens = settings.MAX_TOKENS_PER_REQUEST
         self.temperature = settings.LLM_TEMPERATURE
         self.provider = settings.LLM_PROVIDER
+        self.prompt_version = get_prompt_version('system.txt', 'container_extraction.txt', 'item_extraction.txt')
         self._init_client()
 
     def _init_client(self):
@@ -127,10 +149,14 @@ class LLMNodeFactsExtractor:
         else:
             logger.warning("⚠️ LLM extraction is DISABLED - Discovery will fail!")
 
-    def _analyze_xml_structure(self, xml_content: str, section_path: str) -> Dict[str, Any]:
+    def _analyze_xml_structure(self, xml_content: str, section_path: str,
+                               stats: Optional[SubtreeStats] = None) -> Dict[str, Any]:
         """
         Analyze XML structure to determine if it's a container or item element.
 
+        Uses the stats precomputed by the parser when available; only parses
+        xml_content when they are missing.
+
         Returns dict with:
         - is_container: bool (True if has repeating children)
         - element_name: str (name of the element)
@@ -139,40 +165,32 @@ class LLMNodeFactsExtractor:
         - max_repetition: int (max count of any single child tag)
         """
         try:
-            root = etree.fromstring(xml_content.encode('utf-8'))
             # Ensure section_path is a string
             section_path_str = str(section_path) if section_path else ""
             element_name = section_path_str.split('/')[-1] if section_path_str else "Unknown"
 
-            # Count direct children by tag name
-            child_tags = {}
-            for child in root:
-                # Extract local name without namespace
-                tag = child.tag.split('}')[-1] if '}' in child.tag else child.tag
-                child_tags[tag] = child_tags.get(tag, 0) + 1
-
-            max_repetition = max(child_tags.values()) if child_tags else 0
-            total_children = len(root)
+            if stats is None:
+                stats = compute_subtree_stats(etree.fromstring(xml_content.encode('utf-8')))
 
             # Determine if this is a container
             # Any element with children is a container - it should be extracted as one structural unit
             # with nested children. The granularity of extraction is controlled by database configuration
             # (which paths are targeted), not by this logic.
             # Leaf elements (total_children == 0) naturally use item extraction.
-            is_container = total_children > 0
+            is_container = stats.total_children > 0
 
             result = {
                 'is_container': is_container,
                 'element_name': element_name,
-                'child_tags': child_tags,
-                'total_children': total_children,
-                'max_repetition': max_repetition,
-                'repeating_tag': max(child_tags.items(), key=lambda x: x[1])[0] if child_tags else None
+                'child_tags': dict(stats.child_tags),
+                'total_children': stats.total_children,
+                'max_repetition': stats.max_repetition,
+                'repeating_tag': stats.repeating_tag
             }
 
             logger.info(f"Structure analysis for {element_name}: "
-                       f"container={is_container}, children={total_children}, "
-                       f"max_repetition={max_repetition}, tags={list(child_tags.keys())}")
+                       f"container={is_container}, children={stats.total_children}, "
+                       f"max_repetition={stats.max_repetition}, tags={list(stats.child_tags.keys())}")
 
             return result
 
@@ -190,12 +208,13 @@ class LLMNodeFactsExtractor:
                 'repeating_tag': None
             }
 
-    def _create_extraction_prompt(self, xml_content: str, section_path: str) -> str:
+    def _create_extraction_prompt(self, xml_content: str, section_path: str,
+                                  stats: Optional[SubtreeStats] = None) -> str:
         """
         Create prompt for LLM extraction.
         Delegates to container or item prompt based on structure analysis.
         """
-        structure = self._analyze_xml_structure(xml_content, section_path)
+        structure = self._analyze_xml_structure(xml_content, section_path, stats)
 
         if structure['is_container']:
             return self._create_container_extraction_prompt(xml_content, section_path, structure)
@@ -237,18 +256,23 @@ class LLMNodeFactsExtractor:
         try:
             logger.info(f"Calling LLM API (model: {self.model}, max_tokens: {self.max_tokens})...")
 
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": get_system_prompt()
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=self.max_tokens,
-                temperature=self.temperature
-            )
+            system_prompt = get_system_prompt()
+            estimated_tokens = prompt_token_estimate(system_prompt, prompt, max_tokens=self.max_tokens)
+
+            async with get_llm_rate_limiter().limit(estimated_tokens) as permit:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": system_prompt
+                        },
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=self.max_tokens,
+                    temperature=self.temperature
+                )
+                permit.record_usage(response.usage.total_tokens if response.usage else None)
 
             processing_time = int((datetime.now() - start_time).total_seconds() * 1000)
 
@@ -279,10 +303,9 @@ class LLMNodeFactsExtractor:
             logger.error(f"   Error: {str(e)}")
             raise ValueError(f"LLM Authentication Failed: Check your API keys in .env file")
 
-        except openai.RateLimitError as e:
-            logger.error(f"❌ LLM RATE LIMIT EXCEEDED")
-            logger.error(f"   Error: {str(e)}")
-            raise ValueError(f"LLM Rate Limit Exceeded: Please try again later")
+        except openai.RateLimitError:
+            # Let async_retry_with_backoff retry (and produce the final user-facing error)
+            raise
 
         except openai.APIConnectionError as e:
             logger.error(f"❌ LLM CONNECTION ERROR: Cannot reach API endpoint")
@@ -805,20 +828,52 @@ class LLMNodeFactsExtractor:
                 extraction_method="llm_unavailable"
             )
 
+        if subtree.batches:
+            return await self._extract_from_batches(subtree, context)
+
         start_time = datetime.now()
 
         try:
             # Create extraction prompt
-            prompt = self._create_extraction_prompt(subtree.xml_content, subtree.path)
-
-            # Call LLM
-            llm_response = await self._call_llm(prompt)
-
-            # Parse response (pass finish_reason to detect truncation)
-            node_facts = self._parse_llm_response(
-                llm_response["content"],
-                finish_reason=llm_response.get("finish_reason", "stop")
-            )
+            prompt = self._create_extraction_prompt(subtree.xml_content, subtree.path, subtree.stats)
+
+            # Cached facts for identical content skip the network entirely
+            llm_cache = (context or {}).get('llm_cache')
+            cache_key = None
+            cached = None
+            if llm_cache is not None:
+                cache_key = llm_cache.make_key(
+                    self.model, self.prompt_version, subtree.path,
+                    canonical_subtree_hash(subtree.xml_content)
+                )
+                cached = llm_cache.get(cache_key)
+
+            if cached is not None:
+                logger.info(f"LLM cache hit for {subtree.path}")
+                node_facts = cached['node_facts']
+                model_used = cached.get('model', self.model)
+                extraction_method = "llm_cached"
+                tokens_used = 0
+            else:
+                # Call LLM
+                llm_response = await self._call_llm(prompt)
+                model_used = llm_response["model"]
+                extraction_method = "llm"
+                tokens_used = llm_response["tokens_used"]
+
+                # Parse response (pass finish_reason to detect truncation)
+                node_facts = self._parse_llm_response(
+                    llm_response["content"],
+                    finish_reason=llm_response.get("finish_reason", "stop")
+                )
+
+                # Only parsed (PII-masked) facts are cached, never the raw response;
+                # truncated responses are not worth reusing
+                if cache_key is not None and llm_response.get("finish_reason") != "length":
+                    llm_cache.put(cache_key, {'node_facts': node_facts, 'model': model_used})
+
+            if subtree.sampling:
+                node_facts = self._apply_sampling(subtree, node_facts)
 
             # Log quality breaks without aborting workflow
             for fact in node_facts:
@@ -845,9 +900,9 @@ class LLMNodeFactsExtractor:
                 node_facts=node_facts,
                 confidence_score=avg_confidence,
                 processing_time_ms=total_time,
-                tokens_used=llm_response["tokens_used"],
-                model_used=llm_response["model"],
-                extraction_method="llm"
+                tokens_used=tokens_used,
+                model_used=model_used,
+                extraction_method=extraction_method
             )
 
         except ValueError as e:
@@ -864,31 +919,148 @@ class LLMNodeFactsExtractor:
 
             raise ValueError(f"LLM Extraction Error: {type(e).__name__}: {str(e)}")
 
+    async def _extract_from_batches(self, subtree: XmlSubtree,
+                                    context: Optional[Dict[str, Any]] = None) -> LLMExtractionResult:
+        """
+        Extract an oversized subtree batch by batch (in parallel) and merge the results.
+
+        Batch calls share the LLM rate limiter's concurrency window with every
+        other caller (see _call_llm), so no separate bound is needed here.
+        The first failing batch cancels the others, so they stop using LLM
+        capacity for a subtree that cannot be completed.
+        """
+        start_time = datetime.now()
+
+        logger.info(f"LLM extraction from {len(subtree.batches)} batches of {subtree.path}")
+        tasks = [asyncio.ensure_future(self.extract_from_subtree(batch, context))
+                 for batch in subtree.batches]
+        try:
+            batch_results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            # Wait for the cancellations and retrieve every outcome before re-raising
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        node_facts = self._merge_batch_facts(subtree, [result.node_facts for result in batch_results])
+        if subtree.sampling:
+            node_facts = self._apply_sampling(subtree, node_facts)
+
+        confidence_scores = [fact.get('confidence', 0.8) for fact in node_facts]
+        avg_confidence = sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0.0
+        total_time = int((datetime.now() - start_time).total_seconds() * 1000)
+
+        logger.info(f"LLM extracted {len(node_facts)} facts from {subtree.path} "
+                   f"({len(subtree.batches)} batches, confidence: {avg_confidence:.2f}, time: {total_time}ms)")
+
+        return LLMExtractionResult(
+            node_facts=node_facts,
+            confidence_score=avg_confidence,
+            processing_time_ms=total_time,
+            tokens_used=sum(result.tokens_used for result in batch_results),
+            model_used=batch_results[0].model_used if batch_results else self.model,
+            extraction_method="llm_batched"
+        )
+
+    def _merge_batch_facts(self, subtree: XmlSubtree,
+                           batch_facts: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Reassemble per-batch facts into one container fact.
+
+        Container facts (node_type == container element) are merged: children are
+        concatenated with ordinals shifted by each batch's ordinal_offset, counts
+        and relationships combined, and child_count set to the real total. Any
+        other facts keep their node_ordinal shifted the same way.
+        """
+        element_name = subtree.path.split('/')[-1]
+        total_children = subtree.stats.total_children if subtree.stats else None
+        container = None
+        container_confidences = []
+        other_facts = []
+
+        for batch, facts in zip(subtree.batches, batch_facts):
+            for fact in facts:
+                if fact.get('node_type') != element_name:
+                    fact['node_ordinal'] = batch.ordinal_offset + int(fact.get('node_ordinal', 1))
+                    other_facts.append(fact)
+                    continue
+
+                children = fact.get('children') or []
+                for position, child in enumerate(children, start=1):
+                    if isinstance(child, dict):
+                        child['ordinal'] = batch.ordinal_offset + int(child.get('ordinal', position))
+                container_confidences.append(float(fact.get('confidence', 0.8)))
+
+                if container is None:
+                    container = fact
+                    container['children'] = list(children)
+                    continue
+
+                container['children'].extend(children)
+                container['relationships'] = container.get('relationships', []) + [
+                    rel for rel in fact.get('relationships', [])
+                    if rel not in container.get('relationships', [])
+                ]
+                container['business_intelligence'] = _merge_counts(
+                    container.get('business_intelligence', {}), fact.get('business_intelligence', {})
+                )
+                merged_checks = container.get('quality_checks') or {}
+                batch_checks = fact.get('quality_checks') or {}
+                if str(batch_checks.get('status', 'ok')).lower() == 'error':
+                    merged_checks['status'] = 'error'
+                merged_checks['missing_elements'] = (merged_checks.get('missing_elements') or []) + \
+                    (batch_checks.get('missing_elements') or [])
+                container['quality_checks'] = merged_checks
+
+        if container is None:
+            return other_facts
+
+        child_count = total_children if total_children is not None else len(container['children'])
+        container['node_ordinal'] = 1
+        container['confidence'] = sum(container_confidences) / len(container_confidences)
+        container.setdefault('attributes', {})['child_count'] = child_count
+        if isinstance(container.get('business_intelligence'), dict):
+            container['business_intelligence']['total_items'] = child_count
+        self._apply_quality_checks(container)
+
+        return [container] + other_facts
+
+    def _apply_sampling(self, subtree: XmlSubtree,
+                        node_facts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Write structural sampling counts back into the container fact.
+
+        Child ordinals are mapped back to their position in the original
+        container, each representative gets the number of children it stands
+        for, and child_count reflects the original total.
+        """
+        sampling = subtree.sampling
+        element_name = subtree.path.split('/')[-1]
+        counts_by_ordinal = {group.representative_ordinal: group.count for group in sampling.groups}
+
+        for fact in node_facts:
+            if fact.get('node_type') != element_name:
+                continue
+
+            for child in fact.get('children') or []:
+                if isinstance(child, dict):
+                    child['ordinal'] = sampling.original_ordinal(int(child.get('ordinal', 1)))
+                    if child['ordinal'] in counts_by_ordinal:
+                        child['represents'] = counts_by_ordinal[child['ordinal']]
+
+            fact.setdefault('attributes', {})['child_count'] = sampling.total_children
+            fact['structural_samples'] = [asdict(group) for group in sampling.groups]
+            if isinstance(fact.get('business_intelligence'), dict):
+                fact['business_intelligence']['total_items'] = sampling.total_children
+            self._apply_quality_checks(fact)
+
+        return node_facts
+
     def extract_from_subtree_sync(self, subtree: XmlSubtree,
                                 context: Optional[Dict[str, Any]] = None) -> LLMExtractionResult:
-        """Synchronous wrapper for extract_from_subtree."""
-        try:
-            # Try to get the current running loop
-            loop = asyncio.get_running_loop()
-            # If we're in a running loop, we need to create a task
-            import concurrent.futures
-
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(self._run_in_new_loop, subtree, context)
-                return future.result()
-
-        except RuntimeError:
-            # No event loop running, create new one
-            return asyncio.run(self.extract_from_subtree(subtree, context))
-
-    def _run_in_new_loop(self, subtree: XmlSubtree, context: Optional[Dict[str, Any]] = None) -> LLMExtractionResult:
-        """Run extraction in a new event loop."""
-        new_loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(new_loop)
-        try:
-            return new_loop.run_until_complete(self.extract_from_subtree(subtree, context))
-        finally:
-            new_loop.close()
+        """Synchronous wrapper for extract_from_subtree (runs on the shared LLM event loop)."""
+        return run_on_llm_loop(self.extract_from_subtree(subtree, context))
 
     async def generate_explanation_async(self, prompt: str) -> str:
         """
@@ -904,12 +1076,14 @@ class LLMNodeFactsExtractor:
             raise ValueError("LLM client not initialized")
 
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,  # Lower temperature for more consistent explanations
-                max_tokens=300  # Limit to keep explanations concise
-            )
+            async with get_llm_rate_limiter().limit(prompt_token_estimate(prompt, max_tokens=300)) as permit:
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.3,  # Lower temperature for more consistent explanations
+                    max_tokens=300  # Limit to keep explanations concise
+                )
+                permit.record_usage(response.usage.total_tokens if response.usage else None)
 
             return response.choices[0].message.content
 
@@ -918,29 +1092,8 @@ class LLMNodeFactsExtractor:
             raise
 
     def generate_explanation(self, prompt: str) -> str:
-        """Synchronous wrapper for generate_explanation_async."""
-        try:
-            # Try to get the current running loop
-            loop = asyncio.get_running_loop()
-            # If we're in a running loop, we need to create a task
-            import concurrent.futures
-
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(self._run_explanation_in_new_loop, prompt)
-                return future.result()
-
-        except RuntimeError:
-            # No event loop running, create new one
-            return asyncio.run(self.generate_explanation_async(prompt))
-
-    def _run_explanation_in_new_loop(self, prompt: str) -> str:
-        """Run explanation generation in a new event loop."""
-        new_loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(new_loop)
-        try:
-            return new_loop.run_until_complete(self.generate_explanation_async(prompt))
-        finally:
-            new_loop.close()
+        """Synchronous wrapper for generate_explanation_async (runs on the shared LLM event loop)."""
+        return run_on_llm_loop(self.generate_explanation_async(prompt))
 
 
 # Global instance
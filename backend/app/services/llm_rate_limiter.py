@@ -0,0 +1,308 @@
+"""
+Client-side rate limiting for LLM calls.
+
+Azure OpenAI deployments have a requests-per-minute and a tokens-per-minute
+quota. Instead of letting every caller hit the quota and back off on its own,
+all LLM calls (node extraction, relationship discovery, pattern descriptions)
+take a permit from one process-wide limiter:
+
+- two token buckets (RPM and TPM) meter requests against the configured quota,
+  using an estimate of prompt tokens + max_tokens that is reconciled with the
+  actual usage once the response arrives;
+- an AIMD window caps in-flight requests: +1/window per success, halved on a
+  429, unchanged after other failures (timeouts, 5xx, connection errors), so
+  concurrency settles just below the point where the service throttles;
+- a 429 pauses every caller until its retry-after has elapsed.
+
+Works from synchronous code (threads) and from coroutines.
+"""
+
+import asyncio
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import openai
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Poll interval while waiting for a concurrency slot
+_SLOT_POLL_SECONDS = 0.05
+# Wait after a 429 without a usable retry-after header
+_DEFAULT_RETRY_AFTER_SECONDS = 1.0
+# Buckets hold 10 seconds of quota; Azure evaluates RPM/TPM over short windows
+_BURST_SECONDS = 10.0
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap prompt token estimate (XML/JSON tokenizes at roughly 3 chars/token).
+
+    Deliberately errs high; the limiter refunds the difference once the
+    response reports actual usage.
+    """
+    if not text:
+        return 0
+    return len(text) // 3 + 1
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Wait time requested by a 429 (retry-after-ms / retry-after headers, or the message)."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+
+    # e.g. "Try again in 50 seconds"
+    match = re.search(r'try again in (\d+) seconds?', str(error), re.IGNORECASE)
+    if match:
+        return float(match.group(1))
+
+    return None
+
+
+class _TokenBucket:
+    """Token bucket refilled continuously at per_minute / 60 per second."""
+
+    def __init__(self, per_minute: int):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * _BURST_SECONDS)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount is available (0 if it is available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)  # Oversized requests wait for a full bucket
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class LLMPermit:
+    """
+    One rate-limited LLM call; use as a (sync or async) context manager.
+
+    Record the response's total token usage with record_usage(). An
+    openai.RateLimitError raised inside the block is reported to the limiter as
+    congestion, any other exception as a failed call.
+    """
+
+    def __init__(self, limiter: 'LLMRateLimiter', estimated_tokens: int):
+        self.limiter = limiter
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens: Optional[int] = None
+        self._acquired = False
+
+    def record_usage(self, total_tokens: Optional[int]):
+        self.actual_tokens = total_tokens
+
+    def __enter__(self) -> 'LLMPermit':
+        self.limiter.acquire(self.estimated_tokens)
+        self._acquired = True
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._release(exc)
+        return False
+
+    async def __aenter__(self) -> 'LLMPermit':
+        await self.limiter.acquire_async(self.estimated_tokens)
+        self._acquired = True
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        self._release(exc)
+        return False
+
+    def _release(self, exc: Optional[BaseException]):
+        if not self._acquired:
+            return
+        self._acquired = False
+        rate_limited = isinstance(exc, openai.RateLimitError)
+        self.limiter.release(
+            estimated_tokens=self.estimated_tokens,
+            actual_tokens=self.actual_tokens,
+            rate_limited=rate_limited,
+            retry_after=retry_after_seconds(exc) if rate_limited else None,
+            failed=exc is not None and not rate_limited
+        )
+
+
+class LLMRateLimiter:
+    """RPM/TPM token buckets plus an AIMD concurrency window, shared by all LLM callers."""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int,
+                 max_concurrency: int, min_concurrency: int = 1, enabled: bool = True):
+        self.enabled = enabled
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.concurrency_limit = float(self.max_concurrency)
+        self.in_flight = 0
+
+        self._requests = _TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._tokens = _TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._paused_until = 0.0
+        self._next_decrease_at = 0.0
+        self._lock = threading.Lock()
+
+        self.requests_started = 0
+        self.rate_limited_count = 0
+        self.failed_count = 0
+        self.throttled_seconds = 0.0
+
+    def limit(self, estimated_tokens: int) -> LLMPermit:
+        """Permit for one call expected to consume estimated_tokens (prompt + max_tokens)."""
+        return LLMPermit(self, estimated_tokens)
+
+    def _try_acquire(self, estimated_tokens: int) -> float:
+        """Take a slot and budget; returns 0 on success, otherwise seconds to wait."""
+        with self._lock:
+            wait = self._reserve(estimated_tokens, time.monotonic())
+            if wait > 0:
+                self.throttled_seconds += wait
+            return wait
+
+    def _reserve(self, estimated_tokens: int, now: float) -> float:
+        """_try_acquire body; caller holds self._lock."""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.in_flight >= int(self.concurrency_limit):
+            return _SLOT_POLL_SECONDS
+
+        wait = 0.0
+        if self._requests:
+            wait = max(wait, self._requests.wait_time(1, now))
+        if self._tokens:
+            wait = max(wait, self._tokens.wait_time(estimated_tokens, now))
+        if wait > 0:
+            return wait
+
+        if self._requests:
+            self._requests.take(1)
+        if self._tokens:
+            self._tokens.take(estimated_tokens)
+        self.in_flight += 1
+        self.requests_started += 1
+        return 0.0
+
+    def acquire(self, estimated_tokens: int):
+        """Block the calling thread until the call may proceed."""
+        if not self.enabled:
+            return
+        while True:
+            wait = self._try_acquire(estimated_tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, estimated_tokens: int):
+        """Wait (without blocking the event loop) until the call may proceed."""
+        if not self.enabled:
+            return
+        while True:
+            wait = self._try_acquire(estimated_tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def release(self, estimated_tokens: int, actual_tokens: Optional[int] = None,
+                rate_limited: bool = False, retry_after: Optional[float] = None,
+                failed: bool = False):
+        """
+        Return the slot and feed the outcome into the AIMD window.
+
+        A failed call (any error other than a 429) neither grows the window nor
+        refunds its token estimate, since the service may have counted it.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.in_flight = max(0, self.in_flight - 1)
+
+            if rate_limited:
+                self.rate_limited_count += 1
+                pause = retry_after if retry_after is not None else _DEFAULT_RETRY_AFTER_SECONDS
+                self._paused_until = max(self._paused_until, now + pause)
+                # One multiplicative decrease per congestion event, not per failed request
+                if now >= self._next_decrease_at:
+                    self.concurrency_limit = max(float(self.min_concurrency), self.concurrency_limit / 2)
+                    self._next_decrease_at = now + max(pause, _DEFAULT_RETRY_AFTER_SECONDS)
+                    logger.warning(f"LLM rate limited: concurrency window -> {int(self.concurrency_limit)}, "
+                                   f"pausing {pause:.1f}s")
+                return
+
+            if failed:
+                self.failed_count += 1
+                return
+
+            self.concurrency_limit = min(float(self.max_concurrency),
+                                         self.concurrency_limit + 1.0 / self.concurrency_limit)
+            if self._tokens and actual_tokens is not None:
+                # Reconcile the estimate with what the service actually counted
+                self._tokens.refund(estimated_tokens - actual_tokens)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for logging and run metadata."""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'concurrency_limit': int(self.concurrency_limit),
+                'in_flight': self.in_flight,
+                'requests': self.requests_started,
+                'rate_limited': self.rate_limited_count,
+                'failed': self.failed_count,
+                'throttled_seconds': round(self.throttled_seconds, 1)
+            }
+
+
+_rate_limiter: Optional[LLMRateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_llm_rate_limiter() -> LLMRateLimiter:
+    """Get the process-wide LLM rate limiter (configured from settings)."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = LLMRateLimiter(
+                    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+                    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+                    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+                    min_concurrency=settings.LLM_MIN_CONCURRENCY,
+                    enabled=settings.LLM_RATE_LIMIT_ENABLED
+                )
+    return _rate_limiter
+
+
+def prompt_token_estimate(*texts: str, max_tokens: int = 0) -> int:
+    """Estimated TPM cost of a request: prompt tokens plus the completion budget."""
+    return sum(estimate_tokens(text) for text in texts) + max(0, max_tokens)
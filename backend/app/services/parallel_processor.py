@@ -3,13 +3,22 @@ Parallel processing utilities for AssistedDiscovery.
 
 Provides thread-safe database session management and parallel node processing
 to improve Discovery workflow performance with large numbers of nodes.
+
+Extraction runs as coroutines on the shared LLM event loop (one long-lived
+client, pooled connections). Subtrees are streamed from the parser through a
+bounded queue to a fixed number of extraction workers, so extraction starts on
+the first subtree and the parser blocks when workers fall behind. Extracted
+NodeFacts are queued to a single NodeFactWriter thread that inserts them in
+batches, so extraction workers never wait on the database.
 """
 
+import asyncio
 import logging
+import queue
 import threading
-from typing import Dict, Any, Optional, Callable
+import time
+from typing import Dict, Any, List, Optional, Callable, Iterable
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, scoped_session, Session
@@ -18,6 +27,9 @@ from sqlalchemy.pool import QueuePool
 from app.core.config import settings
 from app.services.xml_parser import XmlSubtree
 from app.services.llm_extractor import LLMNodeFactsExtractor, LLMExtractionResult
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_event_loop import run_on_llm_loop
+from app.services.workspace_db import run_with_db_retry
 from app.models.database import NodeFact
 
 logger = logging.getLogger(__name__)
@@ -72,18 +84,118 @@ class ThreadSafeDatabaseManager:
         self.scoped_session_factory.remove()
 
 
+_STOP_WRITER = object()
+
+
+class NodeFactWriter:
+    """
+    Single writer thread that persists NodeFacts in batches.
+
+    Extraction workers submit fact mappings and return immediately. The writer
+    drains its queue and inserts with bulk_insert_mappings, committing once
+    flush_size facts are pending or flush_interval seconds have passed since
+    the last flush. Being the only writer, it needs no lock.
+    """
+
+    def __init__(self, db_manager: ThreadSafeDatabaseManager,
+                 flush_size: Optional[int] = None,
+                 flush_interval: Optional[float] = None):
+        self.db_manager = db_manager
+        self.flush_size = max(1, flush_size or settings.NODE_FACT_FLUSH_SIZE)
+        self.flush_interval = flush_interval if flush_interval is not None \
+            else settings.NODE_FACT_FLUSH_INTERVAL_SECONDS
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="NodeFactWriter", daemon=True)
+
+        self.facts_written = 0
+        self.batches_written = 0
+        self.failed_paths: Dict[str, str] = {}
+
+    def start(self) -> 'NodeFactWriter':
+        self._thread.start()
+        return self
+
+    def submit(self, subtree_path: str, mappings: List[Dict[str, Any]]) -> int:
+        """Queue the facts of one subtree; returns the number queued."""
+        if mappings:
+            self._queue.put((subtree_path, mappings))
+        return len(mappings)
+
+    def close(self) -> Dict[str, Any]:
+        """Flush everything still queued, stop the thread and return write statistics."""
+        self._queue.put(_STOP_WRITER)
+        self._thread.join()
+        return {
+            'facts_written': self.facts_written,
+            'batches_written': self.batches_written,
+            'failed_paths': dict(self.failed_paths)
+        }
+
+    def _flush(self, session: Session, pending: List[Dict[str, Any]], pending_paths: List[str]):
+        def write_batch():
+            session.bulk_insert_mappings(NodeFact, pending)
+            session.commit()
+
+        try:
+            run_with_db_retry(write_batch, on_retry=session.rollback)
+            self.facts_written += len(pending)
+            self.batches_written += 1
+            logger.debug(f"Flushed {len(pending)} facts from {len(pending_paths)} subtrees")
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Failed to write batch of {len(pending)} facts: {type(e).__name__}: {e}")
+            for path in pending_paths:
+                self.failed_paths[path] = f"Database write failed: {type(e).__name__}: {e}"
+        pending.clear()
+        pending_paths.clear()
+
+    def _run(self):
+        session = self.db_manager.get_session()
+        pending: List[Dict[str, Any]] = []
+        pending_paths: List[str] = []
+        last_flush = time.monotonic()
+
+        try:
+            while True:
+                timeout = None
+                if pending:
+                    timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP_WRITER:
+                    break
+                if item is not None:
+                    subtree_path, mappings = item
+                    pending.extend(mappings)
+                    pending_paths.append(subtree_path)
+
+                if pending and (len(pending) >= self.flush_size or
+                                time.monotonic() - last_flush >= self.flush_interval):
+                    self._flush(session, pending, pending_paths)
+                    last_flush = time.monotonic()
+
+            if pending:
+                self._flush(session, pending, pending_paths)
+        finally:
+            self.db_manager.cleanup_session()
+
+
 class NodeProcessingResult:
     """Result from processing a single node."""
 
     def __init__(self, subtree_path: str, status: str, facts_stored: int = 0,
                  confidence: float = 0.0, processing_time_ms: int = 0,
-                 error: Optional[str] = None):
+                 error: Optional[str] = None, tokens_used: int = 0):
         self.subtree_path = subtree_path
         self.status = status  # 'success', 'skipped', 'error'
         self.facts_stored = facts_stored
         self.confidence = confidence
         self.processing_time_ms = processing_time_ms
         self.error = error
+        self.tokens_used = tokens_used
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary."""
@@ -93,71 +205,52 @@ class NodeProcessingResult:
             'facts_stored': self.facts_stored,
             'confidence': self.confidence,
             'processing_time_ms': self.processing_time_ms,
-            'error': self.error
+            'error': self.error,
+            'tokens_used': self.tokens_used
         }
 
 
-def _store_llm_node_facts_with_session(
-    session: Session,
+def _node_fact_mappings(
     run_id: str,
     spec_version: str,
     message_root: str,
-    subtree: XmlSubtree,
+    subtree_path: str,
     llm_result: LLMExtractionResult
-) -> int:
-    """
-    Store LLM-extracted node facts using provided session.
-
-    This is a standalone function that can be used in parallel processing
-    with different database sessions.
-
-    Args:
-        session: SQLAlchemy session to use
-        run_id: Run identifier
-        spec_version: NDC spec version
-        message_root: Message root (e.g., OrderViewRS)
-        subtree: XML subtree that was processed
-        llm_result: LLM extraction result
-
-    Returns:
-        Number of node facts stored
-    """
-    node_facts_stored = 0
-
-    for fact_data in llm_result.node_facts:
-        node_fact = NodeFact(
-            run_id=run_id,
-            spec_version=spec_version,
-            message_root=message_root,
-            section_path=subtree.path,
-            node_type=fact_data['node_type'],
-            node_ordinal=fact_data['node_ordinal'],
-            fact_json=fact_data,
-            pii_masked=settings.PII_MASKING_ENABLED,
-            created_at=datetime.utcnow()
-        )
-
-        session.add(node_fact)
-        node_facts_stored += 1
-
-    return node_facts_stored
+) -> List[Dict[str, Any]]:
+    """Build NodeFact row mappings for bulk insertion."""
+    created_at = datetime.utcnow()
+    return [
+        {
+            'run_id': run_id,
+            'spec_version': spec_version,
+            'message_root': message_root,
+            'section_path': subtree_path,
+            'node_type': fact_data['node_type'],
+            'node_ordinal': fact_data['node_ordinal'],
+            'fact_json': fact_data,
+            'pii_masked': settings.PII_MASKING_ENABLED,
+            'created_at': created_at
+        }
+        for fact_data in llm_result.node_facts
+    ]
 
 
-def process_single_node(
+async def process_single_node(
     subtree: XmlSubtree,
     run_id: str,
     spec_version: str,
     message_root: str,
     llm_extractor: LLMNodeFactsExtractor,
-    db_manager: ThreadSafeDatabaseManager,
+    fact_writer: NodeFactWriter,
     node_configs: Dict,
-    should_extract_func: Optional[Callable] = None
+    should_extract_func: Optional[Callable] = None,
+    llm_cache: Optional[LLMResponseCache] = None
 ) -> NodeProcessingResult:
     """
     Process a single node (subtree) with LLM extraction and database storage.
 
-    This function is designed to be called in parallel by ThreadPoolExecutor.
-    Each thread gets its own database session via scoped_session.
+    Runs as a coroutine on the shared LLM event loop; the facts are queued to
+    the writer thread, so this never waits on the database.
 
     Args:
         subtree: XML subtree to process
@@ -165,9 +258,10 @@ def process_single_node(
         spec_version: NDC spec version
         message_root: Message root (e.g., OrderViewRS)
         llm_extractor: LLM extractor instance
-        db_manager: Thread-safe database manager
+        fact_writer: Batched NodeFact writer
         node_configs: Node configurations for filtering
         should_extract_func: Optional function to check if node should be extracted
+        llm_cache: Optional LLM response cache for this run
 
     Returns:
         NodeProcessingResult with processing details
@@ -177,40 +271,27 @@ def process_single_node(
     try:
 
         # LLM Extraction
-        logger.debug(f"[Thread-{threading.current_thread().name}] Processing node: {subtree.path}")
+        logger.debug(f"Processing node: {subtree.path}")
 
-        llm_result = llm_extractor.extract_from_subtree_sync(
+        llm_result = await llm_extractor.extract_from_subtree(
             subtree,
             context={
                 'run_id': run_id,
                 'spec_version': spec_version,
-                'message_root': message_root
+                'message_root': message_root,
+                'llm_cache': llm_cache
             }
         )
 
-        # Thread-safe database write
-        def write_facts():
-            session = db_manager.get_session()
-            try:
-                facts_stored = _store_llm_node_facts_with_session(
-                    session, run_id, spec_version, message_root, subtree, llm_result
-                )
-                session.commit()
-                logger.debug(f"Stored {facts_stored} facts for {subtree.path}")
-                return facts_stored
-            except Exception as e:
-                session.rollback()
-                logger.error(f"Database error for {subtree.path}: {e}")
-                raise
-            finally:
-                session.close()
-
-        facts_stored = db_manager.write_with_lock(write_facts)
+        # Hand the facts to the writer thread
+        facts_stored = fact_writer.submit(
+            subtree.path,
+            _node_fact_mappings(run_id, spec_version, message_root, subtree.path, llm_result)
+        )
 
         total_time = int((datetime.now() - start_time).total_seconds() * 1000)
 
-        logger.info(f"✅ [Thread-{threading.current_thread().name}] "
-                   f"Processed {subtree.path}: {facts_stored} facts "
+        logger.info(f"✅ Processed {subtree.path}: {facts_stored} facts queued "
                    f"(confidence: {llm_result.confidence_score:.2f}, time: {total_time}ms)")
 
         return NodeProcessingResult(
@@ -218,7 +299,8 @@ def process_single_node(
             status='success',
             facts_stored=facts_stored,
             confidence=llm_result.confidence_score,
-            processing_time_ms=total_time
+            processing_time_ms=total_time,
+            tokens_used=llm_result.tokens_used or 0
         )
 
     except ValueError as e:
@@ -248,97 +330,177 @@ def process_single_node(
         )
 
 
-def process_nodes_parallel(
-    subtrees: list,
+_END_OF_STREAM = object()
+
+
+async def process_nodes_async(
+    subtrees: Iterable[XmlSubtree],
     run_id: str,
     spec_version: str,
     message_root: str,
     llm_extractor: LLMNodeFactsExtractor,
     db_manager: ThreadSafeDatabaseManager,
     node_configs: Dict,
-    max_workers: int,
-    should_extract_func: Optional[Callable] = None
+    max_concurrency: int,
+    should_extract_func: Optional[Callable] = None,
+    llm_cache: Optional[LLMResponseCache] = None,
+    queue_size: Optional[int] = None,
+    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+    result_callback: Optional[Callable[[NodeProcessingResult], None]] = None
 ) -> Dict[str, Any]:
     """
-    Process multiple nodes in parallel using ThreadPoolExecutor.
+    Stream subtrees through a bounded queue to concurrent extraction workers.
+
+    The subtrees iterable (typically a live parser iterator) is consumed on a
+    producer thread. It blocks once queue_size subtrees are waiting, so at
+    most queue_size + max_concurrency subtrees are held in memory and parsing
+    never runs far ahead of extraction. An exception raised by the iterable is
+    re-raised once the workers have stopped.
 
     Args:
-        subtrees: List of XML subtrees to process
+        subtrees: Iterable of XML subtrees to process (consumed once)
         run_id: Run identifier
         spec_version: NDC spec version
         message_root: Message root
         llm_extractor: LLM extractor instance
-        db_manager: Thread-safe database manager
+        db_manager: Database manager; its engine backs the NodeFact writer thread
         node_configs: Node configurations
-        max_workers: Maximum number of parallel workers
+        max_concurrency: Number of extraction workers (in-flight LLM extractions)
         should_extract_func: Optional function to check if node should be extracted
+        llm_cache: Optional LLM response cache for this run
+        queue_size: Parsed subtrees buffered ahead of the workers
+                    (defaults to settings.SUBTREE_QUEUE_SIZE)
+        progress_callback: Optional callable receiving the running counters
+                           after each node
+        result_callback: Optional callable receiving each NodeProcessingResult
 
     Returns:
         Dictionary with processing results and statistics
     """
-    logger.info(f"Starting parallel processing of {len(subtrees)} nodes with {max_workers} workers")
+    worker_count = max(1, max_concurrency)
+    queue_size = max(1, queue_size or settings.SUBTREE_QUEUE_SIZE)
 
-    subtrees_processed = 0
-    total_facts_extracted = 0
-    nodes_skipped_by_config = 0
+    logger.info(f"Starting streaming processing with {worker_count} extraction workers "
+               f"(queue size {queue_size})")
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    producer_failed = threading.Event()
+    start_time = datetime.now()
+
+    stats = {
+        'subtrees_queued': 0,
+        'subtrees_processed': 0,
+        'total_facts_extracted': 0,
+        'nodes_skipped_by_config': 0,
+        'errors': 0,
+        'tokens_used': 0,
+        'processing_time_ms': 0,
+        'time_to_first_fact_ms': None
+    }
     processing_errors = []
     processing_results = []
 
-    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="NodeProc") as executor:
-        # Submit all subtrees for processing
-        future_to_subtree = {
-            executor.submit(
-                process_single_node,
+    def produce():
+        try:
+            for subtree in subtrees:
+                # Blocks while the queue is full (backpressure on the parser)
+                asyncio.run_coroutine_threadsafe(queue.put(subtree), loop).result()
+                stats['subtrees_queued'] += 1
+        except BaseException:
+            producer_failed.set()
+            raise
+        finally:
+            for _ in range(worker_count):
+                asyncio.run_coroutine_threadsafe(queue.put(_END_OF_STREAM), loop).result()
+
+    def record(result: NodeProcessingResult):
+        processing_results.append(result)
+        stats['tokens_used'] += result.tokens_used
+        stats['processing_time_ms'] += result.processing_time_ms
+
+        if result.status == 'success':
+            stats['subtrees_processed'] += 1
+            stats['total_facts_extracted'] += result.facts_stored
+            if stats['time_to_first_fact_ms'] is None and result.facts_stored > 0:
+                stats['time_to_first_fact_ms'] = int((datetime.now() - start_time).total_seconds() * 1000)
+            logger.info(f"Progress: {stats['subtrees_processed']} nodes processed "
+                       f"({stats['subtrees_queued']} parsed so far), "
+                       f"{stats['total_facts_extracted']} total facts")
+
+        elif result.status == 'skipped':
+            stats['nodes_skipped_by_config'] += 1
+            logger.debug(f"Node skipped: {result.subtree_path}")
+
+        elif result.status == 'error':
+            stats['errors'] += 1
+            processing_errors.append({
+                'subtree_path': result.subtree_path,
+                'error': result.error
+            })
+            logger.error(f"Error processing {result.subtree_path}: {result.error}")
+
+        if result_callback:
+            try:
+                result_callback(result)
+            except Exception as e:
+                logger.warning(f"Result callback failed: {e}")
+
+        if progress_callback:
+            try:
+                progress_callback(dict(stats))
+            except Exception as e:
+                logger.warning(f"Progress callback failed: {e}")
+
+    async def worker():
+        while True:
+            subtree = await queue.get()
+            if subtree is _END_OF_STREAM:
+                return
+            if producer_failed.is_set():
+                # Parsing failed - drain what is left without extracting it
+                continue
+            record(await process_single_node(
                 subtree=subtree,
                 run_id=run_id,
                 spec_version=spec_version,
                 message_root=message_root,
                 llm_extractor=llm_extractor,
-                db_manager=db_manager,
+                fact_writer=fact_writer,
                 node_configs=node_configs,
-                should_extract_func=should_extract_func
-            ): subtree
-            for subtree in subtrees
-        }
-
-        # Collect results as they complete
-        for future in as_completed(future_to_subtree):
-            subtree = future_to_subtree[future]
-
-            try:
-                result = future.result()  # Get result or raise exception
-                processing_results.append(result)
-
-                if result.status == 'success':
-                    subtrees_processed += 1
-                    total_facts_extracted += result.facts_stored
-                    logger.info(f"Progress: {subtrees_processed}/{len(subtrees)} "
-                               f"nodes processed, {total_facts_extracted} total facts")
-
-                elif result.status == 'skipped':
-                    nodes_skipped_by_config += 1
-                    logger.debug(f"Node skipped: {result.subtree_path}")
-
-                elif result.status == 'error':
-                    processing_errors.append({
-                        'subtree_path': result.subtree_path,
-                        'error': result.error
-                    })
-                    logger.error(f"Error processing {result.subtree_path}: {result.error}")
+                should_extract_func=should_extract_func,
+                llm_cache=llm_cache
+            ))
 
-            except Exception as e:
-                # Catch any exceptions from future.result()
-                logger.error(f"Failed to retrieve result for {subtree.path}: {e}")
-                processing_errors.append({
-                    'subtree_path': subtree.path,
-                    'error': str(e)
-                })
+    fact_writer = NodeFactWriter(db_manager).start()
+    producer = loop.run_in_executor(None, produce)
+    try:
+        await asyncio.gather(*(worker() for _ in range(worker_count)))
+    finally:
+        # Flush the remaining facts without blocking the event loop
+        write_stats = await loop.run_in_executor(None, fact_writer.close)
+    await producer  # Re-raises parser errors
+
+    # Subtrees whose batch failed to commit are errors, not successes
+    for result in processing_results:
+        write_error = write_stats['failed_paths'].get(result.subtree_path)
+        if write_error and result.status == 'success':
+            stats['subtrees_processed'] -= 1
+            stats['total_facts_extracted'] -= result.facts_stored
+            result.status = 'error'
+            result.facts_stored = 0
+            result.error = write_error
+            processing_errors.append({
+                'subtree_path': result.subtree_path,
+                'error': write_error
+            })
 
     # Log summary
     logger.info(f"Parallel processing completed: "
-               f"{subtrees_processed} successful, "
-               f"{nodes_skipped_by_config} skipped, "
-               f"{len(processing_errors)} errors")
+               f"{stats['subtrees_processed']} successful, "
+               f"{stats['nodes_skipped_by_config']} skipped, "
+               f"{len(processing_errors)} errors "
+               f"(first fact after {stats['time_to_first_fact_ms']}ms)")
 
     # Handle errors
     if processing_errors:
@@ -351,10 +513,52 @@ def process_nodes_parallel(
             logger.warning(f"  ... and {len(processing_errors) - 5} more errors")
 
     return {
-        'subtrees_processed': subtrees_processed,
-        'total_facts_extracted': total_facts_extracted,
-        'nodes_skipped_by_config': nodes_skipped_by_config,
+        'subtrees_processed': stats['subtrees_processed'],
+        'total_facts_extracted': stats['total_facts_extracted'],
+        'nodes_skipped_by_config': stats['nodes_skipped_by_config'],
         'processing_errors': processing_errors,
         'processing_results': processing_results,
-        'total_nodes': len(subtrees)
+        'total_nodes': stats['subtrees_queued'],
+        'time_to_first_fact_ms': stats['time_to_first_fact_ms'],
+        'tokens_used': stats['tokens_used'],
+        'processing_time_ms': stats['processing_time_ms'],
+        'write_batches': write_stats['batches_written']
     }
+
+
+def process_nodes_parallel(
+    subtrees: Iterable[XmlSubtree],
+    run_id: str,
+    spec_version: str,
+    message_root: str,
+    llm_extractor: LLMNodeFactsExtractor,
+    db_manager: ThreadSafeDatabaseManager,
+    node_configs: Dict,
+    max_concurrency: int,
+    should_extract_func: Optional[Callable] = None,
+    llm_cache: Optional[LLMResponseCache] = None,
+    queue_size: Optional[int] = None,
+    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+    result_callback: Optional[Callable[[NodeProcessingResult], None]] = None
+) -> Dict[str, Any]:
+    """
+    Process multiple nodes concurrently from synchronous code.
+
+    Schedules process_nodes_async on the shared LLM event loop and waits for it.
+    See process_nodes_async for arguments and return value.
+    """
+    return run_on_llm_loop(process_nodes_async(
+        subtrees=subtrees,
+        run_id=run_id,
+        spec_version=spec_version,
+        message_root=message_root,
+        llm_extractor=llm_extractor,
+        db_manager=db_manager,
+        node_configs=node_configs,
+        max_concurrency=max_concurrency,
+        should_extract_func=should_extract_func,
+        llm_cache=llm_cache,
+        queue_size=queue_size,
+        progress_callback=progress_callback,
+        result_callback=result_callback
+    ))
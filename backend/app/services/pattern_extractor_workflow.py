@@ -5,12 +5,12 @@ Orchestrates the complete pattern extraction process: XML parsing, target detect
 fact extraction, and storage. Implements the end-to-end Pattern Extractor pipeline.
 """
 
+import itertools
 import logging
 import uuid
 from typing import Dict, List, Any, Optional, Iterator
 from datetime import datetime
 from pathlib import Path
-import hashlib
 
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
@@ -18,16 +18,19 @@ from sqlalchemy import create_engine
 
 from app.core.config import settings
 from app.models.database import Run, RunKind, RunStatus, NodeFact, NodeConfiguration, Pattern
-from app.services.xml_parser import XmlStreamingParser, create_parser_for_version, XmlSubtree, detect_ndc_version_fast
+from app.services.xml_parser import XmlIngestPipeline, NdcVersionInfo, XmlSubtree
 from app.services.template_extractor import template_extractor
 from app.services.llm_extractor import get_llm_extractor
+from app.services.llm_cache import LLMResponseCache
 from app.services.pii_masking import pii_engine
 from app.services.pattern_generator import create_pattern_generator
 from app.services.utils import normalize_iata_prefix
 from app.services.parallel_processor import (
+    NodeProcessingResult,
     ThreadSafeDatabaseManager,
     process_nodes_parallel
 )
+from app.services.run_progress import RunProgress
 
 logger = logging.getLogger(__name__)
 
@@ -40,20 +43,16 @@ class PatternExtractorWorkflow:
         self.db_session = db_session
         self.message_root: Optional[str] = None
 
-    def _calculate_file_hash(self, file_path: str) -> str:
-        """Calculate SHA-256 hash of file."""
-        hash_sha256 = hashlib.sha256()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_sha256.update(chunk)
-        return hash_sha256.hexdigest()
-
     def _get_node_configurations(self, spec_version: str = None,
                                  message_root: str = None,
-                                 airline_code: str = None) -> Dict[str, Dict]:
+                                 airline_code: str = None,
+                                 any_airline: bool = False) -> Dict[str, Dict]:
         """
         Get node configurations from database.
 
+        With any_airline=True, returns enabled configs of every airline (the superset
+        that an airline-specific lookup can fall back to).
+
         Returns dict mapping section_path -> config dict with enabled status.
         """
         query = self.db_session.query(NodeConfiguration).filter(
@@ -66,7 +65,9 @@ class PatternExtractorWorkflow:
             query = query.filter(NodeConfiguration.message_root == message_root)
 
         # Try to get airline-specific and global configs (NULL airline_code)
-        if airline_code:
+        if any_airline:
+            configs_list = query.all()
+        elif airline_code:
             airline_query = query.filter(
                 (NodeConfiguration.airline_code == airline_code) |
                 (NodeConfiguration.airline_code == None)
@@ -152,10 +153,32 @@ class PatternExtractorWorkflow:
         # No matching config - default to extract
         return True
 
-    def _create_run_record(self, file_path: str, file_hash: str, file_size: int) -> str:
-        """Create a new run record in database."""
-        run_id = str(uuid.uuid4())
+    def _create_run_record(self, file_path: str, file_hash: str, file_size: int,
+                           run_id: Optional[str] = None) -> str:
+        """
+        Create a new run record in database.
+
+        A run submitted to the background executor already has its record
+        (kind, original filename, job parameters); it is completed instead.
+        """
+        metadata = {
+            'workflow_version': '1.0',
+            'max_xml_size_mb': settings.MAX_XML_SIZE_MB,
+            'max_subtree_size_kb': settings.MAX_SUBTREE_SIZE_KB,
+            'pii_masking_enabled': settings.PII_MASKING_ENABLED
+        }
+
+        run = self.db_session.query(Run).filter(Run.id == run_id).first() if run_id else None
+        if run:
+            run.file_size_bytes = file_size
+            run.file_hash = file_hash
+            run.filename = run.filename or Path(file_path).name
+            run.metadata_json = {**(run.metadata_json or {}), **metadata}
+            self.db_session.commit()
+            logger.info(f"Started submitted discovery run: {run_id}")
+            return run_id
 
+        run_id = run_id or str(uuid.uuid4())
         run = Run(
             id=run_id,
             kind=RunKind.PATTERN_EXTRACTOR,
@@ -164,12 +187,7 @@ class PatternExtractorWorkflow:
             file_size_bytes=file_size,
             file_hash=file_hash,
             started_at=datetime.utcnow(),
-            metadata_json={
-                'workflow_version': '1.0',
-                'max_xml_size_mb': settings.MAX_XML_SIZE_MB,
-                'max_subtree_size_kb': settings.MAX_SUBTREE_SIZE_KB,
-                'pii_masking_enabled': settings.PII_MASKING_ENABLED
-            }
+            metadata_json=metadata
         )
 
         self.db_session.add(run)
@@ -194,6 +212,20 @@ class PatternExtractorWorkflow:
             airline_info = f" - Airline: {airline_code}" if airline_code else ""
             logger.info(f"Updated run {run_id} with version: {spec_version}/{message_root}{airline_info}")
 
+    def _update_run_file_hash(self, run_id: str, file_hash: str):
+        """Store the file hash computed during ingest."""
+        run = self.db_session.query(Run).filter(Run.id == run_id).first()
+        if run:
+            run.file_hash = file_hash
+            self.db_session.commit()
+
+    def _update_run_metadata(self, run_id: str, **values):
+        """Merge values into the run's metadata_json."""
+        run = self.db_session.query(Run).filter(Run.id == run_id).first()
+        if run:
+            run.metadata_json = {**(run.metadata_json or {}), **values}
+            self.db_session.commit()
+
     def _update_run_status(self, run_id: str, status: RunStatus, error_details: str = None):
         """Update run status."""
         run = self.db_session.query(Run).filter(Run.id == run_id).first()
@@ -298,12 +330,17 @@ class PatternExtractorWorkflow:
             return template_extractor.get_available_templates()
 
     def run_discovery(self, xml_file_path: str, skip_pattern_generation: bool = False,
-                     conflict_resolution: Optional[str] = None) -> Dict[str, Any]:
+                     conflict_resolution: Optional[str] = None,
+                     run_id: Optional[str] = None,
+                     progress: Optional[RunProgress] = None) -> Dict[str, Any]:
         """
-        Run complete discovery workflow on XML file using optimized two-phase approach.
+        Run complete discovery workflow on XML file.
 
-        Phase 1: Fast version detection from XML root element
-        Phase 2: Targeted processing with version-specific target paths
+        Phase 1: Single-pass ingest (XmlIngestPipeline) - one read of the file
+                 computes its hash, sniffs version and airline from the header
+                 and streams the target subtrees; subtrees are held back until
+                 the airline is known and the final target paths are loaded
+        Phase 2: Extraction of NodeFacts from the streamed subtrees
         Phase 2.5: Relationship analysis (always runs)
         Phase 3: Pattern generation (skipped when called from Discovery mode)
 
@@ -313,6 +350,8 @@ class PatternExtractorWorkflow:
                                     Used when calling from Discovery workflow.
             conflict_resolution: Strategy for resolving pattern conflicts (replace/keep_both/merge).
                                 Only used during pattern generation.
+            run_id: Id of an already created run record (background runs); a new run is created if None
+            progress: Receives the phase and extraction counters as the run advances
 
         Returns:
             Dict containing workflow results and statistics
@@ -328,16 +367,17 @@ class PatternExtractorWorkflow:
             raise FileNotFoundError(f"XML file not found: {xml_file_path}")
 
         file_size = file_path.stat().st_size
-        file_hash = self._calculate_file_hash(xml_file_path)
 
-        # Create run record
-        run_id = self._create_run_record(xml_file_path, file_hash, file_size)
+        # File hash is computed during the single-pass ingest below
+        run_id = self._create_run_record(xml_file_path, None, file_size, run_id=run_id)
+        progress = progress or RunProgress(run_id)
+        progress.phase('parsing')
 
         workflow_results = {
             'run_id': run_id,
             'file_path': xml_file_path,
             'file_size_bytes': file_size,
-            'file_hash': file_hash,
+            'file_hash': None,
             'started_at': datetime.utcnow().isoformat(),
             'subtrees_processed': 0,
             'node_facts_extracted': 0,
@@ -349,121 +389,129 @@ class PatternExtractorWorkflow:
         }
 
         try:
-            version_info = detect_ndc_version_fast(xml_file_path)
-
             target_paths = []
             node_configs = {}
 
-            if version_info and version_info.spec_version and version_info.message_root:
-                # SUCCESS: Version detected, use optimized approach
-                logger.info(f"Version detected: {version_info.spec_version}/{version_info.message_root}")
+            def load_candidate_targets(detected: NdcVersionInfo) -> List[Dict]:
+                """Version known: load configs of any airline so no target is missed."""
+                if not (detected.spec_version and detected.message_root):
+                    # Version detection failed - cannot proceed
+                    logger.error("Version detection failed - cannot determine spec version and message root")
+                    raise ValueError(
+                        "Could not detect NDC version and message root from XML file. "
+                        "Please ensure the XML file has valid NDC structure with version information "
+                        "in the root element or PayloadAttributes section."
+                    )
+
+                logger.info(f"Version detected: {detected.spec_version}/{detected.message_root}")
 
                 # Cache message root for helper methods
-                self.message_root = version_info.message_root
+                self.message_root = detected.message_root
+
+                candidate_configs = self._get_node_configurations(
+                    spec_version=detected.spec_version,
+                    message_root=detected.message_root,
+                    any_airline=True
+                )
+                return self._convert_node_configs_to_target_paths(candidate_configs)
 
-                # Update run with version info immediately
+            def resolve_targets(detected: NdcVersionInfo) -> List[Dict]:
+                """Airline known: load BA-defined extraction rules for this run."""
+                nonlocal node_configs, target_paths
+
+                # Update run with version info
                 self._update_run_version_info(
                     run_id,
-                    version_info.spec_version,
-                    version_info.message_root,
-                    airline_code=version_info.airline_code,
-                    airline_name=version_info.airline_name
+                    detected.spec_version,
+                    detected.message_root,
+                    airline_code=detected.airline_code,
+                    airline_name=detected.airline_name
                 )
 
-                # Load node configurations (BA-defined extraction rules)
                 node_configs = self._get_node_configurations(
-                    spec_version=version_info.spec_version,
-                    message_root=version_info.message_root,
-                    airline_code=version_info.airline_code
+                    spec_version=detected.spec_version,
+                    message_root=detected.message_root,
+                    airline_code=detected.airline_code
                 )
 
-                if node_configs:
-                    # Use node configurations as target paths
-                    target_paths = self._convert_node_configs_to_target_paths(node_configs)
-                    logger.info(f"Using {len(target_paths)} configured target paths")
-                else:
+                if not node_configs:
                     # No node configurations found - cannot proceed
                     error_msg = (
-                        f"No node configurations found for {version_info.spec_version}/{version_info.message_root}"
-                        f"{f'/{version_info.airline_code}' if version_info.airline_code else '/Global'}. "
+                        f"No node configurations found for {detected.spec_version}/{detected.message_root}"
+                        f"{f'/{detected.airline_code}' if detected.airline_code else '/Global'}. "
                         f"Please configure nodes in Node Manager before running Pattern Extractor."
                     )
                     logger.error(error_msg)
                     raise ValueError(error_msg)
 
-            else:
-                # Version detection failed - cannot proceed
-                logger.error("Fast version detection failed - cannot determine spec version and message root")
-                raise ValueError(
-                    "Could not detect NDC version and message root from XML file. "
-                    "Please ensure the XML file has valid NDC structure with version information "
-                    "in the root element or PayloadAttributes section."
-                )
+                # Use node configurations as target paths
+                target_paths = self._convert_node_configs_to_target_paths(node_configs)
+                logger.info(f"Using {len(target_paths)} configured target paths")
+                return target_paths
 
-            parser = XmlStreamingParser(target_paths)
+            # Single read: hashing, version/airline detection and subtree extraction
+            ingest = XmlIngestPipeline(xml_file_path, load_candidate_targets, resolve_targets)
+            version_info = ingest.version_info
 
             # Initialize variables
             subtrees_processed = 0
             total_facts_extracted = 0
-            version_updated_during_processing = False
             nodes_skipped_by_config = 0
 
             # Check if LLM is available and decide processing mode
             llm_extractor = get_llm_extractor()
+            llm_cache = LLMResponseCache.for_session(self.db_session)
             use_parallel = settings.ENABLE_PARALLEL_PROCESSING and llm_extractor.client
 
             if not llm_extractor.client:
                 logger.warning("LLM client not available - parallel processing disabled")
                 use_parallel = False
 
-            # Collect subtrees from XML stream
-            logger.info("Collecting subtrees from XML stream...")
-            subtrees_to_process = []
-
-            for subtree in parser.parse_stream(xml_file_path):
-                # Handle version info if not detected in Phase 1
-                if (not version_info and
-                    not version_updated_during_processing and
-                    parser.version_info.spec_version):
-
-                    logger.info("Version detected during processing: "
-                               f"{parser.version_info.spec_version}/"
-                               f"{parser.version_info.message_root}")
-
-                    self._update_run_version_info(
-                        run_id,
-                        parser.version_info.spec_version,
-                        parser.version_info.message_root,
-                        airline_code=parser.version_info.airline_code,
-                        airline_name=parser.version_info.airline_name
-                    )
-                    version_updated_during_processing = True
-                    version_info = parser.version_info
-                    self.message_root = parser.version_info.message_root
-
-                # Find matching target path for this subtree
-                matching_target = None
-                for target in parser.target_paths:
-                    if target['path_local'] in subtree.path:
-                        matching_target = target
-                        break
-
-                if matching_target:
-                    # Only collect nodes that should be extracted
-                    subtrees_to_process.append(subtree)
-                else:
-                    logger.warning(f"No matching target path found for subtree: {subtree.path}")
-
-            logger.info(f"Collected {len(subtrees_to_process)} subtrees for processing "
-                       f"({nodes_skipped_by_config} skipped by config)")
+            def iter_subtrees_to_process() -> Iterator[XmlSubtree]:
+                """Stream target subtrees straight from the parser."""
+                for subtree in ingest.iter_subtrees():
+                    # Find matching target path for this subtree
+                    matching_target = None
+                    for target in target_paths:
+                        if target['path_local'] in subtree.path:
+                            matching_target = target
+                            break
+
+                    if matching_target:
+                        # Only process nodes that should be extracted
+                        yield subtree
+                    else:
+                        logger.warning(f"No matching target path found for subtree: {subtree.path}")
+
+            # Parse up to the first target subtree: by then version, airline and
+            # node configurations are resolved. The rest is parsed while extracting.
+            subtree_stream = iter_subtrees_to_process()
+            first_subtree = next(subtree_stream, None)
+            has_subtrees = first_subtree is not None
+            if has_subtrees:
+                subtree_stream = itertools.chain([first_subtree], subtree_stream)
 
             # Initialize parallel_results to avoid UnboundLocalError
             parallel_results = None
+            tokens_used = 0
+            progress.phase('extracting')
+
+            def report_extraction(stats: Dict[str, Any]):
+                progress.update(
+                    subtrees_done=stats['subtrees_processed'] + stats['nodes_skipped_by_config'] + stats['errors'],
+                    subtrees_total=stats['subtrees_queued'],
+                    node_facts=stats['total_facts_extracted'],
+                    tokens_used=stats['tokens_used'],
+                    processing_time_ms=stats['processing_time_ms']
+                )
+
+            def report_result(result: NodeProcessingResult):
+                progress.emit('node_result', result.to_dict())
 
             # Process nodes - Parallel or Sequential based on configuration
-            if use_parallel and len(subtrees_to_process) > 0:
+            if use_parallel and has_subtrees:
                 # PARALLEL PROCESSING
-                logger.info(f"Starting PARALLEL processing with {settings.MAX_PARALLEL_NODES} workers")
+                logger.info(f"Starting PARALLEL processing with up to {settings.LLM_MAX_CONCURRENCY} concurrent LLM requests")
 
                 # Initialize thread-safe database manager
                 db_manager = ThreadSafeDatabaseManager(self.db_session.bind)
@@ -471,25 +519,40 @@ class PatternExtractorWorkflow:
                 try:
                     # Process nodes in parallel
                     parallel_results = process_nodes_parallel(
-                        subtrees=subtrees_to_process,
+                        subtrees=subtree_stream,
                         run_id=run_id,
                         spec_version=version_info.spec_version if version_info else None,
                         message_root=version_info.message_root if version_info else None,
                         llm_extractor=llm_extractor,
                         db_manager=db_manager,
                         node_configs=node_configs,
-                        max_workers=min(settings.MAX_PARALLEL_NODES, len(subtrees_to_process)),
-                        should_extract_func=self._should_extract_node
+                        max_concurrency=settings.LLM_MAX_CONCURRENCY,
+                        should_extract_func=self._should_extract_node,
+                        llm_cache=llm_cache,
+                        progress_callback=report_extraction,
+                        result_callback=report_result
                     )
 
                     # Extract results
                     subtrees_processed = parallel_results['subtrees_processed']
                     total_facts_extracted = parallel_results['total_facts_extracted']
                     nodes_skipped_by_config += parallel_results['nodes_skipped_by_config']
+                    tokens_used = parallel_results['tokens_used']
+                    progress.update(
+                        subtrees_total=parallel_results['total_nodes'],
+                        node_facts=total_facts_extracted,
+                        tokens_used=tokens_used,
+                        processing_time_ms=parallel_results['processing_time_ms']
+                    )
 
                     logger.info(f"✅ Parallel processing completed: "
                                f"{subtrees_processed} nodes processed, "
                                f"{total_facts_extracted} facts extracted")
+                    self._update_run_metadata(
+                        run_id,
+                        subtrees_total=parallel_results['total_nodes'],
+                        time_to_first_fact_ms=parallel_results['time_to_first_fact_ms']
+                    )
 
                     # Handle errors if any
                     if parallel_results['processing_errors']:
@@ -509,7 +572,7 @@ class PatternExtractorWorkflow:
                         # Save errors to Run record so user can see them
                         run = self.db_session.query(Run).filter(Run.id == run_id).first()
                         if run:
-                            run.error_details = f"LLM extraction failed for {error_count} of {len(subtrees_to_process)} nodes:\n\n{error_summary}"
+                            run.error_details = f"LLM extraction failed for {error_count} of {parallel_results['total_nodes']} nodes:\n\n{error_summary}"
 
                             # Also save detailed errors to metadata for debugging
                             if run.metadata_json is None:
@@ -530,14 +593,16 @@ class PatternExtractorWorkflow:
                             raise ValueError(error_msg)
 
                 finally:
-                    # Cleanup thread-local sessions
+                    # Cleanup thread-local sessions and stop the writer thread
                     db_manager.cleanup_session()
 
             else:
                 # SEQUENTIAL PROCESSING (Fallback/Legacy mode)
                 logger.info("Using SEQUENTIAL processing (legacy mode)")
 
-                for subtree in subtrees_to_process:
+                processing_time_ms = 0
+                for subtree in subtree_stream:
+                    subtree_started = datetime.now()
                     try:
                         # Use LLM-based extraction
                         logger.debug(f"Using LLM extraction for path: {subtree.path}")
@@ -547,7 +612,8 @@ class PatternExtractorWorkflow:
                             context={
                                 'run_id': run_id,
                                 'spec_version': version_info.spec_version if version_info else None,
-                                'message_root': version_info.message_root if version_info else None
+                                'message_root': version_info.message_root if version_info else None,
+                                'llm_cache': llm_cache
                             }
                         )
 
@@ -555,8 +621,26 @@ class PatternExtractorWorkflow:
                         facts_stored = self._store_llm_node_facts(run_id, subtree, llm_result)
                         total_facts_extracted += facts_stored
                         subtrees_processed += 1
+                        tokens_used += llm_result.tokens_used or 0
+                        subtree_time_ms = int((datetime.now() - subtree_started).total_seconds() * 1000)
+                        processing_time_ms += subtree_time_ms
+                        report_result(NodeProcessingResult(
+                            subtree_path=subtree.path,
+                            status='success',
+                            facts_stored=facts_stored,
+                            confidence=llm_result.confidence_score,
+                            processing_time_ms=subtree_time_ms,
+                            tokens_used=llm_result.tokens_used or 0
+                        ))
+                        progress.update(
+                            subtrees_done=subtrees_processed,
+                            subtrees_total=subtrees_processed,
+                            node_facts=total_facts_extracted,
+                            tokens_used=tokens_used,
+                            processing_time_ms=processing_time_ms
+                        )
 
-                        logger.info(f"Processed subtree {subtrees_processed}/{len(subtrees_to_process)}: "
+                        logger.info(f"Processed subtree {subtrees_processed}: "
                                    f"{subtree.path} -> {facts_stored} facts")
 
                     except ValueError as e:
@@ -573,11 +657,23 @@ class PatternExtractorWorkflow:
                         logger.error(f"   Traceback:\n{traceback.format_exc()}")
                         raise ValueError(f"Discovery Error: {type(e).__name__}: {str(e)}")
 
+            # The stream has been read to the end, so the file hash is known
+            workflow_results['file_hash'] = ingest.file_hash
+            self._update_run_file_hash(run_id, ingest.file_hash)
+
+            if llm_cache is not None:
+                cache_stats = llm_cache.stats()
+                llm_cache.close()
+                workflow_results['llm_cache'] = cache_stats
+                self._update_run_metadata(run_id, llm_cache=cache_stats)
+                logger.info(f"LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+
             # Update workflow results (but DON'T set finished_at yet - still have more phases!)
             workflow_results.update({
                 'subtrees_processed': subtrees_processed,
                 'node_facts_extracted': total_facts_extracted,
                 'nodes_skipped_by_config': nodes_skipped_by_config,
+                'tokens_used': tokens_used,
                 'node_configs_loaded': len(node_configs),
                 'status': 'in_progress',  # Still processing - relationship analysis and pattern generation pending
                 'target_paths_loaded': len(target_paths),
@@ -611,6 +707,7 @@ class PatternExtractorWorkflow:
             if total_facts_extracted > 0:
                 logger.info(f"DEBUG: Phase 2.5 condition TRUE - entering relationship analysis")
                 logger.info(f"Phase 2.5: Analyzing relationships between {total_facts_extracted} NodeFacts")
+                progress.phase('relationships')
                 try:
                     from app.services.relationship_analyzer import create_relationship_analyzer
 
@@ -623,10 +720,12 @@ class PatternExtractorWorkflow:
                     relationship_analyzer = create_relationship_analyzer(self.db_session)
                     relationship_results = relationship_analyzer.analyze_relationships(
                         run_id,
-                        node_facts
+                        node_facts,
+                        progress_callback=lambda counts: progress.emit('relationships', counts)
                     )
 
                     workflow_results['relationship_analysis'] = relationship_results
+                    progress.update(relationships_found=relationship_results.get('relationships_count', 0))
 
                     logger.info(f"Relationship analysis completed: "
                                f"{relationship_results.get('relationships_count', 0)} relationships discovered, "
@@ -642,6 +741,7 @@ class PatternExtractorWorkflow:
             # PHASE 3: Pattern Generation (if NodeFacts were extracted AND not skipped)
             if total_facts_extracted > 0 and not skip_pattern_generation:
                 logger.info(f"Phase 3: Generating patterns from {total_facts_extracted} NodeFacts (auto-discovery mode)")
+                progress.phase('pattern_generation')
 
                 # Initialize patterns_to_supersede for MERGE strategy
                 patterns_to_supersede = []
@@ -728,6 +828,17 @@ class PatternExtractorWorkflow:
                     pattern_results = pattern_generator.generate_patterns_from_run(run_id)
 
                     workflow_results['pattern_generation'] = pattern_results
+                    progress.emit('patterns', {
+                        'node_facts_analyzed': pattern_results.get('node_facts_analyzed', 0),
+                        'pattern_groups': pattern_results.get('pattern_groups', 0),
+                        'patterns_created': pattern_results.get('patterns_created', 0),
+                        'patterns_updated': pattern_results.get('patterns_updated', 0),
+                        'errors': len(pattern_results.get('errors', []))
+                    })
+                    progress.update(
+                        patterns_created=pattern_results.get('patterns_created', 0),
+                        patterns_updated=pattern_results.get('patterns_updated', 0)
+                    )
 
                     logger.info(f"Pattern generation completed: "
                                f"{pattern_results.get('patterns_created', 0)} created, "
@@ -971,7 +1082,8 @@ class PatternExtractorWorkflow:
             'duration_seconds': run.duration_seconds,
             'node_facts_count': node_facts_count,
             'metadata': run.metadata_json,
-            'error_details': run.error_details
+            'error_details': run.error_details,
+            'warning': run.warning
         }
 
 
@@ -3,14 +3,21 @@ Pattern generation service for AssistedDiscovery.
 
 Analyzes NodeFacts to generate reusable Pattern signatures for future matching.
 Implements Phase 2: Pattern Discovery.
+
+generate_patterns_from_run costs a constant number of queries per run: the
+relationships of the run are prefetched once, NodeFacts are streamed in
+group order (one group's fact_json in memory at a time), the existing
+patterns of all signature hashes are looked up together, and patterns are
+inserted and updated in bulk.
 """
 
 import logging
 import hashlib
 import json
-from typing import Dict, List, Any, Optional, Set, Tuple
+from typing import Dict, List, Any, Iterator, Optional, Set, Tuple
 from datetime import datetime
 from collections import defaultdict
+from itertools import groupby
 from sqlalchemy.orm import Session
 from openai import AzureOpenAI, OpenAI
 import httpx
@@ -20,10 +27,18 @@ from app.core.config import settings
 from app.services.llm_extractor import get_llm_extractor
 from app.services.utils import normalize_iata_prefix
 from app.services.llm_client_factory import LLMClientFactory
+from app.services.llm_rate_limiter import get_llm_rate_limiter, prompt_token_estimate
 from app.prompts import get_pattern_description_prompt
 
 logger = logging.getLogger(__name__)
 
+# NodeFact rows fetched per batch while streaming a run
+FACT_STREAM_BATCH_SIZE = 500
+# Signature hashes per IN (...) lookup, below SQLite's bound parameter limit
+PATTERN_LOOKUP_CHUNK_SIZE = 500
+# Examples kept per pattern
+MAX_PATTERN_EXAMPLES = 5
+
 
 class PatternGenerator:
     """Generates pattern signatures from NodeFacts."""
@@ -325,34 +340,41 @@ class PatternGenerator:
 
         return normalized
 
-    def _get_expected_relationships(self, run_id: str, section_path: str) -> List[Dict[str, Any]]:
+    def _get_expected_relationships_by_section(self, run_id: str) -> Dict[str, List[Dict[str, Any]]]:
         """
-        Query node_relationships table to get expected relationships for a section_path.
+        Expected relationships of every section of a run, in one query.
 
         Args:
             run_id: Discovery run ID
-            section_path: Section path to get relationships for
 
         Returns:
-            List of expected relationships with is_valid status
+            source section_path -> expected relationships with is_valid status
         """
-        # Query all relationships where this section is the source
-        relationships = self.db_session.query(NodeRelationship).filter(
-            NodeRelationship.run_id == run_id,
-            NodeRelationship.source_section_path == section_path
-        ).all()
-
-        expected_rels = []
+        relationships = self.db_session.query(
+            NodeRelationship.source_section_path,
+            NodeRelationship.target_section_path,
+            NodeRelationship.target_node_type,
+            NodeRelationship.reference_type,
+            NodeRelationship.is_valid,
+            NodeRelationship.confidence
+        ).filter(
+            NodeRelationship.run_id == run_id
+        ).order_by(NodeRelationship.id).all()
+
+        by_section = defaultdict(list)
         for rel in relationships:
-            expected_rels.append({
-                'target_section_path': rel.target_section_path,
-                'target_node_type': rel.target_node_type,
-                'reference_type': rel.reference_type,
-                'is_valid': rel.is_valid,  # KEY: Store the expected validity!
-                'confidence': float(rel.confidence) if rel.confidence else 1.0
-            })
+            by_section[rel.source_section_path].append(self._expected_relationship(rel))
+        return by_section
 
-        return expected_rels
+    @staticmethod
+    def _expected_relationship(rel: Any) -> Dict[str, Any]:
+        return {
+            'target_section_path': rel.target_section_path,
+            'target_node_type': rel.target_node_type,
+            'reference_type': rel.reference_type,
+            'is_valid': rel.is_valid,  # KEY: Store the expected validity!
+            'confidence': float(rel.confidence) if rel.confidence else 1.0
+        }
 
     def generate_signature_hash(self, decision_rule: Dict[str, Any],
                                 spec_version: str,
@@ -439,22 +461,12 @@ class PatternGenerator:
                 references=', '.join([p.get('type', '') for p in reference_patterns]) if reference_patterns else 'None'
             )
 
-            if hasattr(sync_client, "chat"):
-                response = sync_client.chat.completions.create(
-                    model=model_name,
-                    max_tokens=150,
-                    temperature=0.3,
-                    messages=[{
-                        "role": "user",
-                        "content": prompt
-                    }]
-                )
-                description = response.choices[0].message.content.strip()
-            else:
-                import asyncio
+            rate_limiter = get_llm_rate_limiter()
+            estimated_tokens = prompt_token_estimate(prompt, max_tokens=150)
 
-                async def _async_call():
-                    resp = await sync_client.chat.completions.create(
+            if hasattr(sync_client, "chat"):
+                with rate_limiter.limit(estimated_tokens) as permit:
+                    response = sync_client.chat.completions.create(
                         model=model_name,
                         max_tokens=150,
                         temperature=0.3,
@@ -463,6 +475,23 @@ class PatternGenerator:
                             "content": prompt
                         }]
                     )
+                    permit.record_usage(response.usage.total_tokens if response.usage else None)
+                description = response.choices[0].message.content.strip()
+            else:
+                import asyncio
+
+                async def _async_call():
+                    async with rate_limiter.limit(estimated_tokens) as permit:
+                        resp = await sync_client.chat.completions.create(
+                            model=model_name,
+                            max_tokens=150,
+                            temperature=0.3,
+                            messages=[{
+                                "role": "user",
+                                "content": prompt
+                            }]
+                        )
+                        permit.record_usage(resp.usage.total_tokens if resp.usage else None)
                     return resp.choices[0].message.content.strip()
 
                 description = asyncio.run(_async_call())
@@ -567,6 +596,137 @@ class PatternGenerator:
 
             return new_pattern
 
+    def _iter_fact_groups(self, run_id: str) -> Iterator[Tuple[Tuple[str, str, str, str], List[Tuple[int, Any]]]]:
+        """
+        Stream the NodeFacts of a run, one (spec_version, message_root, section_path, node_type) group at a time.
+
+        The query is ordered by the group key (then id), and fetched in
+        batches of FACT_STREAM_BATCH_SIZE rows.
+
+        Yields:
+            (group key, [(node_fact_id, fact_json), ...])
+        """
+        rows = self.db_session.query(
+            NodeFact.spec_version,
+            NodeFact.message_root,
+            NodeFact.section_path,
+            NodeFact.node_type,
+            NodeFact.id,
+            NodeFact.fact_json
+        ).filter(
+            NodeFact.run_id == run_id
+        ).order_by(
+            NodeFact.spec_version,
+            NodeFact.message_root,
+            NodeFact.section_path,
+            NodeFact.node_type,
+            NodeFact.id
+        ).yield_per(FACT_STREAM_BATCH_SIZE)
+
+        for key, group in groupby(rows, key=lambda row: tuple(row[:4])):
+            yield key, [(row.id, row.fact_json) for row in group]
+
+    def _find_patterns_by_hash(self, signature_hashes: List[str]) -> Dict[str, Any]:
+        """Existing patterns (id, times_seen, examples, airline_code) by signature hash, in chunked IN queries."""
+        existing = {}
+        for start in range(0, len(signature_hashes), PATTERN_LOOKUP_CHUNK_SIZE):
+            rows = self.db_session.query(
+                Pattern.id,
+                Pattern.signature_hash,
+                Pattern.times_seen,
+                Pattern.examples,
+                Pattern.airline_code
+            ).filter(
+                Pattern.signature_hash.in_(signature_hashes[start:start + PATTERN_LOOKUP_CHUNK_SIZE])
+            ).all()
+            existing.update((row.signature_hash, row) for row in rows)
+        return existing
+
+    def _upsert_patterns(self, candidates: List[Dict[str, Any]], airline_code: Optional[str]) -> Tuple[int, int]:
+        """
+        Create or update the patterns of a run in bulk.
+
+        Same outcome as find_or_create_pattern per candidate, in order: a
+        candidate whose signature hash exists (in the database, or earlier in
+        the run) updates that pattern, any other creates one.
+
+        Args:
+            candidates: Dicts with spec_version, message_root, section_path,
+                        decision_rule, signature_hash and example_node_fact_id
+            airline_code: Airline of the run
+
+        Returns:
+            (patterns created, patterns updated)
+        """
+        existing = self._find_patterns_by_hash(sorted({c['signature_hash'] for c in candidates}))
+        inserts: Dict[str, Dict[str, Any]] = {}
+        updates: Dict[str, Dict[str, Any]] = {}
+        patterns_created = 0
+        patterns_updated = 0
+
+        for candidate in candidates:
+            signature_hash = candidate['signature_hash']
+            now = datetime.utcnow()
+            example = {'node_fact_id': candidate['example_node_fact_id'], 'timestamp': now.isoformat()}
+
+            pattern = inserts.get(signature_hash) or updates.get(signature_hash)
+            if pattern is None and signature_hash in existing:
+                row = existing[signature_hash]
+                if row.airline_code != airline_code:
+                    logger.info(f"Pattern {row.id} found with different airline_code: "
+                               f"{row.airline_code} -> {airline_code}")
+                pattern = updates[signature_hash] = {
+                    'id': row.id,
+                    'airline_code': airline_code,
+                    'times_seen': row.times_seen or 0,
+                    'examples': list(row.examples or [])
+                }
+
+            if pattern is not None:
+                pattern['times_seen'] += 1
+                pattern['last_seen_at'] = now
+                pattern['decision_rule'] = candidate['decision_rule']
+                pattern['examples'] = (pattern['examples'] + [example])[-MAX_PATTERN_EXAMPLES:]
+                patterns_updated += 1
+                logger.info(f"Updated existing pattern {signature_hash} (times_seen: {pattern['times_seen']})")
+                continue
+
+            section_path = candidate['section_path']
+            message_root = candidate['message_root']
+            decision_rule = candidate['decision_rule']
+
+            # Generate LLM-powered description
+            description = self._generate_pattern_description(decision_rule, section_path)
+
+            inserts[signature_hash] = {
+                'spec_version': candidate['spec_version'],
+                'message_root': message_root,
+                'airline_code': airline_code,
+                'section_path': self._normalize_path(section_path, message_root),
+                'selector_xpath': self.generate_selector_xpath(section_path, decision_rule.get('node_type', 'Unknown')),
+                'decision_rule': decision_rule,
+                'description': description,
+                'signature_hash': signature_hash,
+                'times_seen': 1,
+                'created_by_model': settings.LLM_MODEL,
+                'examples': [example],
+                'created_at': now,
+                'last_seen_at': now
+            }
+            patterns_created += 1
+
+            airline_info = f" - {airline_code}" if airline_code else ""
+            desc_info = f" - {description[:50]}..." if description else ""
+            logger.info(f"Created new pattern: {signature_hash} for "
+                       f"{candidate['spec_version']}/{message_root}{airline_info}/{section_path}{desc_info}")
+
+        if inserts:
+            self.db_session.bulk_insert_mappings(Pattern, list(inserts.values()))
+        if updates:
+            self.db_session.bulk_update_mappings(Pattern, list(updates.values()))
+
+        return patterns_created, patterns_updated
+
     def generate_patterns_from_run(self, run_id: str) -> Dict[str, Any]:
         """
         Generate patterns from all NodeFacts in a run (fully automatic).
@@ -593,81 +753,60 @@ class PatternGenerator:
 
         airline_code = run.airline_code
 
-        # Get all NodeFacts from this run
-        node_facts = self.db_session.query(NodeFact).filter(
-            NodeFact.run_id == run_id
-        ).all()
+        # Expected relationships of every section, from the node_relationships table
+        expected_by_section = self._get_expected_relationships_by_section(run_id)
 
-        if not node_facts:
-            logger.warning(f"No NodeFacts found for run: {run_id}")
-            return {
-                'run_id': run_id,
-                'node_facts_analyzed': 0,
-                'patterns_created': 0,
-                'patterns_updated': 0,
-                'errors': []
-            }
-
-        # Group NodeFacts by (spec_version, message_root, section_path, node_type)
-        groups = defaultdict(list)
-
-        for nf in node_facts:
-            key = (
-                nf.spec_version,
-                nf.message_root,
-                nf.section_path,
-                nf.node_type
-            )
-            groups[key].append({
-                'id': nf.id,
-                'fact_json': nf.fact_json
-            })
-
-        logger.info(f"Grouped {len(node_facts)} NodeFacts into {len(groups)} pattern groups")
-
-        # Generate patterns for each group
-        patterns_created = 0
-        patterns_updated = 0
+        # Decision rule and signature of each (spec_version, message_root, section_path, node_type) group
+        candidates = []
+        node_facts_analyzed = 0
+        pattern_groups = 0
         errors = []
 
-        for (spec_version, message_root, section_path, node_type), facts in groups.items():
+        for (spec_version, message_root, section_path, node_type), facts in self._iter_fact_groups(run_id):
+            node_facts_analyzed += len(facts)
+            pattern_groups += 1
             try:
                 # Extract fact_json from each NodeFact
-                fact_jsons = [f['fact_json'] for f in facts]
-
-                # Get expected relationships from node_relationships table
-                expected_relationships = self._get_expected_relationships(run_id, section_path)
+                fact_jsons = [fact_json for _, fact_json in facts]
 
+                expected_relationships = expected_by_section.get(section_path, [])
                 if expected_relationships:
                     logger.debug(f"Found {len(expected_relationships)} expected relationships for {section_path}")
 
                 # Generate decision rule (includes expected relationships with is_valid status)
                 decision_rule = self.generate_decision_rule(fact_jsons, expected_relationships)
 
-                # Find or create pattern
-                pattern = self.find_or_create_pattern(
-                    spec_version=spec_version,
-                    message_root=message_root,
-                    airline_code=airline_code,
-                    section_path=section_path,
-                    decision_rule=decision_rule,
-                    example_node_fact_id=facts[0]['id']  # Use first fact as example
-                )
-
-                if pattern.id:
-                    # Existing pattern was updated
-                    patterns_updated += 1
-                else:
-                    # New pattern was created
-                    patterns_created += 1
+                candidates.append({
+                    'spec_version': spec_version,
+                    'message_root': message_root,
+                    'section_path': section_path,
+                    'decision_rule': decision_rule,
+                    'signature_hash': self.generate_signature_hash(decision_rule, spec_version, section_path),
+                    'example_node_fact_id': facts[0][0]  # Use first fact as example
+                })
 
             except Exception as e:
                 error_msg = f"Failed to generate pattern for {section_path}/{node_type}: {e}"
                 logger.error(error_msg)
                 errors.append(error_msg)
 
-        # Commit all pattern changes
+        if not node_facts_analyzed:
+            logger.warning(f"No NodeFacts found for run: {run_id}")
+            return {
+                'run_id': run_id,
+                'node_facts_analyzed': 0,
+                'patterns_created': 0,
+                'patterns_updated': 0,
+                'errors': []
+            }
+
+        logger.info(f"Grouped {node_facts_analyzed} NodeFacts into {pattern_groups} pattern groups")
+
+        # Find or create all patterns, then commit
+        patterns_created = 0
+        patterns_updated = 0
         try:
+            patterns_created, patterns_updated = self._upsert_patterns(candidates, airline_code)
             self.db_session.commit()
             logger.info(f"Pattern generation completed: {patterns_created} created, "
                        f"{patterns_updated} updated")
@@ -679,8 +818,8 @@ class PatternGenerator:
 
         return {
             'run_id': run_id,
-            'node_facts_analyzed': len(node_facts),
-            'pattern_groups': len(groups),
+            'node_facts_analyzed': node_facts_analyzed,
+            'pattern_groups': pattern_groups,
             'patterns_created': patterns_created,
             'patterns_updated': patterns_updated,
             'errors': errors,
@@ -0,0 +1,516 @@
+"""
+Compiled pattern index for Discovery matching.
+
+Discovery compares every extracted NodeFact against the active patterns of the
+same message type. Instead of querying and re-normalizing the pattern library
+for every NodeFact, the library is loaded once and compiled:
+
+- patterns are bucketed by (message_root, normalized node_type, normalized
+  section_path), so finding the candidates for a NodeFact is a dict lookup;
+- decision rules (legacy and variations format) are precompiled into frozensets
+  of required/optional/child attributes, so scoring is set arithmetic.
+
+The scoring rules are the ones DiscoveryWorkflow.calculate_pattern_similarity
+has always applied; this module is now their single implementation.
+"""
+
+import copy
+import json
+import logging
+from functools import cached_property
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.database import Pattern
+from app.services.utils import normalize_iata_prefix
+
+logger = logging.getLogger(__name__)
+
+# Fields added during extraction; they are not XML attributes and are never compared
+METADATA_FIELDS = frozenset({'summary', 'child_count', 'confidence', 'node_ordinal'})
+VARIATION_METADATA_FIELDS = METADATA_FIELDS | {'missing_elements'}
+
+# Legacy score weights
+WEIGHT_NODE_TYPE = 0.3
+WEIGHT_MUST_HAVE = 0.3
+WEIGHT_CHILD = 0.25
+WEIGHT_REFS = 0.15
+
+BucketKey = Tuple[str, str, str]
+
+
+def normalize_node_type(node_type: Optional[str]) -> str:
+    """Normalize node type names for flexible matching and comparison."""
+    if not node_type:
+        return ""
+
+    nt = node_type.lower()
+
+    # Only normalize explicit synonyms; keep other types distinct
+    if nt in {'paxlist', 'passengerlist'}:
+        return 'pax_list'
+    if nt in {'paxjourneylist', 'passengerjourneylist'}:
+        return 'pax_journey_list'
+    if nt in {'paxsegmentlist', 'passengersegmentlist'}:
+        return 'pax_segment_list'
+
+    return nt
+
+
+def normalize_child_type(child_type: Optional[str]) -> str:
+    """Normalize child type names for flexible matching (Pax/Passenger, ...)."""
+    if not child_type:
+        return ""
+    ct = child_type.lower()
+
+    # Only normalize exact synonyms
+    if ct in ['pax', 'passenger']:
+        return 'pax'
+    elif ct in ['paxjourney', 'passengerjourney']:
+        return 'pax_journey'
+    elif ct in ['paxsegment', 'passengersegment']:
+        return 'pax_segment'
+
+    return ct
+
+
+def normalize_section_path(section_path: Optional[str], message_root: Optional[str]) -> str:
+    """Section path without slashes, IATA_ root prefix or case, for section comparisons."""
+    return normalize_iata_prefix(
+        (section_path or "").strip("/"),
+        message_root or ""
+    ).strip("/").lower()
+
+
+def reference_signature(ref: Dict[str, Any]) -> str:
+    """Relationship signature; includes direction for infant_parent (varies by airline)."""
+    ref_type = ref.get('type', '')
+    direction = ref.get('direction', '')
+    if ref_type == 'infant_parent' and direction:
+        return f"{ref_type}:{direction}"
+    return ref_type
+
+
+class FactProfile:
+    """
+    Per-NodeFact view used for scoring, computed once and shared by all candidate patterns.
+
+    Child-related views are computed on first use, so malformed children only
+    matter to patterns that look at them.
+    """
+
+    def __init__(self, structure: Dict[str, Any]):
+        self.structure = structure
+        self.node_type = structure.get('node_type')
+        self.node_type_normalized = normalize_node_type(self.node_type)
+
+        attribute_names = set((structure.get('attributes') or {}).keys())
+        self.attributes = frozenset(attribute_names - METADATA_FIELDS)
+        self.variation_attributes = frozenset(attribute_names - VARIATION_METADATA_FIELDS)
+
+        self.children = structure.get('children', [])
+        self.relationships = structure.get('relationships', [])
+
+    @cached_property
+    def is_container(self) -> bool:
+        return isinstance(self.children[0], dict) if self.children else False
+
+    @cached_property
+    def child_types(self) -> FrozenSet[str]:
+        return frozenset(normalize_child_type(child.get('node_type', '')) for child in self.children)
+
+    @cached_property
+    def variation_children(self) -> List[Tuple[Any, FrozenSet[str]]]:
+        """(node_type, attributes) of dict children, after the variation matcher's normalization."""
+        children = self.children
+        if isinstance(children, str):
+            try:
+                children = json.loads(children)
+            except (TypeError, ValueError):
+                children = []
+        elif isinstance(children, dict):
+            children = [children]
+
+        return [
+            (child.get('node_type'),
+             frozenset(set(child.get('attributes', {}).keys()) - VARIATION_METADATA_FIELDS))
+            for child in children if isinstance(child, dict)
+        ]
+
+    @cached_property
+    def reference_signatures(self) -> FrozenSet[str]:
+        return frozenset(reference_signature(r) for r in self.relationships)
+
+    @cached_property
+    def relationship_validity(self) -> Dict[str, bool]:
+        """target_section_path -> is_valid (last relationship per target wins)."""
+        return {
+            rel.get('target_section_path', ''): bool(rel.get('is_valid', True))
+            for rel in self.relationships
+        }
+
+    @cached_property
+    def broken_relationships(self) -> int:
+        return sum(1 for rel in self.relationships if not rel.get('is_valid', True))
+
+
+def score_variations(variations, fact: FactProfile) -> Tuple[float, Optional[int]]:
+    """Best (confidence, variation_id) over variations; stops at the first perfect match."""
+    best_confidence = 0.0
+    best_variation_id = None
+
+    for variation in variations:
+        matches, confidence = variation.match(fact)
+
+        if matches and confidence == 1.0:
+            # Perfect match found - return immediately
+            return (1.0, variation.variation_id)
+
+        if confidence > best_confidence:
+            best_confidence = confidence
+            best_variation_id = variation.variation_id
+
+    return (best_confidence, best_variation_id)
+
+
+def apply_relationship_penalties(normalized_score: float,
+                                 expected_relationships: Tuple[Tuple[str, bool], ...],
+                                 fact: FactProfile) -> float:
+    """Penalize relationship mismatches against the expected ones (or broken ones if none are expected)."""
+    if expected_relationships:
+        actual = fact.relationship_validity
+        mismatch_count = 0
+        for target, expected_valid in expected_relationships:
+            if target not in actual:
+                mismatch_count += 1
+                logger.debug(f"Expected relationship to {target} is missing")
+            elif actual[target] != expected_valid:
+                mismatch_count += 1
+                logger.debug(f"Relationship mismatch for {target}: "
+                             f"expected is_valid={expected_valid}, actual is_valid={actual[target]}")
+
+        if mismatch_count > 0:
+            penalty = min(0.6, mismatch_count * 0.3)
+            normalized_score = normalized_score * (1.0 - penalty)
+            logger.warning(f"Node has {mismatch_count} relationship mismatch(es), applying {penalty*100:.0f}% penalty. "
+                           f"Original score: {normalized_score/(1.0-penalty):.2f}, New score: {normalized_score:.2f}")
+    elif fact.relationships:
+        # Pattern has no expected relationships - penalize broken ones
+        broken_count = fact.broken_relationships
+        if broken_count > 0:
+            penalty = min(0.6, broken_count * 0.3)
+            normalized_score = normalized_score * (1.0 - penalty)
+            logger.warning(f"Node has {broken_count} broken relationship(s) (pattern has no expected relationships), "
+                           f"applying {penalty*100:.0f}% penalty. "
+                           f"Original score: {normalized_score/(1.0-penalty):.2f}, New score: {normalized_score:.2f}")
+
+    return normalized_score
+
+
+class CompiledVariation:
+    """One variation of a variations-format decision rule."""
+
+    def __init__(self, variation: Dict[str, Any]):
+        self.variation_id = variation.get('variation_id')
+        self.node_type = variation.get('node_type')
+        self.required = frozenset(variation.get('must_have_attributes', []))
+        self.optional = frozenset(variation.get('optional_attributes', []))
+
+        child_structure = variation.get('child_structure', {})
+        self.has_children = bool(child_structure.get('has_children'))
+        self.child_structures: Tuple[Tuple[Any, FrozenSet[str]], ...] = tuple(
+            (child.get('node_type'), frozenset(child.get('required_attributes', [])))
+            for child in child_structure.get('child_structures', [])
+        ) if self.has_children else ()
+
+    def match(self, fact: FactProfile) -> Tuple[bool, float]:
+        """(matches, confidence) with the semantics of pattern_variations.match_node_to_variation."""
+        if fact.node_type != self.node_type:
+            return False, 0.0
+
+        missing_required = self.required - fact.variation_attributes
+        if missing_required:
+            return False, (1.0 - len(missing_required) / len(self.required))
+
+        if self.has_children:
+            if not fact.children:
+                return False, 0.5
+
+            child_match_score = 0.0
+            total_child_checks = 0
+            for child_type, required in self.child_structures:
+                matching = [attrs for node_type, attrs in fact.variation_children if node_type == child_type]
+                if not matching:
+                    total_child_checks += 1
+                    continue
+
+                for attrs in matching:
+                    total_child_checks += 1
+                    missing = required - attrs
+                    if not missing:
+                        child_match_score += 1
+                    else:
+                        child_match_score += 1.0 - (len(missing) / len(required))
+
+            child_confidence = child_match_score / total_child_checks if total_child_checks > 0 else 1.0
+            if child_confidence < 1.0:
+                return False, (1.0 + child_confidence) / 2.0
+
+        return True, 1.0
+
+
+class CompiledRule:
+    """A decision rule (legacy or variations format) compiled for repeated scoring."""
+
+    def __init__(self, decision_rule: Dict[str, Any]):
+        self.variations: Optional[Tuple[CompiledVariation, ...]] = None
+
+        if 'variations' in decision_rule:
+            self.variations = tuple(
+                CompiledVariation(variation) for variation in decision_rule.get('variations', [])
+            )
+            return
+
+        self.node_type = decision_rule.get('node_type')
+        self.node_type_normalized = normalize_node_type(self.node_type)
+
+        self.must_have = frozenset(decision_rule.get('must_have_attributes', []))
+        self.optional = frozenset(decision_rule.get('optional_attributes', []))
+        self.expected_attributes = self.must_have | self.optional
+
+        child_structure = decision_rule.get('child_structure', {})
+        self.has_children = bool(child_structure.get('has_children'))
+        self.is_container = child_structure.get('is_container', False)
+        self.child_types = frozenset(
+            normalize_child_type(t) for t in child_structure.get('child_types', [])
+        ) if self.has_children else frozenset()
+
+        reference_patterns = decision_rule.get('reference_patterns', [])
+        self.has_references = bool(reference_patterns)
+        self.reference_signatures = frozenset(reference_signature(r) for r in reference_patterns)
+
+        self.expected_relationships: Tuple[Tuple[str, bool], ...] = tuple(
+            (expected.get('target_section_path', ''), bool(expected.get('is_valid', True)))
+            for expected in decision_rule.get('expected_relationships', [])
+        )
+
+    def score(self, fact: FactProfile) -> Tuple[float, Optional[int]]:
+        """
+        Similarity between a NodeFact and this rule.
+
+        Returns:
+            Tuple of (confidence: float 0.0-1.0, variation_id: int or None)
+        """
+        if self.variations is not None:
+            return score_variations(self.variations, fact)
+        return (self._score_legacy(fact), None)
+
+    def _score_legacy(self, fact: FactProfile) -> float:
+        score = 0.0
+        total_weight = WEIGHT_NODE_TYPE + WEIGHT_MUST_HAVE + WEIGHT_CHILD + WEIGHT_REFS
+
+        # 1. Node type (hard requirement; synonyms such as PaxList/PassengerList match)
+        node_type_matches = (self.node_type_normalized == fact.node_type_normalized) or \
+                            (fact.node_type == self.node_type)
+        if node_type_matches:
+            score += WEIGHT_NODE_TYPE
+
+        # 2. Must-have attributes
+        if self.must_have:
+            score += WEIGHT_MUST_HAVE * (len(self.must_have & fact.attributes) / len(self.must_have))
+        else:
+            score += WEIGHT_MUST_HAVE
+
+        # Penalty for attributes the pattern neither requires nor allows
+        extra_attributes = fact.attributes - self.expected_attributes
+        if extra_attributes and self.expected_attributes:
+            extra_penalty = min(0.3, len(extra_attributes) * 0.10)
+            score -= extra_penalty
+            logger.info(f"Found {len(extra_attributes)} unexpected attribute(s): {set(extra_attributes)}. "
+                        f"Applying {extra_penalty*100:.0f}% penalty.")
+
+        # 3. Child structure
+        if self.has_children:
+            if fact.children and self.is_container == fact.is_container:
+                score += WEIGHT_CHILD * 0.5
+
+                if self.is_container and fact.is_container:
+                    fact_types = fact.child_types
+                    if self.child_types and fact_types:
+                        type_overlap = len(self.child_types & fact_types) / len(self.child_types | fact_types)
+                        score += WEIGHT_CHILD * 0.5 * type_overlap
+                    else:
+                        score += WEIGHT_CHILD * 0.5
+        elif not fact.children:
+            score += WEIGHT_CHILD
+
+        # 4. Reference patterns (type and direction must match)
+        if self.has_references:
+            if fact.relationships:
+                overlap = len(self.reference_signatures & fact.reference_signatures) / len(self.reference_signatures)
+                score += WEIGHT_REFS * overlap
+        else:
+            score += WEIGHT_REFS
+
+        normalized_score = min(1.0, score / total_weight)
+
+        # Different node types never score above 20% (PaxSegmentList vs BaggageAllowanceList)
+        if not node_type_matches:
+            normalized_score = min(normalized_score, 0.20)
+
+        # 5. Relationship validation
+        return apply_relationship_penalties(normalized_score, self.expected_relationships, fact)
+
+
+class CompiledPattern:
+    """An active Pattern with its normalized keys and compiled decision rule."""
+
+    def __init__(self, pattern: Pattern, ordinal: int):
+        self.pattern = pattern
+        self.ordinal = ordinal  # Library order, keeps tie-breaking stable
+        self.id = pattern.id
+        self.spec_version = pattern.spec_version
+        self.airline_code = pattern.airline_code
+        self.message_root = pattern.message_root or ""
+
+        self.decision_rule = pattern.decision_rule or {}
+        self.node_type_normalized = normalize_node_type(self.decision_rule.get('node_type'))
+        self.section_normalized = normalize_section_path(pattern.section_path, self.message_root)
+
+    @cached_property
+    def rule(self) -> CompiledRule:
+        return CompiledRule(self.decision_rule)
+
+    @property
+    def key(self) -> BucketKey:
+        return (self.message_root, self.node_type_normalized, self.section_normalized)
+
+
+class PatternIndex:
+    """
+    Active patterns bucketed by (message_root, normalized node_type, normalized section_path).
+
+    Built once per Discovery run; holds the session's Pattern instances, so
+    updates such as times_seen are applied to the same objects. Runs in other
+    sessions share an index through bind().
+    """
+
+    # Ids per IN (...) query when re-loading patterns in bind()
+    ID_BATCH_SIZE = 500
+
+    def __init__(self, patterns: List[Pattern]):
+        self._buckets: Dict[BucketKey, List[CompiledPattern]] = {}
+        self._by_root: Dict[str, List[CompiledPattern]] = {}
+        self._keys_by_node_type: Dict[Tuple[str, str], List[BucketKey]] = {}
+        self._keys_by_section: Dict[Tuple[str, str], List[BucketKey]] = {}
+
+        for ordinal, pattern in enumerate(patterns):
+            self._add(CompiledPattern(pattern, ordinal))
+
+    def _add(self, compiled: CompiledPattern):
+        key = compiled.key
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = []
+            root, node_type, section = key
+            self._keys_by_node_type.setdefault((root, node_type), []).append(key)
+            self._keys_by_section.setdefault((root, section), []).append(key)
+        bucket.append(compiled)
+        self._by_root.setdefault(compiled.message_root, []).append(compiled)
+
+    @classmethod
+    def build(cls, db_session: Session, message_root: Optional[str] = None) -> 'PatternIndex':
+        """Load and compile the active (not superseded) patterns, optionally for one message type."""
+        query = db_session.query(Pattern).filter(Pattern.superseded_by.is_(None))
+        if message_root:
+            query = query.filter(Pattern.message_root == message_root)
+
+        index = cls(query.all())
+        logger.info(f"Compiled pattern index: {len(index)} pattern(s) in {len(index._buckets)} bucket(s)"
+                    f"{f' for {message_root}' if message_root else ''}")
+        return index
+
+    def bind(self, db_session: Session) -> 'PatternIndex':
+        """
+        The same compiled patterns, holding Pattern instances of another session.
+
+        Keys, decision rules and ordinals are reused as compiled (so are rules a
+        BulkSimilarityScorer encoded from them); only the Pattern rows are
+        re-loaded, in bulk. Patterns deleted since the index was built are dropped.
+        """
+        compiled_patterns = sorted(
+            (compiled for patterns in self._by_root.values() for compiled in patterns),
+            key=lambda compiled: compiled.ordinal
+        )
+        pattern_ids = [compiled.id for compiled in compiled_patterns]
+
+        loaded: Dict[int, Pattern] = {}
+        for start in range(0, len(pattern_ids), self.ID_BATCH_SIZE):
+            chunk = pattern_ids[start:start + self.ID_BATCH_SIZE]
+            for pattern in db_session.query(Pattern).filter(Pattern.id.in_(chunk)).all():
+                loaded[pattern.id] = pattern
+
+        index = type(self)([])
+        for compiled in compiled_patterns:
+            pattern = loaded.get(compiled.id)
+            if pattern is None:
+                continue
+            rebound = copy.copy(compiled)
+            rebound.pattern = pattern
+            index._add(rebound)
+        return index
+
+    def __len__(self) -> int:
+        return sum(len(patterns) for patterns in self._by_root.values())
+
+    @staticmethod
+    def _accepts(compiled: CompiledPattern, spec_version: Optional[str], airline_code: Optional[str]) -> bool:
+        if spec_version is not None and compiled.spec_version != spec_version:
+            return False
+        if airline_code is not None and compiled.airline_code != airline_code:
+            return False
+        return True
+
+    def patterns(self,
+                 message_root: str,
+                 spec_version: Optional[str] = None,
+                 airline_code: Optional[str] = None) -> List[CompiledPattern]:
+        """All indexed patterns of a message type (None filters match everything)."""
+        return [
+            compiled for compiled in self._by_root.get(message_root or "", [])
+            if self._accepts(compiled, spec_version, airline_code)
+        ]
+
+    def candidates(self,
+                   message_root: str,
+                   node_type_normalized: str,
+                   section_normalized: str,
+                   spec_version: Optional[str] = None,
+                   airline_code: Optional[str] = None) -> List[Tuple[CompiledPattern, bool]]:
+        """
+        Patterns a NodeFact should be scored against, in library order.
+
+        Returns (pattern, node_type_override) pairs. Patterns of the same (or
+        an unspecified) node type are regular candidates; patterns of another
+        node type are only included when they sit at the identical section
+        path, flagged with node_type_override=True.
+        """
+        root = message_root or ""
+
+        if not node_type_normalized:
+            return [(compiled, False) for compiled in self.patterns(root, spec_version, airline_code)]
+
+        selected: List[Tuple[CompiledPattern, bool]] = []
+        for node_type in {node_type_normalized, ""}:
+            for key in self._keys_by_node_type.get((root, node_type), []):
+                selected.extend((compiled, False) for compiled in self._buckets[key])
+
+        if section_normalized:
+            for key in self._keys_by_section.get((root, section_normalized), []):
+                if key[1] and key[1] != node_type_normalized:
+                    selected.extend((compiled, True) for compiled in self._buckets[key])
+
+        selected = [item for item in selected if self._accepts(item[0], spec_version, airline_code)]
+        selected.sort(key=lambda item: item[0].ordinal)
+        return selected
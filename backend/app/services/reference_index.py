@@ -0,0 +1,325 @@
+"""
+Local reference indexes for relationship analysis.
+
+Relationship discovery asks the LLM, for a pair of sections, which field of
+the source refers to the target. Most section pairs of a message have no
+reference at all, which can be seen without the LLM: a reference only exists
+if a value the source points to (*Ref/*RefID fields, references, refs) is an
+ID the target defines (ID, Key, ObjectKey, *ID attributes).
+
+ReferenceCandidateIndex scans the NodeFacts of a run once, builds an inverted
+index from every defined ID value to the sections defining it, and keeps only
+the section pairs whose reference values intersect.
+
+TargetReferenceIndex resolves the reference values of every source instance
+to a fact of the target section without rescanning the section per value.
+"""
+
+import bisect
+import json
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from app.models.database import NodeFact
+
+logger = logging.getLogger(__name__)
+
+# Root-level keys that hold an ID of the fact itself
+ROOT_ID_FIELDS = ('ID', 'Key', 'ObjectKey')
+# Sections of a fact whose values are references to other nodes
+REFERENCE_SECTIONS = ('references', 'refs', 'child_references')
+
+
+def normalize_reference_value(value: Any) -> Optional[str]:
+    """Convert reference values to a comparable string representation."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, (dict, list)):
+        try:
+            return json.dumps(value, sort_keys=True)
+        except TypeError:
+            return str(value)
+    return str(value)
+
+
+def is_reference_name(name: str) -> bool:
+    """Field names pointing to another node (PaxRefID, InfantRef, SegmentRefs)."""
+    return 'ref' in name.lower()
+
+
+def is_id_name(name: str) -> bool:
+    """Field names holding an ID or key (PaxID, ObjectKey, OrderItemID)."""
+    lowered = name.lower()
+    return lowered.endswith('id') or lowered.endswith('key') or name in ROOT_ID_FIELDS
+
+
+def _fact_json_dict(fact: NodeFact) -> Dict[str, Any]:
+    fact_json = fact.fact_json
+    if isinstance(fact_json, str):
+        try:
+            fact_json = json.loads(fact_json)
+        except json.JSONDecodeError:
+            return {}
+    return fact_json if isinstance(fact_json, dict) else {}
+
+
+def _scalar_values(value: Any) -> Iterator[str]:
+    """Comparable values of a field; lists are flattened, IDREFS strings split."""
+    if isinstance(value, list):
+        for item in value:
+            yield from _scalar_values(item)
+        return
+    if isinstance(value, dict) or value is None or isinstance(value, bool):
+        return
+    normalized = normalize_reference_value(value)
+    if not normalized:
+        return
+    yield normalized
+    parts = normalized.split()
+    if len(parts) > 1:
+        yield from parts
+
+
+def _reference_section_values(section: Any) -> Iterator[str]:
+    if isinstance(section, dict):
+        for value in section.values():
+            if isinstance(value, dict):
+                # e.g. 'other': {'DatedMarketingSegmentRefId': 'SEG1'}
+                yield from _reference_section_values(value)
+            else:
+                yield from _scalar_values(value)
+    else:
+        yield from _scalar_values(section)
+
+
+def _walk_element(element: Dict[str, Any], defined: Set[str], referenced: Set[str]):
+    """Collect the IDs an extracted element defines and the values it references."""
+    attributes = element.get('attributes')
+    if isinstance(attributes, dict):
+        for name, value in attributes.items():
+            if is_reference_name(name):
+                referenced.update(_scalar_values(value))
+            elif is_id_name(name):
+                defined.update(_scalar_values(value))
+
+    for section in REFERENCE_SECTIONS:
+        if section in element:
+            referenced.update(_reference_section_values(element[section]))
+
+    children = element.get('children')
+    for child in children if isinstance(children, list) else []:
+        if isinstance(child, dict):
+            _walk_element(child, defined, referenced)
+
+
+def fact_reference_values(fact: NodeFact) -> Tuple[Set[str], Set[str]]:
+    """
+    Values a NodeFact defines and references.
+
+    Returns:
+        (defined IDs, referenced values)
+    """
+    fact_json = _fact_json_dict(fact)
+    defined: Set[str] = set()
+    referenced: Set[str] = set()
+
+    for name, value in fact_json.items():
+        if name in ('attributes', 'children') or name in REFERENCE_SECTIONS:
+            continue
+        if is_reference_name(name):
+            referenced.update(_scalar_values(value))
+        elif is_id_name(name):
+            defined.update(_scalar_values(value))
+
+    _walk_element(fact_json, defined, referenced)
+    return defined, referenced
+
+
+class ReferenceCandidateIndex:
+    """
+    Inverted index of the IDs defined in a run, by section.
+
+    Built in one pass over the NodeFacts; candidate_pairs() then tells which
+    section pairs can hold a reference at all.
+    """
+
+    def __init__(self, node_groups: Dict[str, List[NodeFact]]):
+        # ID value -> sections defining it
+        self.definitions: Dict[str, Set[str]] = {}
+        # Section -> values its facts reference
+        self.references: Dict[str, Set[str]] = {}
+
+        for section_path, facts in node_groups.items():
+            section_references = self.references.setdefault(section_path, set())
+            for fact in facts:
+                defined, referenced = fact_reference_values(fact)
+                for value in defined:
+                    self.definitions.setdefault(value, set()).add(section_path)
+                section_references.update(referenced)
+
+        # Section -> sections defining a value it references
+        self._targets: Dict[str, Set[str]] = {}
+        for section_path, values in self.references.items():
+            targets = self._targets.setdefault(section_path, set())
+            for value in values:
+                targets.update(self.definitions.get(value, ()))
+
+    def referenced_sections(self, source_path: str) -> Set[str]:
+        """Sections defining at least one value referenced by source_path."""
+        return self._targets.get(source_path, set())
+
+    def candidate_pairs(self, pairs: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """The pairs (kept in order) whose source references an ID defined by the target."""
+        return [pair for pair in pairs if pair[1] in self.referenced_sections(pair[0])]
+
+
+class TargetReferenceIndex:
+    """
+    Lookup structure resolving reference values to the facts of one target section.
+
+    Applies the matching rules of the former linear scan in
+    RelationshipAnalyzer._find_target_by_reference, and returns the same fact:
+    the first fact (in section order) matching any rule. A fact matches a
+    reference value r when:
+
+    - r equals its root ID/Key/ObjectKey, a root *ID*/*Key* field, a child
+      attribute, a child reference list item, or a refs value (exact);
+    - an ID/Key-named child attribute a is a prefix or suffix of r, or r of a,
+      and the shorter is at least 80% as long as the longer (composite IDs);
+    - a child reference list item or refs list item rv contains r, or r
+      contains rv (substring).
+
+    Exact values are a hash map. Composite IDs are also kept sorted forwards
+    and reversed, so the values starting/ending with r are a bisect range; the
+    values r starts/ends with are looked up by r's prefixes/suffixes. For the
+    substring rule, every suffix of the reference items is kept sorted (items
+    containing r are a bisect range) and r's substrings are looked up in a map.
+    Resolutions are memoized per value.
+    """
+
+    def __init__(self, target_facts: List[NodeFact]):
+        self.facts = list(target_facts)
+        # value -> index of the first fact it matches
+        self._exact: Dict[str, int] = {}
+        self._composite: Dict[str, int] = {}
+        self._reference_items: Dict[str, int] = {}
+        self._resolved: Dict[str, Optional[int]] = {}
+
+        for index, fact in enumerate(self.facts):
+            self._index_fact(index, _fact_json_dict(fact))
+
+        self._composite_sorted = sorted(self._composite.items())
+        self._composite_reversed = sorted((value[::-1], index) for value, index in self._composite.items())
+        self._suffixes = sorted(
+            (item[start:], index)
+            for item, index in self._reference_items.items()
+            for start in range(len(item) + 1)
+        )
+        self._longest_reference_item = max(map(len, self._reference_items), default=0)
+
+    @staticmethod
+    def _add(values: Dict[str, int], value: Optional[str], index: int):
+        if value is not None and value not in values:
+            values[value] = index
+
+    def _add_reference_items(self, items: List[Any], index: int):
+        for item in items:
+            normalized = normalize_reference_value(item)
+            self._add(self._exact, normalized, index)
+            self._add(self._reference_items, normalized, index)
+
+    def _index_fact(self, index: int, fact_data: Dict[str, Any]):
+        for field in ROOT_ID_FIELDS:
+            self._add(self._exact, normalize_reference_value(fact_data.get(field)), index)
+
+        children = fact_data.get('children', [])
+        for child in children if isinstance(children, list) else []:
+            if not isinstance(child, dict):
+                continue
+
+            attributes = child.get('attributes', {})
+            for attr_key, attr_value in (attributes.items() if isinstance(attributes, dict) else ()):
+                normalized = normalize_reference_value(attr_value)
+                self._add(self._exact, normalized, index)
+                if 'id' in attr_key.lower() or 'key' in attr_key.lower():
+                    self._add(self._composite, normalized, index)
+
+            references = child.get('references', {})
+            for ref_values in (references.values() if isinstance(references, dict) else ()):
+                if isinstance(ref_values, list):
+                    self._add_reference_items(ref_values, index)
+
+        refs = fact_data.get('refs', {})
+        for ref_values in (refs.values() if isinstance(refs, dict) else ()):
+            if isinstance(ref_values, list):
+                self._add_reference_items(ref_values, index)
+            else:
+                self._add(self._exact, normalize_reference_value(ref_values), index)
+
+        for key, value in fact_data.items():
+            if 'ID' in key or 'Key' in key:
+                self._add(self._exact, normalize_reference_value(value), index)
+
+    @staticmethod
+    def _composite_match(attr: str, ref: str) -> bool:
+        # Same expression as the linear scan, so float rounding agrees
+        return min(len(ref), len(attr)) >= max(len(ref), len(attr)) * 0.8
+
+    @staticmethod
+    def _starting_with(sorted_values: List[Tuple[str, int]], prefix: str) -> Iterator[Tuple[str, int]]:
+        position = bisect.bisect_left(sorted_values, (prefix,))
+        while position < len(sorted_values) and sorted_values[position][0].startswith(prefix):
+            yield sorted_values[position]
+            position += 1
+
+    def find(self, ref_value: Any) -> Optional[NodeFact]:
+        """The first target fact matching ref_value, or None."""
+        ref = normalize_reference_value(ref_value)
+        if ref is None:
+            return None
+
+        if ref not in self._resolved:
+            self._resolved[ref] = self._resolve(ref)
+        index = self._resolved[ref]
+        return self.facts[index] if index is not None else None
+
+    def _resolve(self, ref: str) -> Optional[int]:
+        candidates = []
+
+        exact = self._exact.get(ref)
+        if exact is not None:
+            candidates.append(exact)
+
+        # Composite IDs: attribute is a prefix/suffix of ref
+        for length in range(len(ref) + 1):
+            if not self._composite_match(ref[:length], ref):
+                continue
+            for part in (ref[:length], ref[len(ref) - length:]):
+                index = self._composite.get(part)
+                if index is not None:
+                    candidates.append(index)
+
+        # Composite IDs: ref is a prefix/suffix of the attribute
+        for value, index in self._starting_with(self._composite_sorted, ref):
+            if self._composite_match(value, ref):
+                candidates.append(index)
+        for value, index in self._starting_with(self._composite_reversed, ref[::-1]):
+            if self._composite_match(value, ref):
+                candidates.append(index)
+
+        # Substrings: a reference item contains ref...
+        for _, index in self._starting_with(self._suffixes, ref):
+            candidates.append(index)
+        # ...or ref contains a reference item
+        if self._reference_items:
+            for start in range(len(ref) + 1):
+                for end in range(start, min(len(ref), start + self._longest_reference_item) + 1):
+                    index = self._reference_items.get(ref[start:end])
+                    if index is not None:
+                        candidates.append(index)
+
+        return min(candidates) if candidates else None
@@ -3,22 +3,63 @@ Relationship Analyzer Service
 
 Uses LLM to discover and validate relationships between nodes in XML.
 Handles both BA-configured expected_references and auto-discovery.
+
+Discovery asks the LLM once per ordered pair of sections that can hold a
+reference (see reference_index: the source must reference an ID the target
+defines; RELATIONSHIP_PREFILTER_ENABLED). The pairs are sent concurrently on
+the shared LLM event loop (at most RELATIONSHIP_MAX_CONCURRENCY in flight),
+and each answer is kept in the workspace LLM cache under the shape of the two
+sections (node types and field names, not values), so later runs of the same
+message type reuse the reference mappings already found.
+
+Before any discovery, the references stored by earlier runs of the same
+message type are compiled into rules (see relationship_rules;
+RELATIONSHIP_RULES_ENABLED). Section pairs covered by a rule are resolved
+locally, without the LLM; only the pairs no rule covers are discovered.
 """
 
-from typing import List, Dict, Any, Optional, Tuple
+import asyncio
+import hashlib
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Callable
 from sqlalchemy.orm import Session
 import structlog
 import json
-from openai import AzureOpenAI, OpenAI
-import httpx
 
 from app.models.database import NodeFact, NodeRelationship, NodeConfiguration
 from app.core.config import settings
-from app.prompts import get_relationship_discovery_prompt, get_relationship_system_prompt
+from app.prompts import get_prompt_version, get_relationship_discovery_prompt, get_relationship_system_prompt
+from app.services.llm_cache import LLMResponseCache
 from app.services.llm_client_factory import LLMClientFactory
+from app.services.llm_event_loop import run_on_llm_loop
+from app.services.llm_rate_limiter import get_llm_rate_limiter, prompt_token_estimate
+from app.services.reference_index import ReferenceCandidateIndex, TargetReferenceIndex, normalize_reference_value
+from app.services.relationship_rules import ReferenceRuleSet
 
 logger = structlog.get_logger(__name__)
 
+# Section pair whose references are discovered: (source section_path, target section_path)
+SectionPair = Tuple[str, str]
+
+_async_client = None
+_async_model = ""
+_async_client_lock = threading.Lock()
+
+
+def _get_async_llm_client() -> Tuple[Any, str]:
+    """
+    Process-wide async LLM client for relationship discovery.
+
+    Created once so its connection pool is reused across runs; like the
+    extraction client it is only used on the shared LLM event loop.
+    """
+    global _async_client, _async_model
+    if _async_client is None:
+        with _async_client_lock:
+            if _async_client is None:
+                _async_client, _async_model = LLMClientFactory.create_async_client(timeout=60.0, verify_ssl=False)
+    return _async_client, _async_model
+
 
 class RelationshipAnalyzer:
     """Analyzes relationships between extracted NodeFacts using LLM."""
@@ -27,39 +68,41 @@ class RelationshipAnalyzer:
         self.db = db
         self.llm_client = None
         self.model = settings.LLM_MODEL
-        self._init_sync_client()
+        self.prompt_version = get_prompt_version('relationship_system.txt', 'relationship_discovery.txt')
+        # id(target facts list) -> (list, index); see _target_index
+        self._target_indexes: Dict[int, Tuple[List[NodeFact], TargetReferenceIndex]] = {}
+        self._init_client()
 
     @staticmethod
     def _normalize_reference_value(value: Any) -> Optional[str]:
         """Convert reference values to a comparable string representation."""
-        if value is None:
-            return None
-        if isinstance(value, str):
-            return value
-        if isinstance(value, (int, float)):
-            return str(value)
-        if isinstance(value, (dict, list)):
-            try:
-                return json.dumps(value, sort_keys=True)
-            except TypeError:
-                return str(value)
-        return str(value)
-
-    def _init_sync_client(self):
-        """Initialize synchronous LLM client using LLMClientFactory."""
-        self.llm_client, self.model = LLMClientFactory.create_sync_client(timeout=60.0, verify_ssl=False)
+        return normalize_reference_value(value)
+
+    def _init_client(self):
+        """Get the shared async LLM client (see _get_async_llm_client)."""
+        self.llm_client, self.model = _get_async_llm_client()
         if self.llm_client:
             logger.info(f"✅ Relationship analyzer initialized successfully: {self.model}")
         else:
             logger.warning("⚠️ Relationship analysis is DISABLED!")
 
-    def analyze_relationships(self, run_id: str, node_facts: List[NodeFact]) -> Dict[str, Any]:
+    def analyze_relationships(self,
+                              run_id: str,
+                              node_facts: List[NodeFact],
+                              progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
         """
         Analyze relationships between all NodeFacts in a run (synchronous).
 
+        Section pairs covered by a learned reference rule are resolved first;
+        the references of the other pairs are discovered concurrently, then
+        validated against every instance pair by pair, in section order.
+
         Args:
             run_id: The run ID
             node_facts: List of extracted NodeFacts
+            progress_callback: Optional callable receiving {'pairs_done', 'pairs_total',
+                               'relationships_found'} after each section pair is
+                               discovered, and once validation has finished
 
         Returns:
             Dictionary with statistics and discovered relationships
@@ -70,9 +113,17 @@ class RelationshipAnalyzer:
         logger.info(f"Run ID: {run_id}")
         logger.info(f"Total NodeFacts to analyze: {len(node_facts)}")
 
+        rule_set = ReferenceRuleSet([])
+        if settings.RELATIONSHIP_RULES_ENABLED and node_facts:
+            rule_set = ReferenceRuleSet.load(
+                self.db, node_facts[0].message_root, node_facts[0].spec_version, exclude_run_id=run_id
+            )
+
         # Log LLM client status
         if self.llm_client:
             logger.info(f"✅ LLM Client: INITIALIZED ({self.model})")
+        elif len(rule_set):
+            logger.warning(f"⚠️ LLM Client: NOT INITIALIZED - only the {len(rule_set)} learned reference rules apply")
         else:
             logger.error(f"❌ LLM Client: NOT INITIALIZED - Relationship discovery will fail!")
             return {
@@ -96,79 +147,117 @@ class RelationshipAnalyzer:
             'broken_relationships': 0,
             'expected_validated': 0,
             'expected_missing': 0,
-            'unexpected_discovered': 0
+            'unexpected_discovered': 0,
+            'llm_calls': 0,
+            'llm_cache_hits': 0,
+            'pairs_pruned': 0,
+            'rule_pairs': 0
         }
 
-        # Analyze each source node type against all target node types
-        for source_path, source_facts in node_groups.items():
-            logger.info("")
-            logger.info("-" * 60)
-            logger.info(f"📊 Analyzing SOURCE: {source_path}")
-            logger.info(f"   Node count: {len(source_facts)}")
-            logger.info(f"   Mode: Auto-discover all relationships (LLM-powered)")
-
-            # Check relationships with all other node types
-            for target_path, target_facts in node_groups.items():
-                if source_path == target_path:
-                    continue
-
+        # Every source node type against all other node types
+        pairs = [
+            (source_path, target_path)
+            for source_path in node_groups
+            for target_path in node_groups
+            if source_path != target_path
+        ]
+
+        # Pairs resolved by a learned rule need no discovery
+        if len(rule_set):
+            pairs = self._apply_rules(run_id, node_groups, pairs, rule_set, relationships, stats)
+        if not self.llm_client:
+            pairs = []
+
+        # Only pairs whose reference values meet an ID of the target go to the LLM
+        if settings.RELATIONSHIP_PREFILTER_ENABLED:
+            candidate_pairs = ReferenceCandidateIndex(node_groups).candidate_pairs(pairs)
+            stats['pairs_pruned'] = len(pairs) - len(candidate_pairs)
+            logger.info(f"Reference pre-filter kept {len(candidate_pairs)} of {len(pairs)} section pairs")
+            pairs = candidate_pairs
+        pairs_done = 0
+
+        def report_pair():
+            if progress_callback:
                 try:
-                    logger.info(f"   🔗 Checking relationship: {source_path} -> {target_path}")
-                    stats['total_comparisons'] += 1
-
-                    # Validate we have facts to analyze
-                    if not source_facts or not target_facts:
-                        logger.warning(f"      ⚠️  Skipping: empty facts list (source={len(source_facts)}, target={len(target_facts)})")
-                        continue
+                    progress_callback({
+                        'pairs_done': pairs_done,
+                        'pairs_total': len(pairs),
+                        'relationships_found': stats['relationships_found']
+                    })
+                except Exception as e:
+                    logger.warning(f"Relationship progress callback failed: {e}")
 
-                    # Use LLM to discover references
-                    discovered = self._discover_references_llm(
-                        source_facts[0],  # Sample source fact
-                        target_facts[0]    # Sample target fact
-                    )
+        def pair_discovered():
+            nonlocal pairs_done
+            pairs_done += 1
+            report_pair()
 
-                    # Handle error cases: None, empty dict, or invalid structure
-                    if not discovered:
-                        logger.info(f"      ❌ No references found: {source_path} -> {target_path} (LLM returned None)")
-                        continue
+        discoveries = self._discover_pairs(node_groups, pairs, stats, pair_discovered)
 
-                    if not isinstance(discovered, dict):
-                        logger.warning(f"      ❌ Invalid LLM response type: {type(discovered)} (expected dict)")
-                        continue
+        current_source = None
+        for source_path, target_path in pairs:
+            source_facts = node_groups[source_path]
+            target_facts = node_groups[target_path]
 
-                    if not discovered.get('has_references'):
-                        logger.info(f"      ❌ No references found: {source_path} -> {target_path}")
-                        continue
+            if source_path != current_source:
+                current_source = source_path
+                logger.info("")
+                logger.info("-" * 60)
+                logger.info(f"📊 Analyzing SOURCE: {source_path}")
+                logger.info(f"   Node count: {len(source_facts)}")
+                logger.info(f"   Mode: Auto-discover all relationships (LLM-powered)")
 
-                    logger.info(f"      ✅ FOUND {len(discovered.get('references', []))} reference(s)!")
+            try:
+                logger.info(f"   🔗 Checking relationship: {source_path} -> {target_path}")
+                stats['total_comparisons'] += 1
 
-                    # Validate discovered references for all instances
-                    for ref_info in discovered.get('references', []):
-                        if not isinstance(ref_info, dict):
-                            logger.warning(f"      ⚠️  Skipping invalid reference info: {type(ref_info)}")
-                            continue
+                discovered = discoveries.get((source_path, target_path))
 
-                        validated_rels = self._validate_reference_instances(
-                            source_facts,
-                            target_facts,
-                            ref_info,
-                            run_id
-                        )
+                # Handle error cases: None, empty dict, or invalid structure
+                if not discovered:
+                    logger.info(f"      ❌ No references found: {source_path} -> {target_path} (LLM returned None)")
+                    continue
 
-                        relationships.extend(validated_rels)
-                        stats['relationships_found'] += len(validated_rels)
-                        stats['valid_relationships'] += sum(1 for r in validated_rels if r['is_valid'])
-                        stats['broken_relationships'] += sum(1 for r in validated_rels if not r['is_valid'])
-                        stats['unexpected_discovered'] += 1
+                if not isinstance(discovered, dict):
+                    logger.warning(f"      ❌ Invalid LLM response type: {type(discovered)} (expected dict)")
+                    continue
 
-                except Exception as e:
-                    logger.error(f"      ❌ Error checking relationship {source_path} -> {target_path}: {str(e)}")
-                    logger.error(f"         Error type: {type(e).__name__}")
-                    import traceback
-                    logger.error(f"         Traceback: {traceback.format_exc()}")
-                    # Continue to next relationship instead of failing entire analysis
+                if not discovered.get('has_references'):
+                    logger.info(f"      ❌ No references found: {source_path} -> {target_path}")
                     continue
 
+                logger.info(f"      ✅ FOUND {len(discovered.get('references', []))} reference(s)!")
+
+                # Validate discovered references for all instances
+                for ref_info in discovered.get('references', []):
+                    if not isinstance(ref_info, dict):
+                        logger.warning(f"      ⚠️  Skipping invalid reference info: {type(ref_info)}")
+                        continue
+
+                    validated_rels = self._validate_reference_instances(
+                        source_facts,
+                        target_facts,
+                        ref_info,
+                        run_id
+                    )
+
+                    relationships.extend(validated_rels)
+                    stats['relationships_found'] += len(validated_rels)
+                    stats['valid_relationships'] += sum(1 for r in validated_rels if r['is_valid'])
+                    stats['broken_relationships'] += sum(1 for r in validated_rels if not r['is_valid'])
+                    stats['unexpected_discovered'] += 1
+
+            except Exception as e:
+                logger.error(f"      ❌ Error checking relationship {source_path} -> {target_path}: {str(e)}")
+                logger.error(f"         Error type: {type(e).__name__}")
+                import traceback
+                logger.error(f"         Traceback: {traceback.format_exc()}")
+                # Continue to next relationship instead of failing entire analysis
+                continue
+
+        report_pair()
+        self._target_indexes.clear()
+
         # Bulk insert relationships to database
         if relationships:
             self._save_relationships(relationships)
@@ -181,6 +270,9 @@ class RelationshipAnalyzer:
         logger.info("📊 RELATIONSHIP ANALYSIS SUMMARY")
         logger.info("=" * 80)
         logger.info(f"Total comparisons: {stats['total_comparisons']}")
+        logger.info(f"Section pairs resolved by learned rules: {stats['rule_pairs']}")
+        logger.info(f"Section pairs pruned without LLM: {stats['pairs_pruned']}")
+        logger.info(f"LLM calls: {stats['llm_calls']} (cache hits: {stats['llm_cache_hits']})")
         logger.info(f"Relationships found: {stats['relationships_found']}")
         logger.info(f"Valid relationships: {stats['valid_relationships']}")
         logger.info(f"Broken relationships: {stats['broken_relationships']}")
@@ -193,6 +285,189 @@ class RelationshipAnalyzer:
             'relationships_count': len(relationships)
         }
 
+    def _apply_rules(self,
+                     run_id: str,
+                     node_groups: Dict[str, List[NodeFact]],
+                     pairs: List[SectionPair],
+                     rule_set: ReferenceRuleSet,
+                     relationships: List[Dict[str, Any]],
+                     stats: Dict[str, Any]) -> List[SectionPair]:
+        """
+        Resolve the section pairs covered by a learned reference rule, locally.
+
+        A pair whose rules resolve no reference in this run (the field is
+        absent from this file) is left for discovery.
+
+        Returns:
+            The pairs still to discover
+        """
+        remaining = []
+        for pair in pairs:
+            source_facts = node_groups[pair[0]]
+            target_facts = node_groups[pair[1]]
+            resolved = 0
+
+            for rule in rule_set.rules_for(pair):
+                validated_rels = self._validate_reference_instances(
+                    source_facts, target_facts, rule.to_ref_info(), run_id, discovered_by='rule'
+                )
+                if not validated_rels:
+                    continue
+                resolved += len(validated_rels)
+                relationships.extend(validated_rels)
+                stats['relationships_found'] += len(validated_rels)
+                stats['valid_relationships'] += sum(1 for r in validated_rels if r['is_valid'])
+                stats['broken_relationships'] += sum(1 for r in validated_rels if not r['is_valid'])
+                stats['unexpected_discovered'] += 1
+
+            if resolved:
+                stats['rule_pairs'] += 1
+                stats['total_comparisons'] += 1
+            else:
+                remaining.append(pair)
+
+        logger.info(f"Learned rules resolved {stats['rule_pairs']} of {len(pairs)} section pairs "
+                    f"({stats['relationships_found']} relationships)")
+        return remaining
+
+    def _discover_pairs(self,
+                        node_groups: Dict[str, List[NodeFact]],
+                        pairs: List[SectionPair],
+                        stats: Dict[str, Any],
+                        on_pair_done: Callable[[], None]) -> Dict[SectionPair, Optional[Dict[str, Any]]]:
+        """
+        Discover the references of each section pair, from the cache or the LLM.
+
+        Prompts are built here, on the calling thread (they read the ORM
+        facts); only the LLM calls run on the shared event loop.
+
+        Returns:
+            Discovery result per pair (None where the LLM call failed)
+        """
+        results: Dict[SectionPair, Optional[Dict[str, Any]]] = {}
+        pending = []  # (pair, cache key, source type, target type, prompt)
+
+        llm_cache = LLMResponseCache.for_session(self.db)
+        try:
+            for pair in pairs:
+                # The first instance of each section is the sample shown to the LLM
+                source_fact = node_groups[pair[0]][0]
+                target_fact = node_groups[pair[1]][0]
+
+                cache_key = self._discovery_cache_key(llm_cache, source_fact, target_fact) if llm_cache else None
+                cached = llm_cache.get(cache_key) if cache_key else None
+                if cached is not None:
+                    logger.debug(f"Relationship cache hit: {pair[0]} -> {pair[1]}")
+                    results[pair] = cached
+                    stats['llm_cache_hits'] += 1
+                    on_pair_done()
+                    continue
+
+                pending.append((
+                    pair,
+                    cache_key,
+                    source_fact.node_type,
+                    target_fact.node_type,
+                    self._build_discovery_prompt(source_fact, target_fact)
+                ))
+
+            if pending:
+                logger.info(f"Discovering references for {len(pending)} section pairs "
+                            f"(up to {settings.RELATIONSHIP_MAX_CONCURRENCY} concurrent LLM calls, "
+                            f"{stats['llm_cache_hits']} cached)")
+                stats['llm_calls'] += len(pending)
+                discovered = run_on_llm_loop(self._discover_all(
+                    [(source_type, target_type, prompt) for _, _, source_type, target_type, prompt in pending],
+                    on_pair_done
+                ))
+
+                for (pair, cache_key, *_), result in zip(pending, discovered):
+                    results[pair] = result
+                    # Failed calls are retried next run; "no references" answers are kept too
+                    if cache_key is not None and isinstance(result, dict):
+                        llm_cache.put(cache_key, result)
+        finally:
+            if llm_cache is not None:
+                llm_cache.close()
+
+        return results
+
+    async def _discover_all(self,
+                            requests: List[Tuple[str, str, str]],
+                            on_pair_done: Callable[[], None]) -> List[Optional[Dict[str, Any]]]:
+        """Run _discover_references_llm for every (source type, target type, prompt), bounded."""
+        semaphore = asyncio.Semaphore(max(1, settings.RELATIONSHIP_MAX_CONCURRENCY))
+
+        async def discover(source_type: str, target_type: str, prompt: str) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                result = await self._discover_references_llm(source_type, target_type, prompt)
+            on_pair_done()
+            return result
+
+        return await asyncio.gather(*(discover(*request) for request in requests))
+
+    @staticmethod
+    def _fact_json_dict(fact: NodeFact) -> Dict[str, Any]:
+        fact_json = fact.fact_json
+        if isinstance(fact_json, str):
+            try:
+                fact_json = json.loads(fact_json)
+            except json.JSONDecodeError:
+                return {}
+        return fact_json if isinstance(fact_json, dict) else {}
+
+    @classmethod
+    def _field_shape(cls, fact: NodeFact, ids_only: bool = False) -> List[str]:
+        """
+        Sorted field names of a fact, where references and IDs can be found.
+
+        Covers what _extract_reference_value and _find_target_by_reference
+        read: root keys, refs, child_references, and children's attributes
+        and references. With ids_only, only ID/Key-like names are kept.
+        """
+        fact_json = cls._fact_json_dict(fact)
+        names = set(fact_json.keys())
+
+        for section in ('refs', 'child_references'):
+            if isinstance(fact_json.get(section), dict):
+                names.update(f"{section}.{key}" for key in fact_json[section])
+
+        children = fact_json.get('children')
+        for child in children if isinstance(children, list) else []:
+            if not isinstance(child, dict):
+                continue
+            if isinstance(child.get('attributes'), dict):
+                names.update(f"attributes.{key}" for key in child['attributes'])
+            if isinstance(child.get('references'), dict):
+                for ref_type, ref_values in child['references'].items():
+                    names.add(f"references.{ref_type}")
+                    if isinstance(ref_values, dict):
+                        names.update(f"references.{ref_type}.{key}" for key in ref_values)
+
+        if ids_only:
+            names = {
+                name for name in names
+                if 'id' in name.lower() or 'key' in name.lower() or name.startswith(('refs', 'references'))
+            }
+        return sorted(names)
+
+    def _discovery_cache_key(self, llm_cache: LLMResponseCache, source_fact: NodeFact, target_fact: NodeFact) -> str:
+        """
+        Cache key of one discovery call.
+
+        Built from the shape of the two samples (source node type and
+        attribute/reference names, target node type and ID names), not their
+        values, so other files of the same message type hit the cache.
+        """
+        shape = json.dumps([
+            source_fact.node_type, self._field_shape(source_fact),
+            target_fact.node_type, self._field_shape(target_fact, ids_only=True)
+        ])
+        return llm_cache.make_key(
+            self.model, self.prompt_version, 'relationship_discovery',
+            hashlib.sha256(shape.encode('utf-8')).hexdigest()
+        )
+
     def _group_by_section(self, node_facts: List[NodeFact]) -> Dict[str, List[NodeFact]]:
         """Group node facts by section_path."""
         groups = {}
@@ -266,22 +541,8 @@ class RelationshipAnalyzer:
 
         return xml_snippet
 
-    def _discover_references_llm(
-        self,
-        source_fact: NodeFact,
-        target_fact: NodeFact
-    ) -> Optional[Dict[str, Any]]:
-        """
-        Use LLM to discover if source node references target node.
-
-        Args:
-            source_fact: Sample source node fact
-            target_fact: Sample target node fact
-
-        Returns:
-            Dictionary with discovered references or None
-        """
-        logger.debug(f"🤖 Calling LLM to discover references...")
+    def _build_discovery_prompt(self, source_fact: NodeFact, target_fact: NodeFact) -> str:
+        """Relationship discovery prompt for a sample source and target fact."""
         logger.debug(f"   Source: {source_fact.node_type} (section: {source_fact.section_path})")
         logger.debug(f"   Target: {target_fact.node_type} (section: {target_fact.section_path})")
 
@@ -302,29 +563,53 @@ class RelationshipAnalyzer:
         )
 
         logger.debug(f"   Prompt length: {len(prompt)} chars")
+        return prompt
+
+    async def _discover_references_llm(
+        self,
+        source_type: str,
+        target_type: str,
+        prompt: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Use LLM to discover if source node references target node.
+
+        Args:
+            source_type: Node type of the sample source fact
+            target_type: Node type of the sample target fact
+            prompt: Discovery prompt (see _build_discovery_prompt)
+
+        Returns:
+            Dictionary with discovered references or None
+        """
+        logger.debug(f"🤖 Calling LLM to discover references: {source_type} -> {target_type}")
 
         try:
-            # Use synchronous LLM client
             if not self.llm_client:
                 logger.error("❌ LLM client not initialized in _discover_references_llm")
                 return None
 
             logger.debug(f"   Calling LLM model: {self.model}")
 
-            response = self.llm_client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": get_relationship_system_prompt()
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.0,  # Zero temperature for maximum consistency
-                max_tokens=1000,
-                response_format={"type": "json_object"},  # Ensure JSON response
-                seed=42  # Fixed seed for deterministic responses
-            )
+            system_prompt = get_relationship_system_prompt()
+            estimated_tokens = prompt_token_estimate(system_prompt, prompt, max_tokens=1000)
+
+            async with get_llm_rate_limiter().limit(estimated_tokens) as permit:
+                response = await self.llm_client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": system_prompt
+                        },
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=0.0,  # Zero temperature for maximum consistency
+                    max_tokens=1000,
+                    response_format={"type": "json_object"},  # Ensure JSON response
+                    seed=42  # Fixed seed for deterministic responses
+                )
+                permit.record_usage(response.usage.total_tokens if response.usage else None)
 
             # Parse JSON response
             content = response.choices[0].message.content
@@ -347,7 +632,7 @@ class RelationshipAnalyzer:
             has_refs = result.get('has_references', False)
             refs_count = len(result.get('references', []))
 
-            logger.info(f"      🤖 LLM Result: {source_fact.node_type} -> {target_fact.node_type}")
+            logger.info(f"      🤖 LLM Result: {source_type} -> {target_type}")
             logger.info(f"         has_references: {has_refs}")
             logger.info(f"         references_count: {refs_count}")
 
@@ -363,8 +648,8 @@ class RelationshipAnalyzer:
         except Exception as e:
             logger.error(f"❌ LLM reference discovery FAILED")
             logger.error(f"   Error: {str(e)}")
-            logger.error(f"   Source: {source_fact.node_type}")
-            logger.error(f"   Target: {target_fact.node_type}")
+            logger.error(f"   Source: {source_type}")
+            logger.error(f"   Target: {target_type}")
             import traceback
             logger.error(f"   Traceback: {traceback.format_exc()}")
             return None
@@ -375,7 +660,8 @@ class RelationshipAnalyzer:
         source_facts: List[NodeFact],
         target_facts: List[NodeFact],
         ref_info: Dict[str, Any],
-        run_id: str
+        run_id: str,
+        discovered_by: str = 'llm'
     ) -> List[Dict[str, Any]]:
         """
         Validate reference across all instances of source and target nodes.
@@ -383,8 +669,9 @@ class RelationshipAnalyzer:
         Args:
             source_facts: All source node instances
             target_facts: All target node instances
-            ref_info: Reference information from LLM
+            ref_info: Reference information from LLM (or a learned rule)
             run_id: Run ID
+            discovered_by: 'llm', or 'rule' for references from learned rules
 
         Returns:
             List of validated relationship dictionaries
@@ -416,8 +703,8 @@ class RelationshipAnalyzer:
                 'is_valid': target_fact is not None,
                 'was_expected': False,  # DEPRECATED: All relationships are auto-discovered
                 'confidence': float(ref_info.get('confidence', 1.0)),
-                'discovered_by': 'llm',
-                'model_used': self.model
+                'discovered_by': discovered_by,
+                'model_used': self.model if discovered_by == 'llm' else None
             })
 
         return relationships
@@ -500,86 +787,19 @@ class RelationshipAnalyzer:
         """
         Find target node that matches the reference value.
 
-        Searches in nested structure (children[].attributes, children[].references) for matching IDs.
+        Searches in nested structure (children[].attributes, children[].references) for matching IDs,
+        through the section's TargetReferenceIndex (built on first use).
         """
-        normalized_ref = self._normalize_reference_value(ref_value)
-        if normalized_ref is None:
-            return None
-
-        for fact in target_facts:
-            fact_data = fact.fact_json
-
-            # Check common ID fields at root level
-            if self._normalize_reference_value(fact_data.get('ID')) == normalized_ref:
-                return fact
-            if self._normalize_reference_value(fact_data.get('Key')) == normalized_ref:
-                return fact
-            if self._normalize_reference_value(fact_data.get('ObjectKey')) == normalized_ref:
-                return fact
-
-            # Search in children structure
-            children = fact_data.get('children', [])
-            for child in children:
-                # Check attributes for ID/Key fields
-                attributes = child.get('attributes', {})
-                for attr_key, attr_value in attributes.items():
-                    normalized_attr = self._normalize_reference_value(attr_value)
-
-                    # Check if this is an ID field and matches our reference (EXACT match only)
-                    if normalized_attr == normalized_ref:
-                        return fact
-                    # Handle composite IDs: only allow partial match if one is a prefix/suffix of the other
-                    # AND they share a substantial common portion (at least 80% match)
-                    # Example: "seg0542686836-leg0" should match "seg0542686836" but NOT "seg-999" vs "seg-001"
-                    if isinstance(normalized_attr, str) and isinstance(normalized_ref, str):
-                        if 'id' in attr_key.lower() or 'key' in attr_key.lower():
-                            # Calculate string similarity - only match if substantial overlap
-                            min_len = min(len(normalized_ref), len(normalized_attr))
-                            max_len = max(len(normalized_ref), len(normalized_attr))
-
-                            # Only consider partial match if:
-                            # 1. One string contains the other as a prefix/suffix (not middle substring)
-                            # 2. The shorter string is at least 80% of the longer string length
-                            if min_len >= max_len * 0.8:
-                                if normalized_attr.startswith(normalized_ref) or normalized_ref.startswith(normalized_attr):
-                                    return fact
-                                if normalized_attr.endswith(normalized_ref) or normalized_ref.endswith(normalized_attr):
-                                    return fact
-
-                # Check references section
-                references = child.get('references', {})
-                for ref_type, ref_values in references.items():
-                    if isinstance(ref_values, list):
-                        for rv in ref_values:
-                            normalized_rv = self._normalize_reference_value(rv)
-                            if normalized_rv == normalized_ref:
-                                return fact
-                            # Check partial matches
-                            if isinstance(normalized_rv, str) and isinstance(normalized_ref, str):
-                                if normalized_ref in normalized_rv or normalized_rv in normalized_ref:
-                                    return fact
-
-            # Check in refs section at root level
-            refs = fact_data.get('refs', {})
-            for ref_key, ref_vals in refs.items():
-                if isinstance(ref_vals, list):
-                    for rv in ref_vals:
-                        normalized_rv = self._normalize_reference_value(rv)
-                        if normalized_rv == normalized_ref:
-                            return fact
-                        # Check partial matches
-                        if isinstance(normalized_rv, str) and isinstance(normalized_ref, str):
-                            if normalized_ref in normalized_rv or normalized_rv in normalized_ref:
-                                return fact
-                elif self._normalize_reference_value(ref_vals) == normalized_ref:
-                    return fact
-
-            # Check in child_values at root level
-            for key, value in fact_data.items():
-                if self._normalize_reference_value(value) == normalized_ref and ('ID' in key or 'Key' in key):
-                    return fact
-
-        return None
+        return self._target_index(target_facts).find(ref_value)
+
+    def _target_index(self, target_facts: List[NodeFact]) -> TargetReferenceIndex:
+        """Reference index of a target section, reused for every pair and reference field targeting it."""
+        cached = self._target_indexes.get(id(target_facts))
+        # The list is kept with its index, so its id cannot be reused by another list
+        if cached is None or cached[0] is not target_facts:
+            cached = (target_facts, TargetReferenceIndex(target_facts))
+            self._target_indexes[id(target_facts)] = cached
+        return cached[1]
 
     def _save_relationships(self, relationships: List[Dict[str, Any]]):
         """Bulk insert relationships to database."""
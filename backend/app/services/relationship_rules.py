@@ -0,0 +1,133 @@
+"""
+Reference rules learned from earlier relationship analyses.
+
+Every reference the LLM discovered is stored in node_relationships together
+with the field it was resolved through and whether it resolved. For one
+message type (message_root, spec_version) these rows compile into
+deterministic rules: "reference_field of a fact in section A resolves to a
+fact of section B". RelationshipAnalyzer applies the rules of a run's message
+type locally, and only asks the LLM about the section pairs no rule covers.
+
+A stored (pair, field) combination becomes a rule when at least
+RELATIONSHIP_RULE_MIN_VALID_RATIO of its instances resolved (and at least
+one did), so a field the LLM got wrong once is not repeated on later runs.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.database import NodeRelationship, Run
+
+logger = logging.getLogger(__name__)
+
+# (source section_path, target section_path)
+SectionPair = Tuple[str, str]
+
+
+@dataclass
+class ReferenceRule:
+    """A reference field of one section resolving to the facts of another."""
+    source_section_path: str
+    target_section_path: str
+    reference_field: str
+    reference_type: Optional[str]
+    confidence: float
+    valid_count: int
+    total_count: int
+
+    @property
+    def pair(self) -> SectionPair:
+        return self.source_section_path, self.target_section_path
+
+    def to_ref_info(self) -> Dict[str, Any]:
+        """The rule in the shape of an LLM discovery reference."""
+        return {
+            'reference_type': self.reference_type,
+            'reference_field': self.reference_field,
+            'confidence': self.confidence
+        }
+
+
+class ReferenceRuleSet:
+    """Reference rules of one message type, by section pair."""
+
+    def __init__(self, rules: List[ReferenceRule]):
+        self._rules: Dict[SectionPair, List[ReferenceRule]] = {}
+        for rule in rules:
+            self._rules.setdefault(rule.pair, []).append(rule)
+
+    def __len__(self) -> int:
+        return sum(len(rules) for rules in self._rules.values())
+
+    def rules_for(self, pair: SectionPair) -> List[ReferenceRule]:
+        return self._rules.get(pair, [])
+
+    @classmethod
+    def load(cls,
+             db: Session,
+             message_root: Optional[str],
+             spec_version: Optional[str],
+             exclude_run_id: Optional[str] = None) -> 'ReferenceRuleSet':
+        """
+        Compile the stored relationships of a message type into rules (one query).
+
+        Args:
+            db: Workspace session
+            message_root: Message root of the runs to learn from
+            spec_version: Spec version of the runs to learn from
+            exclude_run_id: Run being analyzed, whose rows are not history
+
+        Returns:
+            Rule set; empty when the message type is unknown
+        """
+        if not message_root or not spec_version:
+            return cls([])
+
+        valid_count = func.sum(case((NodeRelationship.is_valid.is_(True), 1), else_=0))
+        query = db.query(
+            NodeRelationship.source_section_path,
+            NodeRelationship.target_section_path,
+            NodeRelationship.reference_field,
+            func.max(NodeRelationship.reference_type),
+            func.max(NodeRelationship.confidence),
+            valid_count,
+            func.count(NodeRelationship.id)
+        ).join(
+            Run, Run.id == NodeRelationship.run_id
+        ).filter(
+            Run.message_root == message_root,
+            Run.spec_version == spec_version,
+            NodeRelationship.reference_field.isnot(None),
+            NodeRelationship.target_section_path.isnot(None)
+        )
+        if exclude_run_id:
+            query = query.filter(NodeRelationship.run_id != exclude_run_id)
+
+        rows = query.group_by(
+            NodeRelationship.source_section_path,
+            NodeRelationship.target_section_path,
+            NodeRelationship.reference_field
+        ).all()
+
+        rules = [
+            ReferenceRule(
+                source_section_path=source_path,
+                target_section_path=target_path,
+                reference_field=reference_field,
+                reference_type=reference_type,
+                confidence=float(confidence) if confidence is not None else 1.0,
+                valid_count=int(valid or 0),
+                total_count=int(total)
+            )
+            for source_path, target_path, reference_field, reference_type, confidence, valid, total in rows
+            if valid and valid / total >= settings.RELATIONSHIP_RULE_MIN_VALID_RATIO
+        ]
+
+        logger.info(f"Compiled {len(rules)} reference rules for {message_root} {spec_version} "
+                    f"from {len(rows)} stored reference fields")
+        return cls(rules)
@@ -0,0 +1,356 @@
+"""
+Background execution of Pattern Extractor and Discovery runs.
+
+POST /runs/ used to execute the whole workflow inside the request, blocking
+the event loop for minutes. Runs are now submitted to a RunExecutor:
+
+- the Run row is the persistent job record: it is created (status 'started',
+  job parameters in metadata_json['job']) before the job is queued, so the
+  run id is returned at once and can be polled through GET /runs/{id};
+- the workflow executes on a worker thread with its own workspace session and
+  publishes its phase and counters to a RunProgress (see run_progress);
+- when the run ends, the final progress snapshot is stored in
+  metadata_json['progress'] and the uploaded temp file is removed;
+- runs still 'started'/'in_progress' when the process starts again were
+  interrupted by a restart and are marked failed.
+
+Batch Discovery (submit_batch) follows the same model: a 'discovery_batch' run
+records the batch and one discovery run is created per file up front, so all
+ids are returned at once. The batch's RunProgress counts finished files and
+emits a 'file_result' event per file; each file's run has its own progress.
+The aggregated report is stored in the batch run's metadata_json['batch'].
+"""
+
+import logging
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.models.database import Run, RunKind, RunStatus
+from app.services.run_progress import RunProgress, track_run, untrack_run
+from app.services.workspace_db import get_workspace_session_factory, list_workspaces, run_with_db_retry
+
+logger = logging.getLogger(__name__)
+
+INTERRUPTED_MESSAGE = "Run interrupted: the server stopped before the run finished. Please submit the file again."
+
+
+class RunExecutor:
+    """Thread pool executing submitted runs, one workspace session per run."""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="run-executor")
+        logger.info(f"Run executor started with {self.max_workers} worker(s)")
+
+    def submit(self,
+               workspace: str,
+               kind: str,
+               xml_file_path: str,
+               filename: str,
+               conflict_resolution: Optional[str] = None) -> str:
+        """
+        Create the run record and queue the workflow.
+
+        The executor takes ownership of xml_file_path and deletes it when the run ends.
+
+        Returns:
+            Id of the created run
+        """
+        run_id = str(uuid.uuid4())
+        factory = get_workspace_session_factory(workspace)
+
+        def create_record():
+            with factory.session_scope() as session:
+                session.add(Run(
+                    id=run_id,
+                    kind=kind,
+                    status=RunStatus.STARTED,
+                    filename=filename,
+                    file_size_bytes=os.path.getsize(xml_file_path),
+                    started_at=datetime.utcnow(),
+                    metadata_json={'job': {'workspace': workspace, 'conflict_resolution': conflict_resolution}}
+                ))
+
+        run_with_db_retry(create_record)
+        progress = track_run(run_id)
+
+        self._executor.submit(self._execute, workspace, run_id, kind, xml_file_path, conflict_resolution, progress)
+        logger.info(f"Queued {kind} run {run_id} ({filename}) in workspace {workspace}")
+        return run_id
+
+    def submit_batch(self,
+                     workspace: str,
+                     xml_file_paths: List[str],
+                     temp_dir: str,
+                     max_parallel_files: Optional[int] = None) -> Tuple[str, List[str]]:
+        """
+        Create the batch run and one discovery run per file, and queue the batch.
+
+        The executor takes ownership of temp_dir (holding the files) and deletes it
+        when the batch ends.
+
+        Returns:
+            Id of the batch run and the run id of each file, in input order
+        """
+        batch_id = str(uuid.uuid4())
+        run_ids = [str(uuid.uuid4()) for _ in xml_file_paths]
+        factory = get_workspace_session_factory(workspace)
+        file_sizes = [os.path.getsize(path) for path in xml_file_paths]
+
+        def create_records():
+            with factory.session_scope() as session:
+                now = datetime.utcnow()
+                session.add(Run(
+                    id=batch_id,
+                    kind=RunKind.DISCOVERY_BATCH,
+                    status=RunStatus.STARTED,
+                    filename=f"{len(xml_file_paths)} file(s)",
+                    file_size_bytes=sum(file_sizes),
+                    started_at=now,
+                    metadata_json={
+                        'job': {'workspace': workspace, 'max_parallel_files': max_parallel_files},
+                        'run_ids': run_ids
+                    }
+                ))
+                session.add_all([
+                    Run(
+                        id=run_id,
+                        kind=RunKind.DISCOVERY,
+                        status=RunStatus.STARTED,
+                        filename=Path(path).name,
+                        file_size_bytes=size,
+                        started_at=now,
+                        metadata_json={'job': {'workspace': workspace, 'batch_id': batch_id}}
+                    )
+                    for run_id, path, size in zip(run_ids, xml_file_paths, file_sizes)
+                ])
+
+        run_with_db_retry(create_records)
+        progress = track_run(batch_id)
+        file_progress = [track_run(run_id) for run_id in run_ids]
+
+        self._executor.submit(self._execute_batch, workspace, batch_id, run_ids, list(xml_file_paths),
+                              temp_dir, max_parallel_files, progress, file_progress)
+        logger.info(f"Queued batch {batch_id} ({len(run_ids)} file(s)) in workspace {workspace}")
+        return batch_id, run_ids
+
+    def _execute(self,
+                 workspace: str,
+                 run_id: str,
+                 kind: str,
+                 xml_file_path: str,
+                 conflict_resolution: Optional[str],
+                 progress: RunProgress):
+        from app.services.discovery_workflow import create_discovery_workflow
+        from app.services.pattern_extractor_workflow import create_pattern_extractor_workflow
+
+        session = get_workspace_session_factory(workspace).get_session()
+        status = 'failed'
+        error_details = None
+        try:
+            if kind == RunKind.PATTERN_EXTRACTOR:
+                results = create_pattern_extractor_workflow(session).run_discovery(
+                    xml_file_path,
+                    conflict_resolution=conflict_resolution,
+                    run_id=run_id,
+                    progress=progress
+                )
+            else:
+                results = create_discovery_workflow(session).run_identify(
+                    xml_file_path,
+                    allow_cross_airline=True,  # Always enabled
+                    run_id=run_id,
+                    progress=progress
+                )
+            status = results.get('status', 'failed')
+            error_details = results.get('error_details')
+
+        except Exception as e:
+            logger.error(f"Run {run_id} failed: {e}")
+            session.rollback()
+            error_details = str(e)
+            self._update_run(session, run_id, status=RunStatus.FAILED, error_details=error_details,
+                             finished_at=datetime.utcnow())
+
+        finally:
+            progress.finish(status, error_details)
+            try:
+                self._update_run(session, run_id, metadata={'progress': progress.snapshot()})
+            except Exception as e:
+                logger.warning(f"Could not store final progress of run {run_id}: {e}")
+            session.close()
+            untrack_run(run_id)
+            try:
+                os.unlink(xml_file_path)
+            except OSError:
+                pass
+            logger.info(f"Run {run_id} finished: {status}")
+
+    def _execute_batch(self,
+                       workspace: str,
+                       batch_id: str,
+                       run_ids: List[str],
+                       xml_file_paths: List[str],
+                       temp_dir: str,
+                       max_parallel_files: Optional[int],
+                       progress: RunProgress,
+                       file_progress: List[RunProgress]):
+        from app.services.discovery_workflow import create_discovery_workflow
+
+        factory = get_workspace_session_factory(workspace)
+        session = factory.get_session()
+        progress_by_run = dict(zip(run_ids, file_progress))
+        status = 'failed'
+        error_details = None
+        failed_files = 0
+
+        def file_done(update: Dict[str, Any]):
+            # Called on this thread each time a file finishes
+            nonlocal failed_files
+            file_result = update['file']
+            if file_result['status'] != 'completed':
+                failed_files += 1
+            self._finish_file_run(session, file_result, progress_by_run.pop(file_result['run_id'], None))
+            progress.update(files_done=update['completed'], files_failed=failed_files)
+            progress.emit('file_result', file_result)
+
+        try:
+            self._update_run(session, batch_id, status=RunStatus.IN_PROGRESS)
+            progress.phase('identifying_files', files_done=0, files_total=len(run_ids), files_failed=0)
+
+            results = create_discovery_workflow(session).run_identify_batch(
+                xml_file_paths,
+                allow_cross_airline=True,  # Always enabled, as for single runs
+                max_workers=max_parallel_files,
+                progress_callback=file_done,
+                session_factory=factory.get_session,
+                run_ids=run_ids,
+                file_progress=file_progress
+            )
+            status = results['status']
+            self._update_run(session, batch_id, status=status, finished_at=datetime.utcnow(),
+                             metadata={'batch': results})
+
+        except Exception as e:
+            logger.error(f"Batch {batch_id} failed: {e}")
+            session.rollback()
+            error_details = str(e)
+            self._update_run(session, batch_id, status=RunStatus.FAILED, error_details=error_details,
+                             finished_at=datetime.utcnow())
+
+        finally:
+            # Files the batch never reached
+            for run_id, file_run_progress in progress_by_run.items():
+                self._finish_file_run(session, {'run_id': run_id, 'status': 'failed',
+                                                'error_details': error_details or "Batch ended before the file ran"},
+                                      file_run_progress)
+
+            # A batch with failed files still ran to the end
+            progress.finish('failed' if status == 'failed' else 'completed', error_details)
+            try:
+                self._update_run(session, batch_id, metadata={'progress': progress.snapshot()})
+            except Exception as e:
+                logger.warning(f"Could not store final progress of batch {batch_id}: {e}")
+            session.close()
+            untrack_run(batch_id)
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            logger.info(f"Batch {batch_id} finished: {status}")
+
+    def _finish_file_run(self, session, file_result: Dict[str, Any], progress: Optional[RunProgress]):
+        """End the progress of one file of a batch and store it on the file's run."""
+        run_id = file_result['run_id']
+        failed = file_result['status'] != 'completed'
+        if progress is not None:
+            progress.finish(file_result['status'], file_result.get('error_details'))
+        try:
+            values: Dict[str, Any] = {}
+            if failed:
+                # The workflow does not record errors raised before extraction started
+                values = {'status': RunStatus.FAILED, 'error_details': file_result.get('error_details'),
+                          'finished_at': datetime.utcnow()}
+            self._update_run(session, run_id, metadata={'progress': progress.snapshot()} if progress else None,
+                             **values)
+        except Exception as e:
+            logger.warning(f"Could not store the outcome of run {run_id}: {e}")
+        finally:
+            untrack_run(run_id)
+
+    @staticmethod
+    def _update_run(session, run_id: str, metadata: Optional[Dict[str, Any]] = None, **values: Any):
+        """Set Run columns, merging metadata keys into metadata_json."""
+        def update():
+            run = session.query(Run).filter(Run.id == run_id).first()
+            if not run:
+                return
+            for name, value in values.items():
+                setattr(run, name, value)
+            if metadata:
+                run.metadata_json = {**(run.metadata_json or {}), **metadata}
+            session.commit()
+
+        run_with_db_retry(update, on_retry=session.rollback)
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def fail_interrupted_runs(workspace: str) -> int:
+    """Mark background runs left unfinished by a previous process as failed; returns how many."""
+    factory = get_workspace_session_factory(workspace)
+
+    def update() -> int:
+        with factory.session_scope() as session:
+            runs = session.query(Run).filter(
+                Run.status.in_([RunStatus.STARTED, RunStatus.IN_PROGRESS])
+            ).all()
+            interrupted = [run for run in runs if (run.metadata_json or {}).get('job') is not None]
+            for run in interrupted:
+                run.status = RunStatus.FAILED
+                run.error_details = INTERRUPTED_MESSAGE
+                run.finished_at = datetime.utcnow()
+            return len(interrupted)
+
+    count = run_with_db_retry(update)
+    if count:
+        logger.warning(f"Marked {count} interrupted run(s) as failed in workspace {workspace}")
+    return count
+
+
+def fail_interrupted_runs_in_all_workspaces() -> int:
+    """Startup recovery over every workspace database."""
+    total = 0
+    for workspace in list_workspaces():
+        try:
+            total += fail_interrupted_runs(workspace)
+        except Exception as e:
+            logger.error(f"Could not check interrupted runs in workspace {workspace}: {e}")
+    return total
+
+
+_run_executor: Optional[RunExecutor] = None
+_run_executor_lock = threading.Lock()
+
+
+def get_run_executor() -> RunExecutor:
+    """Get (starting on first use) the process-wide run executor."""
+    global _run_executor
+    if _run_executor is None:
+        with _run_executor_lock:
+            if _run_executor is None:
+                _run_executor = RunExecutor(settings.MAX_CONCURRENT_RUNS)
+    return _run_executor
+
+
+def shutdown_run_executor():
+    global _run_executor
+    with _run_executor_lock:
+        if _run_executor is not None:
+            _run_executor.shutdown()
+            _run_executor = None
@@ -0,0 +1,150 @@
+"""
+Live progress of Pattern Extractor and Discovery runs.
+
+Workflows publish their current phase and counters (subtrees done/total,
+NodeFacts extracted, LLM tokens and latency, NodeFacts matched) to a
+RunProgress. Runs executed in the background are registered process-wide, so
+GET /runs/{id} reports the live snapshot while the run executes; the final
+snapshot is stored in Run.metadata_json['progress'] when the run ends.
+
+Listeners (GET /runs/{id}/events) receive every change as an event:
+- 'phase' / 'progress' / 'end': the snapshot after a phase change, a counter
+  update, or the end of the run;
+- 'node_result', 'relationships', 'patterns', 'file_result': details published
+  with emit() (one extracted subtree, relationship analysis counts, generated
+  patterns, one finished file of a batch).
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Phases in the order a run goes through them (Discovery runs add matching/gap_analysis)
+PHASES = (
+    'queued',
+    'parsing',
+    'extracting',
+    'relationships',
+    'pattern_generation',
+    'matching',
+    'gap_analysis',
+    'identifying_files',  # Batch runs: files_done/files_total
+    'completed',
+    'failed'
+)
+
+# Called with (event, data)
+ProgressListener = Callable[[str, Dict[str, Any]], None]
+
+
+class RunProgress:
+    """
+    Phase and counters of one run.
+
+    Updated from the workflow thread and from the extraction workers on the
+    LLM event loop, so all access goes through a lock. Listeners are called
+    outside the lock, on the thread that made the change.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self._lock = threading.Lock()
+        self._listeners: List[ProgressListener] = []
+        self._started = time.monotonic()
+        self._state: Dict[str, Any] = {
+            'phase': 'queued',
+            'subtrees_done': 0,
+            'subtrees_total': 0,  # Grows while the file is parsed
+            'node_facts': 0,
+            'tokens_used': 0,
+            'processing_time_ms': 0,  # Sum of per-subtree extraction latencies
+            'facts_matched': 0,
+            'elapsed_seconds': 0.0,
+            'updated_at': datetime.utcnow().isoformat()
+        }
+
+    def phase(self, name: str, **counters: Any):
+        """Enter a new phase, optionally updating counters."""
+        logger.info(f"Run {self.run_id}: phase {name}")
+        self._apply('phase', phase=name, **counters)
+
+    def update(self, **counters: Any):
+        """Update counters of the current phase."""
+        self._apply('progress', **counters)
+
+    def finish(self, status: str, error_details: Optional[str] = None):
+        """Enter the final phase ('completed' or 'failed')."""
+        phase = 'completed' if status == 'completed' else 'failed'
+        if error_details:
+            self._apply('end', phase=phase, error_details=error_details)
+        else:
+            self._apply('end', phase=phase)
+
+    def emit(self, event: str, data: Dict[str, Any]):
+        """Publish an event to the listeners without changing the snapshot."""
+        with self._lock:
+            listeners = list(self._listeners)
+        self._notify(listeners, event, data)
+
+    @property
+    def finished(self) -> bool:
+        with self._lock:
+            return self._state['phase'] in ('completed', 'failed')
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._state)
+
+    def add_listener(self, listener: ProgressListener):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: ProgressListener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _apply(self, event: str, **values: Any):
+        with self._lock:
+            self._state.update(values)
+            self._state['elapsed_seconds'] = round(time.monotonic() - self._started, 3)
+            self._state['updated_at'] = datetime.utcnow().isoformat()
+            snapshot = dict(self._state)
+            listeners = list(self._listeners)
+
+        self._notify(listeners, event, snapshot)
+
+    def _notify(self, listeners: List[ProgressListener], event: str, data: Dict[str, Any]):
+        for listener in listeners:
+            try:
+                listener(event, data)
+            except Exception as e:
+                logger.warning(f"Progress listener failed for run {self.run_id}: {e}")
+
+
+_active_runs: Dict[str, RunProgress] = {}
+_active_runs_lock = threading.Lock()
+
+
+def track_run(run_id: str) -> RunProgress:
+    """Register a run executing in this process and return its progress."""
+    with _active_runs_lock:
+        progress = _active_runs.get(run_id)
+        if progress is None:
+            progress = _active_runs[run_id] = RunProgress(run_id)
+        return progress
+
+
+def get_run_progress(run_id: str) -> Optional[RunProgress]:
+    """Progress of a run executing in this process (None once it has ended)."""
+    with _active_runs_lock:
+        return _active_runs.get(run_id)
+
+
+def untrack_run(run_id: str):
+    with _active_runs_lock:
+        _active_runs.pop(run_id, None)
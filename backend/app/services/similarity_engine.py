@@ -0,0 +1,323 @@
+"""
+Bulk similarity scoring of NodeFacts against patterns.
+
+The pattern-matching weights (see pattern_index.CompiledRule, the reference
+implementation) compare sets of attribute names, child types and relationship
+signatures. Scoring a whole run means facts x patterns x variations of those
+comparisons, so this engine encodes every name into a shared vocabulary and
+represents each set as an integer bitset:
+
+- intersections and differences become AND / AND NOT on machine words;
+- set sizes become popcounts;
+- every fact and every decision rule is encoded once and reused for all pairs.
+
+Scores are identical to the reference implementation (same counts, same
+floating-point operations in the same order); tests/unit/test_similarity_engine.py
+checks parity on randomized facts and rules.
+"""
+
+import logging
+import threading
+from functools import cached_property
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services.pattern_index import (
+    WEIGHT_CHILD,
+    WEIGHT_MUST_HAVE,
+    WEIGHT_NODE_TYPE,
+    WEIGHT_REFS,
+    CompiledPattern,
+    FactProfile,
+    PatternIndex,
+    apply_relationship_penalties,
+    normalize_child_type,
+    normalize_node_type,
+    reference_signature,
+    score_variations
+)
+
+logger = logging.getLogger(__name__)
+
+Score = Tuple[float, Optional[int]]
+
+if hasattr(int, 'bit_count'):
+    _popcount = int.bit_count
+else:  # Python < 3.10
+    def _popcount(mask: int) -> int:
+        return bin(mask).count("1")
+
+
+class Vocabulary:
+    """
+    Assigns each distinct name one bit; grows as new names are encoded.
+
+    Safe to share between threads: lookups are lock-free, new names are
+    assigned their bit under a lock.
+    """
+
+    def __init__(self):
+        self._bits: Dict[Any, int] = {}
+        self._names: List[Any] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _add(self, name: Any) -> int:
+        with self._lock:
+            bit = self._bits.get(name)
+            if bit is None:
+                bit = 1 << len(self._names)
+                self._names.append(name)
+                self._bits[name] = bit
+            return bit
+
+    def mask(self, names: Iterable[Any]) -> int:
+        mask = 0
+        for name in names:
+            bit = self._bits.get(name)
+            if bit is None:
+                bit = self._add(name)
+            mask |= bit
+        return mask
+
+    def names(self, mask: int) -> set:
+        """Decode a bitset (used for log messages only)."""
+        return {name for position, name in enumerate(self._names) if mask >> position & 1}
+
+
+class EncodedFact(FactProfile):
+    """FactProfile with its attribute, child type and reference sets encoded as bitsets."""
+
+    def __init__(self, structure: Dict[str, Any], scorer: 'BulkSimilarityScorer'):
+        super().__init__(structure)
+        self._scorer = scorer
+        self.attribute_mask = scorer.attributes.mask(self.attributes)
+        self.variation_attribute_mask = scorer.attributes.mask(self.variation_attributes)
+
+    @cached_property
+    def child_type_mask(self) -> int:
+        return self._scorer.child_types.mask(self.child_types)
+
+    @cached_property
+    def reference_mask(self) -> int:
+        return self._scorer.references.mask(self.reference_signatures)
+
+    @cached_property
+    def variation_child_masks(self) -> Dict[Any, List[int]]:
+        """Attribute bitsets of dict children grouped by node_type, in document order."""
+        grouped: Dict[Any, List[int]] = {}
+        for node_type, attributes in self.variation_children:
+            grouped.setdefault(node_type, []).append(self._scorer.attributes.mask(attributes))
+        return grouped
+
+
+class EncodedVariation:
+    """One variation of a variations-format rule, as bitsets."""
+
+    def __init__(self, variation: Dict[str, Any], scorer: 'BulkSimilarityScorer'):
+        self.variation_id = variation.get('variation_id')
+        self.node_type = variation.get('node_type')
+        self.required_mask = scorer.attributes.mask(variation.get('must_have_attributes', []))
+        self.required_count = _popcount(self.required_mask)
+
+        child_structure = variation.get('child_structure', {})
+        self.has_children = bool(child_structure.get('has_children'))
+        self.child_structures: Tuple[Tuple[Any, int, int], ...] = ()
+        if self.has_children:
+            structures = []
+            for child in child_structure.get('child_structures', []):
+                mask = scorer.attributes.mask(child.get('required_attributes', []))
+                structures.append((child.get('node_type'), mask, _popcount(mask)))
+            self.child_structures = tuple(structures)
+
+    def match(self, fact: EncodedFact) -> Tuple[bool, float]:
+        if fact.node_type != self.node_type:
+            return False, 0.0
+
+        missing_required = self.required_mask & ~fact.variation_attribute_mask
+        if missing_required:
+            return False, (1.0 - _popcount(missing_required) / self.required_count)
+
+        if self.has_children:
+            if not fact.children:
+                return False, 0.5
+
+            child_match_score = 0.0
+            total_child_checks = 0
+            children_by_type = fact.variation_child_masks
+            for child_type, required_mask, required_count in self.child_structures:
+                matching = children_by_type.get(child_type)
+                if not matching:
+                    total_child_checks += 1
+                    continue
+
+                for attribute_mask in matching:
+                    total_child_checks += 1
+                    missing = required_mask & ~attribute_mask
+                    if not missing:
+                        child_match_score += 1
+                    else:
+                        child_match_score += 1.0 - (_popcount(missing) / required_count)
+
+            child_confidence = child_match_score / total_child_checks if total_child_checks > 0 else 1.0
+            if child_confidence < 1.0:
+                return False, (1.0 + child_confidence) / 2.0
+
+        return True, 1.0
+
+
+class EncodedRule:
+    """A decision rule (legacy or variations format) as bitsets over the scorer's vocabularies."""
+
+    def __init__(self, decision_rule: Dict[str, Any], scorer: 'BulkSimilarityScorer'):
+        self.variations: Optional[Tuple[EncodedVariation, ...]] = None
+
+        if 'variations' in decision_rule:
+            self.variations = tuple(
+                EncodedVariation(variation, scorer) for variation in decision_rule.get('variations', [])
+            )
+            return
+
+        self.node_type = decision_rule.get('node_type')
+        self.node_type_normalized = normalize_node_type(self.node_type)
+
+        self.must_have_mask = scorer.attributes.mask(decision_rule.get('must_have_attributes', []))
+        self.must_have_count = _popcount(self.must_have_mask)
+        self.expected_mask = self.must_have_mask | scorer.attributes.mask(decision_rule.get('optional_attributes', []))
+
+        child_structure = decision_rule.get('child_structure', {})
+        self.has_children = bool(child_structure.get('has_children'))
+        self.is_container = child_structure.get('is_container', False)
+        self.child_type_mask = scorer.child_types.mask(
+            normalize_child_type(t) for t in child_structure.get('child_types', [])
+        ) if self.has_children else 0
+
+        reference_patterns = decision_rule.get('reference_patterns', [])
+        self.has_references = bool(reference_patterns)
+        self.reference_mask = scorer.references.mask(reference_signature(r) for r in reference_patterns)
+        self.reference_count = _popcount(self.reference_mask)
+
+        self.expected_relationships: Tuple[Tuple[str, bool], ...] = tuple(
+            (expected.get('target_section_path', ''), bool(expected.get('is_valid', True)))
+            for expected in decision_rule.get('expected_relationships', [])
+        )
+
+
+class BulkSimilarityScorer:
+    """
+    Scores encoded NodeFacts against encoded decision rules.
+
+    One scorer (and so one vocabulary) is used for every fact and pattern of a
+    Discovery run - or of all runs of a batch, across threads; rules of a
+    PatternIndex are encoded on first use and reused.
+    """
+
+    def __init__(self):
+        self.attributes = Vocabulary()
+        self.child_types = Vocabulary()
+        self.references = Vocabulary()
+        self._pattern_rules: Dict[int, EncodedRule] = {}
+
+    def encode_fact(self, structure: Dict[str, Any]) -> EncodedFact:
+        return EncodedFact(structure, self)
+
+    def encode_rule(self, decision_rule: Dict[str, Any]) -> EncodedRule:
+        return EncodedRule(decision_rule, self)
+
+    def rule_for(self, compiled: CompiledPattern) -> EncodedRule:
+        """Encoded decision rule of an indexed pattern (cached by library position)."""
+        rule = self._pattern_rules.get(compiled.ordinal)
+        if rule is None:
+            rule = self._pattern_rules[compiled.ordinal] = self.encode_rule(compiled.decision_rule)
+        return rule
+
+    def encode_index(self, pattern_index: PatternIndex, message_root: str) -> int:
+        """Encode all indexed patterns of a message type up front; returns the number encoded."""
+        compiled_patterns = pattern_index.patterns(message_root)
+        for compiled in compiled_patterns:
+            self.rule_for(compiled)
+        return len(compiled_patterns)
+
+    def score(self, fact: EncodedFact, rule: EncodedRule) -> Score:
+        """
+        Similarity between an encoded NodeFact and an encoded rule.
+
+        Returns:
+            Tuple of (confidence: float 0.0-1.0, variation_id: int or None)
+        """
+        if rule.variations is not None:
+            return score_variations(rule.variations, fact)
+        return (self._score_legacy(fact, rule), None)
+
+    def score_row(self, fact: EncodedFact, rules: Sequence[EncodedRule]) -> List[Score]:
+        """Scores of one fact against many rules."""
+        return [self.score(fact, rule) for rule in rules]
+
+    def score_matrix(self, facts: Sequence[EncodedFact], rules: Sequence[EncodedRule]) -> List[List[Score]]:
+        """facts x rules similarity matrix."""
+        return [self.score_row(fact, rules) for fact in facts]
+
+    def score_candidates(self,
+                         fact: EncodedFact,
+                         candidates: Sequence[Tuple[CompiledPattern, bool]]) -> List[Score]:
+        """Scores of one fact against PatternIndex.candidates() output."""
+        return [self.score(fact, self.rule_for(compiled)) for compiled, _ in candidates]
+
+    def _score_legacy(self, fact: EncodedFact, rule: EncodedRule) -> float:
+        score = 0.0
+        total_weight = WEIGHT_NODE_TYPE + WEIGHT_MUST_HAVE + WEIGHT_CHILD + WEIGHT_REFS
+
+        # 1. Node type
+        node_type_matches = (rule.node_type_normalized == fact.node_type_normalized) or \
+                            (fact.node_type == rule.node_type)
+        if node_type_matches:
+            score += WEIGHT_NODE_TYPE
+
+        # 2. Must-have attributes
+        if rule.must_have_count:
+            score += WEIGHT_MUST_HAVE * (_popcount(rule.must_have_mask & fact.attribute_mask) / rule.must_have_count)
+        else:
+            score += WEIGHT_MUST_HAVE
+
+        # Penalty for attributes the pattern neither requires nor allows
+        extra_mask = fact.attribute_mask & ~rule.expected_mask
+        if extra_mask and rule.expected_mask:
+            extra_count = _popcount(extra_mask)
+            extra_penalty = min(0.3, extra_count * 0.10)
+            score -= extra_penalty
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(f"Found {extra_count} unexpected attribute(s): {self.attributes.names(extra_mask)}. "
+                            f"Applying {extra_penalty*100:.0f}% penalty.")
+
+        # 3. Child structure
+        if rule.has_children:
+            if fact.children and rule.is_container == fact.is_container:
+                score += WEIGHT_CHILD * 0.5
+
+                if rule.is_container and fact.is_container:
+                    fact_types = fact.child_type_mask
+                    if rule.child_type_mask and fact_types:
+                        type_overlap = _popcount(rule.child_type_mask & fact_types) / \
+                            _popcount(rule.child_type_mask | fact_types)
+                        score += WEIGHT_CHILD * 0.5 * type_overlap
+                    else:
+                        score += WEIGHT_CHILD * 0.5
+        elif not fact.children:
+            score += WEIGHT_CHILD
+
+        # 4. Reference patterns
+        if rule.has_references:
+            if fact.relationships:
+                overlap = _popcount(rule.reference_mask & fact.reference_mask) / rule.reference_count
+                score += WEIGHT_REFS * overlap
+        else:
+            score += WEIGHT_REFS
+
+        normalized_score = min(1.0, score / total_weight)
+
+        if not node_type_matches:
+            normalized_score = min(normalized_score, 0.20)
+
+        # 5. Relationship validation
+        return apply_relationship_penalties(normalized_score, rule.expected_relationships, fact)
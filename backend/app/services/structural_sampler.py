@@ -0,0 +1,119 @@
+"""
+Structural sampling of repeated sibling elements for AssistedDiscovery.
+
+Large containers (PaxList with hundreds of Pax, OfferList, ...) mostly repeat
+the same few shapes. The extracted NodeFacts describe structure, not values,
+so one representative per distinct shape is enough for the LLM. This module
+computes a shape signature (tag path + attribute names + child shapes) for
+each repeated child and keeps one representative per signature, recording
+how many children each representative stands for.
+"""
+
+import hashlib
+import logging
+from copy import deepcopy
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ShapeGroup:
+    """Children of a container that share one structural shape."""
+    signature: str
+    node_type: str
+    count: int
+    representative_ordinal: int  # 1-based position of the kept child in the original container
+
+
+@dataclass
+class SampledChildren:
+    """Outcome of sampling a container's children."""
+    groups: List[ShapeGroup]
+    kept_ordinals: List[int] = field(default_factory=list)  # Original ordinal of each kept child, in order
+    total_children: int = 0
+
+    def original_ordinal(self, sampled_ordinal: int) -> int:
+        """Map a 1-based ordinal in the sampled container back to the original one."""
+        if 1 <= sampled_ordinal <= len(self.kept_ordinals):
+            return self.kept_ordinals[sampled_ordinal - 1]
+        return sampled_ordinal
+
+
+def _local_name(tag: str) -> str:
+    return tag.split('}')[-1]
+
+
+def shape_signature(element: etree.Element, parent_path: str = "") -> str:
+    """
+    Structural signature of an element: tag path, attribute names and the
+    distinct shapes of its children (cardinality and values are ignored).
+    """
+    path = f"{parent_path}/{_local_name(element.tag)}"
+    child_shapes = sorted({
+        shape_signature(child, path)
+        for child in element.iterchildren(tag=etree.Element)
+    })
+    attributes = ",".join(sorted(_local_name(name) for name in element.attrib))
+    raw = f"{path}[{attributes}]({';'.join(child_shapes)})"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def sample_distinct_shapes(element: etree.Element) -> Optional[Tuple[etree.Element, SampledChildren]]:
+    """
+    Keep one representative per distinct shape among repeated children.
+
+    Children whose tag appears only once are always kept. Returns None when
+    sampling would not drop anything.
+
+    Returns:
+        Tuple of (sampled copy of the container, SampledChildren)
+    """
+    children = list(element.iterchildren(tag=etree.Element))
+    tag_counts: Dict[str, int] = {}
+    for child in children:
+        tag_counts[child.tag] = tag_counts.get(child.tag, 0) + 1
+
+    groups: Dict[str, ShapeGroup] = {}
+    kept: List[etree.Element] = []
+    kept_ordinals: List[int] = []
+
+    for ordinal, child in enumerate(children, start=1):
+        if tag_counts[child.tag] < 2:
+            kept.append(child)
+            kept_ordinals.append(ordinal)
+            continue
+
+        signature = shape_signature(child)
+        group = groups.get(signature)
+        if group is None:
+            groups[signature] = ShapeGroup(
+                signature=signature,
+                node_type=_local_name(child.tag),
+                count=1,
+                representative_ordinal=ordinal
+            )
+            kept.append(child)
+            kept_ordinals.append(ordinal)
+        else:
+            group.count += 1
+
+    if len(kept) == len(children):
+        return None
+
+    sampled = etree.Element(element.tag, attrib=element.attrib, nsmap=element.nsmap)
+    sampled.text = element.text
+    for child in kept:
+        sampled.append(deepcopy(child))
+
+    logger.debug(f"Structural sampling of {_local_name(element.tag)}: "
+                 f"{len(children)} children -> {len(kept)} ({len(groups)} distinct repeated shapes)")
+
+    return sampled, SampledChildren(
+        groups=list(groups.values()),
+        kept_ordinals=kept_ordinals,
+        total_children=len(children)
+    )
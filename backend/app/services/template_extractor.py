@@ -532,7 +532,7 @@ class TemplateExtractorEngine:
 
         try:
             # Parse XML content
-            root = ET.fromstring(subtree.xml_content)
+            root = ET.fromstring(subtree.xml_bytes)
 
             all_facts = []
 
@@ -4,6 +4,11 @@ Workspace Database Adapter
 Provides SQLAlchemy session factory that connects to workspace-specific SQLite databases
 instead of centralized MySQL. Enables portable, user-friendly deployments.
 
+Each workspace database runs in WAL mode with a pool of read-write
+connections (SQLite admits one writer at a time; the others wait up to
+SQLITE_BUSY_TIMEOUT_MS) and a separate pool of read-only connections, so
+listing endpoints keep reading while a discovery run writes.
+
 Usage:
     # Get session for a specific workspace
     db = get_workspace_session(workspace="SQ")
@@ -15,19 +20,70 @@ Usage:
 import os
 import logging
 import re
+import time
 from pathlib import Path
-from typing import Optional, Generator
+from typing import Any, Callable, Optional, Generator, TypeVar
 from contextlib import contextmanager
 
 from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import QueuePool
 
 from app.models.database import Base
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+
+def _configure_sqlite_connection(dbapi_conn, read_only: bool = False):
+    """Apply the workspace storage pragmas to a new SQLite connection."""
+    cursor = dbapi_conn.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    if settings.SQLITE_WAL_ENABLED and not read_only:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size={-int(settings.SQLITE_CACHE_SIZE_KB)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE_MB) * 1024 * 1024}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def is_database_locked(error: Exception) -> bool:
+    """True for SQLite lock contention errors that are worth retrying."""
+    message = str(error).lower()
+    return isinstance(error, OperationalError) and (
+        "database is locked" in message or "database is busy" in message
+    )
+
+
+def run_with_db_retry(operation: Callable[[], T], on_retry: Optional[Callable[[], Any]] = None) -> T:
+    """
+    Run a database operation, retrying on lock contention.
+
+    Each attempt already waits up to SQLITE_BUSY_TIMEOUT_MS inside SQLite;
+    after that the operation is retried up to MAX_DB_RETRIES times with
+    exponential backoff. on_retry (e.g. session.rollback) runs before each retry,
+    so the operation must be safe to repeat from scratch.
+    """
+    for attempt in range(settings.MAX_DB_RETRIES + 1):
+        try:
+            return operation()
+        except OperationalError as e:
+            if not is_database_locked(e) or attempt >= settings.MAX_DB_RETRIES:
+                raise
+            if on_retry:
+                on_retry()
+            wait = min(0.1 * settings.RETRY_BACKOFF_FACTOR ** attempt, 5.0)
+            logger.warning(f"Database locked (attempt {attempt + 1}/{settings.MAX_DB_RETRIES + 1}), "
+                           f"retrying in {wait:.1f}s")
+            time.sleep(wait)
+
 
 class WorkspaceSessionFactory:
     """Creates SQLAlchemy sessions for workspace-specific SQLite databases."""
@@ -37,7 +93,9 @@ class WorkspaceSessionFactory:
         self.db_dir = self._get_db_dir()
         self.db_path = self.db_dir / f"{workspace_name}.db"
         self.engine = None
+        self.read_engine = None
         self.SessionLocal = None
+        self.ReadSessionLocal = None
         self._init_engine()
 
     def _get_db_dir(self) -> Path:
@@ -49,24 +107,27 @@ class WorkspaceSessionFactory:
         return backend_data_dir
 
     def _init_engine(self):
-        """Initialize SQLite engine and session factory."""
+        """Initialize SQLite engines (read-write and read-only pools) and session factories."""
         # SQLite connection string
         sqlite_url = f"sqlite:///{self.db_path}"
+        connect_args = {
+            "check_same_thread": False,  # Pooled connections move between threads
+            "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000.0
+        }
 
-        # Create engine with SQLite-specific settings
+        # Read-write pool; SQLite (WAL) serializes the writers
         self.engine = create_engine(
             sqlite_url,
-            connect_args={"check_same_thread": False},  # Allow multi-threading
-            poolclass=StaticPool,  # Keep single connection
+            connect_args=connect_args,
+            poolclass=QueuePool,
+            pool_size=settings.WORKSPACE_DB_POOL_SIZE,
+            max_overflow=settings.WORKSPACE_DB_MAX_OVERFLOW,
             echo=settings.LOG_LEVEL == "DEBUG"
         )
 
-        # Enable foreign keys for SQLite
         @event.listens_for(self.engine, "connect")
         def set_sqlite_pragma(dbapi_conn, connection_record):
-            cursor = dbapi_conn.cursor()
-            cursor.execute("PRAGMA foreign_keys=ON")
-            cursor.close()
+            _configure_sqlite_connection(dbapi_conn)
 
         # Create all tables if they don't exist
         Base.metadata.create_all(bind=self.engine)
@@ -80,12 +141,37 @@ class WorkspaceSessionFactory:
         # Ensure patterns table has superseded_by column for conflict resolution
         self._ensure_patterns_superseded_by()
 
-        # Create session factory
+        # Ensure hot-query indexes exist (older workspaces and rebuilt tables lack them)
+        self._ensure_indexes()
+
+        # Start from fresh connections so none carries a pre-migration schema cache
+        self.engine.dispose()
+
+        # Read-only pool for listing/reporting queries (WAL readers never block the writer)
+        self.read_engine = create_engine(
+            sqlite_url,
+            connect_args=connect_args,
+            poolclass=QueuePool,
+            pool_size=settings.WORKSPACE_DB_READ_POOL_SIZE,
+            max_overflow=0,
+            echo=settings.LOG_LEVEL == "DEBUG"
+        )
+
+        @event.listens_for(self.read_engine, "connect")
+        def set_sqlite_read_pragma(dbapi_conn, connection_record):
+            _configure_sqlite_connection(dbapi_conn, read_only=True)
+
+        # Create session factories
         self.SessionLocal = sessionmaker(
             bind=self.engine,
             autocommit=False,
             autoflush=False
         )
+        self.ReadSessionLocal = sessionmaker(
+            bind=self.read_engine,
+            autocommit=False,
+            autoflush=False
+        )
 
     def _fix_sqlite_autoincrement(self):
         """
@@ -311,10 +397,43 @@ class WorkspaceSessionFactory:
                 else:
                     raise
 
+    def _ensure_indexes(self):
+        """
+        Create the secondary indexes declared on the models if they are missing.
+
+        create_all() only adds indexes when it creates a table, and the table
+        rebuilds above recreate tables without them, so existing workspace
+        databases are brought up to date here.
+        Migration: 009_add_hot_query_indexes
+        """
+        from sqlalchemy import inspect
+
+        inspector = inspect(self.engine)
+        existing_tables = set(inspector.get_table_names())
+
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+                logger.info(f"Creating index {index.name} on {table.name}")
+                index.create(bind=self.engine, checkfirst=True)
+
     def get_session(self) -> Session:
         """Get a new database session."""
         return self.SessionLocal()
 
+    def get_read_session(self) -> Session:
+        """Get a new read-only database session (writes raise an error)."""
+        return self.ReadSessionLocal()
+
+    def dispose(self):
+        """Close all pooled connections."""
+        self.engine.dispose()
+        self.read_engine.dispose()
+
     @contextmanager
     def session_scope(self) -> Generator[Session, None, None]:
         """Provide a transactional scope around a series of operations."""
@@ -395,6 +514,26 @@ def _get_workspace_session_generator(workspace: str) -> Generator[Session, None,
         session.close()
 
 
+def _get_workspace_read_session_generator(workspace: str) -> Generator[Session, None, None]:
+    """Internal generator for read-only workspace sessions."""
+    factory = get_workspace_session_factory(workspace)
+    session = factory.get_read_session()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def get_workspace_read_db(workspace: str) -> Generator[Session, None, None]:
+    """
+    Read-only counterpart of get_workspace_db for listing/reporting endpoints.
+
+    Sessions come from the workspace's read-only pool, so they are served
+    while a discovery run holds the write lock.
+    """
+    return _get_workspace_read_session_generator(workspace)
+
+
 def get_workspace_db(workspace: str) -> Generator[Session, None, None]:
     """
     Dependency factory for workspace database sessions.
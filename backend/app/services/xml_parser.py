@@ -6,13 +6,16 @@ for target section detection. Designed for large NDC XML files.
 """
 
 import logging
-from typing import Dict, List, Optional, Iterator, Tuple, Set
+import re
+from typing import Dict, List, Optional, Iterator, Tuple, Set, Callable, BinaryIO
 from pathlib import Path
 from dataclasses import dataclass, field
 from lxml import etree
+from copy import deepcopy
 import hashlib
 
 from app.core.config import settings
+from app.services.structural_sampler import SampledChildren, sample_distinct_shapes
 
 logger = logging.getLogger(__name__)
 
@@ -35,14 +38,112 @@ class XmlElement:
         return self.tag
 
 
+@dataclass
+class SubtreeStats:
+    """Structure of a subtree, computed while it is serialized."""
+    child_tags: Dict[str, int]
+    node_count: int
+    size_bytes: int
+
+    @property
+    def total_children(self) -> int:
+        return sum(self.child_tags.values())
+
+    @property
+    def max_repetition(self) -> int:
+        return max(self.child_tags.values()) if self.child_tags else 0
+
+    @property
+    def repeating_tag(self) -> Optional[str]:
+        if not self.child_tags:
+            return None
+        return max(self.child_tags.items(), key=lambda x: x[1])[0]
+
+
+def _serialize_element(element: etree.Element) -> bytes:
+    """Compact UTF-8 serialization of an element (no pretty-printing, no tail)."""
+    return etree.tostring(element, encoding='utf-8', with_tail=False)
+
+
+def compute_subtree_stats(element: etree.Element, size_bytes: int = 0) -> SubtreeStats:
+    """
+    Count direct child tags and total nodes in a single traversal.
+
+    Each node is visited once: direct children feed the histogram and their
+    own descendants are counted by lxml's C-level iterator.
+    """
+    child_tags: Dict[str, int] = {}
+    node_count = 1
+    for child in element.iterchildren(tag=etree.Element):
+        tag = child.tag.split('}')[-1]
+        child_tags[tag] = child_tags.get(tag, 0) + 1
+        node_count += sum(1 for _ in child.iter(tag=etree.Element))
+    return SubtreeStats(child_tags=child_tags, node_count=node_count, size_bytes=size_bytes)
+
+
 @dataclass
 class XmlSubtree:
-    """Represents an extracted XML subtree."""
+    """
+    Represents an extracted XML subtree.
+
+    The subtree is held as a compact UTF-8 buffer (xml_bytes); xml_content
+    decodes it on first access. stats carries the structure computed at
+    extraction time so downstream stages don't have to re-parse it.
+
+    Subtrees above MAX_SUBTREE_SIZE_KB carry batches: copies of the container
+    (same tag and attributes) each holding a contiguous run of its children,
+    with ordinal_offset = number of children before the batch.
+
+    With STRUCTURAL_DEDUP_ENABLED, repeated children are reduced to one
+    representative per shape and sampling records the original counts.
+    """
     root_element: XmlElement
-    xml_content: str
+    xml_bytes: bytes
     size_bytes: int
     path: str
     node_count: int = 0
+    stats: Optional[SubtreeStats] = None
+    batches: List['XmlSubtree'] = field(default_factory=list)
+    ordinal_offset: int = 0
+    sampling: Optional[SampledChildren] = None
+    _xml_content: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def xml_content(self) -> str:
+        """Subtree XML as text (decoded lazily from xml_bytes)."""
+        if self._xml_content is None:
+            self._xml_content = self.xml_bytes.decode('utf-8')
+        return self._xml_content
+
+    @classmethod
+    def from_element(cls, element: etree.Element, path: str,
+                     namespace_uri: Optional[str] = None,
+                     xml_bytes: Optional[bytes] = None) -> 'XmlSubtree':
+        """Serialize an element once (unless xml_bytes is given) and capture its structure stats."""
+        if xml_bytes is None:
+            xml_bytes = _serialize_element(element)
+        stats = compute_subtree_stats(element, size_bytes=len(xml_bytes))
+        root_element = XmlElement(
+            tag=element.tag,
+            text=element.text.strip() if element.text else None,
+            attributes=dict(element.attrib),
+            path=path,
+            namespace_uri=namespace_uri
+        )
+        return cls(
+            root_element=root_element,
+            xml_bytes=xml_bytes,
+            size_bytes=stats.size_bytes,
+            path=path,
+            node_count=stats.node_count,
+            stats=stats
+        )
+
+    @classmethod
+    def from_xml(cls, xml_content: str, path: str) -> 'XmlSubtree':
+        """Build a subtree from an XML string (e.g. API input)."""
+        element = etree.fromstring(xml_content.encode('utf-8'))
+        return cls.from_element(element, path, namespace_uri=etree.QName(element).namespace)
 
 
 @dataclass
@@ -56,6 +157,19 @@ class NdcVersionInfo:
     airline_name: Optional[str] = None
 
 
+def _validate_xml_file(xml_file_path: str) -> float:
+    """Check that the XML file exists and is within MAX_XML_SIZE_MB. Returns size in MB."""
+    file_path = Path(xml_file_path)
+    if not file_path.exists():
+        raise FileNotFoundError(f"XML file not found: {xml_file_path}")
+
+    file_size_mb = file_path.stat().st_size / (1024 * 1024)
+    if file_size_mb > settings.MAX_XML_SIZE_MB:
+        raise ValueError(f"XML file too large: {file_size_mb:.1f}MB > {settings.MAX_XML_SIZE_MB}MB")
+
+    return file_size_mb
+
+
 class PathTrieNode:
     """Node in the path matching trie for efficient target detection."""
 
@@ -107,10 +221,21 @@ class XmlStreamingParser:
 
         logger.info(f"Built path trie with {len(self.target_paths)} target paths")
 
-    def _extract_version_info(self, element: etree.Element) -> bool:
-        """Extract NDC version info from root element. Returns True if found."""
-        import re
+    def set_target_paths(self, target_paths: List[Dict]):
+        """Replace target paths and rebuild the path trie (safe to call mid-stream)."""
+        self.target_paths = target_paths
+        self.path_trie = PathTrieNode()
+        self._build_path_trie()
 
+    def _detect_root_version(self, element: etree.Element) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Populate namespace/message root from the root element and detect the version
+        from its namespace URI or version attributes.
+
+        Returns:
+            Tuple of (detected_version, detection_source); both None if the root
+            element alone does not carry version information.
+        """
         tag = element.tag
 
         # Extract namespace URI
@@ -174,34 +299,26 @@ class XmlStreamingParser:
                 elif 'schemalocation' in attr_name.lower():
                     self.version_info.schema_location = attr_value
 
-        # 3. Look for PayloadAttributes/Version element
-        if not detected_version:
-            payload_attrs = element.find('.//PayloadAttributes/Version')
-            if payload_attrs is not None and payload_attrs.text:
-                detected_version = payload_attrs.text.strip()
-                detection_source = "PayloadAttributes/Version"
+        return detected_version, detection_source
 
-        # 4. Check for Version element directly under root
-        if not detected_version:
-            version_elem = element.find('./Version')
-            if version_elem is not None and version_elem.text:
-                detected_version = version_elem.text.strip()
-                detection_source = "direct Version element"
+    def _fallback_version(self) -> Tuple[Optional[str], Optional[str]]:
+        """Infer a version for files without explicit version information."""
+        detected_version = None
+        detection_source = None
 
         # 5. Fallback strategies for files without explicit versions
-        if not detected_version:
-            # Try to infer from namespace patterns
-            if self.version_info.namespace_uri:
-                if 'IATA/2015' in self.version_info.namespace_uri:
-                    # Newer IATA format, assume latest supported version
-                    detected_version = '21.3'
-                    detection_source = "fallback (IATA/2015 namespace)"
-                elif 'EDIST' in self.version_info.namespace_uri:
-                    # NDC EDIST format, assume latest version if no other version found
-                    detected_version = '21.3'
-                    detection_source = "fallback (EDIST namespace)"
-                    logger.warning(f"NDC version not explicitly detected in XML, defaulting to {detected_version}. "
-                                   f"Message: {self.version_info.message_root}, Namespace: {self.version_info.namespace_uri}")
+        # Try to infer from namespace patterns
+        if self.version_info.namespace_uri:
+            if 'IATA/2015' in self.version_info.namespace_uri:
+                # Newer IATA format, assume latest supported version
+                detected_version = '21.3'
+                detection_source = "fallback (IATA/2015 namespace)"
+            elif 'EDIST' in self.version_info.namespace_uri:
+                # NDC EDIST format, assume latest version if no other version found
+                detected_version = '21.3'
+                detection_source = "fallback (EDIST namespace)"
+                logger.warning(f"NDC version not explicitly detected in XML, defaulting to {detected_version}. "
+                               f"Message: {self.version_info.message_root}, Namespace: {self.version_info.namespace_uri}")
 
         # 6. Final fallback for recognized message types
         if not detected_version and self.version_info.message_root in ['OrderViewRS', 'OrderCreateRQ', 'OrderChangeRQ']:
@@ -211,7 +328,11 @@ class XmlStreamingParser:
                            f"Message: {self.version_info.message_root}. "
                            f"Consider adding version info to XML for accurate processing.")
 
-        # Set the detected version
+        return detected_version, detection_source
+
+    def _set_detected_version(self, detected_version: Optional[str],
+                              detection_source: Optional[str]) -> bool:
+        """Store the detected version. Returns True if version and message root are known."""
         self.version_info.spec_version = detected_version
 
         # Log version detection with source
@@ -223,6 +344,29 @@ class XmlStreamingParser:
 
         return bool(self.version_info.spec_version and self.version_info.message_root)
 
+    def _extract_version_info(self, element: etree.Element) -> bool:
+        """Extract NDC version info from root element. Returns True if found."""
+        detected_version, detection_source = self._detect_root_version(element)
+
+        # 3. Look for PayloadAttributes/Version element
+        if not detected_version:
+            payload_attrs = element.find('.//PayloadAttributes/Version')
+            if payload_attrs is not None and payload_attrs.text:
+                detected_version = payload_attrs.text.strip()
+                detection_source = "PayloadAttributes/Version"
+
+        # 4. Check for Version element directly under root
+        if not detected_version:
+            version_elem = element.find('./Version')
+            if version_elem is not None and version_elem.text:
+                detected_version = version_elem.text.strip()
+                detection_source = "direct Version element"
+
+        if not detected_version:
+            detected_version, detection_source = self._fallback_version()
+
+        return self._set_detected_version(detected_version, detection_source)
+
     def _extract_airline_info(self, element: etree.Element) -> bool:
         """Extract airline information from root element. Returns True if found."""
 
@@ -288,60 +432,97 @@ class XmlStreamingParser:
         """Build element path from stack."""
         return '/' + '/'.join(element_stack) if element_stack else '/'
 
-    def _is_potential_target_ancestor(self, element_stack: List[str]) -> bool:
+    def _walk_trie_cursors(self, element_stack: List[str]) -> Tuple[List[Optional[PathTrieNode]], int]:
         """
-        Check if current element path is part of or ancestor of any target path.
-        This prevents premature clearing of elements that might be part of target subtrees.
-        """
-        if not element_stack:
-            return False
+        Compute trie cursors for every open element from scratch.
 
-        current_path_parts = [part for part in element_stack if part]
+        Only needed when the target paths change mid-stream; during normal parsing
+        the cursor stack is maintained incrementally.
 
-        for target in self.target_paths:
-            target_path = target.get('path_local', '')
-            if target_path.startswith('/'):
-                target_path = target_path[1:]
-
-            target_parts = target_path.split('/') if target_path else []
-
-            # Case 1: Current path is a prefix of target (ancestor)
-            # Example: /OrderViewRS/Response is ancestor of /OrderViewRS/Response/DataLists/BaggageAllowanceList
-            if len(current_path_parts) <= len(target_parts):
-                is_prefix = all(
-                    current_path_parts[i] == target_parts[i]
-                    for i in range(len(current_path_parts))
-                )
-                if is_prefix:
-                    return True
-
-            # Case 2: Target path is a prefix of current path (child/descendant of target)
-            # Example: /OrderViewRS/Response/DataLists/BaggageAllowanceList/BaggageAllowance
-            # is a child of target /OrderViewRS/Response/DataLists/BaggageAllowanceList
-            if len(target_parts) <= len(current_path_parts):
-                is_child = all(
-                    target_parts[i] == current_path_parts[i]
-                    for i in range(len(target_parts))
-                )
-                if is_child:
-                    return True
+        Returns:
+            Tuple of (cursor per element, number of open target elements)
+        """
+        cursors: List[Optional[PathTrieNode]] = []
+        open_targets = 0
+        node: Optional[PathTrieNode] = self.path_trie
+        for name in element_stack:
+            node = node.children.get(name) if node is not None else None
+            cursors.append(node)
+            if node is not None and node.is_target:
+                open_targets += 1
+        return cursors, open_targets
+
+    def _split_oversized_subtree(self, element: etree.Element, path: str,
+                                 xml_bytes: bytes) -> Optional[XmlSubtree]:
+        """
+        Split a subtree above MAX_SUBTREE_SIZE_KB into batches of its children.
 
-        return False
+        Each batch repeats the container header (tag, attributes, namespaces) and
+        packs consecutive children while staying under the size budget. Children
+        that do not fit a batch on their own are skipped.
 
-    def _element_to_string(self, element: etree.Element) -> str:
-        """Convert element and its subtree to string."""
-        return etree.tostring(element, encoding='unicode', pretty_print=True)
+        Returns:
+            Container subtree with batches, or None if it cannot be split
+        """
+        max_bytes = settings.MAX_SUBTREE_SIZE_KB * 1024
+        children = list(element.iterchildren(tag=etree.Element))
 
-    def _calculate_subtree_size(self, xml_content: str) -> int:
-        """Calculate subtree size in bytes."""
-        return len(xml_content.encode('utf-8'))
+        if not settings.SPLIT_OVERSIZED_SUBTREES or len(children) < 2:
+            logger.warning(f"Subtree too large, skipping: {path} "
+                         f"({len(xml_bytes)} bytes > {max_bytes})")
+            return None
 
-    def _count_nodes(self, element: etree.Element) -> int:
-        """Count total nodes in subtree."""
-        count = 1  # Current element
-        for child in element:
-            count += self._count_nodes(child)
-        return count
+        header_bytes = len(_serialize_element(etree.Element(element.tag, attrib=element.attrib,
+                                                             nsmap=element.nsmap)))
+        namespace_uri = self.version_info.namespace_uri
+
+        def make_batch(members: List[etree.Element], ordinal_offset: int) -> XmlSubtree:
+            container = etree.Element(element.tag, attrib=element.attrib, nsmap=element.nsmap)
+            for child in members:
+                container.append(deepcopy(child))
+            batch = XmlSubtree.from_element(container, path, namespace_uri=namespace_uri)
+            batch.ordinal_offset = ordinal_offset
+            return batch
+
+        batches: List[XmlSubtree] = []
+        members: List[etree.Element] = []
+        members_offset = 0
+        batch_bytes = header_bytes
+
+        for index, child in enumerate(children):
+            # Standalone size repeats namespace declarations, so it over-estimates
+            child_bytes = len(_serialize_element(child))
+            if header_bytes + child_bytes > max_bytes:
+                logger.warning(f"Child {index + 1} of {path} too large for a batch, skipping "
+                             f"({child_bytes} bytes > {max_bytes - header_bytes})")
+                if members:
+                    batches.append(make_batch(members, members_offset))
+                members, batch_bytes = [], header_bytes
+                continue
+
+            if members and batch_bytes + child_bytes > max_bytes:
+                batches.append(make_batch(members, members_offset))
+                members, batch_bytes = [], header_bytes
+
+            if not members:
+                members_offset = index
+            members.append(child)
+            batch_bytes += child_bytes
+
+        if members:
+            batches.append(make_batch(members, members_offset))
+
+        if not batches or len(batches) > settings.MAX_SUBTREE_BATCHES:
+            logger.warning(f"Subtree too large, skipping: {path} "
+                         f"({len(xml_bytes)} bytes, {len(batches)} batches, "
+                         f"max {settings.MAX_SUBTREE_BATCHES})")
+            return None
+
+        subtree = XmlSubtree.from_element(element, path, namespace_uri=namespace_uri, xml_bytes=xml_bytes)
+        subtree.batches = batches
+        logger.info(f"Split oversized subtree {path} ({len(xml_bytes)} bytes, "
+                   f"{len(children)} children) into {len(batches)} batches")
+        return subtree
 
     def parse_stream(self, xml_file_path: str) -> Iterator[XmlSubtree]:
         """
@@ -353,24 +534,40 @@ class XmlStreamingParser:
         Yields:
             XmlSubtree: Target subtrees found during parsing
         """
-        file_path = Path(xml_file_path)
-        if not file_path.exists():
-            raise FileNotFoundError(f"XML file not found: {xml_file_path}")
+        file_size_mb = _validate_xml_file(xml_file_path)
+        logger.info(f"Starting XML stream parsing: {xml_file_path} ({file_size_mb:.1f}MB)")
 
-        file_size_mb = file_path.stat().st_size / (1024 * 1024)
-        if file_size_mb > settings.MAX_XML_SIZE_MB:
-            raise ValueError(f"XML file too large: {file_size_mb:.1f}MB > {settings.MAX_XML_SIZE_MB}MB")
+        yield from self._iter_subtrees(xml_file_path, xml_file_path)
 
-        logger.info(f"Starting XML stream parsing: {xml_file_path} ({file_size_mb:.1f}MB)")
+    def _iter_subtrees(self, source, source_name: str,
+                       sniffer: Optional['NdcHeaderSniffer'] = None) -> Iterator[XmlSubtree]:
+        """
+        Run the iterparse loop over a file path or binary file object.
 
+        Args:
+            source: File path or binary file-like object passed to iterparse
+            source_name: Name used in log and error messages
+            sniffer: Optional header sniffer fed with every event before target
+                     matching. When given, it owns version/airline detection and may
+                     replace the target paths mid-stream.
+
+        Yields:
+            XmlSubtree: Target subtrees found during parsing
+        """
         element_stack: List[str] = []
+        # Trie cursor per open element: the trie node for its path, or None once the
+        # path has left the trie. Target detection and keep-or-clear decisions are
+        # then O(1) per event instead of re-scanning every target path.
+        cursor_stack: List[Optional[PathTrieNode]] = []
+        open_targets = 0  # Open elements that are targets (their descendants must be kept)
+        trie = self.path_trie
         subtrees_found = 0
         version_detected = False
 
         try:
             # Use iterparse for memory-efficient streaming with recovery mode
             # recover=True allows parsing files with trailing garbage/EDIFACT content
-            context = etree.iterparse(xml_file_path, events=('start', 'end'), recover=True)
+            context = etree.iterparse(source, events=('start', 'end'), recover=True)
 
             for event, element in context:
                 if event == 'start':
@@ -382,79 +579,96 @@ class XmlStreamingParser:
 
                     element_stack.append(local_name)
 
-                    # Detect version info from root element
-                    if len(element_stack) == 1 and not version_detected:
+                    if sniffer is not None:
+                        sniffer.on_event(event, element, element_stack)
+                    elif len(element_stack) == 1 and not version_detected:
+                        # Detect version info from root element
                         version_detected = self._extract_version_info(element)
                         # Note: Airline detection happens in detect_ndc_version_fast() before streaming
 
+                    if self.path_trie is not trie:
+                        # Target paths replaced (e.g. by the sniffer) - re-anchor cursors
+                        trie = self.path_trie
+                        cursor_stack, open_targets = self._walk_trie_cursors(element_stack[:-1])
+
+                    parent_cursor = cursor_stack[-1] if cursor_stack else trie
+                    cursor = parent_cursor.children.get(local_name) if parent_cursor is not None else None
+                    cursor_stack.append(cursor)
+                    if cursor is not None and cursor.is_target:
+                        open_targets += 1
+
                 elif event == 'end':
                     if element_stack:
-                        current_path = self._build_element_path(element_stack)
+                        if sniffer is not None:
+                            sniffer.on_event(event, element, element_stack)
+
+                        if self.path_trie is not trie:
+                            trie = self.path_trie
+                            cursor_stack, open_targets = self._walk_trie_cursors(element_stack)
+
+                        cursor = cursor_stack.pop()
 
-                        # Check if current path matches any target
-                        path_parts = [part for part in element_stack if part]
-                        target_info = self.path_trie.match_path(path_parts)
+                        if cursor is not None and cursor.is_target:
+                            open_targets -= 1
+                            current_path = self._build_element_path(element_stack)
 
-                        if target_info:
-                            # Extract subtree
-                            xml_content = self._element_to_string(element)
-                            subtree_size = self._calculate_subtree_size(xml_content)
+                            # Optionally keep one representative per repeated shape
+                            target_element, sampling = element, None
+                            if settings.STRUCTURAL_DEDUP_ENABLED:
+                                sampled = sample_distinct_shapes(element)
+                                if sampled is not None:
+                                    target_element, sampling = sampled
+
+                            # Serialize compactly; stats come from the same pass
+                            xml_bytes = _serialize_element(target_element)
+                            subtree_size = len(xml_bytes)
 
                             # Check size limit
                             if subtree_size <= settings.MAX_SUBTREE_SIZE_KB * 1024:
-                                node_count = self._count_nodes(element)
-
-                                xml_element = XmlElement(
-                                    tag=element.tag,
-                                    text=element.text.strip() if element.text else None,
-                                    attributes=dict(element.attrib),
-                                    path=current_path,
-                                    namespace_uri=self.version_info.namespace_uri
-                                )
-
-                                subtree = XmlSubtree(
-                                    root_element=xml_element,
-                                    xml_content=xml_content,
-                                    size_bytes=subtree_size,
-                                    path=current_path,
-                                    node_count=node_count
+                                subtree = XmlSubtree.from_element(
+                                    target_element, current_path,
+                                    namespace_uri=self.version_info.namespace_uri,
+                                    xml_bytes=xml_bytes
                                 )
+                            else:
+                                subtree = self._split_oversized_subtree(target_element, current_path, xml_bytes)
 
+                            if subtree is not None:
+                                subtree.sampling = sampling
                                 subtrees_found += 1
                                 logger.debug(f"Found target subtree: {current_path} "
-                                           f"({subtree_size} bytes, {node_count} nodes)")
+                                           f"({subtree.size_bytes} bytes, {subtree.node_count} nodes, "
+                                           f"{len(subtree.batches)} batches)")
                                 yield subtree
-                            else:
-                                logger.warning(f"Subtree too large, skipping: {current_path} "
-                                             f"({subtree_size} bytes > {settings.MAX_SUBTREE_SIZE_KB * 1024})")
 
                             # After extracting target, always clear it
                             element.clear()
                             while element.getprevious() is not None:
                                 del element.getparent()[0]
-                        else:
-                            # Check if this element is part of a potential target path
-                            # Only clear if not in a potential target path
-                            should_clear = not self._is_potential_target_ancestor(element_stack)
 
-                            if should_clear:
-                                # Clean up processed element to free memory
-                                element.clear()
-                                while element.getprevious() is not None:
-                                    del element.getparent()[0]
+                        elif cursor is None and open_targets == 0:
+                            # Neither on the way to a target nor inside one:
+                            # clean up processed element to free memory
+                            element.clear()
+                            while element.getprevious() is not None:
+                                del element.getparent()[0]
 
                         # Pop from stack
                         element_stack.pop()
 
         except etree.XMLSyntaxError as e:
-            logger.error(f"❌ XML SYNTAX ERROR in {xml_file_path}")
+            logger.error(f"❌ XML SYNTAX ERROR in {source_name}")
             logger.error(f"   Error: {str(e)}")
             logger.error(f"   Line: {e.lineno if hasattr(e, 'lineno') else 'Unknown'}")
             logger.error(f"   The XML file is malformed or corrupted")
             raise ValueError(f"Invalid XML: {str(e)} at line {e.lineno if hasattr(e, 'lineno') else 'unknown'}")
 
+        except ValueError:
+            # Already a user-facing message (e.g. raised by a target resolver)
+            raise
+
         except Exception as e:
-            logger.error(f"❌ XML PARSING ERROR in {xml_file_path}")
+            logger.error(f"❌ XML PARSING ERROR in {source_name}")
             logger.error(f"   Error type: {type(e).__name__}")
             logger.error(f"   Error message: {str(e)}")
             import traceback
@@ -477,12 +691,299 @@ class XmlStreamingParser:
         return matching_paths
 
 
-def detect_ndc_version_fast(xml_file_path: str) -> Optional[NdcVersionInfo]:
+class _CountingReader:
+    """Binary file wrapper that counts (and optionally hashes) bytes as the parser pulls them."""
+
+    def __init__(self, fileobj: BinaryIO, compute_hash: bool = False):
+        self._fileobj = fileobj
+        self._hasher = hashlib.sha256() if compute_hash else None
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._fileobj.read(size)
+        if self._hasher is not None:
+            self._hasher.update(data)
+        self.bytes_read += len(data)
+        return data
+
+    def drain(self, chunk_size: int = 1024 * 1024):
+        """Read whatever the parser left unread so the hash covers the whole file."""
+        while self.read(chunk_size):
+            pass
+
+    def hexdigest(self) -> Optional[str]:
+        return self._hasher.hexdigest() if self._hasher is not None else None
+
+
+# Airline signals in priority order (the order of the former DOM-based lookup)
+_AIRLINE_SOURCES = (
+    "Order/@Owner",
+    "OwnerCode",
+    "BookingReference/AirlineID",
+    "MarketingCarrierInfo",
+    "OperatingCarrierInfo",
+)
+
+
+class NdcHeaderSniffer:
+    """
+    Incremental NDC version and airline detection from iterparse events.
+
+    Fed with every start/end event (before any element clearing), it fills the
+    parser's NdcVersionInfo without needing a full DOM:
+
+    - Version: root namespace/attributes, else PayloadAttributes/Version or a
+      Version element under the root. Detection falls back to the namespace and
+      message-type defaults once the Response body starts or the stream ends.
+    - Airline: by priority, Order/@Owner (of the first Order), then the first
+      OwnerCode, BookingReference/AirlineID, PaxSegment/MarketingCarrierInfo and
+      PaxSegment/OperatingCarrierInfo. The owner settles the airline at once;
+      lower-priority signals are kept as candidates and settled once no better
+      signal can follow (OwnerCode after an Order without Owner) or in finish().
+
+    Optional callbacks fire once each, version before airline.
+    """
+
+    def __init__(self, parser: XmlStreamingParser,
+                 on_version: Optional[Callable[[NdcVersionInfo], None]] = None,
+                 on_airline: Optional[Callable[[NdcVersionInfo], None]] = None):
+        self.parser = parser
+        self.version_info = parser.version_info
+        self.on_version = on_version
+        self.on_airline = on_airline
+        self.version_resolved = False
+        self.airline_resolved = False
+        self._version_notified = False
+        self._airline_notified = False
+        self._root_version: Tuple[Optional[str], Optional[str]] = (None, None)
+        self._carrier_info: Dict[str, Dict[str, str]] = {}
+        self._order_seen = False
+        # First (code, name, source) seen per _AIRLINE_SOURCES priority
+        self._airline_candidates: Dict[int, Tuple[str, Optional[str], str]] = {}
+
+    @property
+    def is_complete(self) -> bool:
+        """True once both version and airline have been settled."""
+        return self.version_resolved and self.airline_resolved
+
+    def on_event(self, event: str, element: etree.Element, element_stack: List[str]):
+        """Consume one iterparse event. element_stack holds local names, root first."""
+        depth = len(element_stack)
+        local_name = element_stack[-1]
+
+        if event == 'start':
+            if depth == 1:
+                self._root_version = self.parser._detect_root_version(element)
+                if self._root_version[0]:
+                    self.resolve_version(*self._root_version)
+            elif depth == 2 and local_name == 'Response' and not self.version_resolved:
+                # Body started without version info - header is over
+                self.resolve_version()
+
+            if not self.airline_resolved and local_name == 'Order' and not self._order_seen:
+                # Only the first Order counts, as in a document-order search
+                self._order_seen = True
+                owner = element.get('Owner')
+                if owner:
+                    self._add_airline_candidate(owner, None, "Order/@Owner")
+                self._settle_airline()
+
+        else:
+            if not self.version_resolved and local_name == 'Version' and element.text and element.text.strip():
+                if depth > 2 and element_stack[-2] == 'PayloadAttributes':
+                    self.resolve_version(element.text.strip(), "PayloadAttributes/Version")
+                elif depth == 2:
+                    self.resolve_version(element.text.strip(), "direct Version element")
+
+            if not self.airline_resolved:
+                self._sniff_airline(element, element_stack)
+
+        self._notify()
+
+    def _sniff_airline(self, element: etree.Element, element_stack: List[str]):
+        """Check an end event for airline signals."""
+        local_name = element_stack[-1]
+        parent = element_stack[-2] if len(element_stack) > 1 else None
+        text = element.text.strip() if element.text else None
+
+        if local_name == 'OwnerCode' and text:
+            self._add_airline_candidate(text, None, "OwnerCode")
+            self._settle_airline()
+
+        elif local_name == 'AirlineID' and parent == 'BookingReference' and text:
+            self._add_airline_candidate(text, element.get('Name'), "BookingReference/AirlineID")
+
+        elif parent in ('MarketingCarrierInfo', 'OperatingCarrierInfo') and \
+                len(element_stack) > 2 and element_stack[-3] == 'PaxSegment':
+            # Children may be cleared before the carrier element ends, so collect them here
+            if local_name == 'CarrierDesigCode' and text:
+                self._carrier_info.setdefault(parent, {})['code'] = text
+            elif local_name == 'CarrierName' and text:
+                self._carrier_info.setdefault(parent, {})['name'] = text
+
+        elif local_name in ('MarketingCarrierInfo', 'OperatingCarrierInfo') and parent == 'PaxSegment':
+            carrier = self._carrier_info.pop(local_name, {})
+            if carrier.get('code'):
+                self._add_airline_candidate(carrier['code'], carrier.get('name'), local_name)
+
+    def _add_airline_candidate(self, airline_code: str, airline_name: Optional[str], source: str):
+        self._airline_candidates.setdefault(_AIRLINE_SOURCES.index(source), (airline_code, airline_name, source))
+
+    def _settle_airline(self):
+        """Resolve the best candidate if no higher-priority signal can still appear."""
+        if not self._airline_candidates:
+            return
+        best = min(self._airline_candidates)
+        # The owner is final; once the first Order had no owner, so is OwnerCode.
+        # Anything lower could still be outranked later in the document.
+        if best == 0 or (best == 1 and self._order_seen):
+            self._resolve_airline(*self._airline_candidates[best])
+
+    def _resolve_airline(self, airline_code: str, airline_name: Optional[str], source: str):
+        self.version_info.airline_code = airline_code
+        if airline_name:
+            self.version_info.airline_name = airline_name
+        self.airline_resolved = True
+        logger.info(f"Detected airline from {source}: {airline_code} ({airline_name or 'N/A'})")
+
+    def resolve_version(self, detected_version: Optional[str] = None,
+                        detection_source: Optional[str] = None):
+        """Settle the version, applying fallbacks when nothing explicit was seen."""
+        if self.version_resolved:
+            return
+        if not detected_version:
+            detected_version, detection_source = self._root_version
+        if not detected_version:
+            detected_version, detection_source = self.parser._fallback_version()
+        self.parser._set_detected_version(detected_version, detection_source)
+        self.version_resolved = True
+
+    def finish(self):
+        """Settle anything still pending at end of input."""
+        self.resolve_version()
+        if not self.airline_resolved:
+            if self._airline_candidates:
+                self._resolve_airline(*self._airline_candidates[min(self._airline_candidates)])
+            else:
+                logger.warning("No airline information detected in XML")
+                self.airline_resolved = True
+        self._notify()
+
+    def _notify(self):
+        if self.version_resolved and not self._version_notified:
+            self._version_notified = True
+            if self.on_version:
+                self.on_version(self.version_info)
+        if self.airline_resolved and self._version_notified and not self._airline_notified:
+            self._airline_notified = True
+            if self.on_airline:
+                self.on_airline(self.version_info)
+
+
+class XmlIngestPipeline:
     """
-    Fast version detection by parsing only the root element.
+    Single-pass ingest of an NDC XML file.
+
+    One iterparse read computes the file's SHA-256, detects version and airline
+    and yields target subtrees. Because target paths depend on the detected
+    header, they are supplied through callbacks:
+
+    - candidate_targets(version_info): called once version and message root are
+      known; returns every path that may be extracted (e.g. configs of any airline).
+    - resolve_targets(version_info): called once the airline is known (or the
+      document ended without one); returns the final target paths.
+
+    Subtrees that complete before the airline is known are held back and filtered
+    against the final paths, so the output matches a detect-then-parse run.
+    Targets are expected under the message body (Response); header elements that
+    close before the version is settled are not matched.
+    """
+
+    def __init__(self, xml_file_path: str,
+                 candidate_targets: Callable[[NdcVersionInfo], List[Dict]],
+                 resolve_targets: Callable[[NdcVersionInfo], List[Dict]]):
+        self.xml_file_path = xml_file_path
+        self.candidate_targets = candidate_targets
+        self.resolve_targets = resolve_targets
+        self.parser = XmlStreamingParser([])
+        self.sniffer = NdcHeaderSniffer(self.parser,
+                                        on_version=self._on_version,
+                                        on_airline=self._on_airline)
+        self.target_paths: List[Dict] = []
+        self.file_hash: Optional[str] = None
+        self.bytes_read = 0
+        self._final_paths: Optional[Set[str]] = None
+
+    @property
+    def version_info(self) -> NdcVersionInfo:
+        return self.parser.version_info
+
+    def _on_version(self, version_info: NdcVersionInfo):
+        self.target_paths = self.candidate_targets(version_info) or []
+        self.parser.set_target_paths(self.target_paths)
+
+    def _on_airline(self, version_info: NdcVersionInfo):
+        self.target_paths = self.resolve_targets(version_info) or []
+        self.parser.set_target_paths(self.target_paths)
+        self._final_paths = {
+            '/' + target.get('path_local', '').lstrip('/') for target in self.target_paths
+        }
+
+    def _release(self, pending: List[XmlSubtree]) -> Iterator[XmlSubtree]:
+        for subtree in pending:
+            if subtree.path in self._final_paths:
+                yield subtree
+        pending.clear()
+
+    def iter_subtrees(self) -> Iterator[XmlSubtree]:
+        """
+        Stream the file once, yielding final target subtrees.
+
+        file_hash and bytes_read are available once the iterator is exhausted.
+        """
+        file_size_mb = _validate_xml_file(self.xml_file_path)
+        logger.info(f"Starting single-pass ingest: {self.xml_file_path} ({file_size_mb:.1f}MB)")
+
+        pending: List[XmlSubtree] = []
+
+        with open(self.xml_file_path, 'rb') as f:
+            reader = _CountingReader(f, compute_hash=True)
+
+            for subtree in self.parser._iter_subtrees(reader, self.xml_file_path, sniffer=self.sniffer):
+                if self._final_paths is None:
+                    pending.append(subtree)
+                    continue
+                if pending:
+                    yield from self._release(pending)
+                yield subtree
+
+            self.sniffer.finish()
+            reader.drain()
+
+        self.file_hash = reader.hexdigest()
+        self.bytes_read = reader.bytes_read
+
+        if pending:
+            yield from self._release(pending)
+
+        logger.info(f"Completed single-pass ingest: {self.bytes_read} bytes hashed, "
+                   f"version {self.version_info.spec_version}/{self.version_info.message_root}, "
+                   f"airline {self.version_info.airline_code or 'N/A'}")
+
+
+def detect_ndc_version_fast(xml_file_path: str, max_bytes: Optional[int] = None) -> Optional[NdcVersionInfo]:
+    """
+    Fast version detection by sniffing only the document header.
+
+    Streams the file with iterparse, clearing every element as it closes, and
+    stops as soon as version and airline are settled (see NdcHeaderSniffer) or
+    the byte budget is spent. Airline signals follow the sniffer's priority
+    (Order/@Owner first); when the budget runs out, the best candidate seen so
+    far is used. Time and memory stay constant with file size.
 
     Args:
         xml_file_path: Path to XML file
+        max_bytes: Maximum bytes to read (defaults to settings.HEADER_SNIFF_MAX_KB)
 
     Returns:
         NdcVersionInfo if detected, None if detection fails
@@ -491,26 +992,54 @@ def detect_ndc_version_fast(xml_file_path: str) -> Optional[NdcVersionInfo]:
     if not file_path.exists():
         raise FileNotFoundError(f"XML file not found: {xml_file_path}")
 
+    if max_bytes is None:
+        max_bytes = settings.HEADER_SNIFF_MAX_KB * 1024
+
     logger.info(f"Fast version detection: {xml_file_path}")
 
     try:
-        # Parse the XML to get the full tree (needed for airline detection in nested elements)
-        # Use XMLParser with recover=True to handle malformed XML (like unescaped & characters)
-        parser = etree.XMLParser(recover=True)
-        tree = etree.parse(xml_file_path, parser)
-        root_element = tree.getroot()
-
         # Create temporary parser to use existing version detection logic
         temp_parser = XmlStreamingParser([])  # Empty target paths for detection only
-        version_detected = temp_parser._extract_version_info(root_element)
-        # Also extract airline information
-        temp_parser._extract_airline_info(root_element)
-
-        if version_detected:
-            logger.info(f"Fast detection successful: {temp_parser.version_info.spec_version}/"
-                       f"{temp_parser.version_info.message_root} - "
-                       f"Airline: {temp_parser.version_info.airline_code or 'N/A'}")
-            return temp_parser.version_info
+        sniffer = NdcHeaderSniffer(temp_parser)
+        element_stack: List[str] = []
+
+        with open(xml_file_path, 'rb') as f:
+            reader = _CountingReader(f)
+            # recover=True handles malformed XML (like unescaped & characters)
+            context = etree.iterparse(reader, events=('start', 'end'), recover=True)
+
+            for event, element in context:
+                if event == 'start':
+                    local_name = element.tag.split('}')[1] if '}' in element.tag else element.tag
+                    if len(element_stack) == 0 and local_name.startswith('IATA_'):
+                        local_name = local_name[5:]
+                    element_stack.append(local_name)
+                    sniffer.on_event(event, element, element_stack)
+                else:
+                    sniffer.on_event(event, element, element_stack)
+                    # Nothing is kept: the sniffer has already captured what it needs
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+                    element_stack.pop()
+
+                if sniffer.is_complete:
+                    break
+                if reader.bytes_read > max_bytes:
+                    logger.info(f"Header sniff budget reached ({max_bytes} bytes) - "
+                               f"using what was detected so far")
+                    break
+
+            sniffer.finish()
+
+        version_info = temp_parser.version_info
+        logger.debug(f"Header sniff read {reader.bytes_read} bytes of {file_path.stat().st_size}")
+
+        if version_info.spec_version and version_info.message_root:
+            logger.info(f"Fast detection successful: {version_info.spec_version}/"
+                       f"{version_info.message_root} - "
+                       f"Airline: {version_info.airline_code or 'N/A'}")
+            return version_info
         else:
             logger.warning(f"Fast version detection failed for: {xml_file_path}")
             return None
@@ -523,6 +1052,44 @@ def detect_ndc_version_fast(xml_file_path: str) -> Optional[NdcVersionInfo]:
         return None
 
 
+def discover_xml_nodes(xml_file_path: str) -> List[Dict]:
+    """
+    Walk the full XML tree and describe every element (used by /node-configs/analyze).
+
+    Returns:
+        List of dicts with node_type, section_path, has_children, has_attributes
+        and child_count, in document order
+    """
+    parser = etree.XMLParser(recover=True)
+    tree = etree.parse(xml_file_path, parser)
+    root = tree.getroot()
+
+    # Recursively discover all nodes
+    discovered_nodes = []
+
+    def extract_nodes(element, path=""):
+        # Remove namespace
+        tag = element.tag.split('}')[-1] if '}' in element.tag else element.tag
+
+        current_path = f"{path}/{tag}" if path else tag
+
+        # Add this node
+        discovered_nodes.append({
+            "node_type": tag,
+            "section_path": current_path,
+            "has_children": len(element) > 0,
+            "has_attributes": len(element.attrib) > 0,
+            "child_count": len(element)
+        })
+
+        # Recursively process children
+        for child in element:
+            extract_nodes(child, current_path)
+
+    extract_nodes(root)
+    return discovered_nodes
+
+
 def create_parser_for_version(spec_version: str, message_root: str,
                             all_target_paths: List[Dict]) -> XmlStreamingParser:
     """Create parser configured for specific NDC version."""
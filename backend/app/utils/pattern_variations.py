@@ -7,6 +7,9 @@ Supports both legacy single-pattern format and new variations format.
 from typing import Dict, Any, List, Optional
 import logging
 
+from app.services.llm_event_loop import run_on_llm_loop
+from app.services.llm_rate_limiter import get_llm_rate_limiter, prompt_token_estimate
+
 logger = logging.getLogger(__name__)
 
 
@@ -238,27 +241,22 @@ Respond in JSON format:
 
         logger.info(f"Sending variation description prompt to LLM:\n{prompt}")
 
-        # Wrap async call - run in a separate thread to avoid event loop conflicts
-        import asyncio
-        import concurrent.futures
+        estimated_tokens = prompt_token_estimate(prompt, max_tokens=2000)
 
         async def _async_generate():
-            response = await llm_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                response_format={"type": "json_object"}
-            )
+            async with get_llm_rate_limiter().limit(estimated_tokens) as permit:
+                response = await llm_client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.3,
+                    max_tokens=2000,
+                    response_format={"type": "json_object"}
+                )
+                permit.record_usage(response.usage.total_tokens if response.usage else None)
             return response.choices[0].message.content
 
-        def _run_in_thread():
-            """Run async function in a new thread with its own event loop."""
-            return asyncio.run(_async_generate())
-
-        # Run in a thread pool to avoid event loop conflicts
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future = executor.submit(_run_in_thread)
-            result_json = future.result(timeout=30)  # 30 second timeout
+        # The async client is bound to the shared LLM loop, so run the call there
+        result_json = run_on_llm_loop(_async_generate(), timeout=30)
 
         import json
         result = json.loads(result_json)
@@ -0,0 +1 @@
+"""Performance benchmarks for AssistedDiscovery (run from backend/, see parser_benchmark)."""
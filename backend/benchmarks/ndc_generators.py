@@ -0,0 +1,200 @@
+"""
+Synthetic NDC payload generators for parser benchmarks.
+
+Writes OrderViewRS, AirShoppingRS and OrderReshopRS documents of a requested
+size straight to disk (never held in memory), with configurable DataLists
+cardinalities. The bulk of the file is made of the message's repeating body
+element (OrderItem for OrderViewRS, Offer for the shopping/reshop messages),
+which is repeated until the size budget is used up.
+"""
+
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+NDC_NAMESPACE = "http://www.iata.org/IATA/2015/EASD/00/IATA_OffersAndOrdersMessage"
+
+SUPPORTED_MESSAGES = ("OrderViewRS", "AirShoppingRS", "OrderReshopRS")
+
+# Body path (below the root) under which the bulk items are written
+BODY_PATHS = {
+    "OrderViewRS": ["Response", "Order"],
+    "AirShoppingRS": ["Response", "OffersGroup", "CarrierOffers"],
+    "OrderReshopRS": ["Response", "ReshopResults", "ReshopOffers"],
+}
+
+
+@dataclass
+class SyntheticNdcSpec:
+    """Shape of a synthetic NDC document."""
+    message_root: str = "OrderViewRS"
+    target_size_mb: float = 1.0
+    pax_count: int = 9
+    segment_count: int = 4
+    journey_count: int = 2
+    baggage_count: int = 4
+    offer_count: Optional[int] = None  # Body items; None fills up to target_size_mb
+    airline_code: str = "XX"
+    spec_version: str = "21.3"
+
+
+@dataclass
+class SyntheticNdcStats:
+    """What the generator actually wrote."""
+    file_size_bytes: int
+    element_count: int
+    body_items: int
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+class _CountingWriter:
+    """Text writer that tracks bytes and elements written."""
+
+    def __init__(self, handle: TextIO):
+        self.handle = handle
+        self.bytes_written = 0
+        self.element_count = 0
+
+    def write(self, text: str, elements: int = 0):
+        self.handle.write(text)
+        self.bytes_written += len(text.encode('utf-8'))
+        self.element_count += elements
+
+
+def _pax(i: int) -> Tuple[str, int]:
+    return (f"<Pax><PaxID>PAX{i}</PaxID><PTC>ADT</PTC>"
+            f"<Individual><GivenName>GIVEN{i}</GivenName><Surname>SURNAME{i}</Surname></Individual>"
+            f"<ContactInfoRefID>CI{i}</ContactInfoRefID></Pax>"), 7
+
+
+def _segment(i: int, airline_code: str) -> Tuple[str, int]:
+    return (f"<PaxSegment><PaxSegmentID>SEG{i}</PaxSegmentID>"
+            f"<Dep><IATA_LocationCode>AAA</IATA_LocationCode><AircraftScheduledDateTime>2026-01-0{i % 9 + 1}T10:00:00</AircraftScheduledDateTime></Dep>"
+            f"<Arrival><IATA_LocationCode>BBB</IATA_LocationCode><AircraftScheduledDateTime>2026-01-0{i % 9 + 1}T13:00:00</AircraftScheduledDateTime></Arrival>"
+            f"<MarketingCarrierInfo><CarrierDesigCode>{airline_code}</CarrierDesigCode>"
+            f"<MarketingCarrierFlightNumberText>{100 + i}</MarketingCarrierFlightNumberText></MarketingCarrierInfo>"
+            f"</PaxSegment>"), 11
+
+
+def _journey(i: int, segment_count: int) -> Tuple[str, int]:
+    refs = "".join(f"<PaxSegmentRefID>SEG{s}</PaxSegmentRefID>" for s in range(segment_count) if s % 2 == i % 2)
+    return (f"<PaxJourney><PaxJourneyID>PJ{i}</PaxJourneyID>{refs}</PaxJourney>",
+            2 + sum(1 for s in range(segment_count) if s % 2 == i % 2))
+
+
+def _baggage(i: int) -> Tuple[str, int]:
+    return (f"<BaggageAllowance><BaggageAllowanceID>BAG{i}</BaggageAllowanceID>"
+            f"<TypeCode>Checked</TypeCode><PieceAllowance><TotalQty>{i % 3 + 1}</TotalQty></PieceAllowance>"
+            f"</BaggageAllowance>"), 5
+
+
+def _body_item(message_root: str, i: int, spec: SyntheticNdcSpec) -> Tuple[str, int]:
+    pax_ref = f"PAX{i % max(spec.pax_count, 1)}"
+    journey_ref = f"PJ{i % max(spec.journey_count, 1)}"
+    if message_root == "OrderViewRS":
+        return (f"<OrderItem><OrderItemID>OI{i}</OrderItemID>"
+                f"<Price><TotalAmount CurCode=\"USD\">{100 + i}.00</TotalAmount></Price>"
+                f"<Service><ServiceID>SRV{i}</ServiceID><PaxRefID>{pax_ref}</PaxRefID>"
+                f"<ServiceAssociations><PaxJourneyRefID>{journey_ref}</PaxJourneyRefID></ServiceAssociations>"
+                f"</Service></OrderItem>"), 9
+    return (f"<Offer><OfferID>OFF{i}</OfferID><OwnerCode>{spec.airline_code}</OwnerCode>"
+            f"<OfferItem><OfferItemID>OFF{i}-1</OfferItemID>"
+            f"<Price><TotalAmount CurCode=\"USD\">{100 + i}.00</TotalAmount></Price>"
+            f"<Service><ServiceID>SRV{i}</ServiceID><PaxRefID>{pax_ref}</PaxRefID>"
+            f"<OfferServiceAssociation><PaxJourneyRef><PaxJourneyRefID>{journey_ref}</PaxJourneyRefID></PaxJourneyRef></OfferServiceAssociation>"
+            f"</Service></OfferItem></Offer>"), 13
+
+
+def _data_lists(spec: SyntheticNdcSpec) -> List[Tuple[str, Iterator[Tuple[str, int]]]]:
+    """Return (container, items) pairs for the DataLists section."""
+    return [
+        ("PaxList", (_pax(i) for i in range(spec.pax_count))),
+        ("PaxSegmentList", (_segment(i, spec.airline_code) for i in range(spec.segment_count))),
+        ("PaxJourneyList", (_journey(i, spec.segment_count) for i in range(spec.journey_count))),
+        ("BaggageAllowanceList", (_baggage(i) for i in range(spec.baggage_count))),
+    ]
+
+
+def generate_ndc_file(spec: SyntheticNdcSpec, output_path: str) -> SyntheticNdcStats:
+    """
+    Write a synthetic NDC document described by spec to output_path.
+
+    The file never exceeds target_size_mb unless the fixed DataLists alone are
+    larger, or offer_count forces more body items.
+    """
+    if spec.message_root not in SUPPORTED_MESSAGES:
+        raise ValueError(f"Unsupported message root: {spec.message_root}. "
+                         f"Supported: {', '.join(SUPPORTED_MESSAGES)}")
+
+    root_tag = f"IATA_{spec.message_root}"
+    body_path = BODY_PATHS[spec.message_root]
+    target_bytes = int(spec.target_size_mb * 1024 * 1024)
+
+    header = (f'<?xml version="1.0" encoding="UTF-8"?>\n'
+              f'<{root_tag} xmlns="{NDC_NAMESPACE}">'
+              f'<PayloadAttributes><Version>{spec.spec_version}</Version></PayloadAttributes>'
+              f'<Response>')
+    footer = "".join(f"</{tag}>" for tag in reversed(body_path[1:])) + f"</Response></{root_tag}>\n"
+
+    body_items = 0
+
+    with open(output_path, 'w', encoding='utf-8') as handle:
+        writer = _CountingWriter(handle)
+        writer.write(header, elements=4)
+
+        # DataLists come first, as in NDC 21.3 responses
+        writer.write("<DataLists>", elements=1)
+        for container, items in _data_lists(spec):
+            writer.write(f"<{container}>", elements=1)
+            for xml, elements in items:
+                writer.write(xml, elements=elements)
+            writer.write(f"</{container}>")
+        writer.write("</DataLists>")
+
+        # Open body containers (Response is already open)
+        for tag in body_path[1:]:
+            if spec.message_root == "OrderViewRS" and tag == "Order":
+                writer.write(f'<Order Owner="{spec.airline_code}"><OrderID>ORD1</OrderID>', elements=2)
+            else:
+                writer.write(f"<{tag}>", elements=1)
+
+        footer_bytes = len(footer.encode('utf-8'))
+        while spec.offer_count is None or body_items < spec.offer_count:
+            xml, elements = _body_item(spec.message_root, body_items, spec)
+            if spec.offer_count is None and \
+                    writer.bytes_written + len(xml.encode('utf-8')) + footer_bytes > target_bytes:
+                break
+            writer.write(xml, elements=elements)
+            body_items += 1
+
+        writer.write(footer)
+
+    return SyntheticNdcStats(
+        file_size_bytes=writer.bytes_written,
+        element_count=writer.element_count,
+        body_items=body_items
+    )
+
+
+def default_target_paths(message_root: str) -> List[Dict]:
+    """Target paths that mirror a typical node configuration for the message type."""
+    paths = [
+        f"/{message_root}/Response/DataLists/PaxList",
+        f"/{message_root}/Response/DataLists/PaxSegmentList",
+        f"/{message_root}/Response/DataLists/PaxJourneyList",
+        f"/{message_root}/Response/DataLists/BaggageAllowanceList",
+    ]
+    item_tag = "OrderItem" if message_root == "OrderViewRS" else "Offer"
+    paths.append("/" + "/".join([message_root] + BODY_PATHS[message_root] + [item_tag]))
+
+    return [
+        {
+            'id': index,
+            'spec_version': None,
+            'message_root': None,
+            'path_local': path,
+            'extractor_key': 'llm',
+        }
+        for index, path in enumerate(paths)
+    ]
@@ -0,0 +1,261 @@
+"""
+Throughput benchmark for the XML ingest path.
+
+Generates synthetic NDC payloads (see ndc_generators) and measures:
+
+- parse_stream: XmlStreamingParser.parse_stream with typical target paths
+- ingest_pipeline: single-pass XmlIngestPipeline (hash + detection + subtrees)
+- detect_ndc_version_fast: bounded header sniffing
+- full_tree_walk: the /node-configs/analyze walk (discover_xml_nodes)
+
+For each operation it reports seconds, MB/s, elements/s (relative to the whole
+document), peak RSS and subtree/node counts as JSON. Each operation runs in a
+fresh process with the app already imported, so timings and peak RSS growth
+reflect that operation alone.
+
+Usage (from backend/):
+    python -m benchmarks.parser_benchmark --messages OrderViewRS AirShoppingRS \\
+        --sizes 1 10 100 --pax 9 --segments 4 --output results.json
+
+    # Fail (exit 1) if MB/s dropped more than 20% against a previous run
+    python -m benchmarks.parser_benchmark --baseline results.json --max-regression 0.2
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from benchmarks.ndc_generators import (
+    SUPPORTED_MESSAGES,
+    SyntheticNdcSpec,
+    default_target_paths,
+    generate_ndc_file,
+)
+
+OPERATIONS = ("parse_stream", "ingest_pipeline", "detect_ndc_version_fast", "full_tree_walk")
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+def _run_operation(operation: str, xml_path: str, target_paths: List[Dict]) -> Dict:
+    """Run one operation and return its raw count (subtrees, nodes, ...)."""
+    from app.services.xml_parser import (
+        XmlIngestPipeline,
+        XmlStreamingParser,
+        detect_ndc_version_fast,
+        discover_xml_nodes,
+    )
+
+    if operation == "parse_stream":
+        parser = XmlStreamingParser(target_paths)
+        subtrees = 0
+        subtree_bytes = 0
+        for subtree in parser.parse_stream(xml_path):
+            subtrees += 1
+            subtree_bytes += subtree.size_bytes
+        return {'subtrees': subtrees, 'subtree_bytes': subtree_bytes}
+
+    if operation == "ingest_pipeline":
+        pipeline = XmlIngestPipeline(xml_path, lambda info: target_paths, lambda info: target_paths)
+        subtrees = sum(1 for _ in pipeline.iter_subtrees())
+        return {'subtrees': subtrees, 'file_hash': pipeline.file_hash}
+
+    if operation == "detect_ndc_version_fast":
+        version_info = detect_ndc_version_fast(xml_path)
+        return {
+            'spec_version': version_info.spec_version if version_info else None,
+            'message_root': version_info.message_root if version_info else None,
+            'airline_code': version_info.airline_code if version_info else None,
+        }
+
+    if operation == "full_tree_walk":
+        return {'nodes': len(discover_xml_nodes(xml_path))}
+
+    raise ValueError(f"Unknown operation: {operation}")
+
+
+def measure_operation(operation: str, xml_path: str, target_paths: List[Dict],
+                      file_size_bytes: int, element_count: int) -> Dict:
+    """Time one operation and collect throughput and memory figures."""
+    # Each isolated run is a fresh process: load the app (config, pydantic, lxml)
+    # before the clock and the RSS baseline, so only the operation is measured
+    import app.services.xml_parser  # noqa: F401
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    counts = _run_operation(operation, xml_path, target_paths)
+    seconds = time.perf_counter() - start
+    rss_after = _peak_rss_mb()
+
+    size_mb = file_size_bytes / (1024 * 1024)
+    return {
+        'seconds': round(seconds, 4),
+        'mb_per_s': round(size_mb / seconds, 2) if seconds > 0 else None,
+        'elements_per_s': int(element_count / seconds) if seconds > 0 else None,
+        # Peak RSS growth during the operation, on top of the loaded app
+        'peak_rss_mb': round(rss_after - rss_before, 1) if rss_before is not None else None,
+        'baseline_rss_mb': rss_before,
+        **counts
+    }
+
+
+def _measure_isolated(operation: str, xml_path: str, target_paths: List[Dict],
+                      file_size_bytes: int, element_count: int) -> Dict:
+    """Run measure_operation in a fresh process so peak RSS is not shared."""
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes=1, maxtasksperchild=1) as pool:
+        return pool.apply(measure_operation,
+                          (operation, xml_path, target_paths, file_size_bytes, element_count))
+
+
+def run_benchmarks(messages: List[str], sizes_mb: List[float], pax_count: int = 9,
+                   segment_count: int = 4, journey_count: int = 2, baggage_count: int = 4,
+                   offer_count: Optional[int] = None, operations: List[str] = OPERATIONS,
+                   isolate: bool = True, work_dir: Optional[str] = None) -> Dict:
+    """
+    Generate one document per (message, size) and measure every operation on it.
+
+    Returns:
+        Report dict with environment info and one entry per case
+    """
+    from lxml import etree
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'lxml': ".".join(str(part) for part in etree.LXML_VERSION),
+            'platform': platform.platform(),
+        },
+        'cases': []
+    }
+
+    measure = _measure_isolated if isolate else measure_operation
+
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmp_dir:
+        for message_root in messages:
+            for size_mb in sizes_mb:
+                spec = SyntheticNdcSpec(
+                    message_root=message_root,
+                    target_size_mb=size_mb,
+                    pax_count=pax_count,
+                    segment_count=segment_count,
+                    journey_count=journey_count,
+                    baggage_count=baggage_count,
+                    offer_count=offer_count,
+                )
+                xml_path = os.path.join(tmp_dir, f"{message_root}_{size_mb}MB.xml")
+                stats = generate_ndc_file(spec, xml_path)
+                target_paths = default_target_paths(message_root)
+
+                case = {
+                    'case': f"{message_root}/{size_mb}MB",
+                    'spec': spec.__dict__.copy(),
+                    'file': stats.to_dict(),
+                    'operations': {}
+                }
+                for operation in operations:
+                    case['operations'][operation] = measure(
+                        operation, xml_path, target_paths,
+                        stats.file_size_bytes, stats.element_count
+                    )
+                report['cases'].append(case)
+                os.unlink(xml_path)
+
+    return report
+
+
+def compare_reports(baseline: Dict, current: Dict, max_regression: float) -> List[str]:
+    """
+    Compare MB/s per (case, operation) against a baseline report.
+
+    Returns:
+        Human-readable regression messages (empty if none exceed max_regression)
+    """
+    baseline_cases = {case['case']: case for case in baseline.get('cases', [])}
+    regressions = []
+
+    for case in current.get('cases', []):
+        previous = baseline_cases.get(case['case'])
+        if not previous:
+            continue
+        for operation, result in case['operations'].items():
+            old = previous['operations'].get(operation, {}).get('mb_per_s')
+            new = result.get('mb_per_s')
+            if old and new and new < old * (1 - max_regression):
+                regressions.append(f"{case['case']} {operation}: {old} -> {new} MB/s "
+                                   f"({(1 - new / old) * 100:.0f}% slower)")
+
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the XML ingest path on synthetic NDC payloads")
+    parser.add_argument("--messages", nargs="+", default=list(SUPPORTED_MESSAGES), choices=SUPPORTED_MESSAGES)
+    parser.add_argument("--sizes", nargs="+", type=float, default=[1.0, 10.0], help="Document sizes in MB")
+    parser.add_argument("--pax", type=int, default=9, help="PaxList cardinality")
+    parser.add_argument("--segments", type=int, default=4, help="PaxSegmentList cardinality")
+    parser.add_argument("--journeys", type=int, default=2, help="PaxJourneyList cardinality")
+    parser.add_argument("--baggage", type=int, default=4, help="BaggageAllowanceList cardinality")
+    parser.add_argument("--offers", type=int, default=None,
+                        help="Fixed number of body items (Offer/OrderItem); default fills the size")
+    parser.add_argument("--operations", nargs="+", default=list(OPERATIONS), choices=OPERATIONS)
+    parser.add_argument("--in-process", action="store_true",
+                        help="Run operations in this process (faster, but peak RSS is cumulative)")
+    parser.add_argument("--output", help="Write JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="Previous JSON report to compare MB/s against")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed MB/s drop against the baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        messages=args.messages,
+        sizes_mb=args.sizes,
+        pax_count=args.pax,
+        segment_count=args.segments,
+        journey_count=args.journeys,
+        baggage_count=args.baggage,
+        offer_count=args.offers,
+        operations=args.operations,
+        isolate=not args.in_process,
+    )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_reports(json.load(f), report, args.max_regression)
+        for message in regressions:
+            print(f"REGRESSION: {message}", file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
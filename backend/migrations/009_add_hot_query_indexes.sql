@@ -0,0 +1,19 @@
+-- Migration 009: Secondary indexes for discovery, gap-analysis and conflict-detection queries
+-- Workspace SQLite databases get these automatically on startup (WorkspaceSessionFactory._ensure_indexes)
+
+-- NodeFacts are read per run (optionally per section) and grouped by message type
+CREATE INDEX IF NOT EXISTS ix_node_facts_run_section ON node_facts (run_id, section_path);
+CREATE INDEX IF NOT EXISTS ix_node_facts_message_version ON node_facts (message_root, spec_version);
+
+-- Relationships are read per source NodeFact during matching and per run/section during pattern generation
+CREATE INDEX IF NOT EXISTS ix_node_relationships_source ON node_relationships (source_node_fact_id);
+CREATE INDEX IF NOT EXISTS ix_node_relationships_target ON node_relationships (target_node_fact_id);
+CREATE INDEX IF NOT EXISTS ix_node_relationships_run_source_section ON node_relationships (run_id, source_section_path);
+
+-- Active pattern lookup: message_root + spec_version (+ airline) with superseded_by IS NULL
+CREATE INDEX IF NOT EXISTS ix_patterns_lookup ON patterns (message_root, spec_version, airline_code, superseded_by);
+
+-- Pattern matches are listed per run (optionally per verdict) and joined to NodeFacts/Patterns
+CREATE INDEX IF NOT EXISTS ix_pattern_matches_run_verdict ON pattern_matches (run_id, verdict);
+CREATE INDEX IF NOT EXISTS ix_pattern_matches_node_fact ON pattern_matches (node_fact_id);
+CREATE INDEX IF NOT EXISTS ix_pattern_matches_pattern ON pattern_matches (pattern_id);
@@ -0,0 +1,30 @@
+"""
+Shared fixtures for unit tests.
+"""
+import pytest
+
+from app.services import workspace_db
+from app.services.workspace_db import WorkspaceSessionFactory
+
+
+@pytest.fixture
+def tmp_workspace(tmp_path, monkeypatch):
+    """
+    Workspace session factory whose SQLite database lives in tmp_path.
+
+    The factory is registered like a real workspace, so code that looks it up
+    by name (get_workspace_session_factory(tmp_workspace.workspace_name)) gets it.
+    """
+    monkeypatch.setattr(WorkspaceSessionFactory, '_get_db_dir', lambda self: tmp_path)
+    factory = workspace_db.get_workspace_session_factory("unit_test")
+    yield factory
+    workspace_db._workspace_factories.pop(factory.workspace_name, None)
+    factory.dispose()
+
+
+@pytest.fixture
+def tmp_workspace_session(tmp_workspace):
+    """Read-write session on the tmp_workspace database."""
+    session = tmp_workspace.get_session()
+    yield session
+    session.close()
@@ -0,0 +1,77 @@
+"""
+Unit tests for the parser benchmark suite.
+
+Tests that synthetic NDC payloads are realistic enough for the parser
+(version/airline detection, target matching) and that the benchmark
+report has the expected shape.
+"""
+import os
+import tempfile
+
+import pytest
+
+from app.services.xml_parser import XmlStreamingParser, detect_ndc_version_fast
+from benchmarks.ndc_generators import SyntheticNdcSpec, default_target_paths, generate_ndc_file
+from benchmarks.parser_benchmark import compare_reports, run_benchmarks
+
+
+class TestNdcGenerators:
+    """Test suite for synthetic NDC generators."""
+
+    @pytest.mark.parametrize("message_root", ["OrderViewRS", "AirShoppingRS", "OrderReshopRS"])
+    def test_generated_file_is_detected_and_parsed(self, message_root):
+        """Test generated documents are detected and yield the configured cardinalities."""
+        spec = SyntheticNdcSpec(message_root=message_root, pax_count=3, segment_count=2, offer_count=5)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "sample.xml")
+            stats = generate_ndc_file(spec, path)
+
+            assert stats.body_items == 5
+            assert stats.file_size_bytes == os.path.getsize(path)
+
+            version_info = detect_ndc_version_fast(path)
+            assert version_info.spec_version == "21.3"
+            assert version_info.message_root == message_root
+            assert version_info.airline_code == "XX"
+
+            parser = XmlStreamingParser(default_target_paths(message_root))
+            subtrees = list(parser.parse_stream(path))
+
+        # 4 DataLists containers + 5 body items
+        assert len(subtrees) == 9
+        pax_list = next(s for s in subtrees if s.path.endswith("PaxList"))
+        assert pax_list.node_count == 1 + 3 * 7
+
+    def test_size_budget_is_respected(self):
+        """Test filling up to target size never exceeds it."""
+        spec = SyntheticNdcSpec(message_root="AirShoppingRS", target_size_mb=0.05)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            stats = generate_ndc_file(spec, os.path.join(tmp_dir, "sample.xml"))
+
+        assert stats.file_size_bytes <= 0.05 * 1024 * 1024
+        assert stats.body_items > 0
+
+
+class TestParserBenchmark:
+    """Test suite for the benchmark runner."""
+
+    def test_report_shape(self):
+        """Test an in-process run reports throughput, memory and counts."""
+        report = run_benchmarks(["OrderViewRS"], [0.05], isolate=False)
+
+        assert len(report['cases']) == 1
+        operations = report['cases'][0]['operations']
+        assert set(operations) == {"parse_stream", "ingest_pipeline", "detect_ndc_version_fast", "full_tree_walk"}
+        assert operations['parse_stream']['subtrees'] == 4 + report['cases'][0]['file']['body_items']
+        assert operations['full_tree_walk']['nodes'] == report['cases'][0]['file']['element_count']
+        assert operations['parse_stream']['mb_per_s'] > 0
+
+    def test_compare_reports_flags_regressions(self):
+        """Test MB/s drops beyond the threshold are reported."""
+        baseline = {'cases': [{'case': 'A', 'operations': {'parse_stream': {'mb_per_s': 10.0}}}]}
+        current = {'cases': [{'case': 'A', 'operations': {'parse_stream': {'mb_per_s': 7.0}}}]}
+
+        assert len(compare_reports(baseline, current, max_regression=0.2)) == 1
+        assert compare_reports(baseline, current, max_regression=0.5) == []
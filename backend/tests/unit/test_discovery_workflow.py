@@ -0,0 +1,194 @@
+"""
+Unit tests for the Discovery (identify) workflow.
+
+Tests cover:
+- Relationships prefetched once per run instead of once per NodeFact
+- Matched patterns fetched in bulk for gap analysis
+- Batch identify: shared pattern index, per-file runs, aggregation, progress
+"""
+import hashlib
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from app.models.database import NodeFact, NodeRelationship, Pattern, Run, RunKind
+from app.services.discovery_workflow import DiscoveryWorkflow
+from app.services.pattern_extractor_workflow import PatternExtractorWorkflow
+
+XML = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<IATA_OrderViewRS xmlns="http://www.iata.org/IATA/2015/00/2021.3/IATA_OrderViewRS">'
+    '<PayloadAttributes><VersionNumber>21.3</VersionNumber></PayloadAttributes>'
+    '<Response><Order><OwnerCode>SQ</OwnerCode></Order></Response>'
+    '</IATA_OrderViewRS>'
+)
+PAX_LIST_PATH = "/OrderViewRS/Response/DataLists/PaxList"
+
+
+class _QueryRecorder:
+    """Records SQL statements executed on an engine."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+    def count(self, fragment):
+        return sum(1 for statement in self.statements if fragment in statement)
+
+
+@pytest.fixture
+def session(tmp_workspace_session):
+    return tmp_workspace_session
+
+
+def _store_run(session, run_id):
+    """Store a run with five PaxList NodeFacts, three of them with a relationship (one broken)."""
+    session.add(Run(id=run_id, kind=RunKind.PATTERN_EXTRACTOR, metadata_json={}))
+    facts = [
+        NodeFact(run_id=run_id, spec_version='21.3', message_root='OrderViewRS',
+                 section_path=PAX_LIST_PATH, node_type='PaxList', node_ordinal=i + 1,
+                 fact_json={'node_type': 'PaxList', 'attributes': {'PaxID': f'P{i}'}})
+        for i in range(5)
+    ]
+    session.add_all(facts)
+    session.flush()
+    session.add_all([
+        NodeRelationship(run_id=run_id, source_node_fact_id=fact.id, source_node_type='PaxList',
+                         source_section_path=PAX_LIST_PATH, target_node_fact_id=None,
+                         target_node_type='Segment', target_section_path='/Segments',
+                         reference_type='segment_reference', is_valid=(i % 2 == 0))
+        for i, fact in enumerate(facts[:3])
+    ])
+    session.commit()
+    return {'run_id': run_id, 'node_facts_extracted': len(facts),
+            'started_at': datetime.utcnow().isoformat()}
+
+
+@pytest.fixture
+def patterns(session):
+    session.add_all([
+        Pattern(
+            spec_version="21.3", message_root="OrderViewRS", airline_code="SQ",
+            section_path=PAX_LIST_PATH, selector_xpath=PAX_LIST_PATH,
+            decision_rule={'node_type': 'PaxList', 'must_have_attributes': ['PaxID']},
+            signature_hash=hashlib.sha256(b"pax").hexdigest()
+        ),
+        Pattern(
+            spec_version="21.3", message_root="OrderViewRS", airline_code="SQ",
+            section_path="/OrderViewRS/Response/DataLists/SegmentList",
+            selector_xpath="/OrderViewRS/Response/DataLists/SegmentList",
+            decision_rule={'node_type': 'SegmentList'},
+            signature_hash=hashlib.sha256(b"segment").hexdigest()
+        ),
+    ])
+    session.commit()
+
+
+@pytest.fixture
+def workflow(session, patterns, tmp_path, monkeypatch):
+    """DiscoveryWorkflow whose extraction phase stores pre-built NodeFacts."""
+
+    def fake_discovery(xml_file_path, skip_pattern_generation=False, **kwargs):
+        return _store_run(session, 'run-1')
+
+    workflow = DiscoveryWorkflow(session)
+    monkeypatch.setattr(workflow.pattern_extractor, 'run_discovery', fake_discovery)
+
+    xml_path = tmp_path / "order_view.xml"
+    xml_path.write_text(XML)
+    workflow.xml_path = str(xml_path)
+    return workflow
+
+
+class TestIdentifyPrefetch:
+    """Test suite for the bulk loads in run_identify."""
+
+    def test_relationships_loaded_once_per_run(self, workflow, session):
+        with _QueryRecorder(session.bind) as recorder:
+            results = workflow.run_identify(workflow.xml_path)
+
+        assert results['node_facts_extracted'] == 5
+        assert recorder.count("FROM node_relationships") == 1
+
+    def test_matched_patterns_fetched_in_bulk(self, workflow, session):
+        with _QueryRecorder(session.bind) as recorder:
+            results = workflow.run_identify(workflow.xml_path)
+
+        matched_ids = {m['best_match']['pattern_id'] for m in results['matches'] if m.get('best_match')}
+        assert len(matched_ids) == 1
+        assert recorder.count("FROM patterns \nWHERE patterns.id = ") == 0
+        assert recorder.count("FROM patterns \nWHERE patterns.id IN ") == 1
+        # The PaxList pattern was matched, so only SegmentList is reported missing
+        assert [p['node_type'] for p in results['gap_analysis']['missing_patterns']] == ['SegmentList']
+
+    def test_prefetched_relationships_feed_matching(self, workflow, session):
+        results = workflow.run_identify(workflow.xml_path)
+
+        confidences = [m['best_match']['confidence'] for m in results['matches']]
+        # Facts with a broken relationship are penalized exactly as with per-fact queries
+        assert sorted(confidences) == pytest.approx([0.7, 1.0, 1.0, 1.0, 1.0])
+
+
+class TestIdentifyBatch:
+    """Test suite for run_identify_batch."""
+
+    @pytest.fixture
+    def xml_paths(self, session, patterns, tmp_path, monkeypatch):
+        def fake_discovery(self, xml_file_path, skip_pattern_generation=False, **kwargs):
+            return _store_run(self.db_session, str(uuid.uuid4()))
+
+        monkeypatch.setattr(PatternExtractorWorkflow, 'run_discovery', fake_discovery)
+
+        paths = []
+        for i in range(3):
+            path = tmp_path / f"order_view_{i}.xml"
+            path.write_text(XML)
+            paths.append(str(path))
+        return paths
+
+    def test_files_run_separately_and_aggregate(self, session, xml_paths, tmp_path):
+        progress = []
+        paths = xml_paths + [str(tmp_path / "missing.xml")]
+
+        results = DiscoveryWorkflow(session).run_identify_batch(paths, max_workers=2, progress_callback=progress.append)
+
+        files = results['files']
+        assert [f['filename'] for f in files] == ["order_view_0.xml", "order_view_1.xml", "order_view_2.xml", "missing.xml"]
+        assert [f['status'] for f in files] == ['completed'] * 3 + ['failed']
+        assert "XML file not found" in files[3]['error_details']
+        assert len({f['run_id'] for f in files[:3]}) == 3
+        assert results['status'] == 'partial_failure'
+
+        summary = results['summary']
+        assert summary['completed_files'] == 3 and summary['failed_files'] == 1
+        assert summary['total_node_facts'] == 15
+        assert summary['matched_facts'] == 15
+        assert summary['missing_patterns'] == [{
+            'message_root': 'OrderViewRS', 'node_type': 'SegmentList',
+            'section_path': '/OrderViewRS/Response/DataLists/SegmentList', 'files': 3
+        }]
+
+        assert [p['completed'] for p in progress] == [1, 2, 3, 4]
+        assert all(p['total'] == 4 for p in progress)
+
+    def test_times_seen_counts_every_file(self, session, xml_paths):
+        pax_pattern = session.query(Pattern).filter(Pattern.section_path == PAX_LIST_PATH).one()
+        times_seen = pax_pattern.times_seen
+
+        DiscoveryWorkflow(session).run_identify_batch(xml_paths, max_workers=3)
+
+        session.refresh(pax_pattern)
+        # Four high confidence matches per file, none lost to concurrent commits
+        assert pax_pattern.times_seen == times_seen + 12
@@ -0,0 +1,181 @@
+"""
+Unit tests for the content-addressed LLM response cache.
+
+Tests:
+- Canonical subtree hashing
+- Get/put, LRU eviction and hit/miss counters
+- Cache hits skip the LLM call in LLMNodeFactsExtractor
+"""
+import asyncio
+import json
+import tempfile
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.services.llm_cache import LLMResponseCache, canonical_subtree_hash
+from app.services.xml_parser import XmlSubtree
+
+
+class TestCanonicalSubtreeHash:
+    """Test suite for canonical_subtree_hash."""
+
+    def test_formatting_does_not_change_hash(self):
+        """Test whitespace and attribute order are normalized."""
+        compact = '<Pax a="1" b="2"><PaxID>P1</PaxID></Pax>'
+        pretty = '<Pax b="2" a="1">\n    <PaxID>P1</PaxID>\n</Pax>'
+        assert canonical_subtree_hash(compact) == canonical_subtree_hash(pretty)
+
+    def test_content_changes_hash(self):
+        """Test different values produce different keys."""
+        assert canonical_subtree_hash('<Pax>P1</Pax>') != canonical_subtree_hash('<Pax>P2</Pax>')
+
+
+class TestLLMResponseCache:
+    """Test suite for LLMResponseCache."""
+
+    def test_get_put_and_counters(self):
+        """Test round trip and hit/miss accounting."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = LLMResponseCache(Path(tmp_dir) / "ws.llm_cache.sqlite", max_entries=10)
+            key = cache.make_key("gpt", "v1", "/A", "hash")
+
+            assert cache.get(key) is None
+            cache.put(key, {"content": "[]", "tokens_used": 5})
+            assert cache.get(key) == {"content": "[]", "tokens_used": 5}
+
+            stats = cache.stats()
+            assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+            cache.close()
+
+    def test_lru_eviction(self):
+        """Test least-recently-used entries are evicted above max_entries."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = LLMResponseCache(Path(tmp_dir) / "ws.llm_cache.sqlite", max_entries=2)
+            cache.put("a", {"v": 1})
+            cache.put("b", {"v": 2})
+            cache.get("a")  # a is now more recent than b
+            cache.put("c", {"v": 3})
+
+            assert cache.get("b") is None
+            assert cache.get("a") == {"v": 1}
+            assert cache.get("c") == {"v": 3}
+            assert cache.entry_count() == 2
+            cache.close()
+
+    def test_for_session_uses_workspace_file(self):
+        """Test the cache file sits next to the workspace database."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            engine = create_engine(f"sqlite:///{tmp_dir}/SQ.db")
+            session = sessionmaker(bind=engine)()
+
+            cache = LLMResponseCache.for_session(session)
+
+            assert cache.cache_path == Path(tmp_dir) / "SQ.llm_cache.sqlite"
+            cache.close()
+            session.close()
+
+            in_memory = sessionmaker(bind=create_engine("sqlite:///:memory:"))()
+            assert LLMResponseCache.for_session(in_memory) is None
+
+
+class TestExtractorCaching:
+    """Test suite for cache use in LLMNodeFactsExtractor."""
+
+    def test_cache_hit_skips_llm_call(self):
+        """Test identical subtrees are served from the cache."""
+        from app.services.llm_extractor import LLMNodeFactsExtractor
+
+        calls = []
+
+        async def fake_call_llm(prompt):
+            calls.append(prompt)
+            return {
+                "content": json.dumps([{"node_type": "Pax", "node_ordinal": 1, "attributes": {}}]),
+                "tokens_used": 42,
+                "processing_time_ms": 1,
+                "model": "test-model",
+                "finish_reason": "stop"
+            }
+
+        extractor = LLMNodeFactsExtractor.__new__(LLMNodeFactsExtractor)
+        extractor.client = object()
+        extractor.model = "test-model"
+        extractor.prompt_version = "v1"
+        extractor._call_llm = fake_call_llm
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = LLMResponseCache(Path(tmp_dir) / "ws.llm_cache.sqlite")
+            context = {'llm_cache': cache}
+
+            first = asyncio.run(extractor.extract_from_subtree(
+                XmlSubtree.from_xml('<Pax><PaxID>P1</PaxID></Pax>', "/Pax"), context))
+            second = asyncio.run(extractor.extract_from_subtree(
+                XmlSubtree.from_xml('<Pax>\n  <PaxID>P1</PaxID>\n</Pax>', "/Pax"), context))
+            cache.close()
+
+        assert len(calls) == 1
+        assert first.tokens_used == 42 and first.extraction_method == "llm"
+        assert second.tokens_used == 0 and second.extraction_method == "llm_cached"
+        assert [f['node_type'] for f in second.node_facts] == ["Pax"]
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_cache_stores_masked_facts_only(self):
+        """Test raw (unmasked) attribute values never reach llm_cache.response_json."""
+        import sqlite3
+        from app.services.llm_extractor import LLMNodeFactsExtractor
+
+        email, passport = "jane.doe@example.com", "AB1234567"
+
+        async def fake_call_llm(prompt):
+            return {
+                "content": json.dumps([{
+                    "node_type": "Pax",
+                    "node_ordinal": 1,
+                    "attributes": {"email": email},
+                    "children": [{"node_type": "IdentityDoc", "attributes": {"doc_id": passport}}]
+                }]),
+                "tokens_used": 42,
+                "processing_time_ms": 1,
+                "model": "test-model",
+                "finish_reason": "stop"
+            }
+
+        extractor = LLMNodeFactsExtractor.__new__(LLMNodeFactsExtractor)
+        extractor.client = object()
+        extractor.model = "test-model"
+        extractor.prompt_version = "v1"
+        extractor._call_llm = fake_call_llm
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir) / "ws.llm_cache.sqlite"
+            cache = LLMResponseCache(cache_path)
+            asyncio.run(extractor.extract_from_subtree(
+                XmlSubtree.from_xml('<Pax><PaxID>P1</PaxID></Pax>', "/Pax"), {'llm_cache': cache}))
+            cache.close()
+
+            conn = sqlite3.connect(str(cache_path))
+            stored = [row[0] for row in conn.execute("SELECT response_json FROM llm_cache")]
+            conn.close()
+
+        assert len(stored) == 1
+        assert email not in stored[0] and passport not in stored[0]
+
+    def test_legacy_entries_dropped_on_open(self):
+        """Test entries written before the masked-facts format are purged."""
+        import sqlite3
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = Path(tmp_dir) / "ws.llm_cache.sqlite"
+            cache = LLMResponseCache(cache_path)
+            cache.put("legacy", {"content": "raw"})
+            cache.close()
+            conn = sqlite3.connect(str(cache_path))
+            conn.execute("PRAGMA user_version = 0")
+            conn.commit()
+            conn.close()
+
+            reopened = LLMResponseCache(cache_path)
+            assert reopened.entry_count() == 0
+            reopened.close()
@@ -0,0 +1,228 @@
+"""
+Unit tests for the shared LLM rate limiter.
+
+Tests cover:
+- Token estimation and retry-after parsing
+- RPM/TPM token buckets
+- AIMD concurrency window on success, 429 and other failures
+- Permit context managers (sync and async)
+"""
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app.services.llm_rate_limiter import (
+    LLMRateLimiter,
+    estimate_tokens,
+    prompt_token_estimate,
+    retry_after_seconds
+)
+
+
+def _rate_limit_error(headers=None, message="Rate limit reached"):
+    response = httpx.Response(429, headers=headers or {}, request=httpx.Request("POST", "http://llm.test"))
+    return openai.RateLimitError(message, response=response, body=None)
+
+
+class TestEstimates:
+    """Test suite for token estimates and retry-after parsing."""
+
+    def test_estimate_tokens(self):
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("a" * 300) == 101
+
+    def test_prompt_token_estimate_includes_completion_budget(self):
+        assert prompt_token_estimate("a" * 30, "b" * 30, max_tokens=100) == 11 + 11 + 100
+
+    def test_retry_after_headers(self):
+        assert retry_after_seconds(_rate_limit_error({'retry-after-ms': '1500'})) == 1.5
+        assert retry_after_seconds(_rate_limit_error({'retry-after': '7'})) == 7.0
+
+    def test_retry_after_from_message(self):
+        error = _rate_limit_error(message="Please try again in 20 seconds.")
+        assert retry_after_seconds(error) == 20.0
+
+    def test_retry_after_missing(self):
+        assert retry_after_seconds(_rate_limit_error()) is None
+
+
+class TestTokenBuckets:
+    """Test suite for RPM/TPM budgets."""
+
+    def test_requests_per_minute_budget(self):
+        # 60 RPM -> 1 request/s with a 10 second burst
+        limiter = LLMRateLimiter(requests_per_minute=60, tokens_per_minute=0, max_concurrency=100)
+
+        for _ in range(10):
+            assert limiter._try_acquire(1) == 0
+
+        wait = limiter._try_acquire(1)
+        assert 0.5 < wait <= 1.0
+
+    def test_tokens_per_minute_budget(self):
+        # 6000 TPM -> 100 tokens/s with a 1000 token burst
+        limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=6000, max_concurrency=100)
+
+        assert limiter._try_acquire(800) == 0
+        wait = limiter._try_acquire(800)
+        assert 5.0 < wait <= 6.0
+
+    def test_actual_usage_refunds_estimate(self):
+        limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=6000, max_concurrency=100)
+
+        assert limiter._try_acquire(800) == 0
+        limiter.release(estimated_tokens=800, actual_tokens=100)
+
+        assert limiter._try_acquire(800) == 0
+
+    def test_oversized_request_waits_for_full_bucket(self):
+        limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=6000, max_concurrency=100)
+
+        assert limiter._try_acquire(50000) == 0
+
+
+class TestAdaptiveConcurrency:
+    """Test suite for the AIMD concurrency window."""
+
+    def test_concurrency_window_blocks(self):
+        limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=0, max_concurrency=2)
+
+        assert limiter._try_acquire(1) == 0
+        assert limiter._try_acquire(1) == 0
+        assert limiter._try_acquire(1) > 0
+
+        limiter.release(estimated_tokens=1)
+        assert limiter._try_acquire(1) == 0
+
+    def test_rate_limit_halves_window_once_per_event(self):
+        limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=0, max_concurrency=16)
+        for _ in range(8):
+            limiter._try_acquire(1)
+
+        # A burst of 429s from the same congestion event
+        for _ in range(4):
+            limiter.release(estimated_tokens=1, rate_limited=True, retry_after=2.0)
+
+        assert int(limiter.concurrency_limit) == 8
+        assert limiter.stats()['rate_limited'] == 4
+
+    def test_rate_limit_pauses_all_callers(self):
+        limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=0, max_concurrency=16)
+        limiter._try_acquire(1)
+        limiter.release(estimated_tokens=1, rate_limited=True, retry_after=5.0)
+
+        wait = limiter._try_acquire(1)
+        assert 4.0 < wait <= 5.0
+
+    def test_success_increases_window_additively(self):
+        limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=0, max_concurrency=16)
+        limiter.concurrency_limit = 4.0
+
+        for _ in range(4):
+            limiter._try_acquire(1)
+            limiter.release(estimated_tokens=1)
+
+        assert 4.8 < limiter.concurrency_limit < 5.0
+
+    def test_failures_do_not_grow_window(self):
+        limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=600, max_concurrency=16)
+        limiter.concurrency_limit = 4.0
+
+        for _ in range(4):
+            limiter._try_acquire(10)
+            limiter.release(estimated_tokens=10, actual_tokens=1, failed=True)
+
+        assert limiter.concurrency_limit == 4.0
+        # Estimates of failed calls are not refunded
+        assert limiter._tokens.tokens < limiter._tokens.capacity - 39
+        assert limiter.stats()['failed'] == 4
+
+    def test_throttled_time_counted_under_contention(self):
+        limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=0, max_concurrency=1)
+        limiter._try_acquire(1)
+
+        assert limiter._try_acquire(1) > 0
+        assert limiter.stats()['throttled_seconds'] > 0
+
+    def test_window_respects_bounds(self):
+        limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=0,
+                                 max_concurrency=4, min_concurrency=2)
+        for _ in range(10):
+            limiter._next_decrease_at = 0.0
+            limiter.release(estimated_tokens=1, rate_limited=True, retry_after=0.0)
+        assert limiter.concurrency_limit == 2.0
+
+        for _ in range(100):
+            limiter.release(estimated_tokens=1)
+        assert limiter.concurrency_limit == 4.0
+
+
+class TestPermits:
+    """Test suite for LLMPermit context managers."""
+
+    def test_sync_permit_reports_rate_limit(self):
+        limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=0, max_concurrency=4)
+
+        with pytest.raises(openai.RateLimitError):
+            with limiter.limit(10):
+                assert limiter.in_flight == 1
+                raise _rate_limit_error({'retry-after': '0'})
+
+        assert limiter.in_flight == 0
+        assert int(limiter.concurrency_limit) == 2
+
+    def test_sync_permit_other_errors_are_not_congestion(self):
+        limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=0, max_concurrency=4)
+
+        with pytest.raises(ValueError):
+            with limiter.limit(10):
+                raise ValueError("bad response")
+
+        assert limiter.in_flight == 0
+        assert limiter.stats()['rate_limited'] == 0
+        assert limiter.stats()['failed'] == 1
+        assert limiter.concurrency_limit == 4.0
+
+    def test_async_permit_failure_keeps_window(self):
+        limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=0, max_concurrency=8)
+        limiter.concurrency_limit = 4.0
+
+        async def call():
+            async with limiter.limit(10):
+                raise TimeoutError("request timed out")
+
+        with pytest.raises(TimeoutError):
+            asyncio.run(call())
+
+        assert limiter.in_flight == 0
+        assert limiter.concurrency_limit == 4.0
+
+    def test_async_permits_bounded_by_window(self):
+        limiter = LLMRateLimiter(requests_per_minute=0, tokens_per_minute=0, max_concurrency=3)
+        peak = {'in_flight': 0}
+
+        async def call():
+            async with limiter.limit(10) as permit:
+                peak['in_flight'] = max(peak['in_flight'], limiter.in_flight)
+                await asyncio.sleep(0.01)
+                permit.record_usage(5)
+
+        async def main():
+            await asyncio.gather(*(call() for _ in range(12)))
+
+        asyncio.run(main())
+
+        assert peak['in_flight'] == 3
+        assert limiter.stats()['requests'] == 12
+
+    def test_disabled_limiter_is_noop(self):
+        limiter = LLMRateLimiter(requests_per_minute=1, tokens_per_minute=1,
+                                 max_concurrency=1, enabled=False)
+
+        for _ in range(5):
+            with limiter.limit(1000):
+                pass
+
+        assert limiter.stats()['requests'] == 0
@@ -5,9 +5,23 @@ Tests parallel processing functionality including:
 - Thread-safe database management
 - Node processing results
 - Parallel execution coordination
+- Batched NodeFact writer
 """
+import asyncio
+import threading
+
 import pytest
-from app.services.parallel_processor import ThreadSafeDatabaseManager, NodeProcessingResult
+
+from app.models.database import NodeFact, Run, RunKind
+from app.services.llm_extractor import LLMExtractionResult
+from app.services.llm_event_loop import get_llm_event_loop
+from app.services.parallel_processor import (
+    ThreadSafeDatabaseManager,
+    NodeFactWriter,
+    NodeProcessingResult,
+    process_nodes_parallel
+)
+from app.services.xml_parser import XmlSubtree
 
 
 class TestNodeProcessingResult:
@@ -98,3 +112,241 @@ class TestThreadSafeDatabaseManager:
         success = True
 
         assert success is True
+
+
+class _FakeAsyncExtractor:
+    """Async extractor that records how many extractions overlap."""
+
+    def __init__(self, fail_paths=()):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.loop_threads = set()
+        self.fail_paths = set(fail_paths)
+
+    async def extract_from_subtree(self, subtree, context=None):
+        self.loop_threads.add(threading.current_thread().name)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        self.completed += 1
+        if subtree.path in self.fail_paths:
+            raise ValueError("LLM extraction failed")
+        return LLMExtractionResult(
+            node_facts=[{'node_type': 'Pax', 'node_ordinal': 1}],
+            confidence_score=0.9,
+            processing_time_ms=10,
+            tokens_used=25,
+            model_used='fake'
+        )
+
+
+@pytest.fixture
+def workspace_factory(tmp_workspace):
+    """Workspace database in a temporary directory with one run."""
+    with tmp_workspace.session_scope() as session:
+        session.add(Run(id='run-1', kind=RunKind.DISCOVERY))
+    return tmp_workspace
+
+
+@pytest.fixture
+def db_manager(workspace_factory):
+    manager = ThreadSafeDatabaseManager(workspace_factory.engine)
+    yield manager
+    manager.cleanup_session()
+
+
+def _stored_facts(workspace_factory):
+    with workspace_factory.session_scope() as session:
+        return session.query(NodeFact).filter(NodeFact.run_id == 'run-1').count()
+
+
+class TestAsyncNodeProcessing:
+    """Test suite for concurrent extraction on the shared LLM event loop."""
+
+    def _subtrees(self, count):
+        return [XmlSubtree.from_xml("<Pax><PaxID>P1</PaxID></Pax>", f"/Root/Pax{i}") for i in range(count)]
+
+    def _process(self, extractor, db_manager, subtrees, max_concurrency, **kwargs):
+        return process_nodes_parallel(
+            subtrees=subtrees,
+            run_id='run-1',
+            spec_version='21.3',
+            message_root='OrderViewRS',
+            llm_extractor=extractor,
+            db_manager=db_manager,
+            node_configs={},
+            max_concurrency=max_concurrency,
+            **kwargs
+        )
+
+    def test_concurrency_bounded_by_workers(self, db_manager, workspace_factory):
+        """Test in-flight extractions never exceed max_concurrency."""
+        extractor = _FakeAsyncExtractor()
+
+        results = self._process(extractor, db_manager, self._subtrees(12), max_concurrency=3)
+
+        assert results['subtrees_processed'] == 12
+        assert results['total_facts_extracted'] == 12
+        assert _stored_facts(workspace_factory) == 12
+        assert 1 < extractor.max_in_flight <= 3
+
+    def test_runs_on_shared_loop(self, db_manager):
+        """Test extraction runs on the shared LLM loop across calls."""
+        extractor = _FakeAsyncExtractor()
+
+        self._process(extractor, db_manager, self._subtrees(5), max_concurrency=5)
+        self._process(extractor, db_manager, self._subtrees(5), max_concurrency=5)
+
+        assert extractor.loop_threads == {get_llm_event_loop()._thread.name}
+
+    def test_facts_written_in_batches(self, db_manager, workspace_factory, monkeypatch):
+        """Test NodeFacts are bulk inserted in a few transactions."""
+        from app.core.config import settings
+        monkeypatch.setattr(settings, 'NODE_FACT_FLUSH_SIZE', 10)
+        monkeypatch.setattr(settings, 'NODE_FACT_FLUSH_INTERVAL_SECONDS', 60.0)
+        extractor = _FakeAsyncExtractor()
+
+        results = self._process(extractor, db_manager, self._subtrees(25), max_concurrency=5)
+
+        assert _stored_facts(workspace_factory) == 25
+        assert results['write_batches'] == 3
+
+    def test_errors_collected_per_node(self, db_manager, workspace_factory):
+        """Test a failing node is reported without stopping the others."""
+        extractor = _FakeAsyncExtractor(fail_paths={"/Root/Pax1"})
+
+        results = self._process(extractor, db_manager, self._subtrees(3), max_concurrency=2)
+
+        assert results['subtrees_processed'] == 2
+        assert _stored_facts(workspace_factory) == 2
+        assert results['processing_errors'] == [
+            {'subtree_path': "/Root/Pax1", 'error': "LLM extraction failed"}
+        ]
+
+    def test_write_failure_reported_as_error(self, db_manager, workspace_factory):
+        """Test facts that fail to commit are not counted as processed."""
+        extractor = _FakeAsyncExtractor()
+
+        results = process_nodes_parallel(
+            subtrees=self._subtrees(2),
+            run_id='missing-run',  # Violates the runs foreign key
+            spec_version='21.3',
+            message_root='OrderViewRS',
+            llm_extractor=extractor,
+            db_manager=db_manager,
+            node_configs={},
+            max_concurrency=2
+        )
+
+        assert results['subtrees_processed'] == 0
+        assert results['total_facts_extracted'] == 0
+        assert len(results['processing_errors']) == 2
+        assert results['processing_errors'][0]['error'].startswith("Database write failed")
+
+    def test_extraction_starts_before_parsing_finishes(self, db_manager):
+        """Test the first node is extracted while the parser is still producing."""
+        extractor = _FakeAsyncExtractor()
+        completed_while_parsing = []
+
+        def slow_parser():
+            for i, subtree in enumerate(self._subtrees(6)):
+                if i == 3:
+                    # Give the workers time to pick up what has been parsed
+                    threading.Event().wait(0.1)
+                    completed_while_parsing.append(extractor.completed)
+                yield subtree
+
+        results = self._process(extractor, db_manager, slow_parser(), max_concurrency=2)
+
+        assert results['total_nodes'] == 6
+        assert results['subtrees_processed'] == 6
+        assert completed_while_parsing[0] > 0
+        assert results['time_to_first_fact_ms'] is not None
+
+    def test_backpressure_bounds_parser_lead(self, db_manager):
+        """Test the parser never runs more than queue_size + workers ahead."""
+        extractor = _FakeAsyncExtractor()
+        lead = []
+
+        def parser():
+            for i, subtree in enumerate(self._subtrees(30)):
+                lead.append(i - extractor.completed)
+                yield subtree
+
+        results = self._process(extractor, db_manager, parser(), max_concurrency=2, queue_size=3)
+
+        assert results['subtrees_processed'] == 30
+        # queue_size queued + max_concurrency in flight + one being put
+        assert max(lead) <= 3 + 2 + 1
+
+    def test_progress_callback(self, db_manager):
+        """Test progress and the result of every node are reported."""
+        extractor = _FakeAsyncExtractor()
+        updates = []
+        results = []
+
+        self._process(extractor, db_manager, self._subtrees(4), max_concurrency=2,
+                      progress_callback=updates.append, result_callback=results.append)
+
+        assert len(updates) == 4
+        assert sorted(result.subtree_path for result in results) == sorted(s.path for s in self._subtrees(4))
+        assert all(result.tokens_used == 25 for result in results)
+        assert updates[-1]['subtrees_processed'] == 4
+        assert updates[-1]['total_facts_extracted'] == 4
+        assert updates[-1]['tokens_used'] == 100
+
+    def test_parser_error_is_raised(self, db_manager):
+        """Test a parse failure stops extraction and propagates."""
+        extractor = _FakeAsyncExtractor()
+
+        def broken_parser():
+            yield from self._subtrees(2)
+            raise ValueError("XML parsing failed")
+
+        with pytest.raises(ValueError, match="XML parsing failed"):
+            self._process(extractor, db_manager, broken_parser(), max_concurrency=2)
+
+
+class TestNodeFactWriter:
+    """Test suite for the batched single-writer thread."""
+
+    def _mappings(self, count):
+        return [
+            {
+                'run_id': 'run-1',
+                'spec_version': '21.3',
+                'message_root': 'OrderViewRS',
+                'section_path': '/Root/PaxList',
+                'node_type': 'Pax',
+                'node_ordinal': i + 1,
+                'fact_json': {'node_type': 'Pax'},
+                'pii_masked': True
+            }
+            for i in range(count)
+        ]
+
+    def test_flush_on_size(self, db_manager, workspace_factory):
+        writer = NodeFactWriter(db_manager, flush_size=4, flush_interval=60.0).start()
+        for i in range(5):
+            writer.submit(f"/Root/PaxList{i}", self._mappings(2))
+        stats = writer.close()
+
+        assert stats['facts_written'] == 10
+        assert stats['batches_written'] == 3  # 4 + 4 + final 2
+        assert _stored_facts(workspace_factory) == 10
+
+    def test_flush_on_interval(self, db_manager, workspace_factory):
+        writer = NodeFactWriter(db_manager, flush_size=1000, flush_interval=0.05).start()
+        writer.submit("/Root/PaxList", self._mappings(3))
+        threading.Event().wait(0.3)
+
+        assert _stored_facts(workspace_factory) == 3
+        assert writer.close()['batches_written'] == 1
+
+    def test_empty_submit_is_ignored(self, db_manager):
+        writer = NodeFactWriter(db_manager).start()
+
+        assert writer.submit("/Root/PaxList", []) == 0
+        assert writer.close()['batches_written'] == 0
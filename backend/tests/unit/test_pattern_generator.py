@@ -6,11 +6,13 @@ Tests pattern generation logic including:
 - Signature hash generation
 - Pattern creation and updates
 - Decision rule generation
+- Batched pattern persistence: constant query count per run
 """
 import pytest
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from app.services.pattern_generator import PatternGenerator
-from app.models.database import Pattern, NodeFact, Run
+from app.models.database import Pattern, NodeFact, NodeRelationship, Run, RunKind
 
 
 class TestPatternGenerator:
@@ -338,3 +340,103 @@ class TestPatternGenerator:
 
         assert result["has_children"] is False
         assert "child_structures" not in result
+
+
+@pytest.fixture
+def workspace_session(tmp_workspace_session, monkeypatch):
+    monkeypatch.setattr(PatternGenerator, '_generate_pattern_description',
+                        lambda self, decision_rule, section_path: "Test description")
+    return tmp_workspace_session
+
+
+def _store_run(session, run_id, section_count, airline_code="AA", section_root="/OrderViewRS"):
+    session.add(Run(id=run_id, kind=RunKind.PATTERN_EXTRACTOR, spec_version="21.3",
+                    message_root="OrderViewRS", airline_code=airline_code))
+    facts = [
+        NodeFact(run_id=run_id, spec_version="21.3", message_root="OrderViewRS",
+                 section_path=f"{section_root}/Response/DataLists/List{index}", node_type=f"Node{index}", node_ordinal=ordinal,
+                 fact_json={"node_type": f"Node{index}", "attributes": {f"Node{index}ID": f"N{ordinal}"},
+                            "children": []})
+        for index in range(section_count)
+        for ordinal in range(3)
+    ]
+    session.add_all(facts)
+    session.flush()
+    session.add(NodeRelationship(
+        run_id=run_id, source_node_fact_id=facts[0].id, source_node_type="Node0",
+        source_section_path=facts[0].section_path, target_node_type="Node1",
+        target_section_path=f"{section_root}/Response/DataLists/List1", reference_type="node_reference",
+        reference_field="Node1RefID", reference_value="N0", is_valid=True, confidence=0.9
+    ))
+    session.commit()
+    return facts
+
+
+def _count_statements(session, action):
+    statements = []
+    engine = session.get_bind()
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_execute)
+    try:
+        result = action()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_execute)
+    return result, statements
+
+
+class TestBatchedPatternGeneration:
+    """Test suite for PatternGenerator.generate_patterns_from_run."""
+
+    def test_patterns_created_then_updated(self, workspace_session):
+        _store_run(workspace_session, "run-1", section_count=3)
+        generator = PatternGenerator(workspace_session)
+
+        result = generator.generate_patterns_from_run("run-1")
+
+        assert result["success"] is True
+        assert (result["node_facts_analyzed"], result["pattern_groups"]) == (9, 3)
+        assert (result["patterns_created"], result["patterns_updated"]) == (3, 0)
+
+        facts = _store_run(workspace_session, "run-2", section_count=3, airline_code="BB")
+        result = generator.generate_patterns_from_run("run-2")
+
+        assert (result["patterns_created"], result["patterns_updated"]) == (0, 3)
+        patterns = workspace_session.query(Pattern).order_by(Pattern.section_path).all()
+        assert [pattern.times_seen for pattern in patterns] == [2, 2, 2]
+        assert {pattern.airline_code for pattern in patterns} == {"BB"}
+        assert patterns[0].examples[-1]["node_fact_id"] == facts[0].id
+        assert len(patterns[0].examples) == 2
+        assert patterns[0].description == "Test description"
+        assert patterns[0].decision_rule["expected_relationships"][0]["reference_type"] == "node_reference"
+        assert "expected_relationships" not in patterns[1].decision_rule
+
+    def test_same_signature_twice_in_run_updates_first(self, workspace_session):
+        _store_run(workspace_session, "run-1", section_count=1)
+        # Same section, written with and without the leading slash
+        _store_run(workspace_session, "run-1b", section_count=1, section_root="OrderViewRS")
+        workspace_session.query(NodeFact).filter(NodeFact.run_id == "run-1b").update({"run_id": "run-1"})
+        workspace_session.commit()
+
+        result = PatternGenerator(workspace_session).generate_patterns_from_run("run-1")
+
+        assert (result["patterns_created"], result["patterns_updated"]) == (1, 1)
+        pattern = workspace_session.query(Pattern).one()
+        assert pattern.times_seen == 2
+        assert len(pattern.examples) == 2
+
+    def test_query_count_independent_of_group_count(self, workspace_session):
+        _store_run(workspace_session, "seed", section_count=1)
+        _store_run(workspace_session, "small", section_count=2)
+        _store_run(workspace_session, "large", section_count=20)
+        generator = PatternGenerator(workspace_session)
+        generator.generate_patterns_from_run("seed")
+
+        _, small_statements = _count_statements(workspace_session, lambda: generator.generate_patterns_from_run("small"))
+        result, large_statements = _count_statements(workspace_session, lambda: generator.generate_patterns_from_run("large"))
+
+        assert (result["patterns_created"], result["patterns_updated"]) == (18, 2)
+        # Run, relationships, NodeFacts, existing patterns, bulk insert, bulk update
+        assert len(small_statements) == len(large_statements) == 6
@@ -0,0 +1,243 @@
+"""
+Unit tests for the compiled pattern index.
+
+Tests cover:
+- Bucketing by (message_root, node_type, section_path) and candidate lookup
+- Version/airline filters and library order
+- Compiled decision rules (legacy and variations format)
+- Discovery matching without per-NodeFact pattern queries
+- Binding a built index to another session
+"""
+import hashlib
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.database import NodeFact, Pattern, Run, RunKind
+from app.services.discovery_workflow import DiscoveryWorkflow
+from app.services.pattern_index import (
+    CompiledRule,
+    FactProfile,
+    PatternIndex,
+    normalize_node_type,
+    normalize_section_path
+)
+
+PAX_LIST_PATH = "/OrderViewRS/Response/DataLists/PaxList"
+
+
+def _pattern(pattern_id, node_type, section_path=PAX_LIST_PATH, message_root="OrderViewRS",
+             spec_version="21.3", airline_code="SQ", **rule):
+    return Pattern(
+        id=pattern_id,
+        spec_version=spec_version,
+        message_root=message_root,
+        airline_code=airline_code,
+        section_path=section_path,
+        selector_xpath=section_path,
+        decision_rule={'node_type': node_type, **rule},
+        signature_hash=hashlib.sha256(str(pattern_id).encode()).hexdigest()
+    )
+
+
+def _ids(candidates):
+    return [(compiled.id, override) for compiled, override in candidates]
+
+
+class TestNormalization:
+    """Test suite for key normalization."""
+
+    def test_node_type_synonyms(self):
+        assert normalize_node_type("PassengerList") == normalize_node_type("PaxList") == "pax_list"
+        assert normalize_node_type("Pax") == "pax"
+        assert normalize_node_type(None) == ""
+
+    def test_section_path(self):
+        assert normalize_section_path("/IATA_OrderViewRS/Response/PaxList/", "OrderViewRS") == \
+            "orderviewrs/response/paxlist"
+
+
+class TestPatternIndex:
+    """Test suite for bucket lookups."""
+
+    def test_candidates_by_node_type(self):
+        index = PatternIndex([
+            _pattern(1, "PaxList"),
+            _pattern(2, "PassengerList", section_path="/OrderViewRS/Response/PassengerList"),
+            _pattern(3, "SegmentList", section_path="/OrderViewRS/Response/DataLists/SegmentList"),
+            _pattern(4, None, section_path="/OrderViewRS/Response/Other"),
+        ])
+
+        candidates = index.candidates("OrderViewRS", "pax_list", "orderviewrs/response/elsewhere")
+
+        assert _ids(candidates) == [(1, False), (2, False), (4, False)]
+
+    def test_other_node_type_only_at_same_section(self):
+        index = PatternIndex([
+            _pattern(1, "PaxList"),
+            _pattern(2, "Pax"),
+            _pattern(3, "Pax", section_path="/OrderViewRS/Response/DataLists/PaxList/Pax"),
+        ])
+
+        section = normalize_section_path(PAX_LIST_PATH, "OrderViewRS")
+        candidates = index.candidates("OrderViewRS", "pax_list", section)
+
+        assert _ids(candidates) == [(1, False), (2, True)]
+
+    def test_fact_without_node_type_sees_all_patterns(self):
+        index = PatternIndex([_pattern(1, "PaxList"), _pattern(2, "SegmentList")])
+
+        assert _ids(index.candidates("OrderViewRS", "", "")) == [(1, False), (2, False)]
+
+    def test_filters(self):
+        index = PatternIndex([
+            _pattern(1, "PaxList", spec_version="18.1", airline_code="AF"),
+            _pattern(2, "PaxList", spec_version="21.3", airline_code="SQ"),
+            _pattern(3, "PaxList", message_root="AirShoppingRS"),
+        ])
+
+        assert _ids(index.candidates("OrderViewRS", "pax_list", "")) == [(1, False), (2, False)]
+        assert _ids(index.candidates("OrderViewRS", "pax_list", "", spec_version="18.1")) == [(1, False)]
+        assert _ids(index.candidates("OrderViewRS", "pax_list", "", airline_code="SQ")) == [(2, False)]
+        assert len(index.patterns("AirShoppingRS")) == 1
+        assert len(index) == 3
+
+
+class TestCompiledRule:
+    """Test suite for precompiled decision rules."""
+
+    def test_legacy_exact_match(self):
+        rule = CompiledRule({'node_type': 'PaxList', 'must_have_attributes': ['PaxID', 'PTC']})
+        fact = FactProfile({'node_type': 'PassengerList', 'attributes': {'PaxID': 'P1', 'PTC': 'ADT', 'summary': 's'}})
+
+        assert rule.score(fact) == (1.0, None)
+        assert rule.must_have == frozenset({'PaxID', 'PTC'})
+
+    def test_legacy_node_type_mismatch_capped(self):
+        rule = CompiledRule({'node_type': 'SegmentList'})
+        fact = FactProfile({'node_type': 'PaxList', 'attributes': {}})
+
+        assert rule.score(fact)[0] == pytest.approx(0.2)
+
+    def test_legacy_extra_attribute_penalty(self):
+        rule = CompiledRule({'node_type': 'Pax', 'must_have_attributes': ['PaxID']})
+        fact = FactProfile({'node_type': 'Pax', 'attributes': {'PaxID': 'P1', 'Birthdate': 'x'}})
+
+        assert rule.score(fact)[0] == pytest.approx(0.9)
+
+    def test_variations_return_matching_variation(self):
+        rule = CompiledRule({
+            'node_type': 'Pax',
+            'variations': [
+                {'variation_id': 1, 'node_type': 'Pax', 'must_have_attributes': ['PaxID', 'Passport']},
+                {'variation_id': 2, 'node_type': 'Pax', 'must_have_attributes': ['PaxID']},
+            ]
+        })
+
+        assert rule.score(FactProfile({'node_type': 'Pax', 'attributes': {'PaxID': 'P1'}})) == (1.0, 2)
+        assert rule.score(FactProfile({'node_type': 'Pax', 'attributes': {'Passport': 'x'}})) == (0.5, 1)
+
+    def test_variation_child_structures(self):
+        rule = CompiledRule({
+            'node_type': 'PaxList',
+            'variations': [{
+                'variation_id': 1,
+                'node_type': 'PaxList',
+                'child_structure': {
+                    'has_children': True,
+                    'child_structures': [{'node_type': 'Pax', 'required_attributes': ['PaxID', 'PTC']}]
+                }
+            }]
+        })
+        fact = FactProfile({
+            'node_type': 'PaxList',
+            'attributes': {},
+            'children': [
+                {'node_type': 'Pax', 'attributes': {'PaxID': 'P1', 'PTC': 'ADT'}},
+                {'node_type': 'Pax', 'attributes': {'PaxID': 'P2'}},
+            ]
+        })
+
+        # One complete child, one half complete -> child confidence 0.75
+        assert rule.score(fact) == (pytest.approx(0.875), 1)
+
+
+class TestDiscoveryMatching:
+    """Test suite for matching through the index."""
+
+    @pytest.fixture
+    def session(self, tmp_workspace_session):
+        session = tmp_workspace_session
+        session.add(Run(id='run-1', kind=RunKind.DISCOVERY))
+        session.add_all([
+            _pattern(1, "PaxList", must_have_attributes=['PaxID']),
+            _pattern(2, "SegmentList", section_path="/OrderViewRS/Response/DataLists/SegmentList"),
+            _pattern(3, "PaxList", message_root="AirShoppingRS"),
+        ])
+        session.commit()
+        return session
+
+    def _node_fact(self, session):
+        node_fact = NodeFact(
+            run_id='run-1', spec_version='21.3', message_root='OrderViewRS',
+            section_path=PAX_LIST_PATH, node_type='PaxList', node_ordinal=1,
+            fact_json={'node_type': 'PaxList', 'attributes': {'PaxID': 'P1'}}
+        )
+        session.add(node_fact)
+        session.commit()
+        return node_fact
+
+    def test_build_excludes_superseded_and_other_messages(self, session):
+        superseded = _pattern(4, "PaxList")
+        superseded.superseded_by = 1
+        session.add(superseded)
+        session.commit()
+
+        index = PatternIndex.build(session, "OrderViewRS")
+
+        assert sorted(compiled.id for compiled in index.patterns("OrderViewRS")) == [1, 2]
+
+    def test_bind_loads_patterns_in_other_session(self, session):
+        index = PatternIndex.build(session)
+
+        with Session(bind=session.get_bind()) as other_session:
+            bound = index.bind(other_session)
+
+            original = index.patterns("OrderViewRS")
+            rebound = bound.patterns("OrderViewRS")
+            assert [(c.id, c.ordinal) for c in rebound] == [(c.id, c.ordinal) for c in original]
+            assert all(c.pattern in other_session for c in rebound)
+            assert not any(c.pattern in session for c in rebound)
+            assert len(bound) == len(index) == 3
+
+    def test_matching_uses_index_without_pattern_queries(self, session):
+        node_fact = self._node_fact(session)
+        workflow = DiscoveryWorkflow(session)
+        index = PatternIndex.build(session, "OrderViewRS")
+
+        pattern_queries = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if "FROM patterns" in statement:
+                pattern_queries.append(statement)
+
+        event.listen(session.bind, "before_cursor_execute", record)
+        try:
+            matches = workflow.match_node_fact_to_patterns(
+                node_fact, "21.3", "OrderViewRS", "SQ", pattern_index=index
+            )
+        finally:
+            event.remove(session.bind, "before_cursor_execute", record)
+
+        assert pattern_queries == []
+        assert [m['pattern_id'] for m in matches] == [1]
+        assert matches[0]['verdict'] == "EXACT_MATCH"
+        assert matches[0]['pattern'] is session.get(Pattern, 1)
+
+    def test_matching_without_index_builds_one(self, session):
+        node_fact = self._node_fact(session)
+
+        matches = DiscoveryWorkflow(session).match_node_fact_to_patterns(node_fact, "21.3", "OrderViewRS", "SQ")
+
+        assert [m['pattern_id'] for m in matches] == [1]
@@ -0,0 +1,204 @@
+"""
+Unit tests for the local reference indexes used by relationship analysis.
+
+Tests cover:
+- Defined IDs and referenced values collected from NodeFact shapes
+- Candidate section pairs from the inverted ID index
+- Target resolution identical to the linear scan it replaced (hand-written and randomized)
+"""
+import random
+
+import pytest
+
+from app.models.database import NodeFact
+from app.services.reference_index import (
+    ReferenceCandidateIndex, TargetReferenceIndex, fact_reference_values, normalize_reference_value
+)
+
+
+def _fact(section_path, fact_json):
+    return NodeFact(section_path=section_path, node_type=section_path.rsplit('/', 1)[-1], fact_json=fact_json)
+
+
+class TestFactReferenceValues:
+    """Test suite for fact_reference_values."""
+
+    def test_container_fact(self):
+        fact = _fact('/DataLists/PaxList', {
+            'node_type': 'PaxList',
+            'children': [{
+                'node_type': 'Pax',
+                'attributes': {'PaxID': 'PAX1', 'PTC': 'ADT', 'ContactInfoRefID': 'CI1'},
+                'references': {'infant': ['PAX1.1'], 'parent': None,
+                               'other': {'DatedMarketingSegmentRefId': 'SEG1'}},
+                'children': [{'node_type': 'LoyaltyProgramAccount', 'attributes': {'AccountID': 'LP1'}}]
+            }],
+            'refs': {'any_id_references': 'OFR1 OFR2'}
+        })
+
+        defined, referenced = fact_reference_values(fact)
+
+        assert defined == {'PAX1', 'LP1'}
+        assert referenced == {'CI1', 'PAX1.1', 'SEG1', 'OFR1 OFR2', 'OFR1', 'OFR2'}
+
+    def test_item_fact_and_root_ids(self):
+        fact = _fact('/Order', {
+            'node_type': 'Order', 'ID': 'ORD1', 'ObjectKey': 42, 'PaxRefID': ['PAX1', 'PAX2'],
+            'attributes': {'OrderID': 'ORD1', 'TotalAmount': '100', 'Active': True}
+        })
+
+        defined, referenced = fact_reference_values(fact)
+
+        assert defined == {'ORD1', '42'}
+        assert referenced == {'PAX1', 'PAX2'}
+
+    def test_string_fact_json(self):
+        fact = _fact('/DataLists/PaxList', '{"children": [{"attributes": {"PaxID": "PAX1"}}]}')
+
+        assert fact_reference_values(fact) == ({'PAX1'}, set())
+
+
+class TestReferenceCandidateIndex:
+    """Test suite for ReferenceCandidateIndex."""
+
+    def test_only_intersecting_pairs_are_candidates(self):
+        groups = {
+            'Pax': [_fact('Pax', {'children': [{'attributes': {'PaxID': 'PAX1'}}]})],
+            'Segment': [_fact('Segment', {'children': [{'attributes': {'PaxSegmentID': 'SEG1'}}]})],
+            'Journey': [_fact('Journey', {'children': [{'attributes': {'PaxJourneyID': 'J1'},
+                                                        'references': {'other': {'PaxSegmentRefID': 'SEG1'}}}]})],
+            'Offer': [_fact('Offer', {'children': [{'attributes': {'OfferID': 'OFR1',
+                                                                   'PaxRefID': 'PAX1 PAX2',
+                                                                   'PaxJourneyRefID': 'J1'}}]})],
+        }
+        pairs = [(source, target) for source in groups for target in groups if source != target]
+
+        candidates = ReferenceCandidateIndex(groups).candidate_pairs(pairs)
+
+        assert candidates == [('Journey', 'Segment'), ('Offer', 'Pax'), ('Offer', 'Journey')]
+
+
+def _linear_find(target_facts, ref_value):
+    """The linear scan formerly in RelationshipAnalyzer._find_target_by_reference."""
+    normalized_ref = normalize_reference_value(ref_value)
+    if normalized_ref is None:
+        return None
+
+    for fact in target_facts:
+        fact_data = fact.fact_json
+
+        if normalize_reference_value(fact_data.get('ID')) == normalized_ref:
+            return fact
+        if normalize_reference_value(fact_data.get('Key')) == normalized_ref:
+            return fact
+        if normalize_reference_value(fact_data.get('ObjectKey')) == normalized_ref:
+            return fact
+
+        for child in fact_data.get('children', []):
+            for attr_key, attr_value in child.get('attributes', {}).items():
+                normalized_attr = normalize_reference_value(attr_value)
+                if normalized_attr == normalized_ref:
+                    return fact
+                if isinstance(normalized_attr, str) and isinstance(normalized_ref, str):
+                    if 'id' in attr_key.lower() or 'key' in attr_key.lower():
+                        min_len = min(len(normalized_ref), len(normalized_attr))
+                        max_len = max(len(normalized_ref), len(normalized_attr))
+                        if min_len >= max_len * 0.8:
+                            if normalized_attr.startswith(normalized_ref) or normalized_ref.startswith(normalized_attr):
+                                return fact
+                            if normalized_attr.endswith(normalized_ref) or normalized_ref.endswith(normalized_attr):
+                                return fact
+
+            for ref_type, ref_values in child.get('references', {}).items():
+                if isinstance(ref_values, list):
+                    for rv in ref_values:
+                        normalized_rv = normalize_reference_value(rv)
+                        if normalized_rv == normalized_ref:
+                            return fact
+                        if isinstance(normalized_rv, str) and isinstance(normalized_ref, str):
+                            if normalized_ref in normalized_rv or normalized_rv in normalized_ref:
+                                return fact
+
+        for ref_key, ref_vals in fact_data.get('refs', {}).items():
+            if isinstance(ref_vals, list):
+                for rv in ref_vals:
+                    normalized_rv = normalize_reference_value(rv)
+                    if normalized_rv == normalized_ref:
+                        return fact
+                    if isinstance(normalized_rv, str) and isinstance(normalized_ref, str):
+                        if normalized_ref in normalized_rv or normalized_rv in normalized_ref:
+                            return fact
+            elif normalize_reference_value(ref_vals) == normalized_ref:
+                return fact
+
+        for key, value in fact_data.items():
+            if normalize_reference_value(value) == normalized_ref and ('ID' in key or 'Key' in key):
+                return fact
+
+    return None
+
+
+class TestTargetReferenceIndex:
+    """Test suite for TargetReferenceIndex parity with the linear scan."""
+
+    def _assert_parity(self, facts, refs):
+        index = TargetReferenceIndex(facts)
+        for ref in refs:
+            assert index.find(ref) is _linear_find(facts, ref), ref
+
+    def test_matching_rules(self):
+        facts = [
+            _fact('Segment', {'children': [{'attributes': {'PaxSegmentID': 'seg0542686836-leg0', 'Code': 'X1'}}]}),
+            _fact('Segment', {'children': [{'attributes': {'PaxSegmentID': 'seg-001'}},
+                                           {'attributes': {'Seq': 7},
+                                            'references': {'other': ['OFFER-ITEM-17'], 'contact': 'CI1'}}]}),
+            _fact('Segment', {'ObjectKey': 12, 'DatedLegKey': 'LEG5',
+                              'refs': {'pax': ['PAX1 PAX2'], 'order': 'ORD1', 'nested': {'a': 1}}}),
+            _fact('Segment', {'children': [{'attributes': {'MarketingKey': 'FLT100'}}]}),
+        ]
+        refs = [
+            'seg0542686836-leg0', 'seg0542686836', 'seg0542686836-leg0-x', 'seg-999', 'seg-001', 'X1', 'X',
+            'OFFER-ITEM-17', 'ITEM', 'OFFER-ITEM-17-A', 'CI1', 12, '12', 7, 'LEG5', 'PAX1', 'PAX1 PAX2 PAX3',
+            'ORD1', '{"a": 1}', 'FLT10', 'FLT1000', 'LT100', '', None, 'missing'
+        ]
+        self._assert_parity(facts, refs)
+
+    def test_first_fact_wins(self):
+        facts = [
+            _fact('Pax', {'children': [{'attributes': {'Name': 'x'}, 'references': {'r': ['ABCDEF-1']}}]}),
+            _fact('Pax', {'children': [{'attributes': {'PaxID': 'ABCDEF'}}]}),
+        ]
+        index = TargetReferenceIndex(facts)
+
+        # Substring match in the first fact beats the exact match in the second
+        assert index.find('ABCDEF') is facts[0]
+        self._assert_parity(facts, ['ABCDEF', 'BCD', 'ABCDEF-1-2'])
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_randomized(self, seed):
+        rng = random.Random(seed)
+        pool = ['SEG1', 'SEG10', 'SEG1-LEG0', 'seg-001', 'seg-002', 'PAX1', 'PAX1.1', 'P', 'OFR1', 'OFR12',
+                'ABCDEFGHIJ', 'ABCDEFGH', 'BCDEFGHIJ', 'J1', 'X', '', 101, 10]
+
+        def value():
+            return rng.choice(pool)
+
+        def child():
+            return {
+                'attributes': {rng.choice(['PaxID', 'SegmentKey', 'Code', 'RefIdx', 'Name']): value()
+                               for _ in range(rng.randint(0, 3))},
+                'references': {rng.choice(['infant', 'other', 'services']):
+                               [value() for _ in range(rng.randint(0, 2))] if rng.random() < 0.8 else value()
+                               for _ in range(rng.randint(0, 2))}
+            }
+
+        facts = []
+        for _ in range(25):
+            fact_json = {'children': [child() for _ in range(rng.randint(0, 3))]}
+            if rng.random() < 0.3:
+                fact_json[rng.choice(['ID', 'Key', 'ObjectKey', 'OrderID', 'Amount'])] = value()
+            if rng.random() < 0.3:
+                fact_json['refs'] = {'r': [value()] if rng.random() < 0.5 else value()}
+            facts.append(_fact('Target', fact_json))
+
+        self._assert_parity(facts, pool + ['SEG', 'EG1', 'SEG1-LEG0-X', 'ABCDEFGHI', 'CDEFGHIJ', 'none'])
@@ -0,0 +1,233 @@
+"""
+Unit tests for relationship discovery.
+
+Tests cover:
+- Section pairs discovered concurrently, bounded by RELATIONSHIP_MAX_CONCURRENCY
+- Pairs without intersecting reference values pruned before any LLM call
+- Discovered references validated against every instance
+- Discovery answers reused from the workspace LLM cache by later runs
+- Progress reported per section pair
+- Pairs covered by rules learned from earlier runs resolved without the LLM
+"""
+import asyncio
+import json
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.models.database import NodeFact, NodeRelationship, Run, RunKind
+from app.services import relationship_analyzer as analyzer_module
+from app.services.relationship_analyzer import RelationshipAnalyzer
+from app.services.relationship_rules import ReferenceRuleSet
+
+PAX_PATH = "/OrderViewRS/Response/DataLists/PaxList"
+SEGMENT_PATH = "/OrderViewRS/Response/DataLists/PaxSegmentList"
+JOURNEY_PATH = "/OrderViewRS/Response/DataLists/PaxJourneyList"
+
+
+class _FakeCompletions:
+    """Answers discovery prompts: Pax references PaxSegment through SegmentRefID."""
+
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create(self, **kwargs):
+        prompt = kwargs['messages'][1]['content']
+        source = re.search(r"\*\*SOURCE NODE\*\*: (\w+)", prompt).group(1)
+        target = re.search(r"\*\*TARGET NODE\*\*: (\w+)", prompt).group(1)
+        self.calls.append((source, target))
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+        if (source, target) == ('Pax', 'PaxSegment'):
+            result = {'has_references': True, 'references': [
+                {'reference_type': 'segment_reference', 'reference_field': 'SegmentRefID', 'confidence': 0.9}
+            ]}
+        else:
+            result = {'has_references': False, 'references': []}
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(result)))],
+            usage=SimpleNamespace(total_tokens=50)
+        )
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    completions = _FakeCompletions()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(analyzer_module, '_get_async_llm_client', lambda: (client, 'test-model'))
+    return completions
+
+
+@pytest.fixture
+def all_pairs(monkeypatch):
+    """Send every section pair to the LLM."""
+    monkeypatch.setattr(settings, 'RELATIONSHIP_PREFILTER_ENABLED', False)
+
+
+@pytest.fixture
+def no_rules(monkeypatch):
+    """Ignore the relationships stored by earlier runs."""
+    monkeypatch.setattr(settings, 'RELATIONSHIP_RULES_ENABLED', False)
+
+
+@pytest.fixture
+def session(tmp_workspace_session):
+    return tmp_workspace_session
+
+
+def _store_run(session, run_id, segment_ids=('SEG1', 'SEG2'), spec_version='21.3'):
+    session.add(Run(id=run_id, kind=RunKind.PATTERN_EXTRACTOR, spec_version=spec_version, message_root='OrderViewRS'))
+
+    def fact(section_path, node_type, ordinal, attributes):
+        return NodeFact(run_id=run_id, spec_version=spec_version, message_root='OrderViewRS',
+                        section_path=section_path, node_type=node_type, node_ordinal=ordinal,
+                        fact_json={'node_type': node_type, 'children': [{'attributes': attributes}]})
+
+    facts = [
+        fact(PAX_PATH, 'Pax', 1, {'PaxID': 'PAX1', 'SegmentRefID': 'SEG1'}),
+        fact(PAX_PATH, 'Pax', 2, {'PaxID': 'PAX2', 'SegmentRefID': 'SEG9'}),
+        fact(JOURNEY_PATH, 'PaxJourney', 1, {'PaxJourneyID': 'J1'}),
+    ] + [
+        fact(SEGMENT_PATH, 'PaxSegment', ordinal, {'PaxSegmentID': segment_id})
+        for ordinal, segment_id in enumerate(segment_ids, 1)
+    ]
+    session.add_all(facts)
+    session.commit()
+    return facts
+
+
+class TestRelationshipDiscovery:
+    """Test suite for RelationshipAnalyzer.analyze_relationships."""
+
+    def test_pairs_discovered_concurrently_and_validated(self, session, completions, all_pairs, monkeypatch):
+        monkeypatch.setattr(settings, 'RELATIONSHIP_MAX_CONCURRENCY', 2)
+        facts = _store_run(session, 'run-1')
+        updates = []
+
+        results = RelationshipAnalyzer(session).analyze_relationships('run-1', facts, progress_callback=updates.append)
+
+        assert len(completions.calls) == 6
+        assert completions.max_in_flight == 2
+        assert results['statistics']['llm_calls'] == 6
+        assert results['relationships_count'] == 2
+
+        relationships = session.query(NodeRelationship).order_by(NodeRelationship.reference_value).all()
+        assert [(r.reference_value, r.is_valid) for r in relationships] == [('SEG1', True), ('SEG9', False)]
+        assert relationships[0].target_section_path == SEGMENT_PATH
+
+        assert [update['pairs_done'] for update in updates] == [1, 2, 3, 4, 5, 6, 6]
+        assert updates[-1]['relationships_found'] == 2
+
+    def test_repeat_run_reuses_cached_mappings(self, session, completions, all_pairs, no_rules):
+        _store_run(session, 'run-1')
+        RelationshipAnalyzer(session).analyze_relationships(
+            'run-1', session.query(NodeFact).filter(NodeFact.run_id == 'run-1').all()
+        )
+        assert len(completions.calls) == 6
+
+        # Same message type, different values
+        facts = _store_run(session, 'run-2', segment_ids=('SEG1', 'SEG2', 'SEG3'))
+        results = RelationshipAnalyzer(session).analyze_relationships('run-2', facts)
+
+        assert len(completions.calls) == 6
+        assert results['statistics']['llm_cache_hits'] == 6
+        assert results['statistics']['llm_calls'] == 0
+        assert results['relationships_count'] == 2
+
+    def test_changed_shape_is_not_served_from_cache(self, session, completions, all_pairs, no_rules):
+        facts = _store_run(session, 'run-1')
+        RelationshipAnalyzer(session).analyze_relationships('run-1', facts)
+
+        session.add(Run(id='run-2', kind=RunKind.PATTERN_EXTRACTOR, spec_version='21.3', message_root='OrderViewRS'))
+        changed = [
+            NodeFact(run_id='run-2', spec_version='21.3', message_root='OrderViewRS', section_path=fact.section_path,
+                     node_type=fact.node_type, node_ordinal=fact.node_ordinal,
+                     fact_json={'node_type': fact.node_type,
+                                'children': [{'attributes': {**fact.fact_json['children'][0]['attributes'],
+                                                             'InfantRefID': 'PAX9'}}]})
+            for fact in facts
+        ]
+        session.add_all(changed)
+        session.commit()
+
+        results = RelationshipAnalyzer(session).analyze_relationships('run-2', changed)
+
+        assert results['statistics']['llm_calls'] == 6
+        assert len(completions.calls) == 12
+
+    def test_prefilter_sends_only_referencing_pairs(self, session, completions):
+        facts = _store_run(session, 'run-1')
+
+        results = RelationshipAnalyzer(session).analyze_relationships('run-1', facts)
+
+        assert completions.calls == [('Pax', 'PaxSegment')]
+        assert results['statistics']['pairs_pruned'] == 5
+        assert results['relationships_count'] == 2
+
+
+class TestLearnedRules:
+    """Test suite for reference rules compiled from earlier runs."""
+
+    def test_rules_compiled_per_message_type(self, session, completions):
+        RelationshipAnalyzer(session).analyze_relationships('run-1', _store_run(session, 'run-1'))
+
+        rules = ReferenceRuleSet.load(session, 'OrderViewRS', '21.3')
+        assert len(rules) == 1
+        rule = rules.rules_for((PAX_PATH, SEGMENT_PATH))[0]
+        assert (rule.reference_field, rule.valid_count, rule.total_count) == ('SegmentRefID', 1, 2)
+        assert rule.to_ref_info()['reference_type'] == 'segment_reference'
+
+        assert len(ReferenceRuleSet.load(session, 'OrderViewRS', '21.3', exclude_run_id='run-1')) == 0
+        assert len(ReferenceRuleSet.load(session, 'OrderViewRS', '18.1')) == 0
+
+    def test_known_message_type_needs_no_llm_calls(self, session, completions, monkeypatch):
+        monkeypatch.setattr(settings, 'LLM_CACHE_ENABLED', False)
+        RelationshipAnalyzer(session).analyze_relationships('run-1', _store_run(session, 'run-1'))
+        assert completions.calls == [('Pax', 'PaxSegment')]
+
+        facts = _store_run(session, 'run-2', segment_ids=('SEG1', 'SEG2', 'SEG9'))
+        results = RelationshipAnalyzer(session).analyze_relationships('run-2', facts)
+
+        assert completions.calls == [('Pax', 'PaxSegment')]
+        assert results['statistics']['rule_pairs'] == 1
+        assert results['statistics']['llm_calls'] == 0
+        relationships = session.query(NodeRelationship).filter(NodeRelationship.run_id == 'run-2').all()
+        assert sorted((r.reference_value, r.is_valid, r.discovered_by) for r in relationships) == [
+            ('SEG1', True, 'rule'), ('SEG9', True, 'rule')
+        ]
+        assert relationships[0].model_used is None
+
+    def test_other_version_is_discovered(self, session, completions, monkeypatch):
+        monkeypatch.setattr(settings, 'LLM_CACHE_ENABLED', False)
+        RelationshipAnalyzer(session).analyze_relationships('run-1', _store_run(session, 'run-1'))
+
+        facts = _store_run(session, 'run-2', spec_version='24.1')
+        results = RelationshipAnalyzer(session).analyze_relationships('run-2', facts)
+
+        assert len(completions.calls) == 2
+        assert results['statistics']['rule_pairs'] == 0
+
+    def test_mostly_broken_reference_is_not_a_rule(self, session, completions, monkeypatch):
+        monkeypatch.setattr(settings, 'RELATIONSHIP_RULE_MIN_VALID_RATIO', 0.75)
+        RelationshipAnalyzer(session).analyze_relationships('run-1', _store_run(session, 'run-1'))
+
+        assert len(ReferenceRuleSet.load(session, 'OrderViewRS', '21.3')) == 0
+
+    def test_rules_apply_without_llm_client(self, session, completions, monkeypatch):
+        RelationshipAnalyzer(session).analyze_relationships('run-1', _store_run(session, 'run-1'))
+        monkeypatch.setattr(analyzer_module, '_get_async_llm_client', lambda: (None, ''))
+
+        facts = _store_run(session, 'run-2')
+        results = RelationshipAnalyzer(session).analyze_relationships('run-2', facts)
+
+        assert results['success']
+        assert results['relationships_count'] == 2
+        assert len(completions.calls) == 1
@@ -0,0 +1,297 @@
+"""
+Unit tests for background run execution.
+
+Tests cover:
+- RunProgress snapshots and listener events
+- Server-sent event stream of a live and of a finished run
+- Run record created before the workflow runs; id returned immediately
+- Final status and progress stored, temp file removed
+- Workflow errors recorded on the run
+- Batch runs: ids returned immediately, per-file progress and stored report
+- Runs interrupted by a restart marked failed
+"""
+import asyncio
+import json
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.v1.endpoints.runs import stream_run_events
+
+from app.models.database import Run, RunKind, RunStatus
+from app.services.pattern_extractor_workflow import PatternExtractorWorkflow
+from app.services.run_executor import INTERRUPTED_MESSAGE, RunExecutor, fail_interrupted_runs
+from app.services.run_progress import RunProgress, get_run_progress, track_run, untrack_run
+
+WORKSPACE = "unit_test"  # Name of the tmp_workspace fixture
+
+
+@pytest.fixture
+def factory(tmp_workspace):
+    return tmp_workspace
+
+
+@pytest.fixture
+def executor():
+    executor = RunExecutor(max_workers=1)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def xml_file(tmp_path):
+    path = tmp_path / "upload.xml"
+    path.write_text("<OrderViewRS/>")
+    return path
+
+
+class TestRunProgress:
+    """Test suite for RunProgress."""
+
+    def test_phase_and_counters(self):
+        progress = RunProgress("run-1")
+        events = []
+        progress.add_listener(lambda event, data: events.append((event, data)))
+
+        progress.phase('extracting')
+        progress.update(subtrees_done=2, subtrees_total=5, node_facts=7, tokens_used=300)
+        progress.emit('node_result', {'subtree_path': '/Root/Pax'})
+        progress.finish('completed')
+
+        snapshot = progress.snapshot()
+        assert snapshot['phase'] == 'completed'
+        assert progress.finished
+        assert (snapshot['subtrees_done'], snapshot['subtrees_total']) == (2, 5)
+        assert [event for event, _ in events] == ['phase', 'progress', 'node_result', 'end']
+        assert events[2][1] == {'subtree_path': '/Root/Pax'}
+        assert events[3][1]['tokens_used'] == 300
+
+    def test_failing_listener_is_ignored(self):
+        progress = RunProgress("run-1")
+        progress.add_listener(lambda event, data: 1 / 0)
+
+        progress.phase('parsing')
+
+        assert progress.snapshot()['phase'] == 'parsing'
+
+
+class TestRunExecutor:
+    """Test suite for RunExecutor."""
+
+    def test_submit_returns_before_workflow_finishes(self, factory, executor, xml_file, monkeypatch):
+        release = threading.Event()
+        finished = threading.Event()
+
+        def fake_discovery(self, xml_file_path, skip_pattern_generation=False, conflict_resolution=None,
+                           run_id=None, progress=None):
+            progress.phase('extracting', subtrees_done=1, subtrees_total=4, node_facts=3)
+            release.wait(5)
+            self._update_run_status(run_id, RunStatus.COMPLETED)
+            finished.set()
+            return {'run_id': run_id, 'status': 'completed'}
+
+        monkeypatch.setattr(PatternExtractorWorkflow, 'run_discovery', fake_discovery)
+
+        run_id = executor.submit(WORKSPACE, RunKind.PATTERN_EXTRACTOR, str(xml_file), "original.xml")
+
+        with factory.session_scope() as session:
+            run = session.get(Run, run_id)
+            assert run.status == RunStatus.STARTED
+            assert run.filename == "original.xml"
+            assert run.metadata_json['job']['workspace'] == WORKSPACE
+        assert get_run_progress(run_id) is not None
+
+        release.set()
+        assert finished.wait(5)
+        executor.shutdown(wait=True)
+
+        with factory.session_scope() as session:
+            run = session.get(Run, run_id)
+            assert run.status == RunStatus.COMPLETED
+            assert run.metadata_json['progress']['phase'] == 'completed'
+            assert run.metadata_json['progress']['node_facts'] == 3
+        assert get_run_progress(run_id) is None
+        assert not xml_file.exists()
+
+    def test_workflow_error_fails_run(self, factory, executor, xml_file, monkeypatch):
+        def failing_identify(self, xml_file_path, **kwargs):
+            raise ValueError("Could not detect NDC version from XML file")
+
+        from app.services.discovery_workflow import DiscoveryWorkflow
+        monkeypatch.setattr(DiscoveryWorkflow, 'run_identify', failing_identify)
+
+        run_id = executor.submit(WORKSPACE, RunKind.DISCOVERY, str(xml_file), "upload.xml")
+        executor.shutdown(wait=True)
+
+        with factory.session_scope() as session:
+            run = session.get(Run, run_id)
+            assert run.status == RunStatus.FAILED
+            assert "Could not detect NDC version" in run.error_details
+            assert run.metadata_json['progress']['phase'] == 'failed'
+
+    def test_submitted_record_is_reused_by_workflow(self, factory, executor, xml_file, monkeypatch):
+        monkeypatch.setattr(RunExecutor, '_execute', lambda self, *args: None)
+        run_id = executor.submit(WORKSPACE, RunKind.DISCOVERY, str(xml_file), "original.xml")
+
+        with factory.session_scope() as session:
+            workflow = PatternExtractorWorkflow(session)
+            assert workflow._create_run_record(str(xml_file), None, 14, run_id=run_id) == run_id
+
+            runs = session.query(Run).all()
+            assert len(runs) == 1
+            assert runs[0].kind == RunKind.DISCOVERY
+            assert runs[0].filename == "original.xml"
+            assert runs[0].metadata_json['job']['workspace'] == WORKSPACE
+            assert 'workflow_version' in runs[0].metadata_json
+
+
+class TestBatchRuns:
+    """Test suite for RunExecutor.submit_batch."""
+
+    def test_batch_reports_files_as_they_finish(self, factory, executor, tmp_path, monkeypatch):
+        from app.services.discovery_workflow import DiscoveryWorkflow
+
+        release = threading.Event()
+
+        def fake_identify(self, xml_file_path, run_id=None, progress=None, **kwargs):
+            release.wait(5)
+            if xml_file_path.endswith("bad.xml"):
+                raise ValueError("Could not detect NDC version from XML file")
+            progress.phase('matching', node_facts=2)
+            run = self.db_session.get(Run, run_id)
+            run.status = RunStatus.COMPLETED
+            self.db_session.commit()
+            return {'run_id': run_id, 'status': 'completed', 'node_facts_extracted': 2,
+                    'gap_analysis': {'matched_facts': 2}}
+
+        monkeypatch.setattr(DiscoveryWorkflow, 'run_identify', fake_identify)
+
+        batch_dir = tmp_path / "batch"
+        batch_dir.mkdir()
+        paths = []
+        for name in ("good.xml", "bad.xml"):
+            path = batch_dir / name
+            path.write_text("<OrderViewRS/>")
+            paths.append(str(path))
+
+        batch_id, run_ids = executor.submit_batch(WORKSPACE, paths, str(batch_dir))
+
+        with factory.session_scope() as session:
+            assert session.get(Run, batch_id).kind == RunKind.DISCOVERY_BATCH
+            assert [session.get(Run, run_id).status for run_id in run_ids] == [RunStatus.STARTED] * 2
+            assert session.get(Run, run_ids[1]).filename == "bad.xml"
+        events = []
+        get_run_progress(batch_id).add_listener(lambda event, data: events.append((event, data)))
+
+        release.set()
+        executor.shutdown(wait=True)
+
+        file_events = [data for event, data in events if event == 'file_result']
+        assert sorted(f['filename'] for f in file_events) == ["bad.xml", "good.xml"]
+        assert events[-1][0] == 'end'
+        assert events[-1][1]['files_done'] == 2 and events[-1][1]['files_failed'] == 1
+
+        with factory.session_scope() as session:
+            batch = session.get(Run, batch_id)
+            assert batch.status == RunStatus.PARTIAL_FAILURE
+            assert batch.metadata_json['batch']['summary']['failed_files'] == 1
+            assert batch.metadata_json['progress']['phase'] == 'completed'
+
+            good, bad = (session.get(Run, run_id) for run_id in run_ids)
+            assert good.status == RunStatus.COMPLETED
+            assert good.metadata_json['progress']['phase'] == 'completed'
+            assert bad.status == RunStatus.FAILED
+            assert "Could not detect NDC version" in bad.error_details
+        assert all(get_run_progress(run_id) is None for run_id in [batch_id, *run_ids])
+        assert not batch_dir.exists()
+
+
+class TestInterruptedRuns:
+    """Test suite for startup recovery."""
+
+    def test_only_unfinished_background_runs_fail(self, factory):
+        with factory.session_scope() as session:
+            session.add_all([
+                Run(id='job-running', kind=RunKind.DISCOVERY, status=RunStatus.IN_PROGRESS,
+                    metadata_json={'job': {'workspace': WORKSPACE}}),
+                Run(id='job-done', kind=RunKind.DISCOVERY, status=RunStatus.COMPLETED,
+                    metadata_json={'job': {'workspace': WORKSPACE}}),
+                Run(id='batch-running', kind=RunKind.DISCOVERY, status=RunStatus.IN_PROGRESS,
+                    metadata_json={}),
+            ])
+
+        assert fail_interrupted_runs(WORKSPACE) == 1
+
+        with factory.session_scope() as session:
+            assert session.get(Run, 'job-running').status == RunStatus.FAILED
+            assert session.get(Run, 'job-running').error_details == INTERRUPTED_MESSAGE
+            assert session.get(Run, 'job-done').status == RunStatus.COMPLETED
+            assert session.get(Run, 'batch-running').status == RunStatus.IN_PROGRESS
+
+
+class _FakeRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def _parse_sse(chunks):
+    events = []
+    for chunk in chunks:
+        fields = dict(line.split(': ', 1) for line in chunk.strip().splitlines() if not line.startswith(':'))
+        if fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+class TestRunEventStream:
+    """Test suite for GET /runs/{run_id}/events."""
+
+    def test_live_run_streams_until_end(self):
+        progress = track_run('run-live')
+
+        async def read_stream():
+            response = await stream_run_events('run-live', _FakeRequest(), workspace=WORKSPACE)
+            chunks = []
+            async for chunk in response.body_iterator:
+                chunks.append(chunk)
+                if len(chunks) == 1:
+                    # Publish from another thread, as the workflow does
+                    def publish():
+                        progress.phase('extracting', subtrees_total=2)
+                        progress.emit('node_result', {'subtree_path': '/Root/Pax', 'tokens_used': 25})
+                        progress.finish('completed')
+                    threading.Thread(target=publish).start()
+            return response, chunks
+
+        try:
+            response, chunks = asyncio.run(read_stream())
+        finally:
+            untrack_run('run-live')
+
+        assert response.media_type == 'text/event-stream'
+        events = _parse_sse(chunks)
+        assert [event for event, _ in events] == ['snapshot', 'phase', 'node_result', 'end']
+        assert events[2][1]['tokens_used'] == 25
+        assert events[3][1]['phase'] == 'completed'
+        assert not progress._listeners
+
+    def test_finished_run_sends_stored_progress(self, factory):
+        with factory.session_scope() as session:
+            session.add(Run(id='run-done', kind=RunKind.DISCOVERY, status=RunStatus.COMPLETED,
+                            metadata_json={'progress': {'phase': 'completed', 'node_facts': 9}}))
+
+        async def read_stream():
+            response = await stream_run_events('run-done', _FakeRequest(), workspace=WORKSPACE)
+            return [chunk async for chunk in response.body_iterator]
+
+        events = _parse_sse(asyncio.run(read_stream()))
+
+        assert len(events) == 1
+        assert events[0][0] == 'end'
+        assert events[0][1]['node_facts'] == 9
+
+    def test_unknown_run(self, factory):
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(stream_run_events('missing', _FakeRequest(), workspace=WORKSPACE))
+        assert exc_info.value.status_code == 404
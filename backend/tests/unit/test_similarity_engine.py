@@ -0,0 +1,223 @@
+"""
+Parity tests for the bulk (bitset) similarity engine.
+
+Every score produced by BulkSimilarityScorer must equal the reference
+implementation (CompiledRule, behind DiscoveryWorkflow.calculate_pattern_similarity)
+exactly - same confidence float and same variation id.
+
+Tests cover:
+- Vocabulary encoding
+- Hand-written edge cases for each scoring component
+- Randomized facts x rules matrices (legacy and variations format)
+"""
+import random
+
+import pytest
+
+from app.services.pattern_index import CompiledRule, FactProfile
+from app.services.similarity_engine import BulkSimilarityScorer, Vocabulary
+
+ATTRIBUTES = ['PaxID', 'PTC', 'Birthdate', 'Passport', 'summary', 'node_ordinal',
+              'child_count', 'confidence', 'missing_elements']
+NODE_TYPES = ['PaxList', 'PassengerList', 'Pax', 'Passenger', 'PaxSegmentList', 'SegmentList', None]
+TARGETS = ['/DataLists/PaxList', '/DataLists/SegmentList', '/DataLists/JourneyList']
+
+
+def _reference(structure, rule):
+    return CompiledRule(rule).score(FactProfile(structure))
+
+
+def _assert_parity(facts, rules):
+    scorer = BulkSimilarityScorer()
+    encoded_rules = [scorer.encode_rule(rule) for rule in rules]
+    encoded_facts = [scorer.encode_fact(fact) for fact in facts]
+
+    matrix = scorer.score_matrix(encoded_facts, encoded_rules)
+
+    for fact, row in zip(facts, matrix):
+        expected = [_reference(fact, rule) for rule in rules]
+        # Exact equality on purpose: the engine must not drift by a rounding error
+        assert row == expected, (fact, rules)
+
+
+class TestVocabulary:
+    """Test suite for name -> bit encoding."""
+
+    def test_mask_assigns_stable_bits(self):
+        vocabulary = Vocabulary()
+
+        first = vocabulary.mask(['PaxID', 'PTC'])
+        second = vocabulary.mask(['PTC', 'Birthdate'])
+
+        assert first == 0b011
+        assert second == 0b110
+        assert vocabulary.mask(['PaxID', 'PaxID']) == 0b001
+        assert len(vocabulary) == 3
+        assert vocabulary.names(first & second) == {'PTC'}
+
+
+class TestParityCases:
+    """Hand-written cases covering each scoring component."""
+
+    def test_attributes_and_extra_attribute_penalty(self):
+        facts = [
+            {'node_type': 'Pax', 'attributes': {'PaxID': 1, 'PTC': 1}},
+            {'node_type': 'Pax', 'attributes': {'PaxID': 1, 'Birthdate': 1, 'Passport': 1, 'summary': 's'}},
+            {'node_type': 'Pax', 'attributes': {}},
+        ]
+        rules = [
+            {'node_type': 'Pax', 'must_have_attributes': ['PaxID', 'PTC']},
+            {'node_type': 'Passenger', 'must_have_attributes': ['PaxID'], 'optional_attributes': ['Birthdate']},
+            {'node_type': 'Pax'},
+            {'node_type': 'SegmentList', 'must_have_attributes': ['PaxID', 'PaxID']},
+        ]
+        _assert_parity(facts, rules)
+
+    def test_child_structures(self):
+        facts = [
+            {'node_type': 'PaxList', 'children': [{'node_type': 'Pax'}, {'node_type': 'Passenger'}]},
+            {'node_type': 'PaxList', 'children': [{'node_type': 'Segment'}]},
+            {'node_type': 'PaxList', 'children': ['PAX1']},
+            {'node_type': 'PaxList', 'children': []},
+        ]
+        rules = [
+            {'node_type': 'PaxList', 'child_structure': {'has_children': True, 'is_container': True,
+                                                         'child_types': ['Pax', 'Infant']}},
+            {'node_type': 'PaxList', 'child_structure': {'has_children': True, 'is_container': True}},
+            {'node_type': 'PaxList', 'child_structure': {'has_children': True, 'is_container': False}},
+            {'node_type': 'PaxList', 'child_structure': {'has_children': False}},
+        ]
+        _assert_parity(facts, rules)
+
+    def test_references_and_relationships(self):
+        facts = [
+            {'node_type': 'Pax', 'relationships': [
+                {'type': 'infant_parent', 'direction': 'infant_to_adult',
+                 'target_section_path': TARGETS[0], 'is_valid': True}]},
+            {'node_type': 'Pax', 'relationships': [
+                {'type': 'infant_parent', 'direction': 'adult_to_infant',
+                 'target_section_path': TARGETS[0], 'is_valid': False},
+                {'type': 'segment_reference', 'target_section_path': TARGETS[1], 'is_valid': True}]},
+            {'node_type': 'Pax', 'relationships': []},
+        ]
+        rules = [
+            {'node_type': 'Pax', 'reference_patterns': [{'type': 'infant_parent', 'direction': 'infant_to_adult'}]},
+            {'node_type': 'Pax', 'reference_patterns': [{'type': 'segment_reference'}, {'type': 'pax_reference'}]},
+            {'node_type': 'Pax', 'expected_relationships': [
+                {'target_section_path': TARGETS[0], 'is_valid': True},
+                {'target_section_path': TARGETS[2], 'is_valid': True}]},
+            {'node_type': 'Pax'},
+        ]
+        _assert_parity(facts, rules)
+
+    def test_variations(self):
+        facts = [
+            {'node_type': 'PaxList', 'attributes': {'PaxID': 1},
+             'children': [{'node_type': 'Pax', 'attributes': {'PaxID': 1, 'PTC': 1}},
+                          {'node_type': 'Pax', 'attributes': {'PaxID': 1, 'missing_elements': []}}]},
+            {'node_type': 'PaxList', 'attributes': {'PaxID': 1},
+             'children': {'node_type': 'Pax', 'attributes': {'PaxID': 1, 'PTC': 1}}},
+            {'node_type': 'PaxList', 'attributes': {'PaxID': 1},
+             'children': '[{"node_type": "Pax", "attributes": {"PaxID": 1}}]'},
+            {'node_type': 'PaxList', 'attributes': {}},
+        ]
+        rules = [{
+            'node_type': 'PaxList',
+            'variations': [
+                {'variation_id': 1, 'node_type': 'PaxList', 'must_have_attributes': ['PaxID', 'Passport']},
+                {'variation_id': 2, 'node_type': 'PaxList', 'must_have_attributes': ['PaxID'],
+                 'child_structure': {'has_children': True, 'child_structures': [
+                     {'node_type': 'Pax', 'required_attributes': ['PaxID', 'PTC']},
+                     {'node_type': 'Infant', 'required_attributes': ['PaxID']}]}},
+                {'variation_id': 3, 'node_type': 'PaxList', 'must_have_attributes': ['PaxID'],
+                 'child_structure': {'has_children': True, 'child_structures': [
+                     {'node_type': 'Pax', 'required_attributes': ['PaxID']}]}},
+            ]
+        }, {
+            'node_type': 'Pax',
+            'variations': [{'variation_id': 1, 'node_type': 'Pax'}]
+        }]
+        _assert_parity(facts, rules)
+
+
+class TestRandomizedParity:
+    """Randomized facts x rules matrices."""
+
+    def _subset(self, rng, names, p=0.4):
+        return [name for name in names if rng.random() < p]
+
+    def _fact(self, rng):
+        fact = {'node_type': rng.choice(NODE_TYPES),
+                'attributes': {name: 1 for name in self._subset(rng, ATTRIBUTES)}}
+        roll = rng.random()
+        if roll < 0.4:
+            fact['children'] = [
+                {'node_type': rng.choice(NODE_TYPES), 'attributes': {n: 1 for n in self._subset(rng, ATTRIBUTES)}}
+                for _ in range(rng.randint(1, 4))
+            ]
+        elif roll < 0.5:
+            fact['children'] = ['REF1']
+        if rng.random() < 0.6:
+            fact['relationships'] = [
+                {'type': rng.choice(['pax_reference', 'infant_parent', 'segment_reference']),
+                 'direction': rng.choice(['', 'infant_to_adult', 'adult_to_infant']),
+                 'target_section_path': rng.choice(TARGETS),
+                 'is_valid': rng.random() < 0.7}
+                for _ in range(rng.randint(0, 3))
+            ]
+        return fact
+
+    def _variation(self, rng):
+        rule = {'node_type': rng.choice(NODE_TYPES),
+                'must_have_attributes': self._subset(rng, ATTRIBUTES),
+                'optional_attributes': self._subset(rng, ATTRIBUTES, 0.2),
+                'variation_id': rng.randint(1, 5)}
+        if rng.random() < 0.5:
+            rule['child_structure'] = {
+                'has_children': rng.random() < 0.8,
+                'is_container': rng.random() < 0.7,
+                'child_types': self._subset(rng, NODE_TYPES[:-1]),
+                'child_structures': [
+                    {'node_type': rng.choice(NODE_TYPES), 'required_attributes': self._subset(rng, ATTRIBUTES)}
+                    for _ in range(rng.randint(0, 3))
+                ]
+            }
+        if rng.random() < 0.4:
+            rule['reference_patterns'] = [
+                {'type': rng.choice(['pax_reference', 'infant_parent']),
+                 'direction': rng.choice(['', 'infant_to_adult'])}
+                for _ in range(rng.randint(1, 2))
+            ]
+        if rng.random() < 0.4:
+            rule['expected_relationships'] = [
+                {'target_section_path': rng.choice(TARGETS), 'is_valid': rng.random() < 0.6}
+                for _ in range(rng.randint(1, 2))
+            ]
+        return rule
+
+    def _rule(self, rng):
+        if rng.random() < 0.4:
+            return {'node_type': rng.choice(NODE_TYPES),
+                    'variations': [self._variation(rng) for _ in range(rng.randint(1, 4))]}
+        return self._variation(rng)
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_matrix_matches_reference(self, seed):
+        rng = random.Random(seed)
+        facts = [self._fact(rng) for _ in range(60)]
+        rules = [self._rule(rng) for _ in range(60)]
+
+        _assert_parity(facts, rules)
+
+    def test_rules_encoded_before_facts(self):
+        """Bits assigned in any order give the same scores."""
+        rng = random.Random(42)
+        facts = [self._fact(rng) for _ in range(30)]
+        rules = [self._rule(rng) for _ in range(30)]
+
+        scorer = BulkSimilarityScorer()
+        encoded_facts = [scorer.encode_fact(fact) for fact in facts]
+        encoded_rules = [scorer.encode_rule(rule) for rule in rules]
+
+        for fact, encoded_fact in zip(facts, encoded_facts):
+            assert scorer.score_row(encoded_fact, encoded_rules) == [_reference(fact, rule) for rule in rules]
@@ -0,0 +1,109 @@
+"""
+Unit tests for structural sampling of repeated sibling elements.
+
+Tests:
+- Shape signatures ignore values and cardinality
+- One representative is kept per distinct shape
+- Parser integration and write-back of counts into the container fact
+"""
+import tempfile
+from pathlib import Path
+
+from lxml import etree
+
+from app.services.structural_sampler import sample_distinct_shapes, shape_signature
+from app.services.xml_parser import XmlStreamingParser
+
+
+PAX_LIST = """<PaxList Note="x">
+    <Pax><PaxID>PAX1</PaxID><PTC>ADT</PTC></Pax>
+    <Pax><PaxID>PAX2</PaxID><PTC>ADT</PTC></Pax>
+    <Pax><PaxID>PAX3</PaxID><PTC>INF</PTC><PaxRefID>PAX1</PaxRefID></Pax>
+    <Pax><PaxID>PAX4</PaxID><PTC>ADT</PTC></Pax>
+    <Pax><PaxID>PAX5</PaxID><PTC>INF</PTC><PaxRefID>PAX2</PaxRefID></Pax>
+    <Summary>5 passengers</Summary>
+</PaxList>"""
+
+
+class TestShapeSignature:
+    """Test suite for shape signatures."""
+
+    def test_values_and_cardinality_are_ignored(self):
+        """Test that only structure contributes to the signature."""
+        a = etree.fromstring('<Pax Type="A"><Phone>1</Phone></Pax>')
+        b = etree.fromstring('<Pax Type="B"><Phone>2</Phone><Phone>3</Phone></Pax>')
+        assert shape_signature(a) == shape_signature(b)
+
+    def test_attributes_and_children_change_the_signature(self):
+        """Test that attribute names and child tags are part of the shape."""
+        base = etree.fromstring('<Pax><Phone>1</Phone></Pax>')
+        with_attr = etree.fromstring('<Pax Type="A"><Phone>1</Phone></Pax>')
+        with_child = etree.fromstring('<Pax><Phone>1</Phone><Email>e</Email></Pax>')
+        assert len({shape_signature(base), shape_signature(with_attr), shape_signature(with_child)}) == 3
+
+
+class TestSampleDistinctShapes:
+    """Test suite for sample_distinct_shapes."""
+
+    def test_keeps_one_representative_per_shape(self):
+        """Test repeated children collapse to distinct shapes with counts."""
+        sampled, sampling = sample_distinct_shapes(etree.fromstring(PAX_LIST))
+
+        assert [child.tag for child in sampled] == ["Pax", "Pax", "Summary"]
+        assert sampled.get("Note") == "x"
+        assert sampling.total_children == 6
+        assert sampling.kept_ordinals == [1, 3, 6]
+        assert [(g.node_type, g.count, g.representative_ordinal) for g in sampling.groups] == [
+            ("Pax", 3, 1), ("Pax", 2, 3)
+        ]
+        assert sampling.original_ordinal(2) == 3
+
+    def test_returns_none_when_nothing_repeats(self):
+        """Test containers without duplicate shapes are left alone."""
+        element = etree.fromstring("<Order><OrderID>1</OrderID><Pax><PaxID>P</PaxID></Pax></Order>")
+        assert sample_distinct_shapes(element) is None
+
+
+class TestStructuralDedupPipeline:
+    """Test suite for parser integration and fact write-back."""
+
+    def test_parser_samples_and_extractor_writes_counts_back(self, monkeypatch):
+        """Test the subtree carries sampled XML and facts get original counts."""
+        from app.core.config import settings
+        from app.services.llm_extractor import LLMNodeFactsExtractor
+        monkeypatch.setattr(settings, "STRUCTURAL_DEDUP_ENABLED", True)
+
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.xml', delete=False) as f:
+            f.write(f"<OrderViewRS><Response><DataLists>{PAX_LIST}</DataLists></Response></OrderViewRS>")
+            temp_path = f.name
+
+        try:
+            parser = XmlStreamingParser([{"path_local": "/OrderViewRS/Response/DataLists/PaxList"}])
+            subtree = list(parser.parse_stream(temp_path))[0]
+        finally:
+            Path(temp_path).unlink()
+
+        assert "PAX2" not in subtree.xml_content
+        assert subtree.stats.total_children == 3
+        assert subtree.sampling.total_children == 6
+
+        facts = [{
+            'node_type': 'PaxList',
+            'node_ordinal': 1,
+            'attributes': {'child_count': 3},
+            'children': [
+                {'node_type': 'Pax', 'ordinal': 1},
+                {'node_type': 'Pax', 'ordinal': 2},
+                {'node_type': 'Summary', 'ordinal': 3}
+            ],
+            'business_intelligence': {'total_items': 3}
+        }]
+
+        extractor = LLMNodeFactsExtractor.__new__(LLMNodeFactsExtractor)
+        fact = extractor._apply_sampling(subtree, facts)[0]
+
+        assert [child['ordinal'] for child in fact['children']] == [1, 3, 6]
+        assert [child.get('represents') for child in fact['children']] == [3, 2, None]
+        assert fact['attributes']['child_count'] == 6
+        assert fact['business_intelligence']['total_items'] == 6
+        assert len(fact['structural_samples']) == 2
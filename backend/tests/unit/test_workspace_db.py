@@ -5,16 +5,22 @@ Tests workspace isolation and management including:
 - Workspace session factory
 - Session creation
 - Data isolation between workspaces
+- SQLite storage profile (WAL, pragmas, read-only pool, lock retries)
+- Secondary indexes on hot query columns (EXPLAIN QUERY PLAN)
 """
 import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.services.workspace_db import (
     WorkspaceSessionFactory,
     get_workspace_session_factory,
     get_workspace_session,
-    list_workspaces
+    list_workspaces,
+    run_with_db_retry
 )
-from app.models.database import Run
+from app.models.database import NodeFact, NodeRelationship, Pattern, PatternMatch, Run
 
 
 class TestWorkspaceSessionFactory:
@@ -122,3 +128,180 @@ class TestWorkspaceHelpers:
         # The runs should have different IDs showing they are isolated
         assert run1_id in [r.id for r in ws1_runs]
         assert run2_id in [r.id for r in ws2_runs]
+
+
+class TestStorageProfile:
+    """Test suite for the workspace SQLite storage profile."""
+
+    @pytest.fixture
+    def factory(self, tmp_workspace):
+        return tmp_workspace
+
+    def _pragma(self, session, name):
+        return session.execute(text(f"PRAGMA {name}")).scalar()
+
+    def test_pragmas_applied(self, factory):
+        """Test WAL journaling and tuned pragmas on read-write connections."""
+        session = factory.get_session()
+        try:
+            assert self._pragma(session, "journal_mode") == "wal"
+            assert self._pragma(session, "synchronous") == 1  # NORMAL
+            assert self._pragma(session, "busy_timeout") == settings.SQLITE_BUSY_TIMEOUT_MS
+            assert self._pragma(session, "cache_size") == -settings.SQLITE_CACHE_SIZE_KB
+            assert self._pragma(session, "temp_store") == 2  # MEMORY
+            assert self._pragma(session, "foreign_keys") == 1
+        finally:
+            session.close()
+
+    def test_connections_are_pooled(self, factory):
+        """Test workspace engines no longer share one static connection."""
+        assert factory.engine.pool.size() == settings.WORKSPACE_DB_POOL_SIZE
+        assert factory.read_engine.pool.size() == settings.WORKSPACE_DB_READ_POOL_SIZE
+
+    def test_read_session_rejects_writes(self, factory):
+        """Test read-only sessions cannot modify the database."""
+        session = factory.get_read_session()
+        try:
+            assert self._pragma(session, "query_only") == 1
+            session.add(Run(id="ro-run", kind="discovery"))
+            with pytest.raises(OperationalError):
+                session.flush()
+        finally:
+            session.rollback()
+            session.close()
+
+    def test_reads_proceed_during_write_transaction(self, factory):
+        """Test readers see the last commit while a writer holds its transaction open."""
+        with factory.session_scope() as session:
+            session.add(Run(id="committed-run", kind="discovery"))
+
+        writer = factory.get_session()
+        reader = factory.get_read_session()
+        try:
+            writer.add(Run(id="pending-run", kind="discovery"))
+            writer.flush()  # Holds the write lock, not yet committed
+
+            assert reader.query(Run).count() == 1
+        finally:
+            writer.rollback()
+            writer.close()
+            reader.close()
+
+
+class TestHotQueryIndexes:
+    """Test suite for the secondary indexes behind discovery and gap-analysis queries."""
+
+    @pytest.fixture
+    def factory(self, tmp_workspace):
+        return tmp_workspace
+
+    def _query_plan(self, session, query):
+        statement = query.statement.compile(
+            dialect=session.bind.dialect,
+            compile_kwargs={"literal_binds": True}
+        )
+        rows = session.execute(text(f"EXPLAIN QUERY PLAN {statement}")).fetchall()
+        return " | ".join(row[-1] for row in rows)
+
+    def _assert_uses_index(self, session, query, table, index_name):
+        plan = self._query_plan(session, query)
+        assert f"USING INDEX {index_name}" in plan, plan
+        assert f"SCAN {table}" not in plan.replace(f"SCAN {table} USING", ""), plan
+
+    def test_node_facts_by_run(self, factory):
+        with factory.session_scope() as session:
+            query = session.query(NodeFact).filter(NodeFact.run_id == "run-1")
+            self._assert_uses_index(session, query, "node_facts", "ix_node_facts_run_section")
+
+    def test_pattern_matches_by_run(self, factory):
+        with factory.session_scope() as session:
+            query = session.query(PatternMatch).filter(
+                PatternMatch.run_id == "run-1",
+                PatternMatch.verdict == "NO_MATCH"
+            )
+            self._assert_uses_index(session, query, "pattern_matches", "ix_pattern_matches_run_verdict")
+
+    def test_relationships_by_source(self, factory):
+        with factory.session_scope() as session:
+            query = session.query(NodeRelationship).filter(NodeRelationship.source_node_fact_id == 42)
+            self._assert_uses_index(session, query, "node_relationships", "ix_node_relationships_source")
+
+    def test_relationships_by_run_and_section(self, factory):
+        with factory.session_scope() as session:
+            query = session.query(NodeRelationship).filter(
+                NodeRelationship.run_id == "run-1",
+                NodeRelationship.source_section_path == "/OrderViewRS/Response/DataLists/PaxList"
+            )
+            self._assert_uses_index(session, query, "node_relationships",
+                                    "ix_node_relationships_run_source_section")
+
+    def test_active_pattern_lookup(self, factory):
+        with factory.session_scope() as session:
+            query = session.query(Pattern).filter(
+                Pattern.superseded_by.is_(None),
+                Pattern.message_root == "OrderViewRS",
+                Pattern.spec_version == "21.3",
+                Pattern.airline_code == "SQ"
+            )
+            self._assert_uses_index(session, query, "patterns", "ix_patterns_lookup")
+
+    def test_missing_indexes_added_on_startup(self, factory, tmp_path):
+        """Test workspaces created before the indexes existed are migrated."""
+        with factory.engine.begin() as conn:
+            conn.execute(text("DROP INDEX ix_node_facts_run_section"))
+            conn.execute(text("DROP INDEX ix_patterns_lookup"))
+        factory.dispose()
+
+        reopened = WorkspaceSessionFactory("indexes")
+        try:
+            inspector = inspect(reopened.engine)
+            assert "ix_node_facts_run_section" in {i["name"] for i in inspector.get_indexes("node_facts")}
+            assert "ix_patterns_lookup" in {i["name"] for i in inspector.get_indexes("patterns")}
+        finally:
+            reopened.dispose()
+
+
+class TestDatabaseRetry:
+    """Test suite for run_with_db_retry."""
+
+    def _locked(self):
+        return OperationalError("INSERT", {}, Exception("database is locked"))
+
+    def test_retries_until_success(self, monkeypatch):
+        monkeypatch.setattr(settings, 'RETRY_BACKOFF_FACTOR', 0.0)
+        attempts = []
+        rollbacks = []
+
+        def operation():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise self._locked()
+            return "done"
+
+        assert run_with_db_retry(operation, on_retry=lambda: rollbacks.append(1)) == "done"
+        assert len(attempts) == 3
+        assert len(rollbacks) == 2
+
+    def test_gives_up_after_max_retries(self, monkeypatch):
+        monkeypatch.setattr(settings, 'RETRY_BACKOFF_FACTOR', 0.0)
+        monkeypatch.setattr(settings, 'MAX_DB_RETRIES', 2)
+        attempts = []
+
+        def operation():
+            attempts.append(1)
+            raise self._locked()
+
+        with pytest.raises(OperationalError):
+            run_with_db_retry(operation)
+        assert len(attempts) == 3
+
+    def test_other_errors_not_retried(self):
+        attempts = []
+
+        def operation():
+            attempts.append(1)
+            raise OperationalError("SELECT", {}, Exception("no such table: runs"))
+
+        with pytest.raises(OperationalError):
+            run_with_db_retry(operation)
+        assert len(attempts) == 1
@@ -12,6 +12,8 @@ from pathlib import Path
 import tempfile
 from app.services.xml_parser import (
     XmlStreamingParser,
+    XmlIngestPipeline,
+    XmlSubtree,
     PathTrieNode,
     detect_ndc_version_fast,
     create_parser_for_version
@@ -193,6 +195,49 @@ class TestXmlStreamingParser:
         finally:
             Path(temp_path).unlink()
 
+    def test_parse_stream_keeps_target_descendants(self):
+        """Test that trie cursors keep whole target subtrees and skip non-targets."""
+        xml_content = """<?xml version="1.0" encoding="UTF-8"?>
+<OrderViewRS Version="21.3">
+    <Response>
+        <DataLists>
+            <ContactInfoList>
+                <ContactInfo><EmailAddress>a@example.com</EmailAddress></ContactInfo>
+            </ContactInfoList>
+            <PaxList>
+                <Pax><PaxID>PAX1</PaxID><Individual><Surname>Doe</Surname></Individual></Pax>
+                <Pax><PaxID>PAX2</PaxID><Individual><Surname>Roe</Surname></Individual></Pax>
+            </PaxList>
+        </DataLists>
+        <Order><OrderItem><OrderItemID>OI1</OrderItemID></OrderItem></Order>
+    </Response>
+</OrderViewRS>"""
+
+        target_paths = [
+            {"path_local": "/OrderViewRS/Response/DataLists/PaxList"},
+            {"path_local": "/OrderViewRS/Response/Order/OrderItem"},
+            {"path_local": "/OrderViewRS/Response/Missing/Node"}
+        ]
+
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.xml', delete=False) as f:
+            f.write(xml_content)
+            temp_path = f.name
+
+        try:
+            parser = XmlStreamingParser(target_paths)
+            subtrees = list(parser.parse_stream(temp_path))
+
+            assert [s.path for s in subtrees] == [
+                "/OrderViewRS/Response/DataLists/PaxList",
+                "/OrderViewRS/Response/Order/OrderItem"
+            ]
+            assert "PAX1" in subtrees[0].xml_content
+            assert "Roe" in subtrees[0].xml_content
+            assert subtrees[0].node_count == 9
+            assert "OI1" in subtrees[1].xml_content
+        finally:
+            Path(temp_path).unlink()
+
     def test_build_element_path(self):
         """Test element path building from stack."""
         parser = XmlStreamingParser([])
@@ -324,3 +369,452 @@ class TestXmlStreamingParser:
             assert version_info.airline_name == "American Airlines"
         finally:
             Path(temp_path).unlink()
+
+
+class TestXmlIngestPipeline:
+    """Test suite for single-pass XmlIngestPipeline."""
+
+    XML_CONTENT = """<?xml version="1.0" encoding="UTF-8"?>
+<IATA_OrderViewRS xmlns="http://www.iata.org/IATA/2015/00/2019.2/IATA_OrderViewRS">
+    <Response>
+        <DataLists>
+            <PaxList>
+                <Pax>
+                    <PaxID>PAX1</PaxID>
+                </Pax>
+            </PaxList>
+            <BaggageAllowanceList>
+                <BaggageAllowance>
+                    <BaggageAllowanceID>BAG1</BaggageAllowanceID>
+                </BaggageAllowance>
+            </BaggageAllowanceList>
+        </DataLists>
+        <Order Owner="AA">
+            <OrderID>ORDER123</OrderID>
+        </Order>
+    </Response>
+</IATA_OrderViewRS>"""
+
+    def _write_temp(self, content: str) -> str:
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.xml', delete=False) as f:
+            f.write(content)
+            return f.name
+
+    def test_single_pass_hash_version_and_subtrees(self):
+        """Test that one read yields hash, version, airline and final subtrees."""
+        import hashlib
+
+        temp_path = self._write_temp(self.XML_CONTENT)
+        calls = []
+
+        def candidate_targets(version_info):
+            calls.append(('candidate', version_info.spec_version, version_info.airline_code))
+            return [
+                {"path_local": "/OrderViewRS/Response/DataLists/PaxList"},
+                {"path_local": "/OrderViewRS/Response/DataLists/BaggageAllowanceList"}
+            ]
+
+        def resolve_targets(version_info):
+            calls.append(('final', version_info.spec_version, version_info.airline_code))
+            return [{"path_local": "/OrderViewRS/Response/DataLists/PaxList"}]
+
+        try:
+            pipeline = XmlIngestPipeline(temp_path, candidate_targets, resolve_targets)
+            subtrees = list(pipeline.iter_subtrees())
+
+            # Candidates are loaded on version, final targets once the airline is known
+            assert calls == [('candidate', '19.2', None), ('final', '19.2', 'AA')]
+
+            # BaggageAllowanceList was only a candidate and must be filtered out
+            assert [s.path for s in subtrees] == ["/OrderViewRS/Response/DataLists/PaxList"]
+
+            with open(temp_path, 'rb') as f:
+                assert pipeline.file_hash == hashlib.sha256(f.read()).hexdigest()
+            assert pipeline.version_info.message_root == "OrderViewRS"
+        finally:
+            Path(temp_path).unlink()
+
+    def test_airline_not_found_resolves_at_end(self):
+        """Test that final targets are resolved at end of input without an airline."""
+        xml_content = """<?xml version="1.0" encoding="UTF-8"?>
+<OrderViewRS Version="21.3">
+    <Response>
+        <DataLists>
+            <PaxList><Pax><PaxID>PAX1</PaxID></Pax></PaxList>
+        </DataLists>
+    </Response>
+</OrderViewRS>"""
+        temp_path = self._write_temp(xml_content)
+        targets = [{"path_local": "/OrderViewRS/Response/DataLists/PaxList"}]
+        resolved = []
+
+        try:
+            pipeline = XmlIngestPipeline(
+                temp_path,
+                lambda info: targets,
+                lambda info: resolved.append(info.airline_code) or targets
+            )
+            subtrees = list(pipeline.iter_subtrees())
+
+            assert resolved == [None]
+            assert len(subtrees) == 1
+            assert pipeline.version_info.spec_version == "21.3"
+        finally:
+            Path(temp_path).unlink()
+
+    def test_owner_outranks_earlier_marketing_carrier(self):
+        """Test a codeshare file: DataLists (marketing carrier) precede the owning Order."""
+        xml_content = """<?xml version="1.0" encoding="UTF-8"?>
+<OrderViewRS Version="21.3">
+    <Response>
+        <DataLists>
+            <PaxSegmentList>
+                <PaxSegment>
+                    <MarketingCarrierInfo><CarrierDesigCode>XX</CarrierDesigCode></MarketingCarrierInfo>
+                </PaxSegment>
+            </PaxSegmentList>
+            <PaxList><Pax><PaxID>PAX1</PaxID></Pax></PaxList>
+        </DataLists>
+        <Order Owner="YY"><OrderID>ORDER123</OrderID></Order>
+    </Response>
+</OrderViewRS>"""
+        temp_path = self._write_temp(xml_content)
+        targets = [{"path_local": "/OrderViewRS/Response/DataLists/PaxList"}]
+        resolved = []
+
+        try:
+            pipeline = XmlIngestPipeline(
+                temp_path,
+                lambda info: targets,
+                lambda info: resolved.append(info.airline_code) or targets
+            )
+            subtrees = list(pipeline.iter_subtrees())
+
+            assert resolved == ["YY"]
+            assert [s.path for s in subtrees] == ["/OrderViewRS/Response/DataLists/PaxList"]
+        finally:
+            Path(temp_path).unlink()
+
+    def test_resolver_errors_propagate(self):
+        """Test that errors raised by target resolvers are not rewrapped."""
+        temp_path = self._write_temp(self.XML_CONTENT)
+
+        def candidate_targets(version_info):
+            raise ValueError("No node configurations found")
+
+        try:
+            pipeline = XmlIngestPipeline(temp_path, candidate_targets, lambda info: [])
+            with pytest.raises(ValueError, match="^No node configurations found$"):
+                list(pipeline.iter_subtrees())
+        finally:
+            Path(temp_path).unlink()
+
+
+class TestHeaderSniffing:
+    """Test suite for bounded header sniffing in detect_ndc_version_fast."""
+
+    def _write_padded(self, padding_items: int) -> str:
+        pax = "".join(
+            f"<Pax><PaxID>PAX{i}</PaxID><PTC>ADT</PTC></Pax>" for i in range(padding_items)
+        )
+        xml_content = f"""<?xml version="1.0" encoding="UTF-8"?>
+<IATA_OrderViewRS xmlns="http://www.iata.org/IATA/2015/00/2019.2/IATA_OrderViewRS">
+    <Response>
+        <DataLists><PaxList>{pax}</PaxList></DataLists>
+        <Order Owner="AA"><OrderID>ORDER123</OrderID></Order>
+    </Response>
+</IATA_OrderViewRS>"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.xml', delete=False) as f:
+            f.write(xml_content)
+            return f.name
+
+    def test_byte_budget_limits_airline_search(self):
+        """Test that sniffing stops at the byte budget but keeps the version."""
+        temp_path = self._write_padded(5000)
+
+        try:
+            version_info = detect_ndc_version_fast(temp_path, max_bytes=1024)
+
+            assert version_info is not None
+            assert version_info.spec_version == "19.2"
+            assert version_info.airline_code is None
+
+            version_info = detect_ndc_version_fast(temp_path)
+            assert version_info.airline_code == "AA"
+        finally:
+            Path(temp_path).unlink()
+
+    def test_stops_at_first_airline_signal(self):
+        """Test that Order/@Owner settles the airline and ends the sniff."""
+        xml_content = """<?xml version="1.0" encoding="UTF-8"?>
+<OrderViewRS Version="21.3">
+    <Response>
+        <Order Owner="AA"><OrderID>ORDER123</OrderID></Order>
+        <DataLists>
+            <PaxSegmentList>
+                <PaxSegment>
+                    <MarketingCarrierInfo>
+                        <CarrierDesigCode>BA</CarrierDesigCode>
+                    </MarketingCarrierInfo>
+                </PaxSegment>
+            </PaxSegmentList>
+        </DataLists>
+    </Response>
+</OrderViewRS>"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.xml', delete=False) as f:
+            f.write(xml_content)
+            temp_path = f.name
+
+        try:
+            version_info = detect_ndc_version_fast(temp_path)
+
+            assert version_info.spec_version == "21.3"
+            assert version_info.airline_code == "AA"
+        finally:
+            Path(temp_path).unlink()
+
+    def test_marketing_carrier_detection(self):
+        """Test airline detection from PaxSegment/MarketingCarrierInfo."""
+        xml_content = """<?xml version="1.0" encoding="UTF-8"?>
+<OrderViewRS Version="21.3">
+    <Response>
+        <DataLists>
+            <PaxSegmentList>
+                <PaxSegment>
+                    <MarketingCarrierInfo>
+                        <CarrierDesigCode>SQ</CarrierDesigCode>
+                        <CarrierName>Singapore Airlines</CarrierName>
+                    </MarketingCarrierInfo>
+                </PaxSegment>
+            </PaxSegmentList>
+        </DataLists>
+    </Response>
+</OrderViewRS>"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.xml', delete=False) as f:
+            f.write(xml_content)
+            temp_path = f.name
+
+        try:
+            version_info = detect_ndc_version_fast(temp_path)
+
+            assert version_info.airline_code == "SQ"
+            assert version_info.airline_name == "Singapore Airlines"
+        finally:
+            Path(temp_path).unlink()
+
+    def test_owner_outranks_earlier_marketing_carrier(self):
+        """Test that Order/@Owner wins over a MarketingCarrierInfo seen before it."""
+        pax = "".join(
+            f"<Pax><PaxID>PAX{i}</PaxID><PTC>ADT</PTC></Pax>" for i in range(5000)
+        )
+        xml_content = f"""<?xml version="1.0" encoding="UTF-8"?>
+<OrderViewRS Version="21.3">
+    <Response>
+        <DataLists>
+            <PaxSegmentList>
+                <PaxSegment>
+                    <MarketingCarrierInfo>
+                        <CarrierDesigCode>BA</CarrierDesigCode>
+                    </MarketingCarrierInfo>
+                </PaxSegment>
+            </PaxSegmentList>
+            <PaxList>{pax}</PaxList>
+        </DataLists>
+        <Order Owner="AA"><OrderID>ORDER123</OrderID></Order>
+    </Response>
+</OrderViewRS>"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.xml', delete=False) as f:
+            f.write(xml_content)
+            temp_path = f.name
+
+        try:
+            version_info = detect_ndc_version_fast(temp_path)
+            assert version_info.airline_code == "AA"
+
+            # Budget spent before the Order: settle to the best candidate so far
+            version_info = detect_ndc_version_fast(temp_path, max_bytes=64 * 1024)
+            assert version_info.airline_code == "BA"
+        finally:
+            Path(temp_path).unlink()
+
+
+class TestSubtreeStats:
+    """Test suite for compact subtree serialization and precomputed stats."""
+
+    def test_stats_match_structure(self):
+        """Test child histogram, node count and byte size come from one traversal."""
+        subtree = XmlSubtree.from_xml(
+            '<PaxList xmlns="urn:x"><Pax><PaxID>P1</PaxID></Pax><Pax><PaxID>P2</PaxID></Pax>'
+            '<!-- note --><Meta/></PaxList>',
+            "/OrderViewRS/Response/DataLists/PaxList"
+        )
+
+        assert subtree.stats.child_tags == {"Pax": 2, "Meta": 1}
+        assert subtree.stats.repeating_tag == "Pax"
+        assert subtree.stats.max_repetition == 2
+        assert subtree.node_count == 6
+        assert subtree.size_bytes == len(subtree.xml_bytes)
+        assert subtree.root_element.namespace_uri == "urn:x"
+
+    def test_serialization_is_compact_and_decoded_lazily(self):
+        """Test no pretty-printing is added and xml_content decodes xml_bytes."""
+        subtree = XmlSubtree.from_xml('<Pax><Name>Zoë</Name></Pax>', "/Pax")
+
+        assert subtree.xml_bytes == '<Pax><Name>Zoë</Name></Pax>'.encode('utf-8')
+        assert subtree.xml_content == '<Pax><Name>Zoë</Name></Pax>'
+
+    def test_extractor_uses_precomputed_stats(self):
+        """Test structure analysis reads stats instead of re-parsing."""
+        from app.services.llm_extractor import LLMNodeFactsExtractor
+
+        subtree = XmlSubtree.from_xml('<PaxList><Pax/><Pax/></PaxList>', "/PaxList")
+        extractor = LLMNodeFactsExtractor.__new__(LLMNodeFactsExtractor)
+
+        # Invalid XML proves the content is not parsed when stats are given
+        structure = extractor._analyze_xml_structure("not xml", subtree.path, subtree.stats)
+
+        assert structure['is_container'] is True
+        assert structure['repeating_tag'] == "Pax"
+        assert structure['total_children'] == 2
+
+
+class TestOversizedSubtreeSplitting:
+    """Test suite for splitting subtrees above MAX_SUBTREE_SIZE_KB into batches."""
+
+    def _write_pax_list(self, pax_count: int, filler: int = 300) -> str:
+        pax = "".join(
+            f"<Pax><PaxID>PAX{i}</PaxID><Remark>{'x' * filler}</Remark></Pax>"
+            for i in range(pax_count)
+        )
+        xml_content = f"""<?xml version="1.0" encoding="UTF-8"?>
+<IATA_OrderViewRS xmlns="http://www.iata.org/IATA/2015/00/2019.2/IATA_OrderViewRS">
+<Response><DataLists><PaxList Note="shared">{pax}</PaxList></DataLists></Response>
+</IATA_OrderViewRS>"""
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.xml', delete=False) as f:
+            f.write(xml_content)
+            return f.name
+
+    def test_oversized_container_is_split_under_budget(self, monkeypatch):
+        """Test batches share the container header, stay under budget and keep offsets."""
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "MAX_SUBTREE_SIZE_KB", 2)
+        temp_path = self._write_pax_list(20)
+
+        try:
+            parser = XmlStreamingParser([{"path_local": "/OrderViewRS/Response/DataLists/PaxList"}])
+            subtrees = list(parser.parse_stream(temp_path))
+
+            assert len(subtrees) == 1
+            container = subtrees[0]
+            assert container.stats.total_children == 20
+            assert len(container.batches) > 1
+
+            offsets = [batch.ordinal_offset for batch in container.batches]
+            counts = [batch.stats.total_children for batch in container.batches]
+            assert offsets == [sum(counts[:i]) for i in range(len(counts))]
+            assert sum(counts) == 20
+
+            for batch in container.batches:
+                assert batch.size_bytes <= 2 * 1024
+                assert batch.root_element.attributes == {"Note": "shared"}
+                assert batch.path == container.path
+            assert b"PAX0<" in container.batches[0].xml_bytes
+            assert b"PAX19<" in container.batches[-1].xml_bytes
+        finally:
+            Path(temp_path).unlink()
+
+    def test_splitting_disabled_skips_subtree(self, monkeypatch):
+        """Test legacy behaviour when splitting is turned off."""
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "MAX_SUBTREE_SIZE_KB", 2)
+        monkeypatch.setattr(settings, "SPLIT_OVERSIZED_SUBTREES", False)
+        temp_path = self._write_pax_list(20)
+
+        try:
+            parser = XmlStreamingParser([{"path_local": "/OrderViewRS/Response/DataLists/PaxList"}])
+            assert list(parser.parse_stream(temp_path)) == []
+        finally:
+            Path(temp_path).unlink()
+
+    def test_batch_facts_merge_into_one_container(self, monkeypatch):
+        """Test per-batch container facts merge with global child ordinals."""
+        from app.core.config import settings
+        from app.services.llm_extractor import LLMNodeFactsExtractor
+        monkeypatch.setattr(settings, "MAX_SUBTREE_SIZE_KB", 2)
+        temp_path = self._write_pax_list(20)
+
+        try:
+            parser = XmlStreamingParser([{"path_local": "/OrderViewRS/Response/DataLists/PaxList"}])
+            container = list(parser.parse_stream(temp_path))[0]
+        finally:
+            Path(temp_path).unlink()
+
+        batch_facts = [
+            [{
+                'node_type': 'PaxList',
+                'node_ordinal': 1,
+                'attributes': {'child_count': batch.stats.total_children},
+                'children': [{'node_type': 'Pax', 'ordinal': i + 1}
+                             for i in range(batch.stats.total_children)],
+                'relationships': [{'type': 'same'}],
+                'business_intelligence': {'type_breakdown': {'ADT': batch.stats.total_children},
+                                          'has_references': False},
+                'quality_checks': {'status': 'ok', 'missing_elements': []},
+                'confidence': 0.9
+            }]
+            for batch in container.batches
+        ]
+
+        extractor = LLMNodeFactsExtractor.__new__(LLMNodeFactsExtractor)
+        merged = extractor._merge_batch_facts(container, batch_facts)
+
+        assert len(merged) == 1
+        fact = merged[0]
+        assert fact['node_ordinal'] == 1
+        assert [child['ordinal'] for child in fact['children']] == list(range(1, 21))
+        assert fact['attributes']['child_count'] == 20
+        assert fact['business_intelligence']['type_breakdown'] == {'ADT': 20}
+        assert fact['business_intelligence']['total_items'] == 20
+        assert fact['relationships'] == [{'type': 'same'}]
+        assert fact['quality_checks']['match_percentage'] == 100
+
+    def test_failing_batch_cancels_siblings(self, monkeypatch):
+        """Test the first failing batch cancels the batches still running."""
+        import asyncio
+        from app.core.config import settings
+        from app.services.llm_extractor import LLMNodeFactsExtractor
+        monkeypatch.setattr(settings, "MAX_SUBTREE_SIZE_KB", 2)
+        temp_path = self._write_pax_list(20)
+
+        try:
+            parser = XmlStreamingParser([{"path_local": "/OrderViewRS/Response/DataLists/PaxList"}])
+            container = list(parser.parse_stream(temp_path))[0]
+        finally:
+            Path(temp_path).unlink()
+
+        started, cancelled = [], []
+
+        async def fake_extract(batch, context=None):
+            started.append(batch.ordinal_offset)
+            if batch.ordinal_offset == 0:
+                await asyncio.sleep(0)
+                raise ValueError("LLM Extraction Error: boom")
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(batch.ordinal_offset)
+                raise
+
+        extractor = LLMNodeFactsExtractor.__new__(LLMNodeFactsExtractor)
+        extractor.extract_from_subtree = fake_extract
+
+        async def run():
+            with pytest.raises(ValueError, match="boom"):
+                await extractor._extract_from_batches(container)
+            return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+        pending = asyncio.run(run())
+
+        assert len(started) == len(container.batches)
+        assert sorted(cancelled) == sorted(started[1:])
+        assert pending == []
@@ -415,11 +415,11 @@ def upload_file_for_run(file, run_kind: str, workspace: str = "default", target_
             f"{API_BASE_URL}/runs/",
             files=files,
             params=params,
-            timeout=600  # Increased to 10 minutes for large XML files with many nodes
+            timeout=120  # Upload only - the run executes in the background
         )
 
         if response.status_code == 200:
-            return response.json()
+            return wait_for_run(response.json(), workspace)
         else:
             # Try to extract detailed error message from response
             try:
@@ -447,7 +447,7 @@ def upload_file_for_run(file, run_kind: str, workspace: str = "default", target_
             return None
 
     except requests.exceptions.Timeout:
-        st.error(f"❌ **Request Timeout**: The server took too long to respond (> 10 minutes)")
+        st.error(f"❌ **Request Timeout**: The server took too long to accept the upload")
         st.warning("**This happens when:**")
         st.write("- Too many nodes are selected for extraction in Node Manager")
         st.write("- Large XML file with complex structure")
@@ -470,6 +470,81 @@ def upload_file_for_run(file, run_kind: str, workspace: str = "default", target_
         return None
 
 
+RUN_POLL_INTERVAL_SECONDS = 2
+RUN_POLL_TIMEOUT_SECONDS = 3600
+# Read timeout of the progress stream; the server sends a heartbeat every 15s
+RUN_EVENTS_READ_TIMEOUT_SECONDS = 60
+
+
+def iter_run_events(run_id: str, workspace: str = "default"):
+    """Yield (event, data) pairs from the run's server-sent progress stream."""
+    with requests.get(
+        f"{API_BASE_URL}/runs/{run_id}/events",
+        params={"workspace": workspace},
+        stream=True,
+        timeout=(10, RUN_EVENTS_READ_TIMEOUT_SECONDS)
+    ) as response:
+        response.raise_for_status()
+        event, data_lines = "message", []
+        for line in response.iter_lines(decode_unicode=True):
+            if line:
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data_lines.append(line[len("data:"):].strip())
+                continue
+            # Blank line: end of one event (comment-only heartbeats carry no data)
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+
+
+def _render_run_progress(placeholder, snapshot: Dict[str, Any]):
+    phase = snapshot.get('phase', 'queued')
+    done, total = snapshot.get('subtrees_done', 0), snapshot.get('subtrees_total', 0)
+    facts_total = snapshot.get('facts_total')
+    if phase == 'matching' and facts_total:
+        fraction, detail = snapshot.get('facts_matched', 0) / facts_total, \
+            f"{snapshot.get('facts_matched', 0)}/{facts_total} NodeFacts matched"
+    else:
+        fraction, detail = (done / total if total else 0.0), f"{done}/{total} subtrees"
+    placeholder.progress(
+        min(fraction, 1.0),
+        text=f"{phase.replace('_', ' ').title()} - {detail}, {snapshot.get('node_facts', 0)} NodeFacts, "
+             f"{snapshot.get('tokens_used', 0):,} tokens, {snapshot.get('elapsed_seconds', 0):.0f}s"
+    )
+
+
+def wait_for_run(run: Dict[str, Any], workspace: str = "default") -> Optional[Dict[str, Any]]:
+    """
+    Wait for a background run to finish; returns its final status.
+
+    Follows the run's progress stream, falling back to polling if the stream
+    is unavailable or closes before the run has ended.
+    """
+    if run.get('status') in ('started', 'in_progress'):
+        placeholder = st.empty()
+        try:
+            for event, data in iter_run_events(run['id'], workspace):
+                if event in ('snapshot', 'phase', 'progress', 'end'):
+                    _render_run_progress(placeholder, data)
+                if event == 'end':
+                    break
+        except (requests.exceptions.RequestException, ValueError):
+            pass
+        placeholder.empty()
+        run = get_run_status(run['id'], workspace) or run
+
+    deadline = time.time() + RUN_POLL_TIMEOUT_SECONDS
+    while run.get('status') in ('started', 'in_progress'):
+        if time.time() > deadline:
+            st.error(f"❌ Run {run['id']} is still processing after {RUN_POLL_TIMEOUT_SECONDS // 60} minutes")
+            return None
+        time.sleep(RUN_POLL_INTERVAL_SECONDS)
+        run = get_run_status(run['id'], workspace) or run
+    return run
+
+
 def get_runs(kind: Optional[str] = None, limit: int = 50, workspace: str = "default") -> List[Dict[str, Any]]:
     """Get list of runs."""
     try: